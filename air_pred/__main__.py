@@ -0,0 +1,3 @@
+from air_pred.cli import main
+
+main()
@@ -0,0 +1,77 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.bench_memory import current_rss_mb, reset_peak_rss, peak_rss_mb
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.pipeline import batch_inference_pipeline
+from air_pred.utils import data_preprocessing, feature_store, model_cache
+
+class FakeFeatureView(object):
+    """Serves get_batch_data from the cleaned data feature group without the label"""
+
+    def __init__(self, fg):
+        self.fg = fg
+
+    def init_serving(self, training_dataset_version):
+        pass
+
+    def get_batch_data(self, start_time=None, end_time=None, read_options=None):
+        df = self.fg.data
+        if start_time is not None:
+            df = df[(df.date_time >= start_time) & (df.date_time < end_time)]
+        return df.drop("femman_pm25", axis=1)
+
+def run_years(years : float, chunk_days : float) -> dict:
+    """Runs batch_predict on years of synthetic cleaned data in a fresh process, chunk_days of None reads the complete history as one chunk"""
+    warnings.simplefilter("ignore")
+    df = data_preprocessing.create_date_time_feature(synthetic_data.generate_station_data(years), keep_date_time_str=True)
+    df = data_preprocessing.clean_data_baseline(data_preprocessing.remove_nan_features(df))
+    df = df.assign(date_time_str=df.date_time.dt.strftime("%Y-%m-%d %H:%M"))
+    cleaned = FakeFeatureGroup("cleaned_air_quality_data", data=df)
+    predictions = FakeFeatureGroup("predicted_air_quality_regression", primary_key=["date_time_str"])
+    features = df.drop(["date_time", "date_time_str", "femman_pm25"], axis=1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(f"{directory}/registry")
+        joblib.dump(LinearRegression().fit(features, df[["femman_pm25"]]), f"{directory}/registry/air_quality_estimation_model.pkl")
+        fv = FakeFeatureView(cleaned)
+        model = type("FakeModel", (), {"name": "air_quality_estimation_model", "version": 1, "download": lambda self: f"{directory}/registry"})()
+        model_cache._default_cache = model_cache.ModelArtifactCache(f"{directory}/cache")
+        feature_store.get_feature_store = lambda: type("FakeFeatureStore", (), {"get_feature_view": lambda self, name, version: fv,
+                                                                                "get_feature_group": lambda self, name, version: cleaned})()
+        feature_store.get_model_registry = lambda: type("FakeModelRegistry", (), {"get_best_model": lambda self, name, metric, direction: model})()
+        # the fake prediction feature group keeps every insert in memory, only the number of rows is kept here
+        predictions.insert = lambda df, **kwargs: setattr(predictions, "inserted_rows", predictions.inserted_rows + len(df))
+        del features
+        reset_peak_rss()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        chunk = pd.Timedelta(days=chunk_days) if chunk_days else pd.Timedelta(days=366 * years + 1)
+        counts = batch_inference_pipeline.batch_predict(predictions, chunk=chunk)
+        seconds = time.perf_counter() - start
+    return {"years": years, "rows": len(df), "chunks": counts["chunks"], "inserted": predictions.inserted_rows,
+            "seconds": seconds, "peak_increase_mb": peak_rss_mb() - rss_before}
+
+def run(scales : list, chunk_days : float):
+    print(f"{'years':>5} {'mode':>10} {'rows':>9} {'chunks':>7} {'time [s]':>9} {'peak +[MB]':>11}")
+    for years in scales:
+        for days in (None, chunk_days):
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                result = pool.apply(run_years, (years, days))
+            mode = "one chunk" if days is None else f"{days:g} days"
+            print(f"{years:>5} {mode:>10} {result['rows']:>9} {result['chunks']:>7} {result['seconds']:>9.2f} {result['peak_increase_mb']:>11.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and peak memory of batch_predict on a growing history, read at once and in chunks")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--chunk-days", type=float, default=batch_inference_pipeline.BATCH_CHUNK.days)
+    args = parser.parse_args()
+    run(args.years, args.chunk_days)
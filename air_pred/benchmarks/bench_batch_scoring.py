@@ -0,0 +1,37 @@
+import argparse
+import time
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from air_pred.utils import batch_scoring
+
+def run(n_rows : int, latency : float, batch_sizes : list, max_in_flight : int):
+    """Compares scoring one row per request against batched and concurrent requests on a LocalDeployment
+        that waits latency seconds per request"""
+    rng = np.random.default_rng(0)
+    features = rng.random((n_rows, 33))
+    model = LinearRegression().fit(features, rng.random((n_rows, 1)))
+    deployment = batch_scoring.LocalDeployment(model, latency=latency)
+
+    start = time.perf_counter()
+    per_row = np.array([deployment.predict(inputs=[feature])["predictions"] for feature in features.tolist()])
+    per_row_time = time.perf_counter() - start
+    print(f"{'mode':>24} {'time [s]':>9} {'rows/s':>10}")
+    print(f"{'per row':>24} {per_row_time:>9.3f} {n_rows/per_row_time:>10.0f}")
+
+    for batch_size in batch_sizes:
+        for in_flight in sorted({1, max_in_flight}):
+            start = time.perf_counter()
+            batched = batch_scoring.predict_in_batches(deployment, features, batch_size=batch_size, max_in_flight=in_flight)
+            batched_time = time.perf_counter() - start
+            assert np.allclose(batched.squeeze(), per_row.squeeze())
+            mode = f"batch {batch_size}, {in_flight} in flight"
+            print(f"{mode:>24} {batched_time:>9.3f} {n_rows/batched_time:>10.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per row against batched scoring")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated round trip per request in seconds")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+    run(args.rows, args.latency, args.batch_sizes, args.max_in_flight)
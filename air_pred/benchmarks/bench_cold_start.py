@@ -0,0 +1,41 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "air_pred --help": [sys.executable, "-m", "air_pred", "--help"],
+    "import data_preprocessing": [sys.executable, "-c", "import air_pred.utils.data_preprocessing"],
+    "import online_feature_pipeline": [sys.executable, "-c", "import air_pred.pipeline.online_feature_pipeline"],
+    "import all pipelines": [sys.executable, "-c", "from air_pred.pipeline import backfill_feature_pipeline, online_feature_pipeline, "
+                             "training_pipeline, batch_inference_pipeline, online_inference_pipeline, deployement_pipeline"],
+}
+HEAVY_MODULES = ["hopsworks", "hsfs", "hsml", "great_expectations", "sklearn"]
+
+def heavy_modules(code : str) -> list:
+    """Returns the heavy modules that are imported by running code"""
+    check = f"{code}\nimport sys\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True)
+    return output.stdout.strip().split(",") if output.returncode == 0 and output.stdout.strip() else []
+
+def run(repeat : int):
+    """Wall time of starting a fresh python process for every command, median and minimum over repeat runs"""
+    print(f"{'command':>32} {'median [s]':>11} {'min [s]':>8}  heavy modules imported")
+    for name, command in COMMANDS.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run(command, capture_output=True)
+            timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            print(f"{name:>32} failed: {result.stderr.decode().strip().splitlines()[-1]}")
+            continue
+        code = command[-1] if command[1] == "-c" else "import air_pred.cli"
+        print(f"{name:>32} {statistics.median(timings):>11.3f} {min(timings):>8.3f}  {', '.join(heavy_modules(code)) or '-'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start time of the cli and of importing the pipelines")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
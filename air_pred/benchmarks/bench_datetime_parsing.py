@@ -0,0 +1,56 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing
+
+def make_date_time_strings(n_rows : int) -> pd.Series:
+    """Function that creates hourly date time strings in the format used by the open data portal,
+        where midnight is written as 24:00 of the previous day and the time carries a +01:00 suffix
+    Parameters
+    ----------
+    n_rows : int
+        number of hourly rows to create
+
+    Returns
+    -------
+    pd.Series
+        Series of date time strings
+    """
+    date_time = pd.Series(pd.date_range("2000-01-01 01:00", periods=n_rows, freq="h"))
+    date_time_str = date_time.dt.strftime('%Y-%m-%d %H:%M')
+    midnight = date_time.dt.hour == 0
+    previous_day = (date_time - pd.Timedelta(days=1)).dt.strftime('%Y-%m-%d')
+    date_time_str = date_time_str.where(~midnight, previous_day + ' 24:00')
+    return date_time_str + '+01:00'
+
+def time_call(func, *args, repeat : int = 3) -> float:
+    """Returns the best wall time out of repeat calls of func"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def run(sizes : list, repeat : int = 3):
+    """Compares the row wise apply of convert_to_datetime against convert_to_datetime_column"""
+    print(f"{'rows':>10} {'apply [s]':>12} {'vectorized [s]':>15} {'speedup':>9}")
+    for n_rows in sizes:
+        date_time_str = make_date_time_strings(n_rows)
+        without_offset = date_time_str.str.split('+', n=1).str[0]
+
+        row_wise = without_offset.apply(data_preprocessing.convert_to_datetime)
+        vectorized = data_preprocessing.convert_to_datetime_column(date_time_str)
+        assert np.array_equal(row_wise.values, vectorized.values)
+
+        apply_time = time_call(lambda s: s.apply(data_preprocessing.convert_to_datetime), without_offset, repeat=1)
+        vectorized_time = time_call(data_preprocessing.convert_to_datetime_column, date_time_str, repeat=repeat)
+        print(f"{n_rows:>10} {apply_time:>12.3f} {vectorized_time:>15.4f} {apply_time/vectorized_time:>8.0f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark date time parsing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,54 @@
+import argparse
+import datetime
+import time
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from air_pred.utils import data_preprocessing, forecasting, online_features, time_series_features
+
+def placeholder_features(cleaned_df : pd.DataFrame) -> pd.DataFrame:
+    """The time series features of the hours after cleaned_df as the feature pipeline created them before, 24 rows with -1
+        appended one at a time and the features of the complete frame created again"""
+    start_time = cleaned_df.date_time.iloc[-1]
+    palceholder = pd.DataFrame(columns=cleaned_df.columns)
+    for i in range(1, 25):
+        future_time = start_time + datetime.timedelta(hours=i)
+        palceholder.loc[len(palceholder)] = [future_time if col == "date_time" else -1 for col in cleaned_df.columns]
+    palceholder.date_time_str = palceholder.date_time.astype(str)
+    full_df = pd.concat([cleaned_df, palceholder]).sort_values("date_time").reset_index()
+    return data_preprocessing.get_time_series_features(full_df)
+
+def timeit(func, repeat : int) -> float:
+    """Median seconds of one call of func"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def run(history_hours : list, repeat : int):
+    """Time of creating the features of the next 24 hours with placeholder rows compared with forecasting them from the ring buffer.
+        The placeholder path only creates the features, the forecasts need another read and prediction on top"""
+    print(f"{'history [h]':>12} {'placeholders [ms]':>18} {'direct [ms]':>12} {'recursive 72h [ms]':>19}")
+    for hours in history_hours:
+        date_time = pd.date_range("2000-01-01 01:00", periods=hours, freq="H")
+        df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                           "femman_pm25": np.random.default_rng(0).random(hours)})
+        features = time_series_features.create_features(df)
+        model = LinearRegression().fit(features[["prev_day", "prev_week"]], features["femman_pm25"])
+        buffer = online_features.HourlyRingBuffer()
+        buffer.ingest(df)
+
+        placeholders = timeit(lambda: placeholder_features(df), repeat)
+        direct = timeit(lambda: forecasting.forecast(buffer, model, horizon=24, strategy="direct"), repeat)
+        recursive = timeit(lambda: forecasting.forecast(buffer, model, horizon=72, strategy="recursive"), repeat)
+        print(f"{hours:>12} {placeholders * 1000:>18.2f} {direct * 1000:>12.2f} {recursive * 1000:>19.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time of forecasting the next hours compared with creating placeholder rows")
+    parser.add_argument("--history-hours", type=int, nargs="+", default=[336, 8760, 87600],
+                        help="hours of cleaned data, 336 is the incremental update and longer histories the full update")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.history_hours, args.repeat)
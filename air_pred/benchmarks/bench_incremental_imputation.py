@@ -0,0 +1,41 @@
+import argparse
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing
+
+def run(csv_path : str, new_days : list):
+    """Compares refitting the IterativeImputer on the complete history against imputing only the newly arrived rows
+        with an imputer fitted on the older rows. Deviation is reported for the imputed values only, 
+        relative to the standard deviation of the column
+    """
+    warnings.simplefilter("ignore")
+    df = data_preprocessing.create_date_time_feature(pd.read_csv(csv_path, skipinitialspace = True))
+    df = data_preprocessing.remove_nan_features(df).sort_values('date_time').reset_index(drop=True)
+    columns = [col for col in df.columns if col not in ["date_time", "date_time_str"]]
+    std = df[columns].std().values
+
+    start = time.perf_counter()
+    full = data_preprocessing.clean_data_IterativeImputer(df)
+    full_time = time.perf_counter() - start
+
+    print(f"{'new rows':>9} {'full refit [s]':>15} {'incremental [s]':>16} {'mean dev':>9} {'p95 dev':>8}")
+    for days in new_days:
+        is_new = (df.date_time >= df.date_time.max() - pd.Timedelta(days=days)).values
+        imputer = data_preprocessing.fit_iterative_imputer(df[~is_new])
+
+        start = time.perf_counter()
+        incremental = data_preprocessing.clean_data_IterativeImputer(df[is_new], imputer=imputer)
+        incremental_time = time.perf_counter() - start
+
+        was_nan = df.loc[is_new, columns].isna().values
+        deviation = (np.abs(incremental[columns].values - full.loc[is_new, columns].values) / std)[was_nan]
+        print(f"{is_new.sum():>9} {full_time:>15.2f} {incremental_time:>16.3f} {deviation.mean():>9.3f} {np.percentile(deviation, 95):>8.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark incremental imputation against a full refit")
+    parser.add_argument("--csv", default="air_quality_2023.csv")
+    parser.add_argument("--new-days", type=int, nargs="+", default=[7, 30])
+    args = parser.parse_args()
+    run(args.csv, args.new_days)
@@ -0,0 +1,65 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.utils import incremental_linear
+
+N_FEATURES = 30
+
+def make_rows(hours : int, start : pd.Timestamp, seed : int) -> tuple:
+    """Hourly rows with N_FEATURES features of different magnitude and a linear label"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0, 1, (hours, N_FEATURES)) * np.logspace(-1, 3, N_FEATURES)
+    y = X @ (rng.normal(0, 1, N_FEATURES) / np.logspace(-1, 3, N_FEATURES)) + rng.normal(0, 1, hours)
+    return X, y, pd.Series(pd.date_range(start, periods=hours, freq="H"))
+
+def timeit(func, repeat : int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def run(history_years : list, new_hours : int, window_hours : int, repeat : int, read_time_per_row : float):
+    """Time of the weekly update of a linear model with a full refit on the history and with folding the new rows into the
+        stored statistics, the statistics are loaded from and saved to a file like in the training pipeline. The update reads
+        the date_time of the new rows from a fake feature group, the time of reading the date_time of all rows is shown
+        for comparison"""
+    print(f"{'history [y]':>12} {'rows':>8} {'full refit [s]':>15} {'incremental [s]':>16} {'all date_time read [s]':>23} {'max coef diff':>14}")
+    for years in history_years:
+        hours = int(years * 8760)
+        X, y, date_time = make_rows(hours + new_hours, pd.Timestamp("2000-01-01"), seed=0)
+        model = incremental_linear.IncrementalLinearRegression([f"x{index}" for index in range(N_FEATURES)], window_hours=window_hours)
+        model.partial_fit(X[:hours], y[:hours], date_time[:hours])
+        path = f"/tmp/bench_incremental_{hours}.npz"
+        model.save(path)
+        fg = FakeFeatureGroup("cleaned_air_quality_data", data=date_time.to_frame("date_time"), read_time_per_row=read_time_per_row)
+        full_read = timeit(lambda: fg.select(["date_time"]).read(), repeat)
+
+        kept = slice(None) if window_hours is None else slice(-window_hours, None)
+        full = timeit(lambda: LinearRegression().fit(X[kept], y[kept]), repeat)
+
+        def update():
+            state = incremental_linear.IncrementalLinearRegression.load(path)
+            fg.select(["date_time"]).filter(fg.date_time >= incremental_linear.hour_to_timestamp(state.fitted_until + 1)).read()
+            state.partial_fit(X[hours:], y[hours:], date_time[hours:])
+            return state.solve()
+        incremental = timeit(update, repeat)
+        if window_hours is None:
+            difference = np.max(np.abs(update()[0] - LinearRegression().fit(X, y).coef_))
+            print(f"{years:>12} {len(X):>8} {full:>15.3f} {incremental:>16.4f} {full_read:>23.4f} {difference:>14.2e}")
+        else:
+            print(f"{years:>12} {len(X):>8} {full:>15.3f} {incremental:>16.4f} {full_read:>23.4f} {'-':>14}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time of the weekly model update with a full refit and from stored sufficient statistics")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--new-hours", type=int, default=168, help="rows added since the last update")
+    parser.add_argument("--window-hours", type=int, help="fit on the most recent hours only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--read-time-per-row", type=float, default=1e-6, help="seconds the fake feature group takes per row read")
+    args = parser.parse_args()
+    run(args.years, args.new_hours, args.window_hours, args.repeat, args.read_time_per_row)
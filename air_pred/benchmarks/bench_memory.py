@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import warnings
+import pandas as pd
+from air_pred.utils import data_preprocessing, streaming_backfill
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process, only supported on linux"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_multi_year_csv(source_csv : str, years : int, path : str):
+    """Writes a csv file with the rows of source_csv repeated for the given number of years, shifted by a year each time"""
+    df = pd.read_csv(source_csv, skipinitialspace = True, dtype=str)
+    date = pd.to_datetime(df["Date"])
+    parts = []
+    for year in range(years):
+        part = df.copy()
+        part["Date"] = (date - pd.DateOffset(years=years - 1 - year)).dt.strftime('%Y-%m-%d')
+        parts.append(part)
+    pd.concat(parts).to_csv(path, index=False)
+
+def run_stages(csv_path : str, lean : bool, imputer : bool) -> list:
+    """Runs the backfill preprocessing stages and returns wall time, peak rss during the stage and rss after the stage"""
+    results = []
+    state = {}
+
+    def stage(name, func):
+        reset_peak_rss()
+        start = time.perf_counter()
+        func()
+        results.append({"stage": name, "seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb(), "rss_after_mb": current_rss_mb()})
+
+    def read():
+        state["df"] = data_preprocessing.read_raw_csv(csv_path, lean=lean)
+
+    def date_time():
+        state["df"] = data_preprocessing.create_date_time_feature(state["df"], keep_date_time_str=not lean)
+
+    def clean():
+        if imputer:
+            state["clean"] = data_preprocessing.clean_data_IterativeImputer(state["df"])
+        else:
+            state["clean"] = data_preprocessing.clean_data_baseline(state["df"])
+        del state["df"]
+
+    def time_series():
+        state["ts"] = data_preprocessing.get_time_series_features(state["clean"])
+
+    def insert_frames():
+        state["clean"] = data_preprocessing.to_insert_frame(state["clean"])
+        state["ts"] = data_preprocessing.to_insert_frame(state["ts"])
+
+    stage("read_csv", read)
+    stage("create_date_time_feature", date_time)
+    stage("clean_data_IterativeImputer" if imputer else "clean_data_baseline", clean)
+    stage("get_time_series_features", time_series)
+    stage("to_insert_frame", insert_frames)
+    return results
+
+def run_streaming(csv_path : str, chunksize : int, lean : bool, imputer : bool, fit_rows : int = streaming_backfill.STREAMING_FIT_ROWS) -> dict:
+    """Runs the streaming backfill preprocessing and returns wall time and peak rss, the inserted frames are built and dropped"""
+    reset_peak_rss()
+    start = time.perf_counter()
+    rows = 0
+    for raw_df, cleaned_df, ts_df in streaming_backfill.iter_backfill_chunks(csv_path, chunksize, method="iterative" if imputer else "baseline", lean=lean, fit_rows=fit_rows):
+        for df in (raw_df, cleaned_df, ts_df):
+            if len(df):
+                data_preprocessing.to_insert_frame(df)
+        rows += len(raw_df)
+    return {"rows": rows, "seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+
+def run_streaming_scaling(source_csv : str, years : list, chunksize : int, imputer : bool, fit_rows : int = streaming_backfill.STREAMING_FIT_ROWS):
+    """Prints the peak memory of the one shot and the streaming backfill for growing csv files"""
+    warnings.simplefilter("ignore")
+    print(f"{'years':>5} {'rows':>8} | {'one shot peak [MB]':>18} {'streaming peak [MB]':>19} | {'one shot [s]':>12} {'streaming [s]':>13}")
+    for n_years in years:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "air_quality.csv")
+            write_multi_year_csv(source_csv, n_years, csv_path)
+            one_shot = run_in_child(csv_path, True, imputer)
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                streaming = pool.apply(run_streaming, (csv_path, chunksize, True, imputer, fit_rows))
+            one_shot_peak = max(result["peak_rss_mb"] for result in one_shot)
+            one_shot_seconds = sum(result["seconds"] for result in one_shot)
+            print(f"{n_years:>5} {streaming['rows']:>8} | {one_shot_peak:>18.0f} {streaming['peak_rss_mb']:>19.0f} | {one_shot_seconds:>12.2f} {streaming['seconds']:>13.2f}")
+
+def run(source_csv : str, years : int, imputer : bool):
+    warnings.simplefilter("ignore")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "air_quality.csv")
+        write_multi_year_csv(source_csv, years, csv_path)
+        print(f"{'stage':>28} | {'default peak [MB]':>17} {'lean peak [MB]':>15} | {'default after [MB]':>18} {'lean after [MB]':>16}")
+        default_results = run_in_child(csv_path, False, imputer)
+        lean_results = run_in_child(csv_path, True, imputer)
+        for default, lean in zip(default_results, lean_results):
+            print(f"{default['stage']:>28} | {default['peak_rss_mb']:>17.0f} {lean['peak_rss_mb']:>15.0f} | {default['rss_after_mb']:>18.0f} {lean['rss_after_mb']:>16.0f}")
+
+def run_in_child(csv_path : str, lean : bool, imputer : bool) -> list:
+    """Runs the stages in a fresh process so that the modes do not share memory"""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_stages, (csv_path, lean, imputer))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of the preprocessing stages with and without lean mode")
+    parser.add_argument("--csv", default="air_quality_2023.csv")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--imputer", action="store_true", help="use clean_data_IterativeImputer instead of clean_data_baseline")
+    parser.add_argument("--streaming", action="store_true", help="compare the lean one shot backfill with the streaming backfill for 1 up to --years years")
+    parser.add_argument("--chunksize", type=int, default=5000, help="rows per chunk of the streaming backfill")
+    parser.add_argument("--fit-rows", type=int, default=streaming_backfill.STREAMING_FIT_ROWS, help="rows the imputer of the streaming backfill is fitted on")
+    args = parser.parse_args()
+    if args.streaming:
+        run_streaming_scaling(args.csv, sorted({1, max(1, args.years // 2), args.years}), args.chunksize, args.imputer, args.fit_rows)
+    else:
+        run(args.csv, args.years, args.imputer)
@@ -0,0 +1,67 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import joblib
+import numpy as np
+from air_pred.utils import model_cache
+from air_pred.benchmarks.bench_memory import current_rss_mb
+
+class FakeModel(object):
+    """Model version whose download copies the artifact after waiting latency seconds, like a download from the model registry"""
+
+    def __init__(self, directory : str, latency : float):
+        self.name = "air_quality_estimation_model"
+        self.version = 1
+        self.directory = directory
+        self.latency = latency
+
+    def download(self):
+        time.sleep(self.latency)
+        target = tempfile.mkdtemp()
+        shutil.copytree(self.directory, target, dirs_exist_ok=True)
+        return target
+
+class FakeModelRegistry(object):
+    def __init__(self, model, latency : float):
+        self.model = model
+        self.latency = latency
+
+    def get_best_model(self, name, metric, direction):
+        time.sleep(self.latency)
+        return self.model
+
+def run(size_mb : float, latency : float):
+    """Time and memory of loading a model whose weights are size_mb large, without cache, from memory in the same process,
+        from the local copy in a new process and with memory mapped weights. Every new process looks up the best model once"""
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(f"{directory}/registry")
+        weights = np.random.default_rng(0).random(int(size_mb * 1024 ** 2 / 8))
+        joblib.dump({"coef": weights}, f"{directory}/registry/air_quality_estimation_model.pkl")
+        registry = FakeModelRegistry(FakeModel(f"{directory}/registry", latency), latency)
+        print(f"{size_mb:g} MB of weights, {latency:g} s registry latency")
+        print(f"{'load':>28} {'time [s]':>9} {'rss +[MB]':>10}")
+
+        def measure(name, cache):
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            model = cache.load(registry, "air_quality_estimation_model")
+            # memory mapped weights are only read from the file when they are used, the timing covers the load only
+            float(model["coef"][0])
+            print(f"{name:>28} {time.perf_counter() - start:>9.3f} {current_rss_mb() - rss_before:>10.0f}")
+            return model
+
+        cache = model_cache.ModelArtifactCache(f"{directory}/cache", mmap_min_bytes=2 ** 62)
+        cold = measure("download and deserialize", cache)
+        measure("same process", cache)
+        del cold
+        measure("new process, local copy", model_cache.ModelArtifactCache(f"{directory}/cache", mmap_min_bytes=2 ** 62))
+        measure("new process, memory mapped", model_cache.ModelArtifactCache(f"{directory}/cache", mmap_min_bytes=0))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load time of models from the model registry with and without the local model cache")
+    parser.add_argument("--size-mb", type=float, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds the model lookup and the download wait, simulates the model registry")
+    args = parser.parse_args()
+    run(args.size_mb, args.latency)
@@ -0,0 +1,67 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from air_pred.utils import data_preprocessing, multi_target, time_series_features
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.bench_memory import peak_rss_mb
+
+def cleaned_targets(years : float, n_targets : int, seed : int = 0) -> tuple:
+    """Cleaned synthetic station data with at least n_targets station x pollutant columns, stations beyond the ones of
+        the archive are noisy copies of them"""
+    df = data_preprocessing.create_date_time_feature(synthetic_data.generate_station_data(years, seed=seed))
+    df = df.interpolate(limit_direction="both")
+    targets = multi_target.find_targets(df.columns)
+    rng = np.random.default_rng(seed)
+    for index in range(n_targets - len(targets)):
+        source = targets[index % len(targets)]
+        df[f"extra{index}_{source.rsplit('_', 1)[1]}"] = df[source] + rng.normal(0, 1, len(df))
+    return df, multi_target.find_targets(df.columns)
+
+def per_target(df : pd.DataFrame, targets : list) -> dict:
+    """The current path run once per target, the features of every target are created on the complete frame"""
+    models = {}
+    for target in targets:
+        features = data_preprocessing.get_time_series_features(df, dict(time_series_features.DEFAULT_SPEC, columns=[target]))
+        models[target] = LinearRegression().fit(features[["prev_day", "prev_week"]], features[target])
+        models[target].predict(features[["prev_day", "prev_week"]])
+    return models
+
+def stacked(df : pd.DataFrame, targets : list) -> multi_target.MultiTargetModel:
+    """Features of all targets in one pass, one model per target fitted on its slice and all targets predicted together"""
+    features = multi_target.stack_features(df, targets)
+    model = multi_target.fit_targets(features)
+    model.predict(features)
+    return model
+
+def timeit(func, repeat : int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def run(years : float, target_counts : list, repeat : int):
+    """Time of creating the features, fitting and predicting all targets once per target and in one stacked pass"""
+    df, all_targets = cleaned_targets(years, max(target_counts))
+    print(f"{len(df)} hours, {len(all_targets)} targets available")
+    print(f"{'targets':>8} {'per target [s]':>15} {'stacked [s]':>12} {'speedup':>8}")
+    for n_targets in target_counts:
+        targets = all_targets[:n_targets]
+        model = stacked(df, targets)
+        reference = per_target(df, targets)
+        assert all(np.allclose(model.models[target].coef_, reference[target].coef_) for target in targets)
+        seconds_per_target = timeit(lambda: per_target(df, targets), repeat)
+        seconds_stacked = timeit(lambda: stacked(df, targets), repeat)
+        print(f"{n_targets:>8} {seconds_per_target:>15.3f} {seconds_stacked:>12.3f} {seconds_per_target / seconds_stacked:>7.1f}x")
+    print(f"peak rss {peak_rss_mb():.0f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling of the time series features, training and prediction with the number of targets")
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--targets", type=int, nargs="+", default=[1, 2, 5, 10, 20, 30])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.years, args.targets, args.repeat)
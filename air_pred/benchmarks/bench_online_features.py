@@ -0,0 +1,50 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing, online_features, time_series_features
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+
+def timeit(func, repeat : int) -> float:
+    """Median seconds of one call of func"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def run(years : float, repeat : int, read_latency : float):
+    """Latency of the time series features of one hour from the ring buffer, from rebuilding the features
+        of the complete history with get_time_series_features and from a filtered read of the time series feature group"""
+    n_rows = int(years * 8760)
+    date_time = pd.date_range("2000-01-01 01:00", periods=n_rows, freq="H")
+    df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                       "femman_pm25": np.random.default_rng(0).random(n_rows)})
+    buffer = online_features.HourlyRingBuffer()
+    buffer.ingest(df)
+    time_series_fg = FakeFeatureGroup("time_series_air_quality_data", data=data_preprocessing.get_time_series_features(df).reset_index(drop=True),
+                                      read_latency=read_latency)
+    hour = date_time[-10]
+    new_row = df.iloc[[-1]].assign(date_time=date_time[-1] + pd.Timedelta(hours=1))
+
+    print(f"{n_rows} hours of history, feature group reads wait {read_latency:g} s")
+    print(f"{'path':>36} {'latency [ms]':>13}")
+    results = {
+        "ring buffer feature_vector": timeit(lambda: buffer.feature_vector(hour), repeat),
+        "ring buffer ingest one hour": timeit(lambda: buffer.ingest(new_row), repeat),
+        "rebuild with get_time_series_features": timeit(lambda: data_preprocessing.get_time_series_features(df).loc[hour], max(3, repeat // 100)),
+        "read time series feature group": timeit(lambda: time_series_fg.filter(time_series_fg.date_time >= hour).filter(time_series_fg.date_time <= hour).read(),
+                                                 max(3, repeat // 100)),
+    }
+    for name, seconds in results.items():
+        print(f"{name:>36} {seconds * 1000:>13.4f}")
+    assert np.allclose(buffer.feature_vector(hour), time_series_features.create_features(df.iloc[-200:]).loc[hour, buffer.feature_names].to_numpy(dtype=float))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of the online time series features from the ring buffer and from the feature store path")
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--read-latency", type=float, default=0.0, help="seconds every feature group read waits, simulates the feature store")
+    args = parser.parse_args()
+    run(args.years, args.repeat, args.read_latency)
@@ -0,0 +1,29 @@
+import argparse
+import time
+from air_pred.benchmarks.fake_rowstore import FakeRowstoreServer
+from air_pred.utils import open_data
+
+def run(page_counts : list, delay : float, max_workers : int):
+    """Compares fetching all pages one after the other against concurrent fetching from a local fake rowstore
+        where every request takes delay seconds"""
+    print(f"{'pages':>6} {'sequential [s]':>15} {'concurrent [s]':>15} {'speedup':>8}")
+    for n_pages in page_counts:
+        rows = [{"date": "2023-10-09", "time": f"{i % 24:02d}:00+01:00", "femman_pm25": str(i)} for i in range(n_pages * 100)]
+        with FakeRowstoreServer(rows, delay=delay) as server:
+            start = time.perf_counter()
+            sequential = open_data.fetch_rowstore(server.url, max_workers=1)
+            sequential_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            concurrent = open_data.fetch_rowstore(server.url, max_workers=max_workers)
+            concurrent_time = time.perf_counter() - start
+        assert sequential.equals(concurrent) and len(concurrent) == len(rows)
+        print(f"{n_pages:>6} {sequential_time:>15.2f} {concurrent_time:>15.2f} {sequential_time/concurrent_time:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark paginated fetching from the open data portal")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 50, 200])
+    parser.add_argument("--delay", type=float, default=0.05, help="simulated server time per page in seconds")
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+    run(args.pages, args.delay, args.max_workers)
@@ -0,0 +1,63 @@
+import argparse
+import os
+import tempfile
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing
+from air_pred.benchmarks.bench_memory import write_multi_year_csv
+
+def mask_values(df : pd.DataFrame, columns : list, fraction : float, seed : int = 0):
+    """Hides a fraction of the observed values so that the imputed values can be compared against the true ones"""
+    rng = np.random.default_rng(seed)
+    observed = df[columns].notna().values
+    hidden = observed & (rng.random(observed.shape) < fraction)
+    masked = df.copy()
+    masked[columns] = masked[columns].mask(hidden)
+    return masked, hidden
+
+def run(csv_path : str, years : int, cores : list, blocks_per_core : list, fraction : float):
+    """Wall time of clean_data_IterativeImputer for growing core counts and both split modes, together with the
+        error on hidden observed values relative to the standard deviation of the column. The single imputer (1 core)
+        is the accuracy reference"""
+    warnings.simplefilter("ignore")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "air_quality.csv")
+        write_multi_year_csv(csv_path, years, path)
+        df = data_preprocessing.create_date_time_feature(data_preprocessing.read_raw_csv(path))
+    df = data_preprocessing.remove_nan_features(df).sort_values('date_time').reset_index(drop=True)
+    columns = [column for column in df.columns if column not in data_preprocessing.DATE_TIME_COLUMNS]
+    masked, hidden = mask_values(df, columns, fraction)
+    truth = df[columns].values[hidden]
+    std = np.broadcast_to(df[columns].std().values, hidden.shape)[hidden]
+
+    print(f"{len(df)} rows, {len(columns)} columns, {hidden.sum()} hidden values, {os.cpu_count()} cores available")
+    print(f"{'split':>8} {'cores':>6} {'blocks':>7} {'time [s]':>9} {'speedup':>8} {'error/std':>10}")
+    reference_time = None
+    settings = [("single", 1, 1)]
+    settings += [("time", n_cores, n_cores * factor) for n_cores in cores for factor in blocks_per_core if n_cores * factor > 1]
+    settings += [("station", n_cores, None) for n_cores in cores if n_cores > 1]
+    for split, n_cores, n_blocks in settings:
+        start = time.perf_counter()
+        if split == "single":
+            result = data_preprocessing.clean_data_IterativeImputer(masked, n_jobs=1)
+        elif split == "time":
+            # n_blocks can be larger than the number of processes, smaller blocks are faster to fit but less accurate
+            result = data_preprocessing.parallel_imputation.impute_parallel(masked[columns], n_jobs=n_cores, split="time", n_blocks=n_blocks)
+        else:
+            result = data_preprocessing.clean_data_IterativeImputer(masked, n_jobs=n_cores, split="station")
+        seconds = time.perf_counter() - start
+        reference_time = seconds if reference_time is None else reference_time
+        error = np.abs(result.sort_index()[columns].values[hidden] - truth) / std
+        print(f"{split:>8} {n_cores:>6} {n_blocks or '-':>7} {seconds:>9.2f} {reference_time / seconds:>8.2f} {error.mean():>10.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wall time and accuracy of parallel imputation against the number of cores")
+    parser.add_argument("--csv", default="air_quality_2023.csv")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--cores", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--blocks-per-core", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--mask-fraction", type=float, default=0.05, help="fraction of observed values hidden to measure the imputation error")
+    args = parser.parse_args()
+    run(args.csv, args.years, args.cores, args.blocks_per_core, args.mask_fraction)
@@ -0,0 +1,77 @@
+import argparse
+import base64
+import importlib.util
+import os
+import threading
+import time
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+def load_predictor_module():
+    """Loads predictor.py from the root of the repository, the script that is uploaded for the deployments"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "predictor.py")
+    spec = importlib.util.spec_from_file_location("predictor", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def columnar_payload(features : np.ndarray) -> dict:
+    """Encodes feature rows as the compact columnar payload accepted by Predict"""
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    return {"dtype": "float32", "shape": list(features.shape), "data": base64.b64encode(features.tobytes()).decode()}
+
+def generate_load(predictor, payloads : list, n_clients : int, duration : float) -> dict:
+    """Runs n_clients threads that send requests to the predictor back to back for duration seconds
+    Returns
+    -------
+    dict
+        p50 and p99 latency in milliseconds and requests per second
+    """
+    latencies = [[] for _ in range(n_clients)]
+    stop_time = time.perf_counter() + duration
+
+    def client(client_id):
+        i = client_id
+        while time.perf_counter() < stop_time:
+            start = time.perf_counter()
+            predictor.predict(payloads[i % len(payloads)])
+            latencies[client_id].append(time.perf_counter() - start)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(client_id,)) for client_id in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = np.concatenate([np.asarray(client_latencies) for client_latencies in latencies]) * 1000
+    return {"p50": np.percentile(all_latencies, 50), "p99": np.percentile(all_latencies, 99), "rps": len(all_latencies) / elapsed}
+
+def run(n_clients : int, rows_per_request : int, duration : float, max_batch_size : int, max_batch_delay : float):
+    predictor_module = load_predictor_module()
+    rng = np.random.default_rng(0)
+    model = LinearRegression().fit(rng.random((1000, 33)), rng.random((1000, 1)))
+    requests = [rng.random((rows_per_request, 33)) for _ in range(256)]
+
+    modes = [
+        ("per request, lists", predictor_module.Predict(model, max_batch_size=1), [request.tolist() for request in requests]),
+        ("micro batch, lists", predictor_module.Predict(model, max_batch_size=max_batch_size, max_batch_delay=max_batch_delay), [request.tolist() for request in requests]),
+        ("per request, columnar", predictor_module.Predict(model, max_batch_size=1), [columnar_payload(request) for request in requests]),
+        ("micro batch, columnar", predictor_module.Predict(model, max_batch_size=max_batch_size, max_batch_delay=max_batch_delay), [columnar_payload(request) for request in requests]),
+    ]
+    print(f"{'mode':>22} {'p50 [ms]':>9} {'p99 [ms]':>9} {'req/s':>9}")
+    for name, predictor, payloads in modes:
+        result = generate_load(predictor, payloads, n_clients, duration)
+        print(f"{name:>22} {result['p50']:>9.3f} {result['p99']:>9.3f} {result['rps']:>9.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local load generator for the Predict class")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--rows-per-request", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-batch-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    run(args.clients, args.rows_per_request, args.duration, args.max_batch_size, args.max_batch_delay)
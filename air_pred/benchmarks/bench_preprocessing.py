@@ -0,0 +1,151 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.bench_memory import current_rss_mb, reset_peak_rss, peak_rss_mb
+
+STAGES = ["read_raw_csv", "create_date_time_feature", "remove_nan_features", "clean_data_baseline",
+          "clean_data_IterativeImputer", "get_time_series_features", "set_feature_type"]
+RESULTS_DIR = "benchmark_results"
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_scale(years : int, stages : list, lean : bool, seed : int, repeat : int = 5) -> list:
+    """Generates the synthetic csv for the given number of years and measures every stage, is run in a fresh process
+        so that the peak memory of one scale does not leak into the next one"""
+    warnings.simplefilter("ignore")
+    results = []
+    state = {}
+
+    def measure(name, func, rows_in):
+        if name not in stages:
+            return
+        reset_peak_rss()
+        rss_before = current_rss_mb()
+        timings = []
+        # stages that take less than a second are repeated and the fastest run is kept, so that noise does not look like a regression
+        while not timings or (len(timings) < repeat and timings[0][0] < 1):
+            start, cpu_start = time.perf_counter(), time.process_time()
+            rows_out = func()
+            timings.append((time.perf_counter() - start, time.process_time() - cpu_start))
+        seconds, cpu_seconds = min(timings)
+        results.append({"years": years, "stage": name, "rows_in": rows_in, "rows_out": rows_out, "runs": len(timings),
+                        "seconds": seconds, "cpu_seconds": cpu_seconds,
+                        "peak_rss_mb": peak_rss_mb(), "peak_increase_mb": peak_rss_mb() - rss_before})
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "air_quality.csv")
+        synthetic_data.write_station_csv(path, years, seed=seed)
+
+        def read():
+            state["raw"] = data_preprocessing.read_raw_csv(path, lean=lean)
+            return len(state["raw"])
+        measure("read_raw_csv", read, None)
+        if "raw" not in state:
+            state["raw"] = data_preprocessing.read_raw_csv(path, lean=lean)
+
+    raw = state.pop("raw")
+    # create_date_time_feature renames the columns of its input, so every stage works on its own copy
+    def date_time():
+        state["df"] = data_preprocessing.create_date_time_feature(raw.copy(), keep_date_time_str=not lean)
+        return len(state["df"])
+    measure("create_date_time_feature", date_time, len(raw))
+    if "df" not in state:
+        state["df"] = data_preprocessing.create_date_time_feature(raw.copy(), keep_date_time_str=not lean)
+    del raw
+    df = state["df"]
+
+    measure("remove_nan_features", lambda: len(data_preprocessing.remove_nan_features(df)), len(df))
+
+    def baseline():
+        state["clean"] = data_preprocessing.clean_data_baseline(df)
+        return len(state["clean"])
+    measure("clean_data_baseline", baseline, len(df))
+    measure("clean_data_IterativeImputer", lambda: len(data_preprocessing.clean_data_IterativeImputer(df)), len(df))
+    if "clean" not in state:
+        state["clean"] = data_preprocessing.clean_data_baseline(df)
+    clean = state["clean"]
+
+    measure("get_time_series_features", lambda: len(data_preprocessing.get_time_series_features(clean)), len(clean))
+
+    def feature_types():
+        columns = [column for column in clean.columns if column not in data_preprocessing.DATE_TIME_COLUMNS]
+        typed = pd.DataFrame({column: data_preprocessing.set_feature_type(clean, column, "double", lean=lean) for column in columns})
+        return len(typed)
+    measure("set_feature_type", feature_types, len(clean))
+    return results
+
+def run(scales : list, stages : list, lean : bool, seed : int, repeat : int) -> dict:
+    results = []
+    for years in scales:
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            results += pool.apply(run_scale, (years, stages, lean, seed, repeat))
+    return {"commit": git_commit(), "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "lean": lean, "seed": seed, "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "machine": platform.machine(), "cpu_count": os.cpu_count(), "results": results}
+
+def print_results(report : dict):
+    print(f"{'years':>5} {'stage':>28} {'rows in':>9} {'rows out':>9} {'time [s]':>9} {'cpu [s]':>8} {'peak [MB]':>10} {'peak +[MB]':>10}")
+    for result in report["results"]:
+        rows_in = "-" if result["rows_in"] is None else result["rows_in"]
+        print(f"{result['years']:>5} {result['stage']:>28} {rows_in:>9} {result['rows_out']:>9} {result['seconds']:>9.3f} "
+              f"{result['cpu_seconds']:>8.3f} {result['peak_rss_mb']:>10.0f} {result['peak_increase_mb']:>10.0f}")
+
+def compare(report : dict, baseline : dict, threshold : float, min_seconds : float) -> list:
+    """Compares the stage times of report against a baseline report and returns the stages that got slower than threshold times
+        and by more than min_seconds"""
+    baseline_times = {(result["years"], result["stage"]): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    print(f"\ncompared with {baseline['commit']} ({baseline['created']})")
+    print(f"{'years':>5} {'stage':>28} {'before [s]':>10} {'after [s]':>10} {'ratio':>6}")
+    for result in report["results"]:
+        before = baseline_times.get((result["years"], result["stage"]))
+        if before is None:
+            continue
+        ratio = result["seconds"] / before if before > 0 else float("inf")
+        flag = " REGRESSION" if ratio > threshold and result["seconds"] - before > min_seconds else ""
+        print(f"{result['years']:>5} {result['stage']:>28} {before:>10.3f} {result['seconds']:>10.3f} {ratio:>6.2f}{flag}")
+        if flag:
+            regressions.append((result["years"], result["stage"], ratio))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and peak memory of the preprocessing functions on synthetic station data, runs offline")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 50], help="sizes of the synthetic data in years of hourly rows")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--lean", action="store_true", help="run the stages in memory lean mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help=f"json file the results are written to, defaults to {RESULTS_DIR}/preprocessing_<commit>.json")
+    parser.add_argument("--compare", help="json file of an earlier run, exits with status 1 if a stage got slower than --threshold times")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="slow downs smaller than this are not reported as regressions")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs of stages that take less than a second")
+    args = parser.parse_args()
+
+    report = run(args.years, args.stages, args.lean, args.seed, args.repeat)
+    print_results(report)
+    output = args.output or os.path.join(RESULTS_DIR, f"preprocessing_{report['commit']}{'_lean' if args.lean else ''}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            if compare(report, json.load(file), args.threshold, args.min_seconds):
+                sys.exit(1)
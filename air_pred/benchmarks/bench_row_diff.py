@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+import types
+import warnings
+import numpy as np
+import pandas as pd
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.pipeline import online_feature_pipeline
+from air_pred.utils import data_preprocessing, feature_store, row_hashes
+
+def setup(hours : int, window_hours : int, read_latency : float):
+    """Fake feature groups, API and imputer of the online feature pipeline over hours of synthetic data"""
+    api_df = synthetic_data.generate_station_data((hours + window_hours) / synthetic_data.HOURS_PER_YEAR, start="2023-01-01 01:00")
+    api_df.columns = api_df.columns.str.lower().str.strip()
+    schema = data_preprocessing.create_date_time_feature(api_df.copy())
+    groups = {name: FakeFeatureGroup(name, data=schema.iloc[:0], read_latency=read_latency)
+              for name in ("air_quality_data", "cleaned_air_quality_data")}
+    groups["time_series_air_quality_data"] = FakeFeatureGroup("time_series_air_quality_data", read_latency=read_latency,
+        data=pd.DataFrame({"date_time": schema.date_time, "date_time_str": schema.date_time_str, "femman_pm25": 0.0, "prev_day": 0.0, "prev_week": 0.0}).iloc[:0])
+    imputer = data_preprocessing.fit_iterative_imputer(schema.iloc[:window_hours], features=groups["cleaned_air_quality_data"].features)
+    dataset_api = types.SimpleNamespace(download=lambda *args, **kwargs: 1 / 0, upload=lambda *args, **kwargs: None)
+    feature_store.get_feature_store = lambda: types.SimpleNamespace(get_feature_group=lambda name, version: groups[name])
+    feature_store.get_project = lambda: types.SimpleNamespace(get_dataset_api=lambda: dataset_api)
+    online_feature_pipeline.get_imputer = lambda *args: imputer
+    return api_df, groups
+
+def run(window_hours : int, modified_fraction : float, read_latency : float, diff : bool):
+    """Runs the pipeline on the same API window twice and on the window moved by a day with corrected values, and reports the
+        rows written to every feature group and the wall time of every run"""
+    warnings.simplefilter("ignore")
+    api_df, groups = setup(24, window_hours, read_latency)
+    if not diff:
+        # an empty store that is never updated sends every row downstream like the pipeline did before
+        row_hashes.RowHashStore.update = lambda self, hours, hashes: None
+    rng = np.random.default_rng(0)
+    moved = api_df.iloc[24:24 + window_hours].copy()
+    modified = rng.choice(moved.index[:-24], int(modified_fraction * window_hours), replace=False)
+    moved.loc[modified, "femman_pm25"] += 1.0
+    runs = [("first", api_df.iloc[:window_hours]), ("unchanged", api_df.iloc[:window_hours]), ("moved 24h", moved)]
+    print(f"{'run':>10} {'skipped':>8} {'raw rows':>9} {'clean rows':>11} {'ts rows':>8} {'time [s]':>9}")
+    for name, window in runs:
+        online_feature_pipeline.get_weekly_data = lambda: window.copy()
+        inserted = [fg.inserted_rows for fg in groups.values()]
+        start = time.perf_counter()
+        counts = online_feature_pipeline.update_feature_groups()
+        seconds = time.perf_counter() - start
+        written = [fg.inserted_rows - before for fg, before in zip(groups.values(), inserted)]
+        print(f"{name:>10} {counts['skipped']:>8} {written[0]:>9} {written[1]:>11} {written[2]:>8} {seconds:>9.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rows written and time of the online feature pipeline with and without row diffing")
+    parser.add_argument("--window-hours", type=int, default=720, help="hours returned by every API call")
+    parser.add_argument("--modified-fraction", type=float, default=0.01, help="fraction of the older rows corrected by the source")
+    parser.add_argument("--read-latency", type=float, default=0.0, help="seconds every feature group read waits")
+    parser.add_argument("--no-diff", action="store_true", help="send every row downstream")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        run(args.window_hours, args.modified_fraction, args.read_latency, not args.no_diff)
@@ -0,0 +1,48 @@
+import argparse
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.utils import feature_store, snapshot_cache
+
+def hourly_frame(start, periods : int, n_columns : int = 33) -> pd.DataFrame:
+    date_time = pd.date_range(start, periods=periods, freq="h")
+    df = pd.DataFrame(np.random.default_rng(0).random((periods, n_columns)), columns=[f"sensor_{i}" for i in range(n_columns)])
+    df["date_time"] = date_time
+    df["date_time_str"] = date_time.strftime('%Y-%m-%d %H:%M')
+    return df
+
+def run(history_rows : list, new_rows : int, read_latency : float, read_time_per_row : float):
+    """Compares a full read of a local stand-in feature group against a warm cached read after new_rows were inserted.
+        The stand-in waits read_latency per query and read_time_per_row per returned row to simulate the feature store"""
+    print(f"{'history':>8} {'full read [s]':>14} {'delta only [s]':>15} {'warm read [s]':>14} {'rows read':>10}")
+    for n_rows in history_rows:
+        fg = FakeFeatureGroup("air_quality_data", 2, ["date_time"], hourly_frame("2000-01-01", n_rows), read_latency, read_time_per_row)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = snapshot_cache.FeatureGroupCache(cache_dir)
+            cache.read(fg)
+            fg.insert(hourly_frame(fg.data.date_time.max() + pd.Timedelta(hours=1), new_rows))
+
+            start = time.perf_counter()
+            feature_store.read_feature_group(fg)
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            feature_store.read_feature_group(fg, start_time=fg.data.date_time.max() - pd.Timedelta(hours=new_rows))
+            delta_time = time.perf_counter() - start
+
+            fg.rows_read = 0
+            start = time.perf_counter()
+            cache.read(fg)
+            warm_time = time.perf_counter() - start
+        print(f"{n_rows:>8} {full_time:>14.3f} {delta_time:>15.3f} {warm_time:>14.3f} {fg.rows_read:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cached feature group reads")
+    parser.add_argument("--history-rows", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--new-rows", type=int, default=168)
+    parser.add_argument("--read-latency", type=float, default=0.5, help="simulated seconds per feature store query")
+    parser.add_argument("--read-time-per-row", type=float, default=5e-6, help="simulated seconds per row read from the feature store")
+    args = parser.parse_args()
+    run(args.history_rows, args.new_rows, args.read_latency, args.read_time_per_row)
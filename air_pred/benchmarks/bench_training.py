@@ -0,0 +1,50 @@
+import argparse
+import os
+import time
+import warnings
+from air_pred.utils import data_preprocessing, model_selection
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.bench_memory import peak_rss_mb
+
+def training_datasets(years : float, seed : int = 0) -> dict:
+    """Estimation and time series training data of the synthetic stations, ordered by time like in the training pipeline"""
+    df = data_preprocessing.create_date_time_feature(synthetic_data.generate_station_data(years, seed=seed))
+    clean = data_preprocessing.clean_data_baseline(data_preprocessing.remove_nan_features(df)).sort_values('date_time').reset_index(drop=True)
+    time_series = data_preprocessing.get_time_series_features(clean).reset_index(drop=True)
+    datasets = {}
+    for name, data in (("air_quality_estimation_model", clean), ("air_quality_time_series_model", time_series)):
+        features = data.drop([column for column in data_preprocessing.DATE_TIME_COLUMNS if column in data.columns], axis=1)
+        datasets[name] = (features.drop('femman_pm25', axis=1), features[['femman_pm25']])
+    return datasets
+
+def run(years : float, cores : list, n_splits : int):
+    """Wall time of selecting the models of both feature views for a growing number of processes. The serial run
+        is the reference for the speedup and for the selected models"""
+    warnings.simplefilter("ignore")
+    datasets = training_datasets(years)
+    n_candidates = len(model_selection.candidate_grid())
+    for name, (X, y) in datasets.items():
+        print(f"{name}: {X.shape[0]} rows, {X.shape[1]} features, {X.values.nbytes / 1024 ** 2:.1f} MB")
+    print(f"{n_candidates} candidates x {len(datasets)} datasets x {n_splits} folds, {os.cpu_count()} cores available")
+    print(f"{'cores':>6} {'time [s]':>9} {'speedup':>8} {'peak [MB]':>10}  winners")
+    reference = None
+    for n_cores in cores:
+        start = time.perf_counter()
+        results = model_selection.select_models(datasets, n_splits=n_splits, n_jobs=n_cores)
+        seconds = time.perf_counter() - start
+        reference = seconds if reference is None else reference
+        winners = ", ".join(f"{result[0]['name']} {result[0]['params']}" for result in results.values())
+        print(f"{n_cores:>6} {seconds:>9.2f} {reference / seconds:>8.2f} {peak_rss_mb():>10.0f}  {winners}")
+
+    print(f"\n{'dataset':>30} {'candidate':>24} {'cv mse':>9} {'std':>8} {'fit [s]':>8}")
+    for name, result in results.items():
+        for candidate in result:
+            print(f"{name:>30} {candidate['name']:>24} {candidate['cv_mse']:>9.3f} {candidate['cv_mse_std']:>8.3f} {candidate['fit_seconds']:>8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wall time of the parallel model selection of the training pipeline on synthetic station data")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--cores", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--splits", type=int, default=model_selection.CV_SPLITS)
+    args = parser.parse_args()
+    run(args.years, args.cores, args.splits)
@@ -0,0 +1,58 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing, training_data
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.bench_memory import current_rss_mb, peak_rss_mb, reset_peak_rss
+
+def write_datasets(years : float, directory : str, seed : int = 0) -> dict:
+    """Writes the train split of the estimation model like the feature store does, in random order with the date time columns,
+        as csv and as parquet, and the local float32 copy of training_data. Returns the paths by format"""
+    df = data_preprocessing.create_date_time_feature(synthetic_data.generate_station_data(years, seed=seed))
+    df = data_preprocessing.clean_data_baseline(data_preprocessing.remove_nan_features(df)).sample(frac=1, random_state=seed)
+    paths = {"csv": os.path.join(directory, "train.csv"), "parquet": os.path.join(directory, "train_full.parquet"),
+             "columnar float32": os.path.join(directory, "train.parquet")}
+    df.to_csv(paths["csv"], index=False)
+    df.to_parquet(paths["parquet"], index=False)
+    training_data.write_split(paths["columnar float32"], df.drop("femman_pm25", axis=1), df[["femman_pm25"]])
+    return paths
+
+def load(data_format : str, path : str) -> dict:
+    """Loads a split into the arrays the estimators are fitted on and returns the time and the peak memory above the start"""
+    reset_peak_rss()
+    before = current_rss_mb()
+    start = time.perf_counter()
+    if data_format == "columnar float32":
+        X, y = training_data.read_split(path)
+    else:
+        df = pd.read_csv(path) if data_format == "csv" else pd.read_parquet(path)
+        df = df.iloc[df['date_time'].argsort(kind="stable").to_numpy()].reset_index(drop=True)
+        X, y = df.drop(["date_time", "date_time_str", "femman_pm25"], axis=1), df[["femman_pm25"]]
+        del df
+    X, y = np.asarray(X), np.asarray(y).ravel()
+    return {"rows": len(X), "seconds": time.perf_counter() - start, "peak_mb": peak_rss_mb() - before,
+            "array_mb": (X.nbytes + y.nbytes) / 1024 ** 2, "file_mb": os.path.getsize(path) / 1024 ** 2}
+
+def run(years : list):
+    """Load time and peak memory of the training data as csv, as parquet read completely and as the projected float32 columns,
+        every load runs in a fresh process"""
+    warnings.simplefilter("ignore")
+    print(f"{'years':>5} {'format':>17} {'rows':>8} {'file [MB]':>10} {'load [s]':>9} {'peak [MB]':>10} {'arrays [MB]':>12}")
+    for n_years in years:
+        with tempfile.TemporaryDirectory() as directory:
+            for data_format, path in write_datasets(n_years, directory).items():
+                with multiprocessing.get_context("spawn").Pool(1) as pool:
+                    result = pool.apply(load, (data_format, path))
+                print(f"{n_years:>5} {data_format:>17} {result['rows']:>8} {result['file_mb']:>10.1f} {result['seconds']:>9.3f} "
+                      f"{result['peak_mb']:>10.0f} {result['array_mb']:>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load time and peak memory of the training data as csv and as parquet")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 10, 30])
+    args = parser.parse_args()
+    run(args.years)
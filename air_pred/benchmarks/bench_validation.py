@@ -0,0 +1,89 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from air_pred.utils import validation
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.bench_memory import peak_rss_mb
+
+def cleaned_frame(n_rows : int, bad_fraction : float, seed : int = 0) -> pd.DataFrame:
+    """Hourly frame with the columns of the cleaned data feature group, values drawn from the column profiles of the
+        2023 archive. bad_fraction of the rows get a missing or out of range value"""
+    rng = np.random.default_rng(seed)
+    date_time = pd.date_range("1900-01-01 01:00", periods=n_rows, freq="H")
+    columns = {"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M")}
+    for name, mean, std, minimum, maximum, *_ in synthetic_data.COLUMN_PROFILES:
+        columns[name.lower().strip()] = np.clip(rng.normal(mean, std, n_rows), minimum, maximum)
+    df = pd.DataFrame(columns)
+    sensors = df.columns[2:]
+    bad_rows = rng.choice(n_rows, int(n_rows * bad_fraction), replace=False)
+    for row, column in zip(bad_rows, rng.choice(sensors, len(bad_rows))):
+        df.iat[row, df.columns.get_loc(column)] = np.nan if row % 2 else 1e6
+    return df
+
+def per_column_checks(df : pd.DataFrame, rules : dict) -> dict:
+    """The checks of the rules as one expectation per column and check, every expectation a separate pandas pass
+        like the per column great expectations suite the backfill used to build"""
+    failed = {}
+    for column in df.columns:
+        if column == rules["key"] or df[column].dtype.kind not in "fiu":
+            continue
+        max_null_rate = validation.column_rule(column, rules["max_null_rate"])
+        null_rows = df[column].isnull()
+        if max_null_rate is not None and null_rows.mean() > max_null_rate:
+            failed[f"null:{column}"] = int(null_rows.sum())
+        bounds = validation.column_rule(column, rules["ranges"])
+        if bounds is not None:
+            out_of_range = ~df[column].between(*bounds) & ~null_rows
+            if out_of_range.any():
+                failed[f"range:{column}"] = int(out_of_range.sum())
+    duplicates = df[rules["key"]].duplicated(keep="last")
+    if duplicates.any():
+        failed["duplicate_key"] = int(duplicates.sum())
+    return failed
+
+def great_expectations_checks(df : pd.DataFrame, rules : dict):
+    """Validation of df with the exported suite, None if great_expectations is not installed"""
+    try:
+        import great_expectations as ge
+    except ImportError:
+        return None
+    suite = validation.to_expectation_suite(rules, list(df.columns), "bench_validation")
+    return ge.from_pandas(df).validate(expectation_suite=suite)
+
+def timeit(func, repeat : int):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), result
+
+def run(n_rows : int, bad_fraction : float, repeat : int):
+    """Time of validating a cleaned data frame with the vectorized checks, with the same checks as one pandas pass per
+        column and expectation, and with the exported great expectations suite if it is installed"""
+    df = cleaned_frame(n_rows, bad_fraction)
+    rules = validation.DEFAULT_RULES
+    print(f"{n_rows} rows, {df.shape[1]} columns, {df.memory_usage(deep=False).sum() / 1024 ** 2:.0f} MB, {bad_fraction:.2%} bad rows")
+    print(f"{'path':>34} {'time [s]':>9} {'rows/s':>12}")
+    seconds, (report, flags) = timeit(lambda: validation.validate(df, rules), repeat)
+    print(f"{'validation.validate':>34} {seconds:>9.3f} {n_rows / seconds:>12,.0f}")
+    print(f"{'':>34} {validation.summary(report)[:100]}")
+    seconds_loop, failed = timeit(lambda: per_column_checks(df, rules), repeat)
+    print(f"{'per column pandas passes':>34} {seconds_loop:>9.3f} {n_rows / seconds_loop:>12,.0f}")
+    assert failed == {check: count for check, count in report["checks"].items() if check.split(":")[0] in ("null", "range", "duplicate_key")}
+
+    seconds_ge, result = timeit(lambda: great_expectations_checks(df, rules), 1)
+    if result is None:
+        print(f"{'great expectations suite':>34} {'skipped, great_expectations is not installed':>22}")
+    else:
+        print(f"{'great expectations suite':>34} {seconds_ge:>9.3f} {n_rows / seconds_ge:>12,.0f}")
+    print(f"peak rss {peak_rss_mb():.0f} MB, speedup over per column passes {seconds_loop / seconds:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time of the pre insert validation of the cleaned data")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--bad-fraction", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.bad_fraction, args.repeat)
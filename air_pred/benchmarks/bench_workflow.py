@@ -0,0 +1,63 @@
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+from air_pred.utils import dag
+
+# seconds every step of the hourly run waits for the API, the feature store or the model serving
+LATENCIES = {"login": 4.0, "fetch": 2.0, "raw_insert": 3.0, "clean": 4.0, "ts_features": 3.0, "score": 2.5,
+             "insert_predictions": 2.0, "forecast": 3.0}
+
+def step(name : str, scale : float):
+    def run(*inputs):
+        time.sleep(LATENCIES[name] * scale)
+        return name, len(inputs)
+    return run
+
+def sequential(scale : float) -> float:
+    """The two pipeline scripts run one after the other, each logs in to the project"""
+    start = time.perf_counter()
+    for script in (["fetch", "raw_insert", "clean", "ts_features"], ["score", "insert_predictions", "forecast"]):
+        for name in ["login"] + script:
+            step(name, scale)()
+    return time.perf_counter() - start
+
+def workflow(scale : float, cache_dir : str, max_workers : int) -> dag.Workflow:
+    stages = [
+        dag.Stage("fetch", step("fetch", scale), cache=False),
+        dag.Stage("raw_insert", step("raw_insert", scale), inputs=["fetch"]),
+        dag.Stage("clean", step("clean", scale), inputs=["raw_insert"]),
+        dag.Stage("ts_features", step("ts_features", scale), inputs=["raw_insert", "clean"]),
+        dag.Stage("score", step("score", scale), inputs=["clean"]),
+        dag.Stage("insert_predictions", step("insert_predictions", scale), inputs=["score"]),
+        dag.Stage("forecast", step("forecast", scale), inputs=["clean"]),
+    ]
+    return dag.Workflow("bench", stages, cache_dir=cache_dir, max_workers=max_workers)
+
+def run(scale : float, max_workers : int, repeat : int):
+    """Wall time of the hourly run as two scripts and as one workflow, cold and when the API returned no new rows"""
+    timings = {"sequential scripts": [], "workflow cold": [], "workflow unchanged rows": []}
+    for _ in range(repeat):
+        timings["sequential scripts"].append(sequential(scale))
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for name in ("workflow cold", "workflow unchanged rows"):
+                start = time.perf_counter()
+                step("login", scale)()
+                workflow(scale, cache_dir, max_workers).run()
+                timings[name].append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(cache_dir)
+    baseline = np.median(timings["sequential scripts"])
+    print(f"{'run':>24} {'time [s]':>9} {'speedup':>8}")
+    for name, values in timings.items():
+        print(f"{name:>24} {np.median(values):>9.2f} {baseline / np.median(values):>8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wall time of the hourly prediction run with the pipeline scripts and with the workflow runner")
+    parser.add_argument("--scale", type=float, default=0.1, help="factor applied to the latencies of the steps")
+    parser.add_argument("--max-workers", type=int, default=dag.WORKFLOW_MAX_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.scale, args.max_workers, args.repeat)
@@ -0,0 +1,109 @@
+import time
+import pandas as pd
+
+class FakeFeature(object):
+    """Stand-in for hsfs.feature.Feature that builds row filters with comparison operators"""
+
+    def __init__(self, name : str, type : str = "double"):
+        self.name = name
+        self.type = type
+
+    def __ge__(self, value):
+        return lambda df: df[self.name] >= value
+
+    def __gt__(self, value):
+        return lambda df: df[self.name] > value
+
+    def __lt__(self, value):
+        return lambda df: df[self.name] < value
+
+    def __le__(self, value):
+        return lambda df: df[self.name] <= value
+
+class FakeQuery(object):
+    """Stand-in for hsfs.constructor.query.Query over a FakeFeatureGroup"""
+
+    def __init__(self, fg, filters : list = None, columns : list = None):
+        self.fg = fg
+        self.filters = filters or []
+        self.columns = columns
+
+    def filter(self, condition):
+        return FakeQuery(self.fg, self.filters + [condition], self.columns)
+
+    def read(self, online=False, dataframe_type="default", read_options=None):
+        df = self.fg.data
+        # the filters are combined before rows are selected, like a filter pushed down to the feature store
+        if self.filters:
+            mask = self.filters[0](df)
+            for condition in self.filters[1:]:
+                mask &= condition(df)
+            df = df.loc[mask, self.columns] if self.columns is not None else df[mask]
+        elif self.columns is not None:
+            df = df[self.columns]
+        self.fg.rows_read += len(df)
+        self.fg.reads += 1
+        if self.fg.read_latency or self.fg.read_time_per_row:
+            time.sleep(self.fg.read_latency + self.fg.read_time_per_row * len(df))
+        return df.copy()
+
+class FakeFeatureGroup(object):
+    """In memory stand-in for hsfs.feature_group.FeatureGroup that supports insert, read and filtered reads
+        and counts the rows that were read, used to test and benchmark the pipelines offline"""
+
+    def __init__(self, name : str, version : int = 1, primary_key : list = None, data : pd.DataFrame = None,
+                 read_latency : float = 0.0, read_time_per_row : float = 0.0):
+        """
+        Parameters
+        ----------
+        name : str
+            name of the feature group
+        version : int
+            version of the feature group
+        primary_key : list
+            columns rows are upserted on
+        data : pd.DataFrame
+            initial rows of the feature group
+        read_latency : float
+            seconds every read waits, simulates starting a query in the feature store
+        read_time_per_row : float
+            seconds every read waits per returned row, simulates transferring the rows
+        """
+        self.name = name
+        self.version = version
+        self.primary_key = primary_key or ["date_time"]
+        self.data = pd.DataFrame() if data is None else data.reset_index(drop=True)
+        self.read_latency = read_latency
+        self.read_time_per_row = read_time_per_row
+        self.rows_read = 0
+        self.reads = 0
+        self.inserted_rows = 0
+
+    @property
+    def features(self):
+        return [FakeFeature(name, "timestamp" if name == "date_time" else "string" if self.data[name].dtype == object else "double")
+                for name in self.data.columns]
+
+    def __getattr__(self, name):
+        if name != "data" and name in self.__dict__.get("data", pd.DataFrame()).columns:
+            return FakeFeature(name)
+        raise AttributeError(name)
+
+    def select_all(self):
+        return FakeQuery(self)
+
+    def select(self, features):
+        return FakeQuery(self, columns=[getattr(feature, "name", feature) for feature in features])
+
+    def filter(self, condition):
+        return FakeQuery(self, [condition])
+
+    def read(self, wallclock_time=None, online=False, dataframe_type="default", read_options=None):
+        return FakeQuery(self).read()
+
+    def insert(self, df : pd.DataFrame, overwrite : bool = False, wait : bool = False, write_options : dict = None):
+        """Upserts the rows of df on the primary key"""
+        self.inserted_rows += len(df)
+        data = df if overwrite or self.data.empty else pd.concat([self.data, df])
+        self.data = data.drop_duplicates(self.primary_key, keep="last").reset_index(drop=True)
+        return None, None
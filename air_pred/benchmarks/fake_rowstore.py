@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class FakeRowstoreServer(object):
+    """Local HTTP server that answers like the open data portal rowstore api, used to test and benchmark the client offline"""
+
+    def __init__(self, rows : list, max_limit : int = 100, delay : float = 0.0, failures : dict = None):
+        """
+        Parameters
+        ----------
+        rows : list
+            list of dicts served as results
+        max_limit : int
+            largest page size the server answers with
+        delay : float
+            seconds every request waits before answering
+        failures : dict
+            number of times the request for an offset answers with status 500 before it succeeds
+        """
+        self.rows = rows
+        self.max_limit = max_limit
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.requested_offsets = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/rowstore/json"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                offset = int(query.get("_offset", [0])[0])
+                limit = min(int(query.get("_limit", [fake.max_limit])[0]), fake.max_limit)
+                with fake.lock:
+                    fake.requested_offsets.append(offset)
+                    fail = fake.failures.get(offset, 0) > 0
+                    if fail:
+                        fake.failures[offset] -= 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                if fail:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = json.dumps({"resultCount": len(fake.rows), "offset": offset, "limit": limit,
+                                   "results": fake.rows[offset:offset + limit]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
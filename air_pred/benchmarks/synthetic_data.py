@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# Columns of air_quality_2023.csv with the mean, standard deviation, minimum, maximum, fraction of missing values
+# and mean length of a run of missing values of every column, measured on the 2023 archive
+COLUMN_PROFILES = [
+    ("Femman_Temp", 11.12, 6.933, -6.582, 27.72, 0.004, 9.0),
+    ("Femman_RH", 72.89, 20.02, 15.64, 100, 0.004, 9.0),
+    ("Femman_GlobRad", 136.4, 214.1, 0, 893, 0.004, 9.0),
+    ("Femman_AirPressure", 1010, 12.17, 970.8, 1038, 0.004, 9.0),
+    ("Femman_WindSpeed", 3.481, 1.786, 0.232, 12.8, 0.004, 7.0),
+    ("Femman_WindDir", 174.2, 88.57, 0.122, 359.9, 0.004, 9.0),
+    ("Femman_Rain", 0.1019, 0.471, 0, 11, 0.004, 10.0),
+    ("Femman_NO2", 10.58, 10.36, 0.3797, 122.9, 0.005, 1.3),
+    ("Femman_O3", 57.35, 25.3, -15.19, 163.3, 0.722, 5121.0),
+    ("Femman_PM10", 13.78, 10.9, -33.53, 361.7, 0.008, 7.2),
+    ("Femman_NOx", 13.5, 21.78, 0.1057, 403.9, 0.005, 1.3),
+    ("Femman_PM25", 5.875, 8.077, -32.4, 394.7, 0.006, 4.6),
+    ("HagaNorra_NO2", 10.5, 9.729, -0.9071, 193.3, 0.004, 1.2),
+    ("HagaNorra_NOx", 13.59, 21, -1.375, 646.2, 0.004, 1.2),
+    ("HagaSodra_PM10", 11.54, 10.62, -13.05, 101.8, 0.071, 167.7),
+    ("HagaSodra_PM25", 6.327, 7.348, -16.95, 95.05, 0.165, 43.3),
+    ("Lejonet_GlobRad", 134.2, 209.7, 0, 955, 0.0, 0.0),
+    ("Lejonet_AirPressure", 1013, 12.24, 973, 1041, 0.0, 0.0),
+    ("Lejonet_Rain", 0.066, 0.4132, 0, 7.1, 0.0, 0.0),
+    ("Lejonet_RH", 78.38, 21.46, 12.64, 100, 0.0, 0.0),
+    ("Lejonet_Temp", 10.88, 7.049, -8.67, 28.23, 0.0, 0.0),
+    ("Lejonet_WindDir", 165.7, 94.71, 0, 360, 0.0, 0.0),
+    ("Lejonet_WindSpeed", 2.914, 1.572, 0.107, 10.73, 0.0, 0.0),
+    ("Mobil1_NO2", 14.06, 11.71, -2.025, 111.5, 0.013, 3.9),
+    ("Mobil1_NOx", 19.8, 23.97, -3.251, 359.2, 0.013, 3.9),
+    ("Mobil1_PM10", 14.44, 15.79, -20.4, 283.2, 0.014, 20.2),
+    ("Mobil2_NO2", 9.151, 7.694, 0.3462, 67.28, 0.268, 99.8),
+    ("Mobil2_NOx", 11.72, 15.3, -0.005478, 218.4, 0.268, 99.8),
+    ("Mobil2_PM10", 11.5, 8.532, 0.1293, 230.4, 0.265, 938.5),
+    ("Mobil3_NO2", 12.78, 10.47, 1.089, 117.4, 0.019, 5.7),
+    ("Mobil3_NOx", 17.29, 21.91, 1.073, 399.2, 0.018, 5.7),
+    ("Mobil3_PM10", 15.39, 12.84, -74.44, 179.4, 0.114, 101.2),
+    ("Mobil2_PM25  ", 5.786, 4.566, 0.08385, 67.58, 0.265, 938.5),
+]
+
+HOURS_PER_YEAR = 8760
+
+def date_and_time_columns(date_time : pd.DatetimeIndex) -> pd.DataFrame:
+    """Formats hourly timestamps like the open data portal, midnight is 24:00 of the previous day and every time has the suffix +01:00"""
+    previous_hour = date_time - pd.Timedelta(hours=1)
+    return pd.DataFrame({"Date": previous_hour.strftime("%Y-%m-%d"),
+                         "Time": pd.Series(previous_hour.hour + 1).map("{:02d}:00+01:00".format).values})
+
+def missing_mask(n_rows : int, fraction : float, mean_run : float, rng : np.random.Generator) -> np.ndarray:
+    """Creates a mask with runs of missing values that cover the given fraction of the rows. Run lengths are geometric
+        with the given mean, scaled to the fraction, and the runs are placed in random non overlapping positions"""
+    mask = np.zeros(n_rows, dtype=bool)
+    n_missing = int(round(n_rows * fraction))
+    if n_missing == 0 or mean_run <= 0:
+        return mask
+    n_runs = max(1, int(round(n_missing / mean_run)))
+    lengths = rng.geometric(1 / max(mean_run, 1), n_runs).astype(float)
+    lengths = np.maximum(1, np.round(lengths * n_missing / lengths.sum())).astype(int)
+    # the rows that are not missing are split into random gaps before, between and after the runs
+    cuts = np.sort(rng.integers(0, max(0, n_rows - lengths.sum()) + 1, n_runs))
+    starts = cuts + np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    for start, length in zip(starts, lengths):
+        mask[start:start + length] = True
+    return mask
+
+def generate_station_data(years : float, start : str = "2000-01-01 01:00", seed : int = 0) -> pd.DataFrame:
+    """Function that generates hourly data shaped like air_quality_2023.csv, with the same columns, missing value patterns
+        and the Date and Time format of the open data portal
+    Parameters
+    ----------
+    years : float
+        number of years of hourly rows
+    start : str
+        first hour of the data
+    seed : int
+        seed of the random generator, the same seed gives the same data
+
+    Returns
+    -------
+    pd.DataFrame
+        Date, Time and the sensor columns of air_quality_2023.csv
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = int(round(years * HOURS_PER_YEAR))
+    date_time = pd.date_range(start, periods=n_rows, freq="H")
+
+    # every column follows a shared weather factor and its own autocorrelated noise, so that columns are correlated like real sensors
+    shared = lfilter([1], [1, -0.95], rng.normal(size=n_rows))
+    own = lfilter([1], [1, -0.9], rng.normal(size=(n_rows, len(COLUMN_PROFILES))), axis=0)
+    daily = np.sin(2 * np.pi * date_time.hour.values / 24)
+    signal = 0.5 * shared[:, None] / shared.std() + 0.7 * own / own.std(axis=0) + 0.3 * daily[:, None]
+
+    columns = {}
+    for index, (name, mean, std, minimum, maximum, fraction, mean_run) in enumerate(COLUMN_PROFILES):
+        values = np.clip(mean + std * signal[:, index], minimum, maximum)
+        values[missing_mask(n_rows, fraction, mean_run, rng)] = np.nan
+        columns[name] = values.round(4)
+    return pd.concat([date_and_time_columns(date_time), pd.DataFrame(columns)], axis=1)
+
+def write_station_csv(path : str, years : float, seed : int = 0):
+    """Writes generate_station_data to a csv file that can be read with data_preprocessing.read_raw_csv"""
+    generate_station_data(years, seed=seed).to_csv(path, index=False)
@@ -0,0 +1,117 @@
+import argparse
+import sys
+
+# Every subcommand imports its pipeline when it runs, so that the cli starts without importing hopsworks, sklearn
+# or great_expectations and without logging in
+
+def backfill(args):
+    from air_pred.pipeline import backfill_feature_pipeline
+    fit_rows = {} if args.fit_rows is None else {"fit_rows": args.fit_rows}
+    backfill_feature_pipeline.backfill_air_quality_data(version=args.version, lean=args.lean, chunksize=args.chunksize, **fit_rows)
+
+def update(args):
+    from air_pred.pipeline import online_feature_pipeline
+    online_feature_pipeline.update_feature_groups(incremental=not args.full)
+
+def train(args):
+    from air_pred.pipeline import training_pipeline
+    if args.multi_target:
+        training_pipeline.train_multi_target_model()
+        return
+    if args.incremental:
+        # settings that are not given are read from the environment by the training pipeline
+        settings = {name: getattr(args, name) for name in ("window_hours", "halflife_hours") if getattr(args, name) is not None}
+        for fv_name in training_pipeline.MODEL_NAMES:
+            training_pipeline.update_linear_model(fv_name, **settings)
+        return
+    if not args.skip_feature_views:
+        training_pipeline.create_featureView()
+    training_pipeline.train_model(n_jobs=args.n_jobs)
+
+def batch_predict(args):
+    import pandas as pd
+    from air_pred.pipeline import batch_inference_pipeline
+    if args.multi_target:
+        batch_inference_pipeline.batch_predict_multi_target(batch_inference_pipeline.create_multi_target_prediction_feature_group())
+        return
+    batch_inference_pipeline.run_batch_inference(chunk=pd.Timedelta(days=args.chunk_days) if args.chunk_days else None)
+
+def predict(args):
+    from air_pred.pipeline import online_inference_pipeline
+    online_inference_pipeline.update_predictions()
+
+def forecast(args):
+    from air_pred.pipeline import online_inference_pipeline
+    from air_pred.utils import forecasting
+    online_inference_pipeline.update_forecasts(horizon=args.horizon or forecasting.FORECAST_HORIZON,
+                                               strategy=args.strategy or forecasting.FORECAST_STRATEGY)
+
+def workflow(args):
+    from air_pred.pipeline import prediction_workflow
+    prediction_workflow.run_prediction_workflow(incremental=not args.full, resume=args.resume, force=args.force, max_workers=args.max_workers)
+
+def deploy(args):
+    from air_pred.pipeline import deployement_pipeline
+    deployement_pipeline.deploy_linear_regression_baseline()
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="air_pred", description="Air quality prediction pipelines for Gothenburg")
+    parser.add_argument("--instrument", action="store_true", help="record the time, memory and rows of every stage, see utils.instrumentation")
+    parser.add_argument("--metrics-file", help="json file the stage summary is written to, printed to stdout if not set")
+    parser.add_argument("--profile-dir", help="directory cProfile statistics of the outermost stages are written to")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    subparsers.required = True
+
+    command = subparsers.add_parser("backfill", help="fill the feature groups from the historical csv file")
+    command.add_argument("--version", type=int, default=2, help="version of the feature groups, 1 for baseline and 2 for iterative imputation")
+    command.add_argument("--chunksize", type=int, help="stream the csv file in chunks of this many rows")
+    command.add_argument("--fit-rows", type=int, help="rows of the streamed csv file the imputer is fitted on, AIR_PRED_STREAMING_FIT_ROWS if not set")
+    command.add_argument("--lean", action="store_true", help="process the csv file with float32 columns, the stored sensor values are rounded to float32")
+    command.set_defaults(func=backfill)
+
+    command = subparsers.add_parser("update", help="add the latest data of the open data portal to the feature groups")
+    command.add_argument("--full", action="store_true", help="refit the imputer on the complete raw data instead of the newly arrived rows")
+    command.set_defaults(func=update)
+
+    command = subparsers.add_parser("train", help="create the training data and train the models")
+    command.add_argument("--skip-feature-views", action="store_true", help="train on the existing feature views and training data")
+    command.add_argument("--n-jobs", type=int, help="number of processes the candidate models are fitted in, -1 for all cores")
+    command.add_argument("--multi-target", action="store_true", help="train one time series model per station and pollutant on stacked features")
+    command.add_argument("--incremental", action="store_true", help="update the linear models with the rows added since their last update")
+    command.add_argument("--window-hours", type=int, help="with --incremental, fit on the most recent hours only, set when the models are first updated")
+    command.add_argument("--halflife-hours", type=float, help="with --incremental, age in hours at which rows count half")
+    command.set_defaults(func=train)
+
+    command = subparsers.add_parser("batch-predict", help="predict the complete cleaned data and store the predictions")
+    command.add_argument("--chunk-days", type=float, help="days of data read, predicted and inserted at once")
+    command.add_argument("--multi-target", action="store_true", help="predict all stations and pollutants with the multi target model")
+    command.set_defaults(func=batch_predict)
+
+    command = subparsers.add_parser("predict", help="predict the rows that do not have a prediction yet with the deployment")
+    command.set_defaults(func=predict)
+
+    command = subparsers.add_parser("forecast", help="forecast the next hours with the time series model and store the forecasts")
+    command.add_argument("--horizon", type=int, help="number of hours forecasted, 24 by default")
+    command.add_argument("--strategy", choices=["direct", "recursive"], help="direct uses only observed values, recursive feeds forecasts back as lags")
+    command.set_defaults(func=forecast)
+
+    command = subparsers.add_parser("workflow", help="update the feature groups, predictions and forecasts as one workflow, skipping the stages whose inputs did not change")
+    command.add_argument("--full", action="store_true", help="refit the imputer on the complete raw data instead of the newly arrived rows")
+    command.add_argument("--resume", action="store_true", help="continue a failed run with the data it fetched instead of fetching again")
+    command.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="stages that are run even if their inputs did not change")
+    command.add_argument("--max-workers", type=int, help="number of stages run at the same time")
+    command.set_defaults(func=workflow)
+
+    command = subparsers.add_parser("deploy", help="deploy the best models with predictor.py")
+    command.set_defaults(func=deploy)
+    return parser
+
+def main(argv : list = None):
+    args = create_parser().parse_args(argv)
+    if args.instrument or args.metrics_file or args.profile_dir:
+        from air_pred.utils import instrumentation
+        instrumentation.enable(metrics_file=args.metrics_file, profile_dir=args.profile_dir)
+    args.func(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
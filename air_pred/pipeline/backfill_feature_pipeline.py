@@ -1,31 +1,38 @@
+from __future__ import annotations
+import typing
 import pandas as pd
-import hopsworks
-from air_pred.utils import data_preprocessing
+from air_pred.utils import data_preprocessing, feature_store, instrumentation, streaming_backfill, validation
 import numpy as np
-import great_expectations as ge
-import hsfs
 
-project = hopsworks.login()
-fs = project.get_feature_store()
+# hsfs is only needed when the backfill runs and is slow to import
+if typing.TYPE_CHECKING:
+    import hsfs
 
-def value_not_null(expectation_suite : ge.core.ExpectationSuite , column_name : list):
-    """Function that adds an baseline expectation that the values would not be null in the feature view cleaned_air_quality_data
+def insert_validated(fg : hsfs.feature_group.FeatureGroup, df : pd.DataFrame, stage_name : str, rules : dict = validation.DEFAULT_RULES):
+    """Function that validates a dataframe against the rules and the schema of the feature group and inserts the rows
+        that passed, the expectation suite of the feature group is saved again when the rules changed
     Parameters
     ----------
-    expectation_suite :  ge.core.ExpectationSuite
-        Expectation suit into which the expectations are to be added
+    fg : hsfs.feature_group.FeatureGroup
+        Feature Group the dataframe is inserted into
 
-    column_name : list
-        List of feature names for which the expectations are to be added 
+    df : pd.DataFrame
+        dataframe to be inserted
+
+    stage_name : str
+        name of the instrumentation stage of the insert
+
+    rules : dict
+        checks run before the insert, see validation.DEFAULT_RULES
     """
-    expectation_suite.add_expectation(ge.core.ExpectationConfiguration(
-                                        expectation_type="expect_column_values_to_not_be_null",
-                                        kwargs={
-                                            "column": column_name,
-                                        }
-                                        ))
-
-def create_and_fill_baseline_fg(fg_raw_data :hsfs.feature_group.FeatureGroup, initial_df:pd.DataFrame, clean_data_fg:hsfs.feature_group.FeatureGroup, ts_data_fg:hsfs.feature_group.FeatureGroup, expectation_suite_clean_data:ge.core.ExpectationSuite):
+    df = validation.enforce(df, fg.name, rules, schema=validation.schema_from_features(fg.features))
+    with instrumentation.stage(stage_name, rows_in=len(df)):
+        fg.insert(df, wait=True, write_options={"wait_for_job":True})
+    # the features of a new feature group are only known after the first insert
+    validation.sync_expectation_suite(fg, rules)
+
+@instrumentation.instrument(rows_arg=1)
+def create_and_fill_baseline_fg(fg_raw_data :hsfs.feature_group.FeatureGroup, initial_df:pd.DataFrame, clean_data_fg:hsfs.feature_group.FeatureGroup, ts_data_fg:hsfs.feature_group.FeatureGroup, rules:dict = validation.DEFAULT_RULES):
     """ Function that create baseline feature groups based on the csv dataset provided using pandas.interpolte to impute null values
     Parameters
     ----------
@@ -41,31 +48,27 @@ def create_and_fill_baseline_fg(fg_raw_data :hsfs.feature_group.FeatureGroup, in
     ts_data_fg : hsfs.feature_group.FeatureGroup
         Feature Group containing cleaned time series features without any null values
     
-    expectation_suite_clean_data : ge.core.ExpectationSuite
-        Expectation suit for both clean_data_fg and ts_data_fg 
+    rules : dict
+        checks run before inserting into clean_data_fg and ts_data_fg, see validation.DEFAULT_RULES
     """
     
-    fg_raw_data.insert(initial_df, wait=True, write_options={"wait_for_job":True})
+    with instrumentation.stage("insert_raw_data", rows_in=len(initial_df)):
+        fg_raw_data.insert(data_preprocessing.to_insert_frame(initial_df), wait=True, write_options={"wait_for_job":True})
 
     # cleaning read dataframe
-    cleneddf = data_preprocessing.clean_data_baseline(initial_df)
-    for feature in cleneddf.columns:
-        value_not_null(expectation_suite_clean_data, feature)
-    
-    if clean_data_fg.get_expectation_suite is None:
-        clean_data_fg.save_expectation_suite(expectation_suite_clean_data, run_validation=True, validation_ingestion_policy="STRICT")
-        ts_data_fg.save_expectation_suite(expectation_suite_clean_data, run_validation=True, validation_ingestion_policy="STRICT")
-        
+    cleneddf = data_preprocessing.to_insert_frame(data_preprocessing.clean_data_baseline(initial_df))
+
     # Insering cleaned data into cleaned_air_quality_data feature group
-    clean_data_fg.insert(cleneddf, wait=True, write_options={"wait_for_job":True})
+    insert_validated(clean_data_fg, cleneddf, "insert_cleaned_data", rules)
 
     # Creating features for time series prediction
-    tsdf = data_preprocessing.get_time_series_features(clean_data_fg)
+    tsdf = data_preprocessing.get_time_series_features(cleneddf)
 
     #inserting time series features into feature group
-    ts_data_fg.insert(tsdf, wait=True, write_options={"wait_for_job":True})
+    insert_validated(ts_data_fg, tsdf, "insert_time_series_features", rules)
 
-def create_and_fill_iterative_imputer_fg(fg_raw_data:hsfs.feature_group.FeatureGroup, initial_df:pd.DataFrame, clean_data_fg:hsfs.feature_group.FeatureGroup,  ts_data_fg:hsfs.feature_group.FeatureGroup, expectation_suite_clean_data:ge.core.ExpectationSuite, version:int=2, use_previous_data:bool = True):
+@instrumentation.instrument(rows_arg=1)
+def create_and_fill_iterative_imputer_fg(fg_raw_data:hsfs.feature_group.FeatureGroup, initial_df:pd.DataFrame, clean_data_fg:hsfs.feature_group.FeatureGroup,  ts_data_fg:hsfs.feature_group.FeatureGroup, rules:dict = validation.DEFAULT_RULES, version:int=2, use_previous_data:bool = True, lean:bool = False):
     """ Function that create feature groups based on multi variate imputation from a given historical csv file or from previous version of feature group
     Parameters
     ----------
@@ -81,53 +84,110 @@ def create_and_fill_iterative_imputer_fg(fg_raw_data:hsfs.feature_group.FeatureG
     ts_data_fg : hsfs.feature_group.FeatureGroup
         Feature Group containing cleaned time series features without any null values
     
-    expectation_suite_clean_data : ge.core.ExpectationSuite
-        Expectation suit for both clean_data_fg and ts_data_fg 
+    rules : dict
+        checks run before inserting into clean_data_fg and ts_data_fg, see validation.DEFAULT_RULES
 
     version : int 
         Version of newly created feature group
     
     use_previous_data : bool
         if set true then use the previous version of the feature group to fill the newly created feature group
+
+    lean : bool
+        if set true the data is processed with float32 sensor columns and without date_time_str, 
+        which are only converted back when inserting into the feature groups
     """
     if use_previous_data:
         try:
-            previous_raw_data_fg = fs.get_feature_group(name="air_quality_data", version=version-1)
-            try:
-                initial_df = previous_raw_data_fg.read()
-            except:
-                initial_df = previous_raw_data_fg.read({"use_hive":True})
-            initial_df["date_time"] = initial_df["date_time_str"].apply(data_preprocessing.convert_to_datetime)
+            previous_raw_data_fg = feature_store.get_feature_store().get_feature_group(name="air_quality_data", version=version-1)
+            with instrumentation.stage("read_previous_version") as stage:
+                try:
+                    initial_df = previous_raw_data_fg.read()
+                except:
+                    initial_df = previous_raw_data_fg.read({"use_hive":True})
+                stage.set_rows(rows_out=len(initial_df))
+            initial_df["date_time"] = data_preprocessing.convert_to_datetime_column(initial_df["date_time_str"])
+            if lean:
+                initial_df = data_preprocessing.to_lean_frame(initial_df)
         except:
             pass
 
-    fg_raw_data.insert(initial_df, wait=True, write_options={"wait_for_job":True})
+    with instrumentation.stage("insert_raw_data", rows_in=len(initial_df)):
+        fg_raw_data.insert(data_preprocessing.to_insert_frame(initial_df), wait=True, write_options={"wait_for_job":True})
 
     # cleaning read dataframe
-    cleneddf = data_preprocessing.clean_data_IterativeImputer(initial_df)
-    for feature in cleneddf.columns:
-        value_not_null(expectation_suite_clean_data, feature)
-    
-    if clean_data_fg.get_expectation_suite is None:
-        clean_data_fg.save_expectation_suite(expectation_suite_clean_data, run_validation=True, validation_ingestion_policy="STRICT")
-    
-    if ts_data_fg.get_expectation_suite is None:
-        ts_data_fg.save_expectation_suite(expectation_suite_clean_data, run_validation=True, validation_ingestion_policy="STRICT")
-        
+    cleneddf = data_preprocessing.to_insert_frame(data_preprocessing.clean_data_IterativeImputer(initial_df))
+
     # Insering cleaned data into cleaned_air_quality_data feature group
-    clean_data_fg.insert(cleneddf, wait=True, write_options={"wait_for_job":True})
+    insert_validated(clean_data_fg, cleneddf, "insert_cleaned_data", rules)
 
     tsdf = data_preprocessing.get_time_series_features(cleneddf)
+    insert_validated(ts_data_fg, tsdf, "insert_time_series_features", rules)
 
-    ts_data_fg.insert(tsdf, wait=True, write_options={"wait_for_job":True})
+@instrumentation.instrument()
+def stream_and_fill_fg(csv_path:str, fg_raw_data:hsfs.feature_group.FeatureGroup, clean_data_fg:hsfs.feature_group.FeatureGroup, ts_data_fg:hsfs.feature_group.FeatureGroup, chunksize:int, method:str = "baseline", lean:bool = False, rules:dict = validation.DEFAULT_RULES, fit_rows:int = streaming_backfill.STREAMING_FIT_ROWS):
+    """ Function that fills the feature groups from a historical csv file chunk by chunk, so that peak memory is bounded by the
+        chunk size and not by the size of the file. The inserted data is the same as when the complete file is processed at once
+    Parameters
+    ----------
+    csv_path : str
+        path of the historical csv file, rows must be ordered by date and time
+
+    fg_raw_data :  hsfs.feature_group.FeatureGroup
+        Feature Group containing raw and unprocessed data
 
-def backfill_air_quality_data(version=1):
+    clean_data_fg : hsfs.feature_group.FeatureGroup
+        Feature Group containing cleaned data that does not have any null values
+
+    ts_data_fg : hsfs.feature_group.FeatureGroup
+        Feature Group containing cleaned time series features without any null values
+    
+    chunksize : int
+        number of csv rows read per chunk
+
+    method : str
+        baseline to impute with pandas.interpolate or iterative to impute with the IterativeImputer
+
+    lean : bool
+        if set true the chunks are processed in memory lean mode, the sensor values are then inserted as their float32 rounding
+
+    rules : dict
+        checks run before inserting into clean_data_fg and ts_data_fg, see validation.DEFAULT_RULES
+
+    fit_rows : int
+        maximum number of rows the IterativeImputer is fitted on, see streaming_backfill.fit_streaming_imputer
+    """
+    for raw_df, cleneddf, tsdf in streaming_backfill.iter_backfill_chunks(csv_path, chunksize, method=method, lean=lean, fit_rows=fit_rows):
+        if len(raw_df):
+            with instrumentation.stage("insert_raw_data", rows_in=len(raw_df)):
+                fg_raw_data.insert(data_preprocessing.to_insert_frame(raw_df), wait=True, write_options={"wait_for_job":True})
+        if len(cleneddf) == 0:
+            continue
+        insert_validated(clean_data_fg, data_preprocessing.to_insert_frame(cleneddf), "insert_cleaned_data", rules)
+        if len(tsdf):
+            insert_validated(ts_data_fg, data_preprocessing.to_insert_frame(tsdf), "insert_time_series_features", rules)
+
+@instrumentation.instrument()
+def backfill_air_quality_data(version=1, lean=False, chunksize=None, fit_rows=streaming_backfill.STREAMING_FIT_ROWS):
     """
     Wrapper function that checks the version of the feature group and call the appropriate function 
 
     version : int
         Version of newly created feature group
+
+    lean : bool
+        if set true the csv file is processed in memory lean mode, float32 sensor columns and date_time_str only created when inserting.
+        The sensor values are then inserted as their float32 rounding, off by default so that the stored values match the csv file
+
+    chunksize : int
+        if set the csv file is streamed into the feature groups in chunks of this many rows instead of being read at once.
+        Version 2 then imputes the csv file instead of the previous version of the feature group
+
+    fit_rows : int
+        maximum number of rows the IterativeImputer is fitted on when the csv file is streamed, None to fit on all rows
     """
+    fs = feature_store.get_feature_store()
+
     # creating or getting feature group air_quality_data that contains all raw data
     fg_raw_data = fs.get_or_create_feature_group(name="air_quality_data",
                                         version=version,
@@ -136,10 +196,6 @@ def backfill_air_quality_data(version=1):
                                         primary_key=["date_time"],
                                         event_time='date_time')
     
-    # reading raw data csv, creating the feature date_time and instering it into feature group
-    df = pd.read_csv("air_quality_2023.csv", skipinitialspace = True)
-    initial_df = data_preprocessing.create_date_time_feature(df)
-
     # creating or getting feature group cleaned_air_quality_data that contains cleaned data without any null entries
     clean_data_fg = fs.get_or_create_feature_group(name="cleaned_air_quality_data",
                                             version=version,
@@ -156,13 +212,20 @@ def backfill_air_quality_data(version=1):
                                             primary_key=["date_time_str"],
                                             event_time='date_time')
     
-    # creating an expectation suit for cleaned_air_quality_data and adding the expecation that all columns are not null 
-    expectation_suite_clean_data = ge.core.ExpectationSuite(expectation_suite_name="cleaned_air_quality_fg")
-    
+
+    if chunksize is not None:
+        stream_and_fill_fg("air_quality_2023.csv", fg_raw_data=fg_raw_data, clean_data_fg=clean_data_fg, ts_data_fg=ts_data_fg,
+                           chunksize=chunksize, method="baseline" if version == 1 else "iterative", lean=lean, fit_rows=fit_rows)
+        return
+
+    # reading raw data csv, creating the feature date_time and instering it into feature group
+    df = data_preprocessing.read_raw_csv("air_quality_2023.csv", lean=lean)
+    initial_df = data_preprocessing.create_date_time_feature(df, keep_date_time_str=not lean)
+    del df
 
     if version == 1:
-        create_and_fill_baseline_fg(fg_raw_data=fg_raw_data, initial_df=initial_df, clean_data_fg=clean_data_fg, ts_data_fg=ts_data_fg,  expectation_suite_clean_data=expectation_suite_clean_data)
+        create_and_fill_baseline_fg(fg_raw_data=fg_raw_data, initial_df=initial_df, clean_data_fg=clean_data_fg, ts_data_fg=ts_data_fg)
     elif version == 2:
-        create_and_fill_iterative_imputer_fg(fg_raw_data=fg_raw_data, initial_df=initial_df, clean_data_fg=clean_data_fg, ts_data_fg=ts_data_fg, expectation_suite_clean_data=expectation_suite_clean_data, version=2, use_previous_data=True)
+        create_and_fill_iterative_imputer_fg(fg_raw_data=fg_raw_data, initial_df=initial_df, clean_data_fg=clean_data_fg, ts_data_fg=ts_data_fg, version=2, use_previous_data=True, lean=lean)
 if __name__ == "__main__":
     backfill_air_quality_data(version=2)
\ No newline at end of file
@@ -1,18 +1,21 @@
-import hopsworks
-import datetime
-import joblib
-from air_pred.utils import data_preprocessing
-import hsfs
-
-project = hopsworks.login()
-fs = project.get_feature_store()
+from __future__ import annotations
+import typing
+import numpy as np
+import pandas as pd
+from air_pred.utils import batch_scoring, data_preprocessing, feature_store, instrumentation, model_cache, multi_target, snapshot_cache
+
+if typing.TYPE_CHECKING:
+    import hsfs
+
 # Version of feature groups to be used and training data to be used in the pipeline
 FEAURE_GROUP_VERSION = 2
 TRAINING_DATA_VERSION = 1
+# time range of the chunks batch_predict reads, predicts and inserts at once
+BATCH_CHUNK = pd.Timedelta(days=90)
 
 def create_predication_feature_group():
     """Function to create feature group that store predictions"""
-    predicated_regression_fg = fs.get_or_create_feature_group(name="predicted_air_quality_regression",
+    predicated_regression_fg = feature_store.get_feature_store().get_or_create_feature_group(name="predicted_air_quality_regression",
                                             version=FEAURE_GROUP_VERSION,
                                             description="Predicted air quality in Gothenburg",
                                             online_enabled=True,
@@ -23,61 +26,149 @@ def create_predication_feature_group():
 def create_predication_feature_view(predicated_regression_fg):
     """Function to create feature view to read from feature group that stores predictions"""
     query = predicated_regression_fg.select_all()
-    fv = fs.get_or_create_feature_view(name="predicted_air_quality_regression_fv",
+    fv = feature_store.get_feature_store().get_or_create_feature_view(name="predicted_air_quality_regression_fv",
                                        query=query,
                                        version=FEAURE_GROUP_VERSION,
                                         labels=[],
                                        )
 
-def batch_predict(predicated_regression_fg:hsfs.feature_group.FeatureGroup):
-    """Function that preforms batch predict on the entier feature group
+def read_scoring_chunk(fv : hsfs.feature_view.FeatureView, fg : hsfs.feature_group.FeatureGroup, start : pd.Timestamp, end : pd.Timestamp) -> pd.DataFrame:
+    """Function that reads the features and the label of the rows with start <= date_time < end joined on date_time.
+        Features are read through the feature view so that they get the transformations of the training data,
+        the label is read from the feature group with a projection on date_time and femman_pm25
+    Parameters
+    ----------
+    fv : hsfs.feature_view.FeatureView
+        feature view the model was trained on, initialized for serving
+    fg : hsfs.feature_group.FeatureGroup
+        feature group with the label
+    start : pd.Timestamp
+        first date_time of the chunk
+    end : pd.Timestamp
+        end of the chunk, not included
+
+    Returns
+    -------
+    pd.DataFrame
+        features, date_time, date_time_str and femman_pm25 of the chunk ordered by date_time
+    """
+    try:
+        features = fv.get_batch_data(start_time=start, end_time=end)
+    except:
+        features = fv.get_batch_data(start_time=start, end_time=end, read_options={"use_hive":True})
+    features = features.assign(date_time=data_preprocessing.naive_date_time(features["date_time"]))
+    # get_batch_data can return rows outside of the time range, they belong to the neighbouring chunks
+    features = features[(features.date_time >= start) & (features.date_time < end)].drop_duplicates('date_time')
+
+    labels = fg.select(["date_time", "femman_pm25"]).filter(fg.date_time >= start).filter(fg.date_time < end).read()
+    labels = labels.assign(date_time=data_preprocessing.naive_date_time(labels["date_time"]))[["date_time", "femman_pm25"]].drop_duplicates('date_time')
+    return features.merge(labels, on="date_time", how="left").sort_values('date_time').reset_index(drop=True)
+
+@instrumentation.instrument()
+def batch_predict(predicated_regression_fg:hsfs.feature_group.FeatureGroup, chunk : pd.Timedelta = BATCH_CHUNK,
+                  start_time : pd.Timestamp = None, end_time : pd.Timestamp = None) -> dict:
+    """Function that preforms batch predict on the entier feature group in time ranged chunks. Every chunk is read, predicted
+        and inserted on its own and the insert of a chunk runs while the next chunk is read, memory depends on the chunk length
+        and not on the length of the history
         Parameters
         ----------
         predicated_regression_fg: hsfs.feature_group.FeatureGroup
             feature group that conatains predictions that have been performed
+        chunk : pd.Timedelta
+            time range of every chunk
+        start_time : pd.Timestamp
+            first date_time to be predicted, the first date_time of the feature group if None
+        end_time : pd.Timestamp
+            end of the time range to be predicted, not included. One hour after the last date_time of the feature group if None
+
+        Returns
+        -------
+        dict
+            number of chunks and of rows that were read and inserted
     """
 
     # Get feature view used for training data 
+    fs = feature_store.get_feature_store()
     fv = fs.get_feature_view("air_qaulity_baseline_fv", version=FEAURE_GROUP_VERSION)
     fv.init_serving(training_dataset_version=TRAINING_DATA_VERSION)
+    # feature group conatining the cleaned data, needed since we do not get the target value from feature view
+    fg = fs.get_feature_group(name="cleaned_air_quality_data", version=FEAURE_GROUP_VERSION)
 
-    # read training data and sort them
-    try:
-        predication_features = fv.get_batch_data()
-    except:
-        predication_features = fv.get_batch_data(read_options={"use_hive":True})
-    predication_features = predication_features.sort_values('date_time')
+    if start_time is None or end_time is None:
+        # only the date_time column is read to find the time range of the feature group
+        with instrumentation.stage("read_time_range"):
+            date_time = data_preprocessing.naive_date_time(fg.select(["date_time"]).read()["date_time"])
+        if len(date_time) == 0:
+            print("No data to predict")
+            return {"chunks": 0, "rows_read": 0, "rows_inserted": 0}
+        start_time = date_time.min() if start_time is None else start_time
+        end_time = date_time.max() + pd.Timedelta(hours=1) if end_time is None else end_time
+        del date_time
+
+    # get the best model avialable, downloaded only if it is not in the local model cache
+    lr_model = model_cache.default_cache().load(feature_store.get_model_registry(), "air_quality_estimation_model", metric="Test MSE", direction='min')
+
+    def predict(df):
+        # drop features not nessary for prediction
+        predication = lr_model.predict(df.drop(["date_time", "date_time_str", "femman_pm25"], axis=1))
+        # Workaround done to convert datatime[us] to datetime feature so that it can be stored in feature group
+        return df[["date_time_str", "femman_pm25"]].assign(date_time=data_preprocessing.convert_to_datetime_column(df["date_time_str"]),
+                                                           predicted_femman_pm25=np.asarray(predication).reshape(len(df)))
+
+    def insert(prediction_df):
+        with instrumentation.stage("insert_predictions", rows_in=len(prediction_df)):
+            predicated_regression_fg.insert(prediction_df, wait=True, write_options={"wait_for_job":True})
 
-    # get feature group conatining trained data and read from it, needed since we do not get the target value from feature view
+    counts = batch_scoring.score_in_chunks(batch_scoring.time_chunks(start_time, end_time, chunk),
+                                           lambda start, end: read_scoring_chunk(fv, fg, start, end), predict, insert)
+    print(f"Predicted {counts['rows_inserted']} rows in {counts['chunks']} chunks")
+    return counts
+
+def create_multi_target_prediction_feature_group():
+    """Function to create feature group that stores the predictions of all stations and pollutants, one row per target and hour"""
+    return feature_store.get_feature_store().get_or_create_feature_group(name="predicted_air_quality_multi_target",
+                                            version=FEAURE_GROUP_VERSION,
+                                            description="Predicted air quality of all stations and pollutants in Gothenburg",
+                                            online_enabled=True,
+                                            primary_key=["date_time_str", "target"],
+                                            event_time='date_time')
+
+@instrumentation.instrument()
+def batch_predict_multi_target(prediction_fg : hsfs.feature_group.FeatureGroup) -> pd.DataFrame:
+    """Function that predicts all targets of the multi target model for the complete cleaned data. The features of all targets
+        are created in one pass and every target is predicted by its model on a slice of one feature array
+        Parameters
+        ----------
+        prediction_fg: hsfs.feature_group.FeatureGroup
+            feature group the predictions are stored in
+
+        Returns
+        -------
+        pd.DataFrame
+            stored predictions
+    """
+    fs = feature_store.get_feature_store()
     fg = fs.get_feature_group(name="cleaned_air_quality_data", version=FEAURE_GROUP_VERSION)
-    try:
-        df_data = fg.read()
-    except:
-        df_data = fg.read({"use_hive":True})
-
-    df_data = df_data.sort_values('date_time')
-    # drop features not nessary for prediction
-    predication_features = predication_features.drop(["date_time", "date_time_str"], axis = 1)
-    
-    # get the best model avialable
-    mr = project.get_model_registry()
-    retrieved_model =  mr.get_best_model("air_quality_estimation_model", metric="Test MSE", direction='min')
-    saved_model_dir = retrieved_model.download()
-
-    # preform prediction 
-    lr_model = joblib.load(saved_model_dir + "/linear_regression.pkl")
-    predication = lr_model.predict(predication_features)
-
-    # create a prediction dataframe to store into prediction feature group
-    prediction_df = df_data[["date_time_str", "femman_pm25"]]
-    # Workaround done to convert datatime[us] to datetime feature so that it can be stored in feature group
-    prediction_df["date_time"] = prediction_df["date_time_str"].apply(data_preprocessing.convert_to_datetime)
-    prediction_df["predicted_femman_pm25"] = predication.squeeze()
-
-    # insert predictions into feature group
-    predicated_regression_fg.insert(prediction_df, wait=True, write_options={"wait_for_job":True})
+    model = model_cache.default_cache().load(feature_store.get_model_registry(), multi_target.MULTI_TARGET_MODEL_NAME, metric="Test MSE", direction='min')
+    df = snapshot_cache.default_cache().read(fg)
+    df['date_time'] = data_preprocessing.convert_to_datetime_column(df['date_time_str'])
 
-if __name__ == "__main__":
+    with instrumentation.stage("stack_features", rows_in=len(df)) as stage:
+        stacked = multi_target.stack_features(df, model.targets)
+        stage.set_rows(rows_out=len(stacked))
+    del df
+    with instrumentation.stage("predict", rows_in=len(stacked)):
+        prediction_df = multi_target.unstack_predictions(stacked, model.predict(stacked))
+    with instrumentation.stage("insert_predictions", rows_in=len(prediction_df)):
+        prediction_fg.insert(prediction_df, wait=True, write_options={"wait_for_job":True})
+    print(f"Predicted {len(prediction_df)} rows of {len(model.targets)} targets")
+    return prediction_df
+
+def run_batch_inference(chunk : pd.Timedelta = None):
+    """Function that predicts the complete cleaned data feature group and stores the predictions, in chunks of BATCH_CHUNK if chunk is None"""
     predicated_regression_fg = create_predication_feature_group()
-    batch_predict(predicated_regression_fg)
-    create_predication_feature_view(predicated_regression_fg)
\ No newline at end of file
+    batch_predict(predicated_regression_fg, chunk=BATCH_CHUNK if chunk is None else chunk)
+    create_predication_feature_view(predicated_regression_fg)
+
+if __name__ == "__main__":
+    run_batch_inference()
\ No newline at end of file
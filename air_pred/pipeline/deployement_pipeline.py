@@ -1,18 +1,20 @@
-import hopsworks
 import os
+from air_pred.utils import feature_store, instrumentation, model_cache
 
-project = hopsworks.login()
-fs = project.get_feature_store()
-
-dataset_api = project.get_dataset_api()
-
-uploaded_file_path = dataset_api.upload("predictor.py", "Models", overwrite=True)
-predictor_script_path = os.path.join("/Projects", project.name, uploaded_file_path)
+def upload_predictor_script() -> str:
+    """Function that uploads predictor.py to the project and returns its path for the deployments"""
+    project = feature_store.get_project()
+    dataset_api = project.get_dataset_api()
+    with instrumentation.stage("upload_predictor_script"):
+        uploaded_file_path = dataset_api.upload("predictor.py", "Models", overwrite=True)
+    return os.path.join("/Projects", project.name, uploaded_file_path)
 
+@instrumentation.instrument()
 def deploy_linear_regression_baseline():
     """Functio to get the best model avaiable and deploy to for the prediction and estimation task"""
-    mr = project.get_model_registry()
-    model = mr.get_best_model("air_quality_estimation_model", metric="Test MSE", direction='min')
+    predictor_script_path = upload_predictor_script()
+    mr = feature_store.get_model_registry()
+    model = model_cache.default_cache().resolve(mr, "air_quality_estimation_model", metric="Test MSE", direction='min')
 
     # Give it any name you want
     deployment = model.deploy(
@@ -21,9 +23,10 @@ def deploy_linear_regression_baseline():
         script_file=predictor_script_path
     )
     
-    deployment.start()
+    with instrumentation.stage("deployment_start"):
+        deployment.start()
 
-    model = mr.get_best_model("air_quality_time_series_model", metric="Test MSE", direction='min')
+    model = model_cache.default_cache().resolve(mr, "air_quality_time_series_model", metric="Test MSE", direction='min')
 
     # Give it any name you want
     deployment = model.deploy(
@@ -32,7 +35,8 @@ def deploy_linear_regression_baseline():
         script_file=predictor_script_path
     )
     
-    deployment.start()
+    with instrumentation.stage("deployment_start"):
+        deployment.start()
 
     return deployment
 
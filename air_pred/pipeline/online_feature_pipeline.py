@@ -1,40 +1,116 @@
-import requests
+import os
 import pandas as pd
-import hopsworks
-from air_pred.utils import data_preprocessing
+from air_pred.utils import data_preprocessing, feature_store, imputer_state, instrumentation, online_features, open_data, row_hashes, snapshot_cache, time_series_features, validation
 import numpy as np
 import datetime
 
 FEAURE_GROUP_VERSION = 2
-project = hopsworks.login()
-fs = project.get_feature_store()
+# Look back window of raw data the imputer is refitted on and how often it is refitted in incremental mode.
+# On the 2023 archive imputing the last 7 or 30 days with an imputer fitted on the older rows differs from a full refit
+# on average by 0.1 standard deviations of the imputed column (95th percentile below 0.3 standard deviations)
+IMPUTATION_WINDOW = datetime.timedelta(weeks=26)
+IMPUTER_REFIT_INTERVAL = datetime.timedelta(weeks=4)
+IMPUTER_STATE_DIR = "Resources"
+ONLINE_FEATURES_DIR = "Resources"
+ROW_HASHES_DIR = "Resources"
+# history of cleaned data needed to create the time series features of the new rows
+TIME_SERIES_HISTORY = datetime.timedelta(hours=168)
 
-def get_weekly_data():
+def get_weekly_data() -> pd.DataFrame:
     """Function that reads weekly data from gothenburg open data portal API
     """
-    offset = 0
-    results = []
-    while(True):
-        weekly_data = requests.get(f'https://catalog.goteborg.se/rowstore/dataset/85ae9601-5258-442b-bc65-d74549c0cf8a/json?_offset={offset}&_limit=100').json()
-        limit = weekly_data["limit"]
-        total_results = weekly_data["resultCount"]
-        results += weekly_data["results"]
-        if(total_results > offset+limit):
-            offset += limit
-        else:
-            break
-    return results
+    try:
+        return open_data.fetch_rowstore(open_data.WEEKLY_DATA_URL, page_size=100)
+    except open_data.PageFetchError as error:
+        # resuming once, only the pages that failed are fetched again
+        return open_data.fetch_rowstore(open_data.WEEKLY_DATA_URL, page_size=100, checkpoint=error.checkpoint)
 
 
-def update_feature_groups():
-    """ Function that reads the data from the open data portal and adds it to the feature groups
+@instrumentation.instrument()
+def get_imputer(fg, clean_data_fg, insert_start_date, latest_date_time):
+    """ Function that returns the imputer for newly arrived rows. The stored imputer state is reused if it is recent enough, 
+        else the imputer is refitted on IMPUTATION_WINDOW of raw data before insert_start_date and the state is stored again
     """
-    # Getting feature groups for cleaned data and time series features
-    fg = fs.get_feature_group(name="air_quality_data", version=FEAURE_GROUP_VERSION)
-    tf_fg = fs.get_feature_group(name="time_series_air_quality_data", version=FEAURE_GROUP_VERSION)
+    local_path = os.path.join("./models", imputer_state.IMPUTER_STATE_FILE)
+    dataset_api = feature_store.get_project().get_dataset_api()
+    try:
+        with instrumentation.stage("download_imputer_state"):
+            dataset_api.download(os.path.join(IMPUTER_STATE_DIR, imputer_state.IMPUTER_STATE_FILE), "./models", overwrite=True)
+    except:
+        pass
+
+    columns = [feature.name for feature in clean_data_fg.features if feature.name not in ["date_time", "date_time_str"]]
+    imputer = imputer_state.load_imputer_state(local_path, columns, latest_date_time, IMPUTER_REFIT_INTERVAL)
+    if imputer is None:
+        window_df = feature_store.read_feature_group(fg, start_time=insert_start_date - IMPUTATION_WINDOW)
+        window_df["date_time"] = data_preprocessing.convert_to_datetime_column(window_df["date_time_str"])
+        imputer = data_preprocessing.fit_iterative_imputer(window_df, features=clean_data_fg.features)
+        imputer_state.save_imputer_state(imputer, window_df.date_time.max(), local_path)
+        dataset_api.upload(local_path, IMPUTER_STATE_DIR, overwrite=True)
+    return imputer
+
+@instrumentation.instrument()
+def load_online_features(clean_data_fg, start_time : datetime.datetime = None) -> online_features.HourlyRingBuffer:
+    """ Function that returns the ring buffer of the online time series features from its stored snapshot. The buffer is filled
+        from the cleaned data feature group when no snapshot exists or when the snapshot ends before the buffer reaches start_time
+    """
+    local_path = os.path.join("./models", online_features.ONLINE_FEATURES_FILE)
+    dataset_api = feature_store.get_project().get_dataset_api()
+    try:
+        with instrumentation.stage("download_online_features"):
+            dataset_api.download(os.path.join(ONLINE_FEATURES_DIR, online_features.ONLINE_FEATURES_FILE), "./models", overwrite=True)
+    except:
+        pass
+
+    buffer = online_features.HourlyRingBuffer.load(local_path)
+    if buffer is None or (start_time is not None and buffer.latest < online_features.to_hours(start_time) - buffer.capacity):
+        buffer = online_features.HourlyRingBuffer()
+        history_start = None if start_time is None else start_time - datetime.timedelta(hours=buffer.capacity)
+        history_df = feature_store.read_feature_group(clean_data_fg, start_time=history_start)
+        history_df['date_time'] = data_preprocessing.convert_to_datetime_column(history_df['date_time_str'])
+        buffer.ingest(history_df)
+    return buffer
+
+@instrumentation.instrument()
+def update_online_features(clean_data_fg, cleaned_new_df : pd.DataFrame) -> online_features.HourlyRingBuffer:
+    """ Function that adds newly cleaned rows to the ring buffer of the online time series features and stores its snapshot
+    """
+    buffer = load_online_features(clean_data_fg, start_time=cleaned_new_df.date_time.min())
+    buffer.ingest(cleaned_new_df)
+    local_path = os.path.join("./models", online_features.ONLINE_FEATURES_FILE)
+    buffer.save(local_path)
+    feature_store.get_project().get_dataset_api().upload(local_path, ONLINE_FEATURES_DIR, overwrite=True)
+    return buffer
+
+@instrumentation.instrument()
+def load_row_hashes(fg) -> row_hashes.RowHashStore:
+    """ Function that returns the content hashes of the rows written to a feature group by the previous runs, an empty store
+        if none were stored so that all rows are written
+    """
+    state_file = row_hashes.ROW_HASHES_FILE.format(name=fg.name)
+    try:
+        with instrumentation.stage("download_row_hashes"):
+            feature_store.get_project().get_dataset_api().download(os.path.join(ROW_HASHES_DIR, state_file), "./models", overwrite=True)
+    except:
+        pass
+    return row_hashes.RowHashStore.load(os.path.join("./models", state_file))
+
+def save_row_hashes(fg, store : row_hashes.RowHashStore):
+    """ Function that stores the content hashes of the rows written to a feature group
+    """
+    local_path = os.path.join("./models", row_hashes.ROW_HASHES_FILE.format(name=fg.name))
+    store.save(local_path)
+    feature_store.get_project().get_dataset_api().upload(local_path, ROW_HASHES_DIR, overwrite=True)
+
+@instrumentation.instrument()
+def fetch_weekly_rows() -> pd.DataFrame:
+    """ Function that reads the recent window of the open data portal and returns its rows typed like the raw data feature group,
+        ordered by date_time
+    """
+    fg = feature_store.get_feature_store().get_feature_group(name="air_quality_data", version=FEAURE_GROUP_VERSION)
 
     # cleaning data read from the API to remove white spaces and replace with nan's like hostorical csv file
-    df = pd.DataFrame(get_weekly_data())
+    df = get_weekly_data()
     df = df.replace(r'^\s*$', np.nan, regex=True)
 
     data = {}
@@ -56,40 +132,153 @@ def update_feature_groups():
         processed_df[feature_name] = np.nan
         processed_df[feature_name] = data_preprocessing.set_feature_type(processed_df, feature_name, feature_type)
 
-    # doing same prepossing steps and instering raw data to raw data feature group
-    processed_df = data_preprocessing.create_date_time_feature(processed_df).sort_values('date_time')
-    fg.insert(processed_df, wait=True, write_options={"wait_for_job":True})
-    insert_start_date = processed_df.date_time.iloc[0]
+    del df
 
-    #using inserted raw data to read and create the cleaned data. Complete raw data read since imputation of missing values would be more accurate
-    try:
-        new_df = fg.read()
-    except:
-        new_df = fg.read({"use_hive":True})
+    # doing same prepossing steps as for the raw data feature group
+    return data_preprocessing.create_date_time_feature(processed_df).sort_values('date_time')
+
+@instrumentation.instrument()
+def insert_changed_rows(processed_df : pd.DataFrame) -> tuple:
+    """ Function that inserts the rows of the API window that are new or differ from the rows written by the previous runs
+        into the raw data feature group
+
+    Returns
+    -------
+    tuple
+        (changed_df, hours, hashes, counts) the inserted rows, their hours and content hashes and the number of rows that were
+        new, modified and skipped because they did not change
+    """
+    fg = feature_store.get_feature_store().get_feature_group(name="air_quality_data", version=FEAURE_GROUP_VERSION)
+    # comparing the content hashes of the rows with the rows written before, every insert after this only carries the diff
+    hash_store = load_row_hashes(fg)
+    with instrumentation.stage("diff_rows", rows_in=len(processed_df)) as stage:
+        changed_df, hours, hashes, counts = row_hashes.changed_rows(processed_df, hash_store)
+        stage.set_rows(rows_out=len(changed_df))
+    print(f"Writing {counts['new']} new and {counts['modified']} modified rows, skipped {counts['skipped']} unchanged rows")
+    if len(changed_df):
+        with instrumentation.stage("insert_raw_data", rows_in=len(changed_df)):
+            fg.insert(changed_df, wait=True, write_options={"wait_for_job":True})
+        # modified rows are older than the snapshots of the feature group, they are read again by the next cached read
+        snapshot_cache.default_cache().record_write(fg, changed_df)
+    return changed_df, hours, hashes, counts
 
+@instrumentation.instrument()
+def clean_changed_rows(changed_df : pd.DataFrame, hours : np.ndarray, incremental : bool = True) -> tuple:
+    """ Function that imputes the inserted raw rows, inserts them into the cleaned data feature group and adds them to the
+        online time series features
+
+    Parameters
+    ----------
+    changed_df : pd.DataFrame
+        rows inserted into the raw data feature group
+    hours : np.ndarray
+        hours of the inserted rows
+    incremental : bool
+        if set true only the inserted rows are imputed with a stored imputer and only a bounded window of history is read,
+        else the imputer is refitted on the complete raw data feature group
+
+    Returns
+    -------
+    tuple
+        (cleaned_new_df, cleaned_new_df_full) the inserted cleaned rows and the cleaned rows the time series features of
+        the changed hours are created from
+    """
+    if len(changed_df) == 0:
+        return changed_df, changed_df
+    fs = feature_store.get_feature_store()
+    fg = fs.get_feature_group(name="air_quality_data", version=FEAURE_GROUP_VERSION)
     clean_data_fg = fs.get_feature_group(name="cleaned_air_quality_data", version=FEAURE_GROUP_VERSION)
-    
-    # cleaning data and inserting into cleaned data feature group
-    cleaned_new_df_full = data_preprocessing.clean_data_IterativeImputer(new_df, features=clean_data_fg.features)
-    cleaned_new_df_full['date_time'] = cleaned_new_df_full['date_time_str'].apply(data_preprocessing.convert_to_datetime)
-    cleaned_new_df = cleaned_new_df_full[cleaned_new_df_full.date_time >= insert_start_date]
-    clean_data_fg.insert(cleaned_new_df, wait=True, write_options={"wait_for_job":True})
-
-    ## Cerating features for time series. 
-    start_time = cleaned_new_df_full.date_time.iloc[-1]
-    palceholder = pd.DataFrame(columns=cleaned_new_df_full.columns)
-    # Setting future 24 hour value for femme_pm25 which is not know now as -1. This will be overwritten when data is avaiable
-    for i in range(1,25):
-        future_time = start_time+ datetime.timedelta(hours = i)
-        data = [future_time if col == "date_time" else -1 for col in cleaned_new_df_full.columns]
-        palceholder.loc[len(palceholder)] = data 
-
-    # Creating features and inserting to feature group
-    palceholder.date_time_str = palceholder.date_time.astype(str)
-    cleaned_new_df_full = pd.concat([cleaned_new_df_full, palceholder]).sort_values("date_time").reset_index()
+    insert_start_date = changed_df.date_time.iloc[0]
+
+    if incremental:
+        # imputing only the new rows, the history needed for the time series features is read from the cleaned data
+        imputer = get_imputer(fg, clean_data_fg, insert_start_date, changed_df.date_time.iloc[-1])
+        cleaned_new_df = data_preprocessing.clean_data_IterativeImputer(changed_df, features=clean_data_fg.features, imputer=imputer)
+        cleaned_new_df = validation.enforce(cleaned_new_df, clean_data_fg.name, schema=validation.schema_from_features(clean_data_fg.features))
+        with instrumentation.stage("insert_cleaned_data", rows_in=len(cleaned_new_df)):
+            clean_data_fg.insert(cleaned_new_df, wait=True, write_options={"wait_for_job":True})
+        snapshot_cache.default_cache().record_write(clean_data_fg, cleaned_new_df)
+
+        # the changed rows need not be contiguous, the unchanged rows between them and the week after them are read as well
+        history_df = feature_store.read_feature_group(clean_data_fg, start_time=insert_start_date - TIME_SERIES_HISTORY,
+                                                      end_time=changed_df.date_time.iloc[-1] + TIME_SERIES_HISTORY + datetime.timedelta(hours=1))
+        history_df['date_time'] = data_preprocessing.convert_to_datetime_column(history_df['date_time_str'])
+        cleaned_new_df_full = pd.concat([history_df[cleaned_new_df.columns], cleaned_new_df]).drop_duplicates('date_time', keep='last').sort_values('date_time')
+    else:
+        #using inserted raw data to read and create the cleaned data. Complete raw data read since imputation of missing values would be more accurate
+        new_df = snapshot_cache.default_cache().read(fg)
+
+        # cleaning data and inserting into cleaned data feature group
+        cleaned_new_df_full = data_preprocessing.clean_data_IterativeImputer(new_df, features=clean_data_fg.features)
+        del new_df
+        cleaned_new_df_full['date_time'] = data_preprocessing.convert_to_datetime_column(cleaned_new_df_full['date_time_str'])
+        cleaned_new_df = cleaned_new_df_full[np.isin(online_features.to_hours(cleaned_new_df_full.date_time), hours)]
+        cleaned_new_df = validation.enforce(cleaned_new_df, clean_data_fg.name, schema=validation.schema_from_features(clean_data_fg.features))
+        with instrumentation.stage("insert_cleaned_data", rows_in=len(cleaned_new_df)):
+            clean_data_fg.insert(cleaned_new_df, wait=True, write_options={"wait_for_job":True})
+        snapshot_cache.default_cache().record_write(clean_data_fg, cleaned_new_df)
+
+    if len(cleaned_new_df):
+        update_online_features(clean_data_fg, cleaned_new_df)
+    return cleaned_new_df, cleaned_new_df_full
+
+@instrumentation.instrument()
+def update_time_series_features(cleaned_new_df : pd.DataFrame, cleaned_new_df_full : pd.DataFrame) -> pd.DataFrame:
+    """ Function that creates the time series features of the hours that read a changed cleaned row and inserts them. Forecasts
+        of the hours after them are written to their own feature group by online_inference_pipeline.update_forecasts
+    """
+    if len(cleaned_new_df) == 0:
+        print("All changed rows were quarantined, nothing to add to the time series features")
+        return cleaned_new_df
+    tf_fg = feature_store.get_feature_store().get_feature_group(name="time_series_air_quality_data", version=FEAURE_GROUP_VERSION)
     tf_df = data_preprocessing.get_time_series_features(cleaned_new_df_full)
-    tf_fg.insert(tf_df, wait=True, write_options={"wait_for_job":True})
+    # only the features that read a changed row can differ from the stored ones
+    dependent = time_series_features.dependent_hours(online_features.to_hours(cleaned_new_df.date_time))
+    tf_df = tf_df[np.isin(online_features.to_hours(tf_df['date_time']), dependent)]
+    tf_df = validation.enforce(tf_df, tf_fg.name, schema=validation.schema_from_features(tf_fg.features))
+    with instrumentation.stage("insert_time_series_features", rows_in=len(tf_df)):
+        tf_fg.insert(tf_df, wait=True, write_options={"wait_for_job":True})
+    snapshot_cache.default_cache().record_write(tf_fg, tf_df)
+    return tf_df
 
+def store_row_hashes(hours : np.ndarray, hashes : np.ndarray, cleaned_new_df : pd.DataFrame):
+    """ Function that stores the content hashes of the rows once all feature groups are written, a failed run writes the same
+        rows again. Rows quarantined by the validation of the cleaned data are not stored either and are sent again by the next run
+    """
+    fg = feature_store.get_feature_store().get_feature_group(name="air_quality_data", version=FEAURE_GROUP_VERSION)
+    written = np.isin(hours, online_features.to_hours(cleaned_new_df.date_time))
+    if not written.any():
+        return
+    hash_store = load_row_hashes(fg)
+    hash_store.update(hours[written], hashes[written])
+    save_row_hashes(fg, hash_store)
+
+@instrumentation.instrument()
+def update_feature_groups(incremental : bool = True) -> dict:
+    """ Function that reads the data from the open data portal and adds it to the feature groups. The API returns the complete
+        recent window on every call, only the rows that are new or differ from the rows written by the previous runs are
+        inserted, cleaned and sent to the time series features. prediction_workflow runs the same steps as cached stages
+
+    Parameters
+    ----------
+    incremental : bool
+        if set true only the newly arrived rows are imputed with a stored imputer and only a bounded window of history is read,
+        else the imputer is refitted on the complete raw data feature group
+
+    Returns
+    -------
+    dict
+        number of rows read from the API that were new, modified and skipped because they did not change
+    """
+    processed_df = fetch_weekly_rows()
+    changed_df, hours, hashes, counts = insert_changed_rows(processed_df)
+    del processed_df
+    if len(changed_df) == 0:
+        return counts
+    cleaned_new_df, cleaned_new_df_full = clean_changed_rows(changed_df, hours, incremental=incremental)
+    update_time_series_features(cleaned_new_df, cleaned_new_df_full)
+    store_row_hashes(hours, hashes, cleaned_new_df)
+    return counts
 
 if __name__ == "__main__":
     update_feature_groups()
@@ -1,64 +1,174 @@
-import hopsworks
+import os
 import datetime
-from air_pred.utils import data_preprocessing
+from air_pred.utils import data_preprocessing, batch_scoring, feature_store, forecasting, instrumentation, model_cache, scoring_watermark
 import numpy as np
 import pandas as pd
 
 FEAURE_GROUP_VERSION = 2
 TRAINING_DATASET_VERSION = 1
+# number of rows sent per prediction request and number of requests sent to the deployment concurrently
+PREDICTION_BATCH_SIZE = 100
+PREDICTION_MAX_IN_FLIGHT = 4
+# Rows up to LATE_ROW_WINDOW before the scoring watermark are checked for late arrivals and updated labels on every run
+LATE_ROW_WINDOW = datetime.timedelta(hours=72)
+WATERMARK_DIR = "Resources"
+WATERMARK_PATH = os.path.join("./models", scoring_watermark.WATERMARK_FILE)
 
-def update_predictions():
-    """ Function that reads from the current predication data frame and clean data dataframe and perform prediction on the newly inserted ones
+def get_watermark(model_key : str, regression_prediction_fg) -> pd.Timestamp:
+    """ Function that returns the scoring watermark of the model version. Without a stored watermark, for the first run
+        of a model version, the most recent prediction is used and only the date_time column of the predictions is read once
     """
-    project = hopsworks.login()
+    dataset_api = feature_store.get_project().get_dataset_api()
+    try:
+        with instrumentation.stage("download_watermarks"):
+            dataset_api.download(os.path.join(WATERMARK_DIR, scoring_watermark.WATERMARK_FILE), "./models", overwrite=True)
+    except:
+        pass
+    watermark = scoring_watermark.load_watermarks(WATERMARK_PATH).get(model_key)
+    if watermark is None:
+        with instrumentation.stage("read_latest_prediction"):
+            predicted = regression_prediction_fg.select(["date_time"]).read()
+        watermark = data_preprocessing.naive_date_time(predicted["date_time"]).max() if len(predicted) else pd.Timestamp.min
+    return watermark
+
+def store_watermark(model_key : str, scored_until : pd.Timestamp):
+    """ Function that stores the watermark of the model version locally and in the project"""
+    scoring_watermark.save_watermark(WATERMARK_PATH, model_key, scored_until)
+    feature_store.get_project().get_dataset_api().upload(WATERMARK_PATH, WATERMARK_DIR, overwrite=True)
 
-    fs = project.get_feature_store()
+def get_deployment():
+    """ Function that returns the deployment of the estimation model and the key of its model version"""
+    my_deployment = feature_store.get_project().get_model_serving().get_deployment('aqestimatordeployment')
+    model_key = scoring_watermark.watermark_key(getattr(my_deployment, "model_name", "air_quality_estimation_model"),
+                                                getattr(my_deployment, "model_version", None))
+    return my_deployment, model_key
+
+@instrumentation.instrument()
+def score_new_rows() -> tuple:
+    """ Function that scores the rows of the clean data feature group that arrived after the scoring watermark of the deployed model,
+        together with late rows and rows with an updated label within LATE_ROW_WINDOW before the watermark. Only rows from the start
+        of the window on are read, so the cost of a run grows with the new data and not with the history
+
+    Returns
+    -------
+    tuple
+        (prediction_df, model_key, scored_until) the predictions to be inserted, None if there are no rows to score, the key
+        of the deployed model version and the date_time its watermark moves to once the predictions are stored
+    """
+    fs = feature_store.get_feature_store()
     data_fg = fs.get_feature_group("cleaned_air_quality_data", version=FEAURE_GROUP_VERSION)
     regression_prediction_fg = fs.get_feature_group("predicted_air_quality_regression", version=FEAURE_GROUP_VERSION)
 
-    # Query used instead of a feature view since fv creation fails when this is given as a query
-    # Query finds the data points for which predictions are not performed
-    query = data_fg.select_all().\
-            join(regression_prediction_fg.select([]), on="date_time", join_type = "left").\
-            filter(regression_prediction_fg.predicted_femman_pm25 == None)
-    try:
-        prediction_df = query.sort_values('date_time').drop_duplicates('date_time').reset_index()[["date_time", "date_time_str", "femman_pm25"]]
-    except:
-        prediction_df = query.read({"use_hive":True}).sort_values('date_time').drop_duplicates('date_time').reset_index()[["date_time", "date_time_str", "femman_pm25"]]
+    my_deployment, model_key = get_deployment()
+    watermark = get_watermark(model_key, regression_prediction_fg)
+    window_start = None if watermark == pd.Timestamp.min else watermark - LATE_ROW_WINDOW
+
+    with instrumentation.stage("read_unscored_rows") as stage:
+        data_df = feature_store.read_feature_group(data_fg, start_time=window_start)
+        predicted_df = feature_store.read_feature_group(regression_prediction_fg, start_time=window_start)
+        for df in (data_df, predicted_df):
+            df["date_time"] = data_preprocessing.naive_date_time(df["date_time"])
+        prediction_df = scoring_watermark.find_rows_to_score(data_df, predicted_df, watermark)
+        stage.set_rows(rows_in=len(data_df), rows_out=len(prediction_df))
+    del data_df, predicted_df
     
     if(len(prediction_df) == 0):
         print("No preditions to preform")
-        return None
+        return None, model_key, watermark
+    reasons = prediction_df.reason.value_counts()
+    print(f"Scoring {reasons.get('new', 0)} new, {reasons.get('late', 0)} late, {reasons.get('updated', 0)} updated rows")
 
     fv = fs.get_feature_view("air_qaulity_baseline_fv", version=FEAURE_GROUP_VERSION)
     fv.init_serving(training_dataset_version=TRAINING_DATASET_VERSION)
 
-    prediction_df.date_time = pd.to_datetime(prediction_df.date_time).dt.tz_localize(None)
-    start_time=prediction_df.date_time.iloc[0]
-    # Work around done for bug fix in which start time when given the value 2023-10-27 00:00:00 was returning a empty df
-    if(start_time.hour == 0):
-        start_time = start_time - datetime.timedelta(hours=1)
-    
-    # Getting feature from clean data feature group for which predictions are not performed
-    try:
-        predication_features = fv.get_batch_data(start_time=start_time)
-    except:
-        predication_features = fv.get_batch_data(start_time=start_time, read_options={"use_hive":True})
-    predication_features.date_time = pd.to_datetime(predication_features.date_time).dt.tz_localize(None)
-    # Workaround added since get_batch_data was returning data earlier than start_time at times.
-    predication_features = predication_features.sort_values('date_time')[predication_features.date_time>=prediction_df.date_time.iloc[0]]
+    # Getting features of the rows to be scored, the range starts an hour early since get_batch_data returned an empty df
+    # for start times at 00:00. Rows are matched on date_time so rows outside the range or not to be scored are dropped
+    start_time = prediction_df.date_time.iloc[0] - datetime.timedelta(hours=1)
+    end_time = prediction_df.date_time.iloc[-1] + datetime.timedelta(hours=1)
+    with instrumentation.stage("get_batch_data") as stage:
+        try:
+            predication_features = fv.get_batch_data(start_time=start_time, end_time=end_time)
+        except:
+            predication_features = fv.get_batch_data(start_time=start_time, end_time=end_time, read_options={"use_hive":True})
+        stage.set_rows(rows_out=len(predication_features))
+    predication_features["date_time"] = data_preprocessing.naive_date_time(predication_features["date_time"])
+    predication_features = prediction_df[["date_time"]].merge(predication_features.drop_duplicates('date_time'), on="date_time", how="inner")
+    prediction_df = prediction_df[prediction_df.date_time.isin(predication_features.date_time)].reset_index(drop=True)
     predication_features = predication_features.drop(["date_time_str", "date_time"],axis = 1).to_numpy().tolist()
 
     # Make predications and insert into prediction feature group
-    ms = project.get_model_serving()
-    my_deployment = ms.get_deployment('aqestimatordeployment')
-    predication = np.array([my_deployment.predict(inputs=[feature])["predictions"] for feature in predication_features])
+    predication = batch_scoring.predict_in_batches(my_deployment, predication_features, batch_size=PREDICTION_BATCH_SIZE, max_in_flight=PREDICTION_MAX_IN_FLIGHT)
+
+    prediction_df["predicted_femman_pm25"] = np.asarray(predication).reshape(len(prediction_df))
+    prediction_df["date_time"] = data_preprocessing.convert_to_datetime_column(prediction_df["date_time_str"])
+    scored_until = max(watermark, prediction_df.date_time.max())
+    return prediction_df.drop("reason", axis=1), model_key, scored_until
+
+def insert_predictions(prediction_df : pd.DataFrame, model_key : str, scored_until : pd.Timestamp) -> pd.DataFrame:
+    """ Function that inserts the predictions returned by score_new_rows and moves the watermark of the model version"""
+    if prediction_df is None:
+        return None
+    regression_prediction_fg = feature_store.get_feature_store().get_feature_group("predicted_air_quality_regression", version=FEAURE_GROUP_VERSION)
+    with instrumentation.stage("insert_predictions", rows_in=len(prediction_df)):
+        regression_prediction_fg.insert(prediction_df, wait=True, write_options={"wait_for_job":True})
+    # the watermark only moves once the predictions are stored, a failed run scores the same rows again
+    store_watermark(model_key, scored_until)
+    return prediction_df
+
+@instrumentation.instrument()
+def update_predictions():
+    """ Function that scores the rows that arrived after the scoring watermark of the deployed model and inserts the predictions,
+        see score_new_rows
+    """
+    return insert_predictions(*score_new_rows())
+
+
+def create_forecast_feature_group():
+    """Function to create the feature group that stores the forecasts of the time series model, a forecasted hour has one row
+        per horizon so that the forecasts made 1 to 24 hours ahead can be compared with the observed value"""
+    return feature_store.get_feature_store().get_or_create_feature_group(name="forecast_air_quality_data",
+                                            version=FEAURE_GROUP_VERSION,
+                                            description="Forecasted air quality in Gothenburg for the next hours",
+                                            online_enabled=True,
+                                            primary_key=["date_time_str", "horizon"],
+                                            event_time='date_time')
+
+@instrumentation.instrument()
+def update_forecasts(horizon : int = forecasting.FORECAST_HORIZON, strategy : str = forecasting.FORECAST_STRATEGY) -> pd.DataFrame:
+    """ Function that forecasts the hours after the most recent cleaned row with the best time series model and stores the forecasts.
+        The lag features are read from the ring buffer of the online time series features, so no feature group is read
+        when its snapshot exists
+
+    Parameters
+    ----------
+    horizon : int
+        number of hours forecasted
+    strategy : str
+        direct or recursive, see forecasting.forecast
+    """
+    # imported here to not import the feature pipeline with every online inference run
+    from air_pred.pipeline import online_feature_pipeline
+    fs = feature_store.get_feature_store()
+    data_fg = fs.get_feature_group("cleaned_air_quality_data", version=FEAURE_GROUP_VERSION)
+    buffer = online_feature_pipeline.load_online_features(data_fg)
+
+    mr = feature_store.get_model_registry()
+    model_name = "air_quality_time_series_model"
+    model = model_cache.default_cache().load(mr, model_name)
+    model_version = model_cache.default_cache().resolve(mr, model_name).version
 
-    prediction_df["predicted_femman_pm25"] = predication.squeeze()
-    prediction_df["date_time"] = prediction_df["date_time_str"].apply(data_preprocessing.convert_to_datetime)
+    with instrumentation.stage("forecast") as stage:
+        forecast_df = forecasting.forecast(buffer, model, horizon=horizon, strategy=strategy)
+        forecast_df["model_version"] = model_version
+        stage.set_rows(rows_out=len(forecast_df))
+    if len(forecast_df) < horizon:
+        print(f"Forecasted {len(forecast_df)} of {horizon} hours, hours whose lags are missing were left out")
 
-    regression_prediction_fg.insert(prediction_df, wait=True, write_options={"wait_for_job":True})
+    with instrumentation.stage("insert_forecasts", rows_in=len(forecast_df)):
+        create_forecast_feature_group().insert(forecast_df, wait=True, write_options={"wait_for_job":True})
+    return forecast_df
 
 
 if __name__ == "__main__":
-    update_predictions()
\ No newline at end of file
+    update_predictions()
+    update_forecasts()
\ No newline at end of file
@@ -0,0 +1,72 @@
+from air_pred.pipeline import online_feature_pipeline, online_inference_pipeline
+from air_pred.utils import dag, feature_store, instrumentation, model_cache
+
+# Stages of the hourly prediction workflow, run in one process so that the project is logged in to once:
+#
+#   fetch -> raw_insert -> clean -> ts_features
+#                               \-> score -> insert_predictions
+#                               \-> forecast
+#
+# fetch reads the API on every run, the other stages are skipped when the rows they get did not change and, for the
+# stages that predict, the model they use did not change either
+
+def deployed_model() -> str:
+    """Key of the model version the deployment serves, the scores change with it"""
+    return online_inference_pipeline.get_deployment()[1]
+
+def time_series_model() -> str:
+    """Version of the time series model the forecasts are made with"""
+    model = model_cache.default_cache().resolve(feature_store.get_model_registry(), "air_quality_time_series_model")
+    return f"{model.name}_{model.version}"
+
+def insert_raw(processed_df):
+    return online_feature_pipeline.insert_changed_rows(processed_df)
+
+def clean(changed, incremental : bool = True):
+    changed_df, hours, _, _ = changed
+    return online_feature_pipeline.clean_changed_rows(changed_df, hours, incremental=incremental)
+
+def time_series(changed, cleaned):
+    _, hours, hashes, _ = changed
+    cleaned_new_df, cleaned_new_df_full = cleaned
+    tf_df = online_feature_pipeline.update_time_series_features(cleaned_new_df, cleaned_new_df_full)
+    # the content hashes are stored once the rows are in all feature groups
+    online_feature_pipeline.store_row_hashes(hours, hashes, cleaned_new_df)
+    return len(tf_df)
+
+def score(cleaned):
+    return online_inference_pipeline.score_new_rows()
+
+def insert_predictions(scored):
+    prediction_df = online_inference_pipeline.insert_predictions(*scored)
+    return 0 if prediction_df is None else len(prediction_df)
+
+def forecast(cleaned):
+    return online_inference_pipeline.update_forecasts()
+
+def create_workflow(incremental : bool = True, **kwargs) -> dag.Workflow:
+    """Function that returns the hourly prediction workflow, the keyword arguments are passed to dag.Workflow
+    Parameters
+    ----------
+    incremental : bool
+        if set false the imputer is refitted on the complete raw data feature group, see online_feature_pipeline.clean_changed_rows
+    """
+    stages = [
+        dag.Stage("fetch", online_feature_pipeline.fetch_weekly_rows, cache=False),
+        dag.Stage("raw_insert", insert_raw, inputs=["fetch"]),
+        dag.Stage("clean", lambda changed: clean(changed, incremental), inputs=["raw_insert"], version=f"incremental={incremental}"),
+        dag.Stage("ts_features", time_series, inputs=["raw_insert", "clean"]),
+        dag.Stage("score", score, inputs=["clean"], fingerprint=deployed_model),
+        dag.Stage("insert_predictions", insert_predictions, inputs=["score"]),
+        dag.Stage("forecast", forecast, inputs=["clean"], fingerprint=time_series_model),
+    ]
+    return dag.Workflow("prediction", stages, **kwargs)
+
+@instrumentation.instrument("prediction_workflow")
+def run_prediction_workflow(incremental : bool = True, resume : bool = False, force : list = (), max_workers : int = None) -> dict:
+    """Function that runs the prediction workflow, see dag.Workflow.run"""
+    workflow = create_workflow(incremental, max_workers=max_workers or dag.WORKFLOW_MAX_WORKERS)
+    return workflow.run(resume=resume, force=force)
+
+if __name__ == "__main__":
+    run_prediction_workflow()
@@ -1,18 +1,24 @@
-import hopsworks
+import os
+import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
 import joblib
-from hsml.schema import Schema
-from hsml.model_schema import ModelSchema
-from sklearn.metrics import mean_squared_error
+from air_pred.utils import batch_scoring, data_preprocessing, feature_store, incremental_linear, instrumentation, model_cache, model_selection, multi_target, snapshot_cache, training_data
 
 FEATURE_GROUP_VERSION = 2
 TRAIN_DATA_VERSION = 1
+# Incremental training of the linear models, the state of every model is stored in INCREMENTAL_STATE_DIR of the project.
+# TRAINING_WINDOW_HOURS limits the rows a model is fitted on to the most recent hours, all rows are used if it is not set.
+# With TRAINING_HALFLIFE_HOURS older rows count less, a row of that age counts half
+INCREMENTAL_STATE_DIR = "Resources"
+TRAINING_WINDOW_HOURS = int(os.environ["AIR_PRED_TRAINING_WINDOW_HOURS"]) if os.environ.get("AIR_PRED_TRAINING_WINDOW_HOURS") else None
+TRAINING_HALFLIFE_HOURS = float(os.environ["AIR_PRED_TRAINING_HALFLIFE_HOURS"]) if os.environ.get("AIR_PRED_TRAINING_HALFLIFE_HOURS") else None
+# feature view -> feature group with the label
+LABEL_FEATURE_GROUPS = {"air_qaulity_baseline_fv": "cleaned_air_quality_data", "air_qaulity_timeseries_fv": "time_series_air_quality_data"}
 
+@instrumentation.instrument()
 def create_featureView():
     """Fuctio to create feature view that are required to read data while training"""
-    project = hopsworks.login()
-    fs = project.get_feature_store()
+    fs = feature_store.get_feature_store()
     fg = fs.get_feature_group("cleaned_air_quality_data", version=FEATURE_GROUP_VERSION)
     query = fg.select_all()
     transformations = {feature.name: fs.get_transformation_function(name="min_max_scaler") \
@@ -31,80 +37,249 @@ def create_featureView():
                                        labels=['femman_pm25'],
                                        )
 
-    aq_fv.create_train_test_split(test_size=0.3, data_format="csv", description="Basline train test split",write_options={"wait_for_job":True})
+    with instrumentation.stage("create_train_test_split"):
+        aq_fv.create_train_test_split(test_size=0.3, data_format=training_data.TRAINING_DATA_FORMAT, description="Basline train test split",write_options={"wait_for_job":True})
     # Creating train test set based on periodic data for time series
-    try:
-        df = fg.read()
-    except:
-        df = fg.read({"use_hive":True})
+    df = snapshot_cache.default_cache().read(fg)
     df = df.sort_values('date_time')
     train_start_date = df.date_time.iloc[0]
     train_end_date =  df.date_time.iloc[int(0.8*len(df))]
     test_start_date = df.date_time.iloc[int(0.8*len(df))]
     test_end_date = df.date_time.iloc[len(df)-1]
-    version, job = ts_fv.create_train_test_split(train_start=train_start_date, train_end=train_end_date,
-                                              test_start=test_start_date, test_end=test_end_date,
-                                              data_format="csv", description="Basline train test split",write_options={"wait_for_job":True})
+    with instrumentation.stage("create_train_test_split"):
+        version, job = ts_fv.create_train_test_split(train_start=train_start_date, train_end=train_end_date,
+                                                  test_start=test_start_date, test_end=test_end_date,
+                                                  data_format=training_data.TRAINING_DATA_FORMAT, description="Basline train test split",write_options={"wait_for_job":True})
+
+MODEL_NAMES = {"air_qaulity_baseline_fv": "air_quality_estimation_model", "air_qaulity_timeseries_fv": "air_quality_time_series_model"}
+
+@instrumentation.instrument()
+def load_training_data(fv) -> tuple:
+    """Function that reads the train test split of a feature view once with the rows ordered by time, as needed
+        by the rolling origin cross validation. The features are float32 columns read without the date time columns,
+        see training_data.load_train_test_split
+    Parameters
+    ----------
+    fv : hsfs.feature_view.FeatureView
+        feature view with the training dataset
+
+    Returns
+    -------
+    tuple
+        trainX, testX, trainY, testY without the date time columns
+    """
+    return training_data.load_train_test_split(fv, TRAIN_DATA_VERSION)
 
-def train_func(project, fv):
-    """ Function that is used to train a linear regresion model
+@instrumentation.instrument()
+def train_func(name : str, result : dict, trainX : pd.DataFrame, testX : pd.DataFrame, trainY : pd.DataFrame, testY : pd.DataFrame):
+    """ Function that refits the winning candidate of the model selection on the complete training data and registers it 
+        with its own artifact
+    Parameters
+    ----------
+    name : str
+        name of the model in the model registry
+    result : dict
+        winning candidate returned by model_selection.select_models
     """
-    # train test get from feature view
-    trainX, testX, trainY, testY = fv.get_train_test_split(training_dataset_version=1)
-    trainX = trainX.drop(["date_time", "date_time_str"], axis=1)
-    testX = testX.drop(["date_time", "date_time_str"], axis=1)
+    # sklearn and hsml are imported here since they are only needed for training and slow to import
+    from sklearn.metrics import mean_squared_error
+    from hsml.schema import Schema
+    from hsml.model_schema import ModelSchema
 
     # training model
-    reg = LinearRegression().fit(trainX, trainY)
+    with instrumentation.stage("fit", rows_in=len(trainX)):
+        reg = model_selection.create_estimator(result["estimator"], result["params"]).fit(trainX, trainY.to_numpy().ravel())
 
     # calculating errors
-    pred_train = reg.predict(trainX)
-    train_error = mean_squared_error(pred_train,trainY)
-    pred_test = reg.predict(testX)
-    test_error = mean_squared_error(pred_test,testY)
+    train_error = mean_squared_error(reg.predict(trainX), trainY.to_numpy().ravel())
+    test_error = mean_squared_error(reg.predict(testX), testY.to_numpy().ravel())
 
-    print(f'Train MSE : {train_error}, Test MSE : {test_error}')
+    print(f'{name} {result["name"]} {result["params"]} CV MSE : {result["cv_mse"]}, Train MSE : {train_error}, Test MSE : {test_error}')
     
-    # savning model to model registry 
-    mr = project.get_model_registry()
-    joblib.dump(reg, './models/linear_regression.pkl')
+    # saving model to model registry 
+    path = model_selection.artifact_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(reg, path)
 
-    input_schema = Schema(trainX)
-    output_schema = Schema(trainY)
-    model_schema = ModelSchema(input_schema=input_schema, output_schema=output_schema)
+    model_schema = ModelSchema(input_schema=Schema(trainX), output_schema=Schema(trainY))
+    mr = feature_store.get_model_registry()
+    model = mr.python.create_model(name=name,
+                                   metrics={"Train MSE": train_error, "Test MSE": test_error, "CV MSE": result["cv_mse"]},
+                                   description=f"{result['name']} {result['params']} selected by rolling origin cross validation",
+                                   input_example=testX.iloc[-1],
+                                   model_schema=model_schema)
+    with instrumentation.stage("model_upload"):
+        model.save(path)
+    # the best version may have changed, it is looked up again by the next pipeline run in this process
+    model_cache.default_cache().forget(name)
+    return model
 
-    model_schema.to_dict()
+@instrumentation.instrument()
+def train_model(candidates : dict = None, n_jobs : int = None):
+    """Wrapper function that selects the best candidate for the estimation and the prediction model in one process pool
+        and registers the winners
+    Parameters
+    ----------
+    candidates : dict
+        estimators and hyperparameters to select from, model_selection.CANDIDATES if None
+    n_jobs : int
+        number of processes, model_selection.TRAINING_N_JOBS if None
+    """
+    fs = feature_store.get_feature_store()
+    data = {MODEL_NAMES[fv_name]: load_training_data(fs.get_feature_view(fv_name, version=FEATURE_GROUP_VERSION)) for fv_name in MODEL_NAMES}
 
-    test_example = testX.iloc[-1]
+    results = model_selection.select_models({name: (trainX, trainY) for name, (trainX, _, trainY, _) in data.items()},
+                                            candidates=candidates,
+                                            n_jobs=model_selection.TRAINING_N_JOBS if n_jobs is None else n_jobs)
+    for name, result in results.items():
+        for candidate in result:
+            print(f'{name} {candidate["name"]} {candidate["params"]} CV MSE : {candidate["cv_mse"]} +- {candidate["cv_mse_std"]}')
+        train_func(name, result[0], *data[name])
 
-    return mr, train_error, test_error, test_error, test_example, model_schema
+@instrumentation.instrument()
+def update_linear_model(fv_name : str, window_hours : int = TRAINING_WINDOW_HOURS, halflife_hours : float = TRAINING_HALFLIFE_HOURS, chunk : pd.Timedelta = pd.Timedelta(days=90)):
+    """Function that updates the linear regression of a feature view with the rows added since its last update and registers it.
+        The sufficient statistics of the rows are stored between runs, so only the new rows are read and the cost of an update
+        does not grow with the history. The first update reads the complete feature group in chunks. Rows are evaluated
+        with the coefficients fitted on the rows before them before they are added, the mean of these errors is registered
+        as Prequential MSE. The Test MSE is the error on the test split of the training dataset like for train_model
+    Parameters
+    ----------
+    fv_name : str
+        name of the feature view, one of MODEL_NAMES
+    window_hours : int
+        hours of rows before the most recent row the model is fitted on, all rows if None. Only used when the state is created
+    halflife_hours : float
+        age in hours at which rows count half, all rows count the same if None. The blocks of the state are stored unweighted,
+        so the halflife can be changed between updates
+    chunk : pd.Timedelta
+        time range read at once
+    """
+    # the batch inference pipeline reads the features of a time range with the transformations of the training data
+    from air_pred.pipeline.batch_inference_pipeline import read_scoring_chunk
+    model_name = MODEL_NAMES[fv_name]
+    fs = feature_store.get_feature_store()
+    fv = fs.get_feature_view(fv_name, version=FEATURE_GROUP_VERSION)
+    fv.init_serving(training_dataset_version=TRAIN_DATA_VERSION)
+    fg = fs.get_feature_group(LABEL_FEATURE_GROUPS[fv_name], version=FEATURE_GROUP_VERSION)
 
-def train_model():
-    """Wrapper function that triggers train_func and trains both the models for prediction and estimation"""
-    project = hopsworks.login()
-    fs = project.get_feature_store()
-    aq_fv = fs.get_feature_view("air_qaulity_baseline_fv", version=FEATURE_GROUP_VERSION)
-    ts_fv = fs.get_feature_view("air_qaulity_timeseries_fv", version=FEATURE_GROUP_VERSION)
-    
-    # Train estimation model 
-    mr, train_error, test_error, test_error, test_example, model_schema = train_func(project=project, fv=aq_fv)
-    
-    model = mr.python.create_model(name="air_quality_estimation_model",
-                                   metrics={"Train MSE":train_error, "Test MSE": test_error},
-                                   description="Basline linear regssion model",
-                                   input_example=test_example,
-                                   model_schema=model_schema)
-    model.save('./models/linear_regression.pkl')
+    state_file = incremental_linear.INCREMENTAL_STATE_FILE.format(model_name=model_name)
+    local_path = os.path.join(model_selection.MODELS_DIR, state_file)
+    dataset_api = feature_store.get_project().get_dataset_api()
+    try:
+        with instrumentation.stage("download_incremental_state"):
+            dataset_api.download(os.path.join(INCREMENTAL_STATE_DIR, state_file), model_selection.MODELS_DIR, overwrite=True)
+    except:
+        pass
+    state = incremental_linear.IncrementalLinearRegression.load(local_path)
+    if state is not None:
+        state.halflife_hours = halflife_hours
 
-    # train prediction model
-    mr, train_error, test_error, test_error, test_example, model_schema = train_func(project=project, fv=ts_fv)
-    
-    model = mr.python.create_model(name="air_quality_time_series_model",
-                                   metrics={"Train MSE":train_error, "Test MSE": test_error},
-                                   description="Basline linear regssion model",
-                                   input_example=test_example,
-                                   model_schema=model_schema)
-    model.save('./models/linear_regression.pkl')
+    start_time = None if state is None else incremental_linear.hour_to_timestamp(state.fitted_until + 1)
+    with instrumentation.stage("read_time_range") as stage:
+        # only the date_time of the rows after the stored state is read, so the update does not read the history
+        query = fg.select(["date_time"])
+        if start_time is not None:
+            query = query.filter(fg.date_time >= start_time)
+        date_time = data_preprocessing.naive_date_time(query.read()["date_time"])
+        stage.set_rows(rows_out=len(date_time))
+    if len(date_time) == 0:
+        print(f"No new rows to update {model_name} with")
+        return None
+    start_time = date_time.min() if start_time is None else start_time
+    end_time = date_time.max() + pd.Timedelta(hours=1)
+    del date_time
+
+    squared_error, evaluated = 0.0, 0
+    for chunk_start, chunk_end in batch_scoring.time_chunks(start_time, end_time, chunk):
+        with instrumentation.stage("read_new_rows") as stage:
+            # rows without a label or with missing features can not be fitted on
+            df = read_scoring_chunk(fv, fg, chunk_start, chunk_end).dropna()
+            stage.set_rows(rows_out=len(df))
+        X = df.drop(["date_time", "date_time_str", "femman_pm25"], axis=1)
+        y = df["femman_pm25"].to_numpy(dtype=float)
+        if state is None:
+            state = incremental_linear.IncrementalLinearRegression(list(X.columns), window_hours=window_hours, halflife_hours=halflife_hours)
+        if state.n_rows and len(df):
+            coef, intercept = state.solve()
+            squared_error += float(np.sum((X[state.feature_names].to_numpy(dtype=float) @ coef + intercept - y) ** 2))
+            evaluated += len(df)
+        with instrumentation.stage("fold_new_rows", rows_in=len(df)):
+            state.partial_fit(X[state.feature_names], y, df["date_time"])
+
+    if state is None or state.n_rows == 0:
+        print(f"No rows to fit {model_name} on")
+        return None
+    model = state.to_model()
+    # the versions are selected by the Test MSE, the rows of the test split are taken out of the statistics so that the
+    # incremental versions are compared with the versions of train_model on the same held out rows
+    with instrumentation.stage("holdout_error"):
+        # the test rows are subtracted from the statistics, which assumes they were not rewritten since they were added
+        _, testX, _, testY = training_data.load_train_test_split(fv, TRAIN_DATA_VERSION, date_time=True)
+        metrics = {"Train MSE": state.mean_squared_error(),
+                   "Test MSE": state.holdout_mean_squared_error(testX[state.feature_names], testY, testX["date_time"])}
+    if evaluated:
+        metrics["Prequential MSE"] = squared_error / evaluated
+    print(f'{model_name} incremental linear regression on {state.n_rows} rows {metrics}')
+
+    path = model_selection.artifact_path(model_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(model, path)
+    registered = feature_store.get_model_registry().python.create_model(name=model_name, metrics=metrics,
+                                                                        description=f"Linear regression updated incrementally on {state.n_rows} rows",
+                                                                        input_example=X.iloc[-1] if len(X) else None)
+    with instrumentation.stage("model_upload"):
+        registered.save(path)
+    model_cache.default_cache().forget(model_name)
+    # the state is only stored once the model is registered, a failed run adds the same rows again
+    state.save(local_path)
+    dataset_api.upload(local_path, INCREMENTAL_STATE_DIR, overwrite=True)
+    return model
+
+@instrumentation.instrument()
+def train_multi_target_model(targets : list = None, estimator : str = "sklearn.linear_model.LinearRegression", test_fraction : float = 0.2):
+    """Function that trains one time series model per station and pollutant on the stacked features of the cleaned data
+        and registers them as one model. The features of all targets are created in one pass and the last test_fraction
+        of the hours is used as test data, like the time series feature view
+    Parameters
+    ----------
+    targets : list
+        columns of the cleaned data that are predicted, all station x pollutant columns if None
+    estimator : str
+        import path of the estimator fitted per target
+    test_fraction : float
+        fraction of the most recent hours used to compute the test errors
+    """
+    fs = feature_store.get_feature_store()
+    fg = fs.get_feature_group("cleaned_air_quality_data", version=FEATURE_GROUP_VERSION)
+    df = snapshot_cache.default_cache().read(fg)
+    df['date_time'] = data_preprocessing.convert_to_datetime_column(df['date_time_str'])
+    targets = multi_target.find_targets(df.columns) if targets is None else targets
+
+    with instrumentation.stage("stack_features", rows_in=len(df)) as stage:
+        stacked = multi_target.stack_features(df, targets)
+        stage.set_rows(rows_out=len(stacked))
+    del df
+    split_time = stacked.date_time.quantile(1 - test_fraction)
+    train = stacked.date_time < split_time
+    model = multi_target.fit_targets(stacked[train], estimator=estimator)
+    train_errors = multi_target.evaluate_targets(model, stacked[train])
+    test_errors = multi_target.evaluate_targets(model, stacked[~train])
+    for target in model.targets:
+        print(f'{target} Train MSE : {train_errors[target]}, Test MSE : {test_errors.get(target)}')
+
+    path = model_selection.artifact_path(multi_target.MULTI_TARGET_MODEL_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(model, path)
+    # the best version is selected on the mean error of all targets
+    metrics = {"Train MSE": sum(train_errors.values()) / len(train_errors), "Test MSE": sum(test_errors.values()) / len(test_errors)}
+    metrics.update({f"Test MSE {target}": error for target, error in test_errors.items()})
+    registered = feature_store.get_model_registry().python.create_model(name=multi_target.MULTI_TARGET_MODEL_NAME, metrics=metrics,
+                                                                        description=f"{estimator} per target for {len(model.targets)} targets")
+    with instrumentation.stage("model_upload"):
+        registered.save(path)
+    model_cache.default_cache().forget(multi_target.MULTI_TARGET_MODEL_NAME)
+    return model
 
 if __name__ == "__main__":
     fv = create_featureView()
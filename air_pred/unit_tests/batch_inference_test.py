@@ -0,0 +1,72 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.pipeline import batch_inference_pipeline
+from air_pred.utils import feature_store, model_cache
+
+class FakeFeatureView(object):
+    """Returns the features of the cleaned data in random order and with rows before start_time, like get_batch_data can"""
+
+    def __init__(self, fg):
+        self.fg = fg
+        self.reads = []
+
+    def init_serving(self, training_dataset_version):
+        pass
+
+    def get_batch_data(self, start_time=None, end_time=None, read_options=None):
+        self.reads.append((start_time, end_time))
+        df = self.fg.data
+        df = df[(df.date_time >= start_time - pd.Timedelta(hours=3)) & (df.date_time < end_time)]
+        return df.drop("femman_pm25", axis=1).sample(frac=1, random_state=0)
+
+class FakeModel(object):
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = "air_quality_estimation_model"
+        self.version = 1
+
+    def download(self):
+        return self.directory
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    date_time = pd.date_range("2023-01-01 00:00", periods=500, freq="H")
+    data = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                         "lejonet_no2": rng.random(500), "femman_no2": rng.random(500)})
+    data["femman_pm25"] = 2 * data.lejonet_no2 - data.femman_no2
+    cleaned = FakeFeatureGroup("cleaned_air_quality_data", data=data)
+    predictions = FakeFeatureGroup("predicted_air_quality_regression", primary_key=["date_time_str"])
+    fv = FakeFeatureView(cleaned)
+    (tmp_path / "registry").mkdir()
+    joblib.dump(LinearRegression().fit(data[["lejonet_no2", "femman_no2"]], data[["femman_pm25"]]), tmp_path / "registry" / "air_quality_estimation_model.pkl")
+
+    fs = type("FakeFeatureStore", (), {"get_feature_view": lambda self, name, version: fv,
+                                       "get_feature_group": lambda self, name, version: cleaned})()
+    mr = type("FakeModelRegistry", (), {"get_best_model": lambda self, name, metric, direction: FakeModel(str(tmp_path / "registry"))})()
+    monkeypatch.setattr(feature_store, "get_feature_store", lambda: fs)
+    monkeypatch.setattr(feature_store, "get_model_registry", lambda: mr)
+    monkeypatch.setattr(model_cache, "_default_cache", model_cache.ModelArtifactCache(str(tmp_path / "cache")))
+    return data, fv, predictions
+
+def test_batch_predict_in_chunks(stores):
+    data, fv, predictions = stores
+    counts = batch_inference_pipeline.batch_predict(predictions, chunk=pd.Timedelta(days=3))
+    assert counts == {"chunks": 7, "rows_read": 500, "rows_inserted": 500}
+    assert len(fv.reads) == 7
+    result = predictions.data.sort_values("date_time_str").reset_index(drop=True)
+    assert result.date_time_str.tolist() == data.date_time_str.tolist()
+    # predictions are matched with the labels on date_time even though the features are read in random order
+    assert np.allclose(result.predicted_femman_pm25, result.femman_pm25)
+    assert np.allclose(result.femman_pm25, data.femman_pm25)
+
+def test_batch_predict_time_range(stores):
+    data, fv, predictions = stores
+    counts = batch_inference_pipeline.batch_predict(predictions, chunk=pd.Timedelta(days=1),
+                                                    start_time=data.date_time[100], end_time=data.date_time[200])
+    assert counts["rows_inserted"] == 100
+    assert predictions.data.date_time_str.tolist() == data.date_time_str[100:200].tolist()
@@ -0,0 +1,59 @@
+import pytest
+from air_pred.utils import batch_scoring
+import numpy as np
+import pandas as pd
+
+class SumModel(object):
+    def predict(self, inputs):
+        return inputs.sum(axis=1, keepdims=True)
+
+class FlakyDeployment(batch_scoring.LocalDeployment):
+    def __init__(self, model, failures):
+        super().__init__(model)
+        self.failures = failures
+
+    def predict(self, inputs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("request failed")
+        return super().predict(inputs)
+
+@pytest.mark.parametrize("batch_size, max_in_flight", [(1, 1), (7, 1), (7, 4), (100, 4)])
+def test_predict_in_batches_keeps_order(batch_size, max_in_flight):
+    features = np.arange(60, dtype=float).reshape(30, 2)
+    predictions = batch_scoring.predict_in_batches(batch_scoring.LocalDeployment(SumModel()), features, batch_size=batch_size, max_in_flight=max_in_flight)
+    assert np.array_equal(predictions.squeeze(), features.sum(axis=1))
+
+def test_predict_in_batches_retries():
+    features = np.ones((10, 2))
+    predictions = batch_scoring.predict_in_batches(FlakyDeployment(SumModel(), failures=2), features, batch_size=5, max_in_flight=2, backoff=0)
+    assert np.array_equal(predictions.squeeze(), np.full(10, 2.0))
+
+def test_predict_in_batches_raises_after_retries():
+    with pytest.raises(ConnectionError):
+        batch_scoring.predict_in_batches(FlakyDeployment(SumModel(), failures=3), np.ones((4, 2)), max_retries=2, backoff=0)
+
+def test_time_chunks_cover_range():
+    chunks = batch_scoring.time_chunks(pd.Timestamp("2023-01-01 01:00"), pd.Timestamp("2023-01-03 05:00"), pd.Timedelta(days=1))
+    assert chunks[0][0] == pd.Timestamp("2023-01-01 01:00") and chunks[-1] == (pd.Timestamp("2023-01-03 01:00"), pd.Timestamp("2023-01-03 05:00"))
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks[:-1], chunks[1:]))
+    with pytest.raises(ValueError):
+        batch_scoring.time_chunks(pd.Timestamp("2023-01-01"), pd.Timestamp("2023-01-02"), pd.Timedelta(0))
+
+def test_score_in_chunks_inserts_every_chunk_once():
+    df = pd.DataFrame({"date_time": pd.date_range("2023-01-01", periods=100, freq="H"), "value": np.arange(100.0)})
+    inserted = []
+    chunks = batch_scoring.time_chunks(df.date_time.iloc[0], df.date_time.iloc[-1] + pd.Timedelta(hours=1), pd.Timedelta(hours=24))
+    counts = batch_scoring.score_in_chunks(chunks,
+                                           lambda start, end: df[(df.date_time >= start) & (df.date_time < end)],
+                                           lambda chunk: chunk.assign(prediction=2 * chunk.value),
+                                           inserted.append)
+    assert counts == {"chunks": 5, "rows_read": 100, "rows_inserted": 100}
+    assert np.array_equal(pd.concat(inserted).prediction.values, 2 * df.value.values)
+
+def test_score_in_chunks_raises_insert_errors():
+    def insert(chunk):
+        raise ConnectionError("insert failed")
+    chunks = [(pd.Timestamp("2023-01-01"), pd.Timestamp("2023-01-02"))] * 3
+    with pytest.raises(ConnectionError):
+        batch_scoring.score_in_chunks(chunks, lambda start, end: pd.DataFrame({"a": [1.0]}), lambda chunk: chunk, insert)
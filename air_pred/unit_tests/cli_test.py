@@ -0,0 +1,59 @@
+import subprocess
+import sys
+import types
+import pytest
+from air_pred import cli
+from air_pred.utils import feature_store
+
+def test_importing_pipelines_does_not_log_in():
+    code = ("from air_pred.pipeline import backfill_feature_pipeline, online_feature_pipeline, training_pipeline, "
+            "batch_inference_pipeline, online_inference_pipeline, deployement_pipeline\n"
+            "import sys\n"
+            "print([module for module in ['hopsworks', 'hsfs', 'great_expectations', 'sklearn'] if module in sys.modules])")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+def test_project_is_created_once(monkeypatch):
+    logins = []
+    project = types.SimpleNamespace(get_feature_store=lambda: "fs", get_model_registry=lambda: "mr")
+    monkeypatch.setitem(sys.modules, "hopsworks", types.SimpleNamespace(login=lambda: logins.append(1) or project))
+    monkeypatch.setattr(feature_store, "_project", None)
+    monkeypatch.setattr(feature_store, "_feature_store", None)
+    monkeypatch.setattr(feature_store, "_model_registry", None)
+
+    assert feature_store.get_feature_store() == "fs"
+    assert feature_store.get_model_registry() == "mr"
+    assert feature_store.get_project() is project
+    assert len(logins) == 1
+
+@pytest.mark.parametrize("argv, expected",
+        [
+            (["update"], {"incremental": True}),
+            (["update", "--full"], {"incremental": False}),
+        ]
+)
+def test_cli_runs_subcommand(monkeypatch, argv, expected):
+    from air_pred.pipeline import online_feature_pipeline
+    calls = []
+    monkeypatch.setattr(online_feature_pipeline, "update_feature_groups", lambda **kwargs: calls.append(kwargs))
+    cli.main(argv)
+    assert calls == [expected]
+
+@pytest.mark.parametrize("argv, lean", [(["backfill"], False), (["backfill", "--lean"], True)])
+def test_cli_backfill_is_not_lean_by_default(monkeypatch, argv, lean):
+    from air_pred.pipeline import backfill_feature_pipeline
+    calls = []
+    monkeypatch.setattr(backfill_feature_pipeline, "backfill_air_quality_data", lambda **kwargs: calls.append(kwargs))
+    cli.main(argv)
+    assert calls[0]["lean"] is lean
+
+def test_cli_passes_incremental_training_settings(monkeypatch):
+    from air_pred.pipeline import training_pipeline
+    calls = []
+    monkeypatch.setattr(training_pipeline, "update_linear_model", lambda fv_name, **kwargs: calls.append(kwargs))
+    cli.main(["train", "--incremental", "--halflife-hours", "336"])
+    assert calls == [{"halflife_hours": 336.0}] * len(training_pipeline.MODEL_NAMES)
+
+def test_cli_requires_subcommand():
+    with pytest.raises(SystemExit):
+        cli.main([])
@@ -0,0 +1,125 @@
+import threading
+import pytest
+from air_pred.utils import dag
+
+def make_stages(calls, model={"version": "1"}, fail=None):
+    def record(name, func):
+        def run(*args):
+            calls.append(name)
+            if fail is not None and name in fail:
+                raise RuntimeError(f"{name} failed")
+            return func(*args)
+        return run
+    return [
+        dag.Stage("fetch", record("fetch", lambda: list(range(5))), cache=False),
+        dag.Stage("insert", record("insert", lambda rows: len(rows)), inputs=["fetch"]),
+        dag.Stage("clean", record("clean", lambda rows: [row * 2 for row in rows]), inputs=["fetch"]),
+        dag.Stage("score", record("score", lambda cleaned: sum(cleaned)), inputs=["clean"], fingerprint=lambda: model["version"]),
+        dag.Stage("write", record("write", lambda inserted, score: (inserted, score)), inputs=["insert", "score"]),
+    ]
+
+def test_order_and_invalid_workflows(tmp_path):
+    workflow = dag.Workflow("test", make_stages([]), cache_dir=str(tmp_path))
+    order = workflow.order()
+    assert order.index("fetch") < order.index("clean") < order.index("score") < order.index("write")
+    with pytest.raises(ValueError, match="not stages"):
+        dag.Workflow("test", [dag.Stage("a", print, inputs=["b"])], cache_dir=str(tmp_path))
+    with pytest.raises(ValueError, match="cycle"):
+        dag.Workflow("test", [dag.Stage("a", print, inputs=["b"]), dag.Stage("b", print, inputs=["a"])], cache_dir=str(tmp_path))
+    with pytest.raises(ValueError, match="unique"):
+        dag.Workflow("test", [dag.Stage("a", print), dag.Stage("a", print)], cache_dir=str(tmp_path))
+
+def test_rerun_skips_stages_whose_inputs_did_not_change(tmp_path):
+    calls, model = [], {"version": "1"}
+    workflow = dag.Workflow("test", make_stages(calls, model), cache_dir=str(tmp_path))
+    results = workflow.run()
+    assert sorted(calls) == ["clean", "fetch", "insert", "score", "write"]
+    assert {result["status"] for result in results.values()} == {"ran"}
+
+    # the API returned the same rows, only the fetch runs
+    calls.clear()
+    results = dag.Workflow("test", make_stages(calls, model), cache_dir=str(tmp_path)).run()
+    assert calls == ["fetch"]
+    assert results["write"]["status"] == "cached"
+
+    # a new model version reruns the scores and what depends on them
+    calls.clear()
+    model["version"] = "2"
+    dag.Workflow("test", make_stages(calls, model), cache_dir=str(tmp_path)).run()
+    assert sorted(calls) == ["fetch", "score"]
+
+    # score gave the same output, so write is still cached, unless forced
+    calls.clear()
+    dag.Workflow("test", make_stages(calls, model), cache_dir=str(tmp_path)).run(force=["write"])
+    assert sorted(calls) == ["fetch", "write"]
+
+    calls.clear()
+    dag.Workflow("test", make_stages(calls, model), cache_dir=str(tmp_path)).run(targets=["insert"])
+    assert calls == ["fetch"]
+
+def test_failed_run_continues_at_the_failed_stage(tmp_path):
+    calls = []
+    with pytest.raises(dag.WorkflowError) as error:
+        dag.Workflow("test", make_stages(calls, fail={"score"}), cache_dir=str(tmp_path)).run()
+    results = error.value.results
+    assert results["score"]["status"] == "failed" and "write" not in results
+    assert results["insert"]["status"] == "ran" and results["clean"]["status"] == "ran"
+
+    # the rerun does not clean again and with resume uses the rows of the failed run instead of fetching
+    calls.clear()
+    results = dag.Workflow("test", make_stages(calls), cache_dir=str(tmp_path)).run(resume=True)
+    assert sorted(calls) == ["score", "write"]
+    assert results["fetch"]["status"] == "resumed" and results["clean"]["status"] == "cached"
+
+    # resume only applies after a failed run
+    calls.clear()
+    dag.Workflow("test", make_stages(calls), cache_dir=str(tmp_path)).run(resume=True)
+    assert calls == ["fetch"]
+
+def test_independent_stages_run_at_the_same_time(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [dag.Stage("source", lambda: 1),
+              dag.Stage("left", lambda value: barrier.wait() >= 0, inputs=["source"]),
+              dag.Stage("right", lambda value: barrier.wait() >= 0, inputs=["source"])]
+    # each branch waits for the other, so the run only finishes if they run in parallel
+    results = dag.Workflow("test", stages, cache_dir=str(tmp_path), max_workers=2).run()
+    assert results["left"]["status"] == results["right"]["status"] == "ran"
+
+def test_stages_are_recorded_under_the_calling_stage(tmp_path):
+    from air_pred.utils import instrumentation
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        with instrumentation.stage("run"):
+            dag.Workflow("test", make_stages([]), cache_dir=str(tmp_path)).run()
+        records = {record["stage"]: record for record in instrumentation.summary()["stages"]}
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert records["test.score"]["parent"] == "run" and records["test.write"]["parent"] == "run"
+
+def test_prediction_workflow_skips_unchanged_rows(tmp_path, monkeypatch):
+    from air_pred.pipeline import online_feature_pipeline, online_inference_pipeline, prediction_workflow
+    calls, window = [], {"rows": [1, 2, 3]}
+    def record(name, result):
+        return lambda *args, **kwargs: calls.append(name) or result(*args)
+    monkeypatch.setattr(online_feature_pipeline, "fetch_weekly_rows", record("fetch", lambda: list(window["rows"])))
+    monkeypatch.setattr(online_feature_pipeline, "insert_changed_rows", record("raw_insert", lambda rows: (rows, rows, rows, {})))
+    monkeypatch.setattr(online_feature_pipeline, "clean_changed_rows", record("clean", lambda rows, hours: (rows, rows)))
+    monkeypatch.setattr(online_feature_pipeline, "update_time_series_features", record("ts_features", lambda rows, full: rows))
+    monkeypatch.setattr(online_feature_pipeline, "store_row_hashes", record("store_row_hashes", lambda *args: None))
+    monkeypatch.setattr(online_inference_pipeline, "get_deployment", lambda: (None, "model_1"))
+    monkeypatch.setattr(online_inference_pipeline, "score_new_rows", record("score", lambda: (window["rows"][-1:], "model_1", window["rows"][-1])))
+    monkeypatch.setattr(online_inference_pipeline, "insert_predictions", record("insert_predictions", lambda *scored: scored[0]))
+    monkeypatch.setattr(online_inference_pipeline, "update_forecasts", record("forecast", lambda: 24))
+    monkeypatch.setattr(prediction_workflow, "time_series_model", lambda: "ts_1")
+
+    prediction_workflow.create_workflow(cache_dir=str(tmp_path)).run()
+    assert sorted(calls) == sorted(["fetch", "raw_insert", "clean", "ts_features", "store_row_hashes", "score", "insert_predictions", "forecast"])
+    calls.clear()
+    prediction_workflow.create_workflow(cache_dir=str(tmp_path)).run()
+    assert calls == ["fetch"]
+    calls.clear()
+    window["rows"].append(4)
+    prediction_workflow.create_workflow(cache_dir=str(tmp_path)).run()
+    assert len(calls) == 8
@@ -23,3 +23,59 @@ def test_convert_to_datetime(date_str,expected_date):
 def test_date_time_feature(input_df,nan_count):
     print(data_preprocessing.clean_data_baseline(input_df))
     assert data_preprocessing.clean_data_baseline(input_df).isna().sum().sum() == nan_count
+
+
+@pytest.mark.parametrize("date_strs",
+        [
+            ["2023-10-09 01:00", "2023-10-09 24:00", "2023-12-31 24:00", "2023-10-09 13:00+01:00"],
+        ]
+)
+def test_convert_to_datetime_column(date_strs):
+    expected = pd.Series([data_preprocessing.convert_to_datetime(date_str.split('+')[0]) for date_str in date_strs])
+    assert data_preprocessing.convert_to_datetime_column(pd.Series(date_strs)).equals(expected)
+
+
+def test_clean_data_IterativeImputer_with_fitted_imputer():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(200, 3))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    df = pd.DataFrame(values, columns=["a", "b", "c"])
+    df["date_time"] = pd.date_range("2023-01-01", periods=200, freq="h")
+    df["date_time_str"] = df["date_time"].dt.strftime('%Y-%m-%d %H:%M')
+
+    imputer = data_preprocessing.fit_iterative_imputer(df.iloc[:150])
+    cleaned_df = data_preprocessing.clean_data_IterativeImputer(df.iloc[150:], imputer=imputer)
+    assert len(cleaned_df) == 50
+    assert cleaned_df.isna().sum().sum() == 0
+
+
+def hourly_pm25(periods, drop_hours=()):
+    date_time = pd.date_range("2023-01-01", periods=periods, freq="h")
+    df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime('%Y-%m-%d %H:%M'), "femman_pm25": np.arange(periods, dtype=float)})
+    return df.drop(list(drop_hours)).reset_index(drop=True)
+
+
+def test_time_series_features_without_gaps():
+    df = hourly_pm25(400)
+    tsdf = data_preprocessing.get_time_series_features(df)
+    assert len(tsdf) == 400 - 168
+    assert (tsdf.femman_pm25 - tsdf.prev_day == 24).all()
+    assert (tsdf.femman_pm25 - tsdf.prev_week == 168).all()
+
+
+def test_time_series_features_with_missing_hours():
+    df = hourly_pm25(400, drop_hours=[200, 201])
+    tsdf = data_preprocessing.get_time_series_features(df)
+    assert (tsdf.femman_pm25 - tsdf.prev_day == 24).all()
+    assert (tsdf.femman_pm25 - tsdf.prev_week == 168).all()
+    assert pd.Timestamp("2023-01-10 08:00") not in tsdf.index
+
+
+def test_time_series_features_incremental():
+    spec = {"columns": ["femman_pm25"], "lags": {"prev_day": 24}, "rolling": {"mean_day": ("mean", 24)},
+            "calendar": ["hour"], "name_template": "{column}_{feature}"}
+    df = hourly_pm25(400)
+    full = data_preprocessing.get_time_series_features(df, spec)
+    history = data_preprocessing.time_series_features.history_tail(df.iloc[:300], spec)
+    incremental = data_preprocessing.get_time_series_features(df.iloc[300:], spec, history=history)
+    assert incremental.equals(full.iloc[-100:])
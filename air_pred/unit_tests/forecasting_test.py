@@ -0,0 +1,93 @@
+import types
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.pipeline import online_inference_pipeline
+from air_pred.utils import feature_store, forecasting, model_cache, online_features, time_series_features
+
+def make_data(n_rows, start="2023-01-01 01:00", seed=0):
+    rng = np.random.default_rng(seed)
+    date_time = pd.date_range(start, periods=n_rows, freq="H")
+    daily = 10 + 5 * np.sin(2 * np.pi * date_time.hour / 24)
+    return pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                         "femman_pm25": daily + rng.normal(0, 1, n_rows)})
+
+def fit_model(df):
+    features = time_series_features.create_features(df)
+    return LinearRegression().fit(features[["prev_day", "prev_week"]], features["femman_pm25"])
+
+def expected_forecast(df, model, hours):
+    """Features of the future hours created from the history with create_features, one hour at a time"""
+    future = pd.DataFrame({"date_time": hours, "date_time_str": hours.strftime("%Y-%m-%d %H:%M"), "femman_pm25": np.nan})
+    features = time_series_features.create_features(future, history=df, dropna=False)
+    return model.predict(features[["prev_day", "prev_week"]])
+
+def test_direct_forecast_matches_features_of_the_history():
+    df = make_data(1000)
+    model = fit_model(df)
+    buffer = online_features.HourlyRingBuffer()
+    buffer.ingest(df)
+    result = forecasting.forecast(buffer, model, horizon=24, strategy="direct")
+    hours = forecasting.forecast_hours(df.date_time.iloc[-1], 24)
+    assert list(result.date_time) == list(hours)
+    assert list(result.horizon) == list(range(1, 25))
+    assert (result.origin_date_time == df.date_time.iloc[-1]).all()
+    assert np.allclose(result.predicted_femman_pm25, expected_forecast(df, model, hours))
+    with pytest.raises(ValueError):
+        forecasting.forecast(buffer, model, horizon=25, strategy="direct")
+
+def test_recursive_forecast_feeds_forecasts_back():
+    df = make_data(1000)
+    model = fit_model(df)
+    buffer = online_features.HourlyRingBuffer()
+    buffer.ingest(df)
+    latest = buffer.latest
+    result = forecasting.forecast(buffer, model, horizon=60, strategy="recursive")
+    assert list(result.horizon) == list(range(1, 61))
+    # the buffer of the caller is not changed
+    assert buffer.latest == latest
+
+    # the first day only uses observed values, later hours use the forecasts as values of the previous day
+    direct = forecasting.forecast(buffer, model, horizon=24, strategy="direct")
+    assert np.allclose(result.predicted_femman_pm25[:24], direct.predicted_femman_pm25)
+    extended = pd.concat([df, result[["date_time", "date_time_str"]].assign(femman_pm25=result.predicted_femman_pm25)[:48]])
+    hours = forecasting.forecast_hours(result.date_time.iloc[47], 12)
+    assert np.allclose(result.predicted_femman_pm25[48:], expected_forecast(extended, model, hours))
+
+def test_hours_with_missing_lags_are_left_out():
+    df = make_data(1000)
+    model = fit_model(df)
+    buffer = online_features.HourlyRingBuffer()
+    # the hours a day before the 3rd and 4th forecasted hour are missing
+    buffer.ingest(df.drop(index=[len(df) - 22, len(df) - 21]))
+    result = forecasting.forecast(buffer, model, horizon=24)
+    assert list(result.horizon) == [horizon for horizon in range(1, 25) if horizon not in (3, 4)]
+
+def test_update_forecasts(tmp_path, monkeypatch):
+    df = make_data(1000)
+    model = fit_model(df)
+    (tmp_path / "registry").mkdir()
+    joblib.dump(model, tmp_path / "registry" / "air_quality_time_series_model.pkl")
+    registered = types.SimpleNamespace(name="air_quality_time_series_model", version=3, download=lambda: str(tmp_path / "registry"))
+
+    cleaned = FakeFeatureGroup("cleaned_air_quality_data", data=df)
+    forecasts = FakeFeatureGroup("forecast_air_quality_data", primary_key=["date_time_str", "horizon"])
+    fs = types.SimpleNamespace(get_feature_group=lambda name, version: cleaned)
+    mr = types.SimpleNamespace(get_best_model=lambda name, metric, direction: registered)
+    dataset_api = types.SimpleNamespace(download=lambda *args, **kwargs: None, upload=lambda *args, **kwargs: None)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(feature_store, "get_feature_store", lambda: fs)
+    monkeypatch.setattr(feature_store, "get_model_registry", lambda: mr)
+    monkeypatch.setattr(feature_store, "get_project", lambda: types.SimpleNamespace(get_dataset_api=lambda: dataset_api))
+    monkeypatch.setattr(model_cache, "_default_cache", model_cache.ModelArtifactCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(online_inference_pipeline, "create_forecast_feature_group", lambda: forecasts)
+
+    online_inference_pipeline.update_forecasts(horizon=24, strategy="direct")
+    assert len(forecasts.data) == 24
+    assert (forecasts.data.model_version == 3).all()
+    assert forecasts.data.date_time.min() == df.date_time.iloc[-1] + pd.Timedelta(hours=1)
+    # no row of the cleaned data is written with a made up value
+    assert cleaned.inserted_rows == 0
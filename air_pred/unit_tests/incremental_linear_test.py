@@ -0,0 +1,144 @@
+import pytest
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from air_pred.utils import incremental_linear
+
+FEATURES = ["femman_temp", "femman_press", "femman_rain"]
+
+def make_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    date_time = pd.Series(pd.date_range("2023-01-02 00:00", periods=n_rows, freq="H"))
+    # features of very different magnitude like the weather data
+    X = np.column_stack([rng.normal(10, 8, n_rows), rng.normal(1013, 10, n_rows), rng.exponential(0.5, n_rows)])
+    y = X @ np.array([0.3, -0.05, 2.0]) + 60 + rng.normal(0, 1, n_rows)
+    return X, y, date_time
+
+def test_matches_full_refit():
+    X, y, date_time = make_data(2000)
+    model = incremental_linear.IncrementalLinearRegression(FEATURES)
+    for start in range(0, 2000, 300):
+        model.partial_fit(X[start:start + 300], y[start:start + 300], date_time[start:start + 300])
+    reference = LinearRegression().fit(X, y)
+    coef, intercept = model.solve()
+    assert model.n_rows == 2000
+    assert np.allclose(coef, reference.coef_, rtol=1e-8, atol=1e-10)
+    assert np.isclose(intercept, reference.intercept_, rtol=1e-8)
+    assert np.isclose(model.mean_squared_error(), np.mean((reference.predict(X) - y) ** 2), rtol=1e-6)
+
+def test_holdout_error_matches_refit_without_the_test_rows():
+    X, y, date_time = make_data(2000)
+    test = np.random.default_rng(1).random(2000) < 0.3
+    reference = LinearRegression().fit(X[~test], y[~test])
+    expected = np.mean((reference.predict(X[test]) - y[test]) ** 2)
+    model = incremental_linear.IncrementalLinearRegression(FEATURES)
+    model.partial_fit(X, y, date_time)
+    assert np.isclose(model.holdout_mean_squared_error(X[test], y[test], date_time[test]), expected, rtol=1e-6)
+
+def test_holdout_error_rejects_rewritten_test_rows():
+    X, y, date_time = make_data(2000)
+    test = np.random.default_rng(1).random(2000) < 0.3
+    model = incremental_linear.IncrementalLinearRegression(FEATURES)
+    model.partial_fit(X, y, date_time)
+    # the test rows were rewritten after they were added, their statistics can not be subtracted
+    with pytest.raises(ValueError):
+        model.holdout_mean_squared_error(X[test], 10 * y[test], date_time[test])
+
+def test_rows_already_added_are_skipped():
+    X, y, date_time = make_data(500)
+    model = incremental_linear.IncrementalLinearRegression(FEATURES)
+    assert model.partial_fit(X[:300], y[:300], date_time[:300]) == 300
+    # the overlapping chunk of a repeated read only adds the new rows
+    assert model.partial_fit(X[200:], y[200:], date_time[200:]) == 200
+    assert model.n_rows == 500
+    assert np.allclose(model.solve()[0], LinearRegression().fit(X, y).coef_)
+
+def test_window_matches_refit_on_kept_blocks():
+    X, y, date_time = make_data(3000)
+    model = incremental_linear.IncrementalLinearRegression(FEATURES, window_hours=1000, block_hours=168)
+    for start in range(0, 3000, 168):
+        model.partial_fit(X[start:start + 168], y[start:start + 168], date_time[start:start + 168])
+    hours = (date_time - pd.Timestamp(0)) // pd.Timedelta(hours=1)
+    kept = np.isin(hours // 168, model.blocks)
+    assert kept[-1] and not kept[0]
+    # whole blocks are kept, at least the window and less than one more block
+    assert 1000 <= kept.sum() < 1000 + 2 * 168
+    assert model.n_rows == kept.sum()
+    reference = LinearRegression().fit(X[kept], y[kept])
+    assert np.allclose(model.solve()[0], reference.coef_)
+
+def test_halflife_matches_weighted_refit():
+    X, y, date_time = make_data(1000)
+    model = incremental_linear.IncrementalLinearRegression(FEATURES, halflife_hours=336, block_hours=168)
+    model.partial_fit(X, y, date_time)
+    hours = (date_time - pd.Timestamp(0)) // pd.Timedelta(hours=1)
+    age = model.fitted_until // 168 - hours // 168
+    reference = LinearRegression().fit(X, y, sample_weight=0.5 ** (age * 168 / 336))
+    coef, intercept = model.solve()
+    assert np.allclose(coef, reference.coef_) and np.isclose(intercept, reference.intercept_)
+
+def test_save_load_and_model(tmp_path):
+    X, y, date_time = make_data(400)
+    model = incremental_linear.IncrementalLinearRegression(FEATURES, window_hours=336)
+    model.partial_fit(X, y, date_time)
+    path = str(tmp_path / "state" / "incremental.npz")
+    model.save(path)
+    loaded = incremental_linear.IncrementalLinearRegression.load(path)
+    assert loaded.feature_names == FEATURES and loaded.window_hours == 336 and loaded.halflife_hours is None
+    assert loaded.fitted_until == model.fitted_until
+    assert np.allclose(loaded.solve()[0], model.solve()[0])
+    assert incremental_linear.hour_to_timestamp(loaded.fitted_until) == date_time.iloc[-1]
+    assert incremental_linear.IncrementalLinearRegression.load(str(tmp_path / "missing.npz")) is None
+
+    sklearn_model = loaded.to_model()
+    frame = pd.DataFrame(X, columns=FEATURES)
+    assert np.allclose(sklearn_model.predict(frame), X @ model.solve()[0] + model.solve()[1])
+
+def test_update_linear_model_reads_only_new_rows(tmp_path, monkeypatch):
+    import types
+    from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+    from air_pred.pipeline import training_pipeline
+    from air_pred.unit_tests.batch_inference_test import FakeFeatureView
+    from air_pred.utils import feature_store, model_cache
+    monkeypatch.chdir(tmp_path)
+    X, y, date_time = make_data(600)
+    data = pd.DataFrame(X, columns=FEATURES).assign(date_time=date_time, date_time_str=date_time.dt.strftime("%Y-%m-%d %H:%M"), femman_pm25=y)
+    cleaned = FakeFeatureGroup("cleaned_air_quality_data", data=data.iloc[:400])
+    fv = FakeFeatureView(cleaned)
+    fv.name, fv.version = "air_qaulity_baseline_fv", 2
+    test = data.iloc[:400:3]
+    fv.get_train_test_split = lambda training_dataset_version: (data.iloc[:0][FEATURES + ["date_time"]], test[FEATURES + ["date_time"]], data.iloc[:0][["femman_pm25"]], test[["femman_pm25"]])
+    registered, uploaded = [], []
+    fs = types.SimpleNamespace(get_feature_view=lambda name, version: fv, get_feature_group=lambda name, version: cleaned)
+    create_model = lambda **kwargs: registered.append(kwargs) or types.SimpleNamespace(save=lambda path: None)
+    mr = types.SimpleNamespace(python=types.SimpleNamespace(create_model=create_model))
+    # the state is stored in the project, the download of the first run fails because it does not exist yet
+    dataset_api = types.SimpleNamespace(download=lambda *args, **kwargs: 1 / 0, upload=lambda path, *args, **kwargs: uploaded.append(path))
+    monkeypatch.setattr(feature_store, "get_feature_store", lambda: fs)
+    monkeypatch.setattr(feature_store, "get_model_registry", lambda: mr)
+    monkeypatch.setattr(feature_store, "get_project", lambda: types.SimpleNamespace(get_dataset_api=lambda: dataset_api))
+    monkeypatch.setattr(model_cache, "_default_cache", model_cache.ModelArtifactCache(str(tmp_path / "cache")))
+
+    # the first run fits in one chunk, it has no prequential error but the error on the test split
+    training_pipeline.update_linear_model("air_qaulity_baseline_fv")
+    assert set(registered[-1]["metrics"]) == {"Train MSE", "Test MSE"} and len(uploaded) == 1
+    train = ~data.index.isin(test.index) & (data.index < 400)
+    reference = LinearRegression().fit(X[train], y[train])
+    assert np.isclose(registered[-1]["metrics"]["Test MSE"], np.mean((reference.predict(X[test.index]) - y[test.index]) ** 2))
+
+    cleaned.data = data
+    fv.reads.clear()
+    cleaned.rows_read = 0
+    model = training_pipeline.update_linear_model("air_qaulity_baseline_fv", chunk=pd.Timedelta(days=5))
+    assert fv.reads[0][0] == date_time[400]
+    # the date_time and the label of the new rows
+    assert cleaned.rows_read == 2 * 200
+    assert np.allclose(model.coef_, LinearRegression().fit(X, y).coef_)
+    assert registered[-1]["description"].endswith("600 rows") and "Prequential MSE" in registered[-1]["metrics"]
+    assert training_pipeline.update_linear_model("air_qaulity_baseline_fv") is None
+
+    # the halflife weights the stored blocks when the model is solved
+    cleaned.data = pd.concat([data, data.iloc[[-1]].assign(date_time=date_time.iloc[-1] + pd.Timedelta(hours=1))])
+    training_pipeline.update_linear_model("air_qaulity_baseline_fv", halflife_hours=168)
+    state = incremental_linear.IncrementalLinearRegression.load("models/" + incremental_linear.INCREMENTAL_STATE_FILE.format(model_name="air_quality_estimation_model"))
+    assert state.halflife_hours == 168
@@ -0,0 +1,94 @@
+import json
+import pytest
+from air_pred.utils import instrumentation
+import pandas as pd
+
+@pytest.fixture
+def enabled(tmp_path):
+    instrumentation.reset()
+    instrumentation.enable(metrics_file=str(tmp_path / "metrics.json"))
+    yield tmp_path
+    instrumentation.disable()
+    instrumentation.reset()
+
+@instrumentation.instrument(rows_arg=1)
+def drop_half(name, df):
+    return df.iloc[:len(df) // 2]
+
+def test_disabled_stage_records_nothing():
+    instrumentation.reset()
+    with instrumentation.stage("stage") as record:
+        record.set_rows(rows_out=3)
+    assert drop_half("name", pd.DataFrame({"a": range(10)})).shape == (5, 1)
+    assert instrumentation.summary()["stages"] == []
+
+def test_nested_stages_and_rows(enabled):
+    df = pd.DataFrame({"a": range(10)})
+    with instrumentation.stage("outer", rows_in=len(df)) as record:
+        drop_half("name", df=df)
+        drop_half("name", df)
+        record.set_rows(rows_out=5)
+
+    stages = instrumentation.summary()["stages"]
+    assert [stage["stage"] for stage in stages] == ["drop_half", "drop_half", "outer"]
+    assert stages[0]["parent"] == "outer" and stages[2]["parent"] is None
+    assert (stages[0]["rows_in"], stages[0]["rows_out"]) == (10, 5)
+    assert (stages[2]["rows_in"], stages[2]["rows_out"]) == (10, 5)
+    assert stages[2]["peak_rss_mb"] >= max(stages[0]["peak_rss_mb"], stages[1]["peak_rss_mb"])
+    assert stages[2]["wall_seconds"] >= stages[0]["wall_seconds"] + stages[1]["wall_seconds"]
+
+    totals = {total["stage"]: total for total in instrumentation.summary()["totals"]}
+    assert totals["drop_half"]["calls"] == 2
+    assert totals["drop_half"]["rows_in"] == 20
+
+def test_failed_stage_is_recorded(enabled):
+    with pytest.raises(ValueError):
+        with instrumentation.stage("failing"):
+            raise ValueError()
+    assert instrumentation.summary()["stages"][0]["error"] == "ValueError"
+
+def test_write_summary_and_profile(enabled):
+    instrumentation.enable(profile_dir=str(enabled / "profiles"))
+    try:
+        with instrumentation.stage("read csv"):
+            sum(range(1000))
+    finally:
+        instrumentation.PROFILE_DIR = None
+    instrumentation.write_summary()
+
+    with open(enabled / "metrics.json") as file:
+        report = json.load(file)
+    assert report["stages"][0]["stage"] == "read csv"
+    assert (enabled / "profiles" / "read_csv.prof").exists()
+
+def test_stages_of_concurrent_threads_report_the_run_peak(enabled, monkeypatch):
+    import threading
+    resets = []
+    monkeypatch.setattr(instrumentation, "_reset_peak_rss", lambda: resets.append(threading.get_ident()) or True)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def worker(parent):
+        with instrumentation.stage("worker", parent=parent):
+            barrier.wait()
+            with instrumentation.stage("nested"):
+                barrier.wait()
+
+    with instrumentation.stage("outer"):
+        parent = instrumentation.current_stage()
+        peak_before = instrumentation._peak_rss_mb()
+        threads = [threading.Thread(target=worker, args=(parent,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    stages = instrumentation.summary()["stages"]
+    workers = [stage for stage in stages if stage["stage"] == "worker"]
+    nested = [stage for stage in stages if stage["stage"] == "nested"]
+    assert [stage["parent"] for stage in workers] == ["outer", "outer"]
+    assert [stage["parent"] for stage in nested] == ["worker", "worker"]
+    assert all(stage["concurrent"] for stage in workers + nested)
+    # the concurrent stages report the peak of the run, which includes the peak before they started
+    assert min(stage["peak_rss_mb"] for stage in workers + nested) >= peak_before
+    # the outer stage resets the peak, the worker threads never do while the outer stage runs
+    assert resets == [threading.get_ident()]
@@ -0,0 +1,75 @@
+import os
+import joblib
+import numpy as np
+import pytest
+from air_pred.utils import model_cache
+
+class FakeModel(object):
+    def __init__(self, directory, name, version):
+        self.directory = directory
+        self.name = name
+        self.version = version
+        self.downloads = 0
+
+    def download(self):
+        self.downloads += 1
+        return self.directory
+
+class FakeModelRegistry(object):
+    def __init__(self, models):
+        self.models = models
+        self.lookups = 0
+
+    def get_best_model(self, name, metric, direction):
+        self.lookups += 1
+        return self.models[name]
+
+@pytest.fixture
+def registry(tmp_path):
+    models = {}
+    for version, name in enumerate(["air_quality_estimation_model", "air_quality_time_series_model"], start=1):
+        directory = tmp_path / "registry" / name
+        directory.mkdir(parents=True)
+        joblib.dump({"coef": np.arange(100000, dtype=float) * version}, directory / f"{name}.pkl")
+        models[name] = FakeModel(str(directory), name, version)
+    return FakeModelRegistry(models)
+
+def test_repeated_loads_skip_download_and_deserialization(tmp_path, registry):
+    cache = model_cache.ModelArtifactCache(str(tmp_path / "cache"))
+    model = cache.load(registry, "air_quality_estimation_model")
+    assert cache.load(registry, "air_quality_estimation_model") is model
+    assert registry.lookups == 1 and registry.models["air_quality_estimation_model"].downloads == 1
+
+    # a new process finds the artifact on disk and only deserializes it
+    cache = model_cache.ModelArtifactCache(str(tmp_path / "cache"))
+    assert np.array_equal(cache.load(registry, "air_quality_estimation_model")["coef"], model["coef"])
+    assert registry.lookups == 2 and registry.models["air_quality_estimation_model"].downloads == 1
+
+    cache.forget("air_quality_estimation_model")
+    cache.load(registry, "air_quality_estimation_model")
+    assert registry.lookups == 3
+
+def test_large_artifacts_are_memory_mapped(tmp_path, registry):
+    cache = model_cache.ModelArtifactCache(str(tmp_path / "cache"), mmap_min_bytes=0)
+    assert isinstance(cache.load(registry, "air_quality_estimation_model")["coef"], np.memmap)
+    cache = model_cache.ModelArtifactCache(str(tmp_path / "other_cache"))
+    assert not isinstance(cache.load(registry, "air_quality_estimation_model")["coef"], np.memmap)
+
+def test_least_recently_used_artifact_is_evicted(tmp_path, registry):
+    cache = model_cache.ModelArtifactCache(str(tmp_path / "cache"), max_bytes=1000000)
+    cache.load(registry, "air_quality_estimation_model")
+    cache.load(registry, "air_quality_time_series_model")
+    index = cache._load_index()
+    assert list(index) == ["air_quality_time_series_model_2"]
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted(["index.json", index["air_quality_time_series_model_2"]["directory"]])
+
+def test_changed_local_copy_is_downloaded_again(tmp_path, registry):
+    cache = model_cache.ModelArtifactCache(str(tmp_path / "cache"))
+    model = registry.models["air_quality_estimation_model"]
+    directory = cache.artifact_dir(model)
+    joblib.dump({"coef": np.zeros(3)}, os.path.join(directory, "air_quality_estimation_model.pkl"))
+    assert len(cache.load(registry, "air_quality_estimation_model", verify=True)["coef"]) == 100000
+    assert model.downloads == 2
+
+    cache.invalidate("air_quality_estimation_model")
+    assert cache._load_index() == {}
@@ -0,0 +1,48 @@
+import pytest
+import joblib
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.linear_model import LinearRegression
+from air_pred.utils import model_selection
+
+CANDIDATES = {
+    "linear_regression": ("sklearn.linear_model.LinearRegression", [{}]),
+    "ridge": ("sklearn.linear_model.Ridge", [{"alpha": 1.0}, {"alpha": 1000.0}]),
+}
+
+def make_data(n_rows=240, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 3))
+    return X, X @ np.array([1.0, -2.0, 0.5]) + rng.normal(scale=0.1, size=n_rows)
+
+@pytest.mark.parametrize("n_rows, n_splits, gap", [(100, 5, 0), (37, 3, 2), (10, 9, 0)])
+def test_folds_match_time_series_split(n_rows, n_splits, gap):
+    folds = model_selection.rolling_origin_folds(n_rows, n_splits, gap=gap)
+    expected = [(train[-1] + 1, test[0], test[-1] + 1) for train, test in TimeSeriesSplit(n_splits, gap=gap).split(np.zeros(n_rows))]
+    assert folds == expected
+
+def test_too_few_rows_for_folds():
+    with pytest.raises(ValueError):
+        model_selection.rolling_origin_folds(5, 5)
+
+def test_candidate_grid():
+    assert [(name, params) for name, _, params in model_selection.candidate_grid(CANDIDATES)] == \
+        [("linear_regression", {}), ("ridge", {"alpha": 1.0}), ("ridge", {"alpha": 1000.0})]
+
+def test_process_pool_selects_same_models_as_serial():
+    datasets = {"estimation": make_data(), "time_series": make_data(seed=1)}
+    serial = model_selection.select_models(datasets, CANDIDATES, n_splits=3, n_jobs=1)
+    parallel = model_selection.select_models(datasets, CANDIDATES, n_splits=3, n_jobs=2)
+    for name in datasets:
+        assert [(result["name"], result["params"]) for result in serial[name]] == [(result["name"], result["params"]) for result in parallel[name]]
+        assert np.allclose([result["cv_mse"] for result in serial[name]], [result["cv_mse"] for result in parallel[name]])
+        # strongly regularized ridge is the worst candidate on noise free linear data
+        assert serial[name][-1]["params"] == {"alpha": 1000.0}
+        assert len(serial[name][0]["fold_mse"]) == 3
+
+def test_load_artifact(tmp_path):
+    X, y = make_data()
+    joblib.dump(LinearRegression().fit(X, y), tmp_path / "linear_regression.pkl")
+    assert np.allclose(model_selection.load_artifact(str(tmp_path), "air_quality_estimation_model").predict(X[:2]), y[:2], atol=0.5)
+    joblib.dump(LinearRegression().fit(X, -y), model_selection.artifact_path("air_quality_estimation_model", str(tmp_path)))
+    assert np.allclose(model_selection.load_artifact(str(tmp_path), "air_quality_estimation_model").predict(X[:2]), -y[:2], atol=0.5)
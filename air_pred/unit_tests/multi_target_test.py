@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from air_pred.utils import multi_target, time_series_features
+
+TARGETS = ["femman_pm25", "haganorra_no2", "mobil1_pm10"]
+
+def make_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    date_time = pd.date_range("2023-01-01 01:00", periods=n_rows, freq="H")
+    df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                       "femman_temp": rng.random(n_rows)})
+    for index, target in enumerate(TARGETS):
+        df[target] = (index + 1) * np.sin(np.arange(n_rows) / 24 * 2 * np.pi) + rng.normal(0, 0.1, n_rows)
+    # missing hours give missing features instead of values of the wrong hour
+    return df.drop(index=rng.choice(n_rows, n_rows // 20, replace=False)).reset_index(drop=True)
+
+def test_find_targets():
+    columns = ["date_time", "date_time_str", "femman_temp", "femman_pm25", "haganorra_nox", "Mobil2_PM25", "lejonet_rh"]
+    assert multi_target.find_targets(columns) == ["femman_pm25", "haganorra_nox", "Mobil2_PM25"]
+
+def test_stacked_features_match_create_features():
+    df = make_data(600)
+    spec = dict(time_series_features.DEFAULT_SPEC, calendar=["hour"])
+    stacked = multi_target.stack_features(df, TARGETS, spec)
+    assert list(stacked.target.cat.categories) == TARGETS
+    for target in TARGETS:
+        rows = stacked[stacked.target == target].reset_index(drop=True)
+        expected = time_series_features.create_features(df, dict(spec, columns=[target])).reset_index(drop=True)
+        assert list(rows.date_time) == list(expected.date_time)
+        assert list(rows.date_time_str) == list(expected.date_time_str)
+        assert np.allclose(rows[["value", "prev_day", "prev_week", "hour"]].to_numpy(dtype=float),
+                           expected[[target, "prev_day", "prev_week", "hour"]].to_numpy(dtype=float))
+
+def test_target_rows():
+    stacked = multi_target.stack_features(make_data(400), TARGETS)
+    rows = multi_target.target_rows(stacked)
+    assert all(isinstance(target_rows, slice) for target_rows in rows.values())
+    assert sum(target_rows.stop - target_rows.start for target_rows in rows.values()) == len(stacked)
+    shuffled = stacked.sample(frac=1, random_state=0).reset_index(drop=True)
+    for target, positions in multi_target.target_rows(shuffled).items():
+        assert (shuffled.target.iloc[positions] == target).all()
+
+def test_fit_and_predict_targets():
+    stacked = multi_target.stack_features(make_data(800), TARGETS)
+    model = multi_target.fit_targets(stacked)
+    assert model.targets == TARGETS
+    for target in TARGETS:
+        rows = stacked[stacked.target == target]
+        expected = LinearRegression().fit(rows[["prev_day", "prev_week"]].to_numpy(), rows.value.to_numpy())
+        assert np.allclose(model.models[target].coef_, expected.coef_)
+
+    # predictions follow the rows of the dataframe in any order
+    shuffled = stacked.sample(frac=1, random_state=0).reset_index(drop=True)
+    predictions = model.predict(shuffled)
+    for target in TARGETS:
+        rows = (shuffled.target == target).to_numpy()
+        assert np.allclose(predictions[rows], model.models[target].predict(shuffled.loc[rows, ["prev_day", "prev_week"]].to_numpy()))
+    errors = multi_target.evaluate_targets(model, stacked)
+    assert set(errors) == set(TARGETS) and all(error < 0.1 for error in errors.values())
+
+    prediction_df = multi_target.unstack_predictions(shuffled, predictions)
+    assert list(prediction_df.columns) == ["date_time", "date_time_str", "target", "value", "predicted_value"]
+    assert prediction_df.target.dtype == object
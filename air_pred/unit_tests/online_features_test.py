@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from air_pred.utils import online_features, time_series_features
+
+SPEC = {"columns": ["femman_pm25", "femman_no2"], "lags": {"prev_day": 24, "prev_week": 168}, "calendar": ["hour", "dayofweek"],
+        "name_template": "{column}_{feature}"}
+
+def make_data(n_rows, start="2023-01-01 01:00", seed=0):
+    rng = np.random.default_rng(seed)
+    date_time = pd.date_range(start, periods=n_rows, freq="H")
+    df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                       "femman_pm25": rng.random(n_rows), "femman_no2": rng.random(n_rows)})
+    # missing hours give missing features instead of values of the wrong hour
+    return df.drop(index=rng.choice(n_rows, n_rows // 20, replace=False)).reset_index(drop=True)
+
+def test_features_match_create_features():
+    df = make_data(1000)
+    buffer = online_features.HourlyRingBuffer(SPEC, capacity=400)
+    for start in range(0, len(df), 97):
+        buffer.ingest(df.iloc[start:start + 97])
+
+    expected = time_series_features.create_features(df, SPEC, dropna=False)
+    date_times = expected.date_time.iloc[-200:]
+    result = buffer.feature_frame(date_times)
+    assert list(result.columns) == ["date_time", "date_time_str"] + buffer.feature_names
+    pd.testing.assert_frame_equal(result[buffer.feature_names], expected.loc[date_times, buffer.feature_names], check_dtype=False, check_names=False, check_freq=False)
+    for date_time in date_times.iloc[::17]:
+        assert np.allclose(buffer.feature_vector(date_time), expected.loc[date_time, buffer.feature_names].to_numpy(dtype=float), equal_nan=True)
+
+def test_future_hours_and_hours_outside_buffer():
+    df = make_data(400)
+    buffer = online_features.HourlyRingBuffer(SPEC, capacity=200)
+    buffer.ingest(df)
+    latest = df.date_time.iloc[-1]
+    # the day lag of the next 24 hours is known, after that only the week lag
+    assert not np.isnan(buffer.feature_vector(latest + pd.Timedelta(hours=24))[:2]).any()
+    assert np.isnan(buffer.feature_vector(latest + pd.Timedelta(hours=25))[:2]).all()
+    # the week lag of an old hour was overwritten
+    assert np.isnan(buffer.feature_vector(latest - pd.Timedelta(hours=100))[2:4]).all()
+
+def test_late_and_updated_rows():
+    df = make_data(300)
+    buffer = online_features.HourlyRingBuffer(SPEC)
+    buffer.ingest(df.iloc[150:])
+    buffer.ingest(df.iloc[:150])
+    updated = df.iloc[[-30]].assign(femman_pm25=5.0)
+    buffer.ingest(updated)
+    assert buffer.feature_vector(updated.date_time.iloc[0] + pd.Timedelta(hours=24))[0] == 5.0
+    # rows older than the buffer are ignored
+    assert buffer.ingest(make_data(10, start="2020-01-01")) == 0
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "snapshot" / online_features.ONLINE_FEATURES_FILE)
+    assert online_features.HourlyRingBuffer.load(path, SPEC) is None
+    buffer = online_features.HourlyRingBuffer(SPEC)
+    buffer.ingest(make_data(500))
+    buffer.save(path)
+    loaded = online_features.HourlyRingBuffer.load(path, SPEC)
+    date_time = pd.Timestamp("2023-01-20 05:00")
+    assert np.array_equal(loaded.feature_vector(date_time), buffer.feature_vector(date_time), equal_nan=True)
+    assert loaded.latest == buffer.latest
+    # a snapshot of other columns or another capacity is not used
+    assert online_features.HourlyRingBuffer.load(path, time_series_features.DEFAULT_SPEC) is None
+    assert online_features.HourlyRingBuffer.load(path, SPEC, capacity=1000) is None
+
+def test_invalid_specifications():
+    with pytest.raises(ValueError):
+        online_features.HourlyRingBuffer(dict(SPEC, rolling={"mean_day": ("mean", 24)}))
+    with pytest.raises(ValueError):
+        online_features.HourlyRingBuffer(SPEC, capacity=100)
@@ -0,0 +1,25 @@
+import pytest
+from air_pred.benchmarks.fake_rowstore import FakeRowstoreServer
+from air_pred.utils import open_data
+
+ROWS = [{"date": "2023-10-09", "time": f"{i % 24:02d}:00+01:00", "femman_pm25": str(i)} for i in range(250)]
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_fetch_rowstore_keeps_order(max_workers):
+    with FakeRowstoreServer(ROWS, max_limit=30) as server:
+        df = open_data.fetch_rowstore(server.url, page_size=100, max_workers=max_workers)
+    assert df.femman_pm25.tolist() == [row["femman_pm25"] for row in ROWS]
+
+def test_fetch_rowstore_retries_failed_page():
+    with FakeRowstoreServer(ROWS, failures={100: 2}) as server:
+        df = open_data.fetch_rowstore(server.url, max_retries=2, backoff=0)
+    assert len(df) == len(ROWS)
+
+def test_fetch_rowstore_resumes_from_checkpoint():
+    with FakeRowstoreServer(ROWS, failures={200: 2}) as server:
+        with pytest.raises(open_data.PageFetchError) as error:
+            open_data.fetch_rowstore(server.url, max_retries=1, backoff=0)
+        server.requested_offsets.clear()
+        df = open_data.fetch_rowstore(server.url, backoff=0, checkpoint=error.value.checkpoint)
+    assert server.requested_offsets == [200]
+    assert df.femman_pm25.tolist() == [row["femman_pm25"] for row in ROWS]
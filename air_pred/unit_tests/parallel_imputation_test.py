@@ -0,0 +1,41 @@
+import pytest
+from air_pred.utils import data_preprocessing, parallel_imputation
+import pandas as pd
+import numpy as np
+
+def make_df(n_rows=300):
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=n_rows)
+    df = pd.DataFrame({"femman_pm25": base + rng.normal(scale=0.1, size=n_rows), "femman_no2": 2 * base,
+                       "lejonet_no2": -base, "lejonet_temp": rng.normal(size=n_rows)})
+    df = df.mask(rng.random(df.shape) < 0.1)
+    df["date_time"] = pd.date_range("2023-01-01 01:00", periods=n_rows, freq="H")
+    return df
+
+@pytest.mark.parametrize("n_rows, n_blocks, overlap", [(100, 4, 10), (7, 3, 0), (5, 8, 2)])
+def test_time_blocks_cover_all_rows_once(n_rows, n_blocks, overlap):
+    blocks = parallel_imputation.time_blocks(n_rows, n_blocks, overlap)
+    cores = np.concatenate([np.arange(core_start, core_stop) for _, _, core_start, core_stop in blocks])
+    assert cores.tolist() == list(range(n_rows))
+    assert all(0 <= start <= core_start and core_stop <= stop <= n_rows for start, stop, core_start, core_stop in blocks)
+
+def test_station_groups():
+    assert parallel_imputation.station_groups(["femman_pm25", "lejonet_no2", "femman_no2"]) == [["femman_pm25", "femman_no2"], ["lejonet_no2"]]
+
+def test_single_block_equals_single_imputer():
+    df = make_df()
+    expected = data_preprocessing.clean_data_IterativeImputer(df, n_jobs=1)
+    result = parallel_imputation.impute_parallel(df.drop("date_time", axis=1), n_jobs=1, n_blocks=1)
+    assert np.allclose(result.values, expected.drop("date_time", axis=1).values)
+
+@pytest.mark.parametrize("split", ["time", "station"])
+def test_parallel_imputation(split):
+    df = make_df()
+    # a column without any value in a block is filled instead of being dropped
+    df.loc[:50, "lejonet_temp"] = np.nan
+    result = data_preprocessing.clean_data_IterativeImputer(df.sample(frac=1, random_state=0), n_jobs=2, split=split, overlap=20)
+    assert result.isna().sum().sum() == 0
+    assert list(result.columns) == list(df.columns)
+    assert result.date_time.is_monotonic_increasing
+    observed = df.set_index("date_time").notna()
+    assert np.allclose(result.set_index("date_time")[observed].fillna(0).values, df.set_index("date_time")[observed].fillna(0).values)
@@ -0,0 +1,62 @@
+import base64
+import importlib.util
+import os
+import threading
+import pytest
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+spec = importlib.util.spec_from_file_location("predictor", os.path.join(os.path.dirname(__file__), "..", "..", "predictor.py"))
+predictor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(predictor)
+
+@pytest.fixture
+def model():
+    rng = np.random.default_rng(0)
+    return LinearRegression().fit(rng.random((50, 3)), rng.random(50))
+
+def test_columnar_inputs_match_lists(model):
+    features = np.arange(12, dtype=np.float32).reshape(4, 3)
+    predict = predictor.Predict(model, max_batch_size=1)
+    columnar = {"dtype": "float32", "shape": [4, 3], "data": base64.b64encode(features.tobytes()).decode()}
+    assert np.allclose(predict.predict(columnar), predict.predict(features.tolist()))
+
+def test_raw_bytes_inputs(model):
+    features = np.arange(12, dtype=np.float32).reshape(4, 3)
+    predict = predictor.Predict(model, max_batch_size=1)
+    assert np.allclose(predict.predict(features.tobytes()), predict.predict(features.tolist()))
+    with pytest.raises(ValueError):
+        predict.predict(features.tobytes()[:-4])
+
+    class NoFeatureCount(object):
+        def predict(self, features):
+            return features.sum(axis=1)
+    with pytest.raises(ValueError, match="columnar payload"):
+        predictor.Predict(NoFeatureCount(), max_batch_size=1).predict(features.tobytes())
+
+def test_invalid_number_of_features(model):
+    with pytest.raises(ValueError):
+        predictor.Predict(model, max_batch_size=1).predict([[1.0, 2.0]])
+
+def test_micro_batched_requests(model):
+    predict = predictor.Predict(model, max_batch_size=8, max_batch_delay=0.01)
+    inputs = [[[float(i), float(i + 1), float(i + 2)]] for i in range(20)]
+    results = [None] * len(inputs)
+
+    def send(i):
+        results[i] = predict.predict(inputs[i])
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert np.allclose(np.concatenate(results), model.predict(np.concatenate(inputs)))
+
+def test_find_model_artifact(tmp_path):
+    (tmp_path / "air_quality_estimation_model.pkl").write_bytes(b"")
+    assert predictor.find_model_artifact(str(tmp_path)).endswith("air_quality_estimation_model.pkl")
+    (tmp_path / "air_quality_time_series_model.pkl").write_bytes(b"")
+    with pytest.raises(FileNotFoundError):
+        predictor.find_model_artifact(str(tmp_path))
+    assert predictor.find_model_artifact(str(tmp_path), "air_quality_time_series_model").endswith("air_quality_time_series_model.pkl")
@@ -0,0 +1,103 @@
+import types
+import numpy as np
+import pandas as pd
+from air_pred.benchmarks import synthetic_data
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.utils import data_preprocessing, feature_store, row_hashes, time_series_features
+
+def make_rows(n_rows, start="2023-01-01 01:00"):
+    date_time = pd.date_range(start, periods=n_rows, freq="H")
+    return pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                         "femman_pm25": np.arange(n_rows, dtype=float), "femman_temp": np.full(n_rows, np.nan)})
+
+def test_hash_rows_depends_on_values_not_column_order():
+    df = make_rows(50)
+    hours, hashes = row_hashes.hash_rows(df)
+    assert hours.dtype == np.int64 and hashes.dtype == np.uint64 and len(np.unique(hashes)) == 50
+    assert np.array_equal(row_hashes.hash_rows(df[df.columns[::-1]])[1], hashes)
+    changed = df.copy()
+    changed.loc[3, "femman_temp"] = 1.0
+    assert np.flatnonzero(row_hashes.hash_rows(changed)[1] != hashes).tolist() == [3]
+    assert np.array_equal(row_hashes.hash_rows(changed, exclude=["femman_temp"])[1], row_hashes.hash_rows(df, exclude=["femman_temp"])[1])
+
+def test_changed_rows_and_store(tmp_path):
+    store = row_hashes.RowHashStore()
+    df = make_rows(100)
+    changed, hours, hashes, counts = row_hashes.changed_rows(df, store)
+    assert len(changed) == 100 and counts == {"new": 100, "modified": 0, "skipped": 0}
+    store.update(hours, hashes)
+
+    # the next call returns the same window shifted by a day with one corrected value
+    df = make_rows(124).iloc[24:].copy()
+    df.loc[30, "femman_pm25"] = -1.0
+    changed, hours, hashes, counts = row_hashes.changed_rows(df, store)
+    assert counts == {"new": 24, "modified": 1, "skipped": 75}
+    assert changed.date_time.tolist() == [df.date_time[30]] + df.date_time.iloc[-24:].tolist()
+    store.update(hours, hashes)
+    assert row_hashes.changed_rows(df, store)[3] == {"new": 0, "modified": 0, "skipped": 100}
+
+    path = str(tmp_path / "hashes.npz")
+    store.save(path)
+    loaded = row_hashes.RowHashStore.load(path)
+    assert np.array_equal(loaded.hours, store.hours) and np.array_equal(loaded.hashes, store.hashes)
+    assert len(row_hashes.RowHashStore.load(str(tmp_path / "missing.npz"))) == 0
+
+    # hours older than the retention are dropped
+    short = row_hashes.RowHashStore(retention_hours=48)
+    short.update(store.hours, store.hashes)
+    assert len(short) == 48
+
+def test_duplicate_hours_compare_the_last_row():
+    df = make_rows(10)
+    store = row_hashes.RowHashStore()
+    store.update(*row_hashes.hash_rows(df))
+    duplicated = pd.concat([df.iloc[[4]].assign(femman_pm25=-1.0), df])
+    changed, _, _, counts = row_hashes.changed_rows(duplicated, store)
+    assert len(changed) == 0 and counts["skipped"] == 11
+
+def test_dependent_hours():
+    assert time_series_features.dependent_hours([10, 11]).tolist() == [10, 11, 34, 35, 178, 179]
+    spec = {"columns": ["femman_pm25"], "lags": {}, "rolling": {"mean_3h": ("mean", 3)}}
+    assert time_series_features.dependent_hours([10], spec).tolist() == [10, 11, 12, 13]
+
+def test_update_feature_groups_writes_only_changed_rows(tmp_path, monkeypatch):
+    from air_pred.pipeline import online_feature_pipeline
+    monkeypatch.chdir(tmp_path)
+    api_df = synthetic_data.generate_station_data(600 / synthetic_data.HOURS_PER_YEAR, start="2023-01-01 01:00")
+    api_df.columns = api_df.columns.str.lower().str.strip()
+    schema = data_preprocessing.create_date_time_feature(api_df.copy())
+    raw = FakeFeatureGroup("air_quality_data", data=schema.iloc[:0])
+    clean = FakeFeatureGroup("cleaned_air_quality_data", data=schema.iloc[:0])
+    ts = FakeFeatureGroup("time_series_air_quality_data", primary_key=["date_time_str"],
+                          data=pd.DataFrame({"date_time": schema.date_time, "date_time_str": schema.date_time_str, "femman_pm25": 0.0,
+                                             "prev_day": 0.0, "prev_week": 0.0}).iloc[:0])
+    groups = {fg.name: fg for fg in (raw, clean, ts)}
+    imputer = data_preprocessing.fit_iterative_imputer(schema, features=clean.features)
+    window = {"df": api_df.iloc[:400]}
+    dataset_api = types.SimpleNamespace(download=lambda *args, **kwargs: 1 / 0, upload=lambda *args, **kwargs: None)
+    monkeypatch.setattr(feature_store, "get_feature_store", lambda: types.SimpleNamespace(get_feature_group=lambda name, version: groups[name]))
+    monkeypatch.setattr(feature_store, "get_project", lambda: types.SimpleNamespace(get_dataset_api=lambda: dataset_api))
+    monkeypatch.setattr(online_feature_pipeline, "get_weekly_data", lambda: window["df"].copy())
+    monkeypatch.setattr(online_feature_pipeline, "get_imputer", lambda *args: imputer)
+
+    assert online_feature_pipeline.update_feature_groups() == {"new": 400, "modified": 0, "skipped": 0}
+    assert raw.inserted_rows == 400 and ts.inserted_rows == len(ts.data) > 0
+    # rows quarantined by the validation of the cleaned data are sent again by the next run
+    quarantined = 400 - clean.inserted_rows
+
+    # an unchanged window writes nothing
+    assert online_feature_pipeline.update_feature_groups() == {"new": quarantined, "modified": 0, "skipped": 400 - quarantined}
+    assert raw.inserted_rows == 400 + quarantined
+
+    # the window moves by 24 hours and one older value is corrected by the source
+    window["df"] = api_df.iloc[24:424].copy()
+    window["df"].loc[200, "femman_pm25"] = 99.0
+    raw_rows, ts_rows = raw.inserted_rows, ts.inserted_rows
+    counts = online_feature_pipeline.update_feature_groups()
+    assert counts["new"] >= 24 and counts["modified"] == 1 and counts["new"] + counts["skipped"] == 399
+    assert raw.inserted_rows - raw_rows == counts["new"] + 1
+    assert clean.data.set_index("date_time_str").femman_pm25[schema.date_time_str[200]] == 99.0
+    # the features of the corrected hour, the day and the week after it and of the new hours
+    written = ts.data.set_index("date_time_str")
+    assert written.prev_day[schema.date_time_str[224]] == 99.0 and written.prev_week[schema.date_time_str[368]] == 99.0
+    assert ts.inserted_rows - ts_rows == 3 + 24
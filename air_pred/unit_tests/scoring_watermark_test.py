@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.pipeline import online_inference_pipeline
+from air_pred.utils import batch_scoring, feature_store, scoring_watermark
+
+def make_data(n_rows, start="2023-01-01 00:00"):
+    rng = np.random.default_rng(0)
+    date_time = pd.date_range(start, periods=n_rows, freq="H")
+    df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                       "lejonet_no2": rng.random(n_rows), "femman_no2": rng.random(n_rows)})
+    return df.assign(femman_pm25=2 * df.lejonet_no2 - df.femman_no2)
+
+def test_find_rows_to_score():
+    data = make_data(10)
+    predicted = data[["date_time", "femman_pm25"]].iloc[:6].drop(index=2)
+    data.loc[4, "femman_pm25"] += 1
+    rows = scoring_watermark.find_rows_to_score(data, predicted, data.date_time[6])
+    assert rows.reason.tolist() == ["late", "updated", "late", "new", "new", "new"]
+    assert rows.date_time.tolist() == data.date_time[[2, 4, 6, 7, 8, 9]].tolist()
+
+def test_watermarks_are_stored_per_model_version(tmp_path):
+    path = str(tmp_path / "state" / scoring_watermark.WATERMARK_FILE)
+    assert scoring_watermark.load_watermarks(path) == {}
+    scoring_watermark.save_watermark(path, scoring_watermark.watermark_key("model", 1), "2023-01-01 05:00")
+    scoring_watermark.save_watermark(path, scoring_watermark.watermark_key("model", 2), "2023-01-02 05:00")
+    assert scoring_watermark.load_watermarks(path) == {"model_1": pd.Timestamp("2023-01-01 05:00"), "model_2": pd.Timestamp("2023-01-02 05:00")}
+    with open(path, "w") as watermark_file:
+        watermark_file.write("{")
+    assert scoring_watermark.load_watermarks(path) == {}
+
+class FakeFeatureView(object):
+    def __init__(self, fg):
+        self.fg = fg
+
+    def init_serving(self, training_dataset_version):
+        pass
+
+    def get_batch_data(self, start_time=None, end_time=None, read_options=None):
+        df = self.fg.data
+        return df[df.date_time >= start_time - pd.Timedelta(hours=5)].drop("femman_pm25", axis=1)
+
+class SumModel(object):
+    def predict(self, inputs):
+        return 2 * inputs[:, 0] - inputs[:, 1]
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    data_fg = FakeFeatureGroup("cleaned_air_quality_data", data=make_data(200))
+    prediction_fg = FakeFeatureGroup("predicted_air_quality_regression",
+                                     data=pd.DataFrame(columns=["date_time_str", "femman_pm25", "date_time", "predicted_femman_pm25"]))
+    deployment = batch_scoring.LocalDeployment(SumModel())
+    deployment.model_name, deployment.model_version = "air_quality_estimation_model", 1
+    groups = {data_fg.name: data_fg, prediction_fg.name: prediction_fg}
+    fs = type("FakeFeatureStore", (), {"get_feature_view": lambda self, name, version: FakeFeatureView(data_fg),
+                                       "get_feature_group": lambda self, name, version: groups[name]})()
+    dataset_api = type("FakeDatasetApi", (), {"download": lambda self, *args, **kwargs: None, "upload": lambda self, *args, **kwargs: None})()
+    serving = type("FakeModelServing", (), {"get_deployment": lambda self, name: deployment})()
+    project = type("FakeProject", (), {"get_dataset_api": lambda self: dataset_api, "get_model_serving": lambda self: serving})()
+    monkeypatch.setattr(feature_store, "get_feature_store", lambda: fs)
+    monkeypatch.setattr(feature_store, "get_project", lambda: project)
+    monkeypatch.setattr(online_inference_pipeline, "WATERMARK_PATH", str(tmp_path / scoring_watermark.WATERMARK_FILE))
+    return data_fg, prediction_fg
+
+def test_update_predictions_reads_after_watermark(stores):
+    data_fg, prediction_fg = stores
+    assert len(online_inference_pipeline.update_predictions()) == 200
+    assert np.allclose(prediction_fg.data.predicted_femman_pm25, prediction_fg.data.femman_pm25)
+    assert online_inference_pipeline.update_predictions() is None
+
+    # ten new rows, a late row inside the window and an updated label
+    new = make_data(10, start="2023-01-09 08:00")
+    data_fg.data = pd.concat([data_fg.data.drop(index=195), new], ignore_index=True)
+    data_fg.insert(make_data(200).iloc[[195]])
+    prediction_fg.data = prediction_fg.data[prediction_fg.data.date_time != data_fg.data.date_time[195]]
+    data_fg.data.loc[190, "femman_pm25"] += 1
+    data_fg.rows_read = 0
+
+    scored = online_inference_pipeline.update_predictions()
+    assert len(scored) == 12
+    # only the late row window and the new rows are read
+    assert data_fg.rows_read <= 72 + 1 + 10
+    assert prediction_fg.data.date_time.nunique() == 210
+    assert np.isclose(prediction_fg.data.set_index("date_time").femman_pm25[data_fg.data.date_time[190]], data_fg.data.femman_pm25[190])
+    watermarks = scoring_watermark.load_watermarks(online_inference_pipeline.WATERMARK_PATH)
+    assert watermarks == {"air_quality_estimation_model_1": new.date_time.iloc[-1]}
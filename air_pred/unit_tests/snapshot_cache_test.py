@@ -0,0 +1,97 @@
+import pandas as pd
+from air_pred.benchmarks.fake_feature_store import FakeFeatureGroup
+from air_pred.utils import snapshot_cache
+
+def hourly_frame(start, periods, value=0.0):
+    date_time = pd.date_range(start, periods=periods, freq="h")
+    return pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime('%Y-%m-%d %H:%M'), "femman_pm25": value})
+
+def test_warm_read_only_reads_new_rows(tmp_path):
+    fg = FakeFeatureGroup("cleaned_air_quality_data", 2, ["date_time_str"], hourly_frame("2023-01-01", 100))
+    cache = snapshot_cache.FeatureGroupCache(str(tmp_path))
+    assert len(cache.read(fg)) == 100
+
+    fg.insert(hourly_frame("2023-01-05 04:00", 10, value=1.0))
+    fg.rows_read = 0
+    df = cache.read(fg)
+    assert len(df) == 110
+    # the row at the high water mark is read again together with the new rows
+    assert fg.rows_read == 11
+    assert df.sort_values("date_time").equals(fg.data.sort_values("date_time"))
+
+def test_invalidate_and_eviction(tmp_path):
+    first_fg = FakeFeatureGroup("air_quality_data", 2, data=hourly_frame("2023-01-01", 1000))
+    second_fg = FakeFeatureGroup("time_series_air_quality_data", 2, data=hourly_frame("2023-01-01", 1000))
+    cache = snapshot_cache.FeatureGroupCache(str(tmp_path))
+    cache.read(first_fg)
+    cache.max_bytes = 1
+    cache.read(second_fg)
+    assert list(cache._load_index()) == ["time_series_air_quality_data_2"]
+
+    cache.invalidate(second_fg)
+    second_fg.rows_read = 0
+    cache.read(second_fg)
+    assert second_fg.rows_read == 1000
+
+def test_parts_are_compacted(tmp_path):
+    fg = FakeFeatureGroup("air_quality_data", 2, data=hourly_frame("2023-01-01", 50))
+    cache = snapshot_cache.FeatureGroupCache(str(tmp_path), max_parts=2)
+    cache.read(fg)
+    for i in range(3):
+        fg.insert(hourly_frame(fg.data.date_time.max() + pd.Timedelta(hours=1), 5, value=float(i)))
+        df = cache.read(fg)
+        assert df.sort_values("date_time").reset_index(drop=True).equals(fg.data.sort_values("date_time").reset_index(drop=True))
+    assert cache._load_index()["air_quality_data_2"]["parts"] <= 2
+
+def test_recorded_writes_of_older_rows_are_read_again(tmp_path):
+    fg = FakeFeatureGroup("air_quality_data", 2, data=hourly_frame("2023-01-01", 100))
+    cache = snapshot_cache.FeatureGroupCache(str(tmp_path))
+    cache.read(fg)
+    updated = hourly_frame("2023-01-01 01:00", 1, value=99.0)
+    fg.insert(updated)
+    cache.record_write(fg, updated)
+    df = cache.read(fg)
+    assert df.set_index("date_time").femman_pm25[updated.date_time[0]] == 99.0
+    assert df.sort_values("date_time").reset_index(drop=True).equals(fg.data.sort_values("date_time").reset_index(drop=True))
+    # the high water mark is back at the newest row
+    fg.rows_read = 0
+    cache.read(fg)
+    assert fg.rows_read == 1
+
+def test_concurrent_reads_keep_all_snapshots(tmp_path):
+    import threading
+    fgs = [FakeFeatureGroup(f"group_{i}", 1, data=hourly_frame("2023-01-01", 50), read_latency=0.01) for i in range(8)]
+    cache = snapshot_cache.FeatureGroupCache(str(tmp_path))
+    threads = [threading.Thread(target=cache.read, args=(fg,)) for fg in fgs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(cache._load_index()) == sorted(cache.key(fg) for fg in fgs)
+
+def test_feature_group_with_time_zone(tmp_path):
+    # the feature store returns date_time with a time zone, the pipelines write it without one
+    stored = hourly_frame("2023-01-01", 100)
+    stored["date_time"] = stored.date_time.dt.tz_localize("UTC")
+    fg = FakeFeatureGroup("air_quality_data", 2, data=stored)
+    cache = snapshot_cache.FeatureGroupCache(str(tmp_path))
+    assert cache.read(fg).date_time.dt.tz is None
+
+    updated = hourly_frame("2023-01-01 01:00", 1, value=99.0)
+    new = hourly_frame("2023-01-05 04:00", 10, value=1.0)
+    written = pd.concat([updated, new], ignore_index=True)
+    fg.insert(written.assign(date_time=written.date_time.dt.tz_localize("UTC")))
+    cache.record_write(fg, written)
+    df = cache.read(fg)
+    assert df.date_time.dt.tz is None
+    assert df.set_index("date_time").femman_pm25[updated.date_time[0]] == 99.0
+    expected = fg.data.assign(date_time=fg.data.date_time.dt.tz_localize(None))
+    assert df.sort_values("date_time").reset_index(drop=True).equals(expected.sort_values("date_time").reset_index(drop=True))
+
+    # written rows with a different time zone are compared at the same instant
+    later = hourly_frame("2023-01-03 00:00", 1, value=7.0)
+    later["date_time"] = later.date_time.dt.tz_localize("UTC").dt.tz_convert("Europe/Stockholm")
+    fg.insert(later.assign(date_time=later.date_time.dt.tz_convert("UTC")))
+    cache.record_write(fg, later)
+    assert cache._load_index()["air_quality_data_2"]["high_water_mark"] == "2023-01-03T00:00:00"
+    assert cache.read(fg).set_index("date_time").femman_pm25[pd.Timestamp("2023-01-03")] == 7.0
@@ -0,0 +1,94 @@
+import pytest
+from air_pred.utils import data_preprocessing, streaming_backfill
+import pandas as pd
+import numpy as np
+
+def write_csv(path, n_hours=400):
+    rng = np.random.default_rng(0)
+    date_time = pd.date_range("2023-01-01 01:00", periods=n_hours, freq="H")
+    df = pd.DataFrame({"Date": date_time.strftime("%Y-%m-%d"), "Time": date_time.strftime("%H:%M") + "+01:00",
+                       "Femman_PM25": rng.normal(10, 2, n_hours), "Femman_NO2": rng.normal(20, 5, n_hours),
+                       "Femman_O3": np.nan})
+    # runs of missing values that cross chunk boundaries
+    df.loc[5:40, "Femman_PM25"] = np.nan
+    df.loc[90:130, "Femman_NO2"] = np.nan
+    df.loc[n_hours - 3:, "Femman_NO2"] = np.nan
+    df.to_csv(path, index=False)
+
+@pytest.mark.parametrize("chunksize", [7, 50, 1000])
+def test_streaming_backfill_matches_one_shot(tmp_path, chunksize):
+    path = str(tmp_path / "air_quality.csv")
+    write_csv(path)
+    initial_df = data_preprocessing.create_date_time_feature(data_preprocessing.read_raw_csv(path))
+    expected_clean = data_preprocessing.clean_data_baseline(initial_df).reset_index(drop=True)
+    expected_ts = data_preprocessing.get_time_series_features(expected_clean)
+
+    chunks = list(streaming_backfill.iter_backfill_chunks(path, chunksize))
+    assert pd.concat([raw for raw, _, _ in chunks], ignore_index=True).equals(initial_df)
+    assert pd.concat([clean for _, clean, _ in chunks], ignore_index=True).equals(expected_clean)
+    assert pd.concat([ts for _, _, ts in chunks]).equals(expected_ts)
+
+def test_streaming_backfill_iterative_matches_one_shot(tmp_path):
+    path = str(tmp_path / "air_quality.csv")
+    write_csv(path)
+    initial_df = data_preprocessing.create_date_time_feature(data_preprocessing.read_raw_csv(path))
+    expected_clean = data_preprocessing.clean_data_IterativeImputer(initial_df).reset_index(drop=True)
+
+    cleaned = pd.concat([clean for _, clean, _ in streaming_backfill.iter_backfill_chunks(path, 50, method="iterative")], ignore_index=True)
+    assert list(cleaned.columns) == list(expected_clean.columns)
+    assert cleaned.date_time.equals(expected_clean.date_time)
+    np.testing.assert_allclose(cleaned[["femman_pm25", "femman_no2"]].values, expected_clean[["femman_pm25", "femman_no2"]].values, atol=1e-9)
+
+def test_streaming_backfill_requires_ordered_csv(tmp_path):
+    path = str(tmp_path / "air_quality.csv")
+    write_csv(path)
+    df = pd.read_csv(path)
+    df.iloc[::-1].to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        list(streaming_backfill.iter_raw_chunks(path, 50))
+
+def test_streaming_imputer_is_fitted_on_a_bounded_sample(tmp_path, monkeypatch):
+    path = str(tmp_path / "air_quality.csv")
+    write_csv(path)
+    fitted = []
+    fit_iterative_imputer = data_preprocessing.fit_iterative_imputer
+    monkeypatch.setattr(data_preprocessing, "fit_iterative_imputer", lambda df: fitted.append(df) or fit_iterative_imputer(df))
+    streaming_backfill.fit_streaming_imputer(path, 50, ["femman_o3"], fit_rows=100)
+    assert len(fitted[0]) == 100
+    assert fitted[0].date_time.diff().dropna().eq(pd.Timedelta(hours=4)).all()
+
+@pytest.mark.parametrize("method", ["baseline", "iterative"])
+def test_default_streamed_inserts_match_one_shot_backfill(tmp_path, monkeypatch, method):
+    import types
+    from air_pred.pipeline import backfill_feature_pipeline
+    path = str(tmp_path / "air_quality.csv")
+    write_csv(path)
+    inserted = {}
+
+    def recorder(name):
+        return types.SimpleNamespace(name=name, insert=lambda df, **kwargs: inserted.setdefault(name, []).append(df))
+    monkeypatch.setattr(backfill_feature_pipeline, "insert_validated", lambda fg, df, stage_name, rules: fg.insert(df))
+
+    def backfill(fill):
+        inserted.clear()
+        fill(fg_raw_data=recorder("raw"), clean_data_fg=recorder("clean"), ts_data_fg=recorder("ts"))
+        return {name: pd.concat(frames, ignore_index=True) for name, frames in inserted.items()}
+
+    # the one shot backfill with the defaults of backfill_air_quality_data
+    initial_df = data_preprocessing.create_date_time_feature(data_preprocessing.read_raw_csv(path))
+    if method == "baseline":
+        one_shot = backfill(lambda **fgs: backfill_feature_pipeline.create_and_fill_baseline_fg(initial_df=initial_df, **fgs))
+    else:
+        one_shot = backfill(lambda **fgs: backfill_feature_pipeline.create_and_fill_iterative_imputer_fg(initial_df=initial_df, use_previous_data=False, **fgs))
+    streamed = backfill(lambda **fgs: backfill_feature_pipeline.stream_and_fill_fg(path, chunksize=50, method=method, **fgs))
+
+    assert streamed["raw"].equals(one_shot["raw"])
+    for name in ("clean", "ts"):
+        assert list(streamed[name].columns) == list(one_shot[name].columns)
+        assert streamed[name].date_time.equals(one_shot[name].date_time)
+        assert (streamed[name].dtypes == one_shot[name].dtypes).all()
+        values = [column for column in one_shot[name].columns if one_shot[name][column].dtype.kind == "f"]
+        if method == "baseline":
+            assert streamed[name][values].equals(one_shot[name][values])
+        else:
+            np.testing.assert_allclose(streamed[name][values].values, one_shot[name][values].values, atol=1e-9)
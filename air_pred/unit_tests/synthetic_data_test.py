@@ -0,0 +1,23 @@
+import pytest
+from air_pred.utils import data_preprocessing
+from air_pred.benchmarks import synthetic_data
+import pandas as pd
+import numpy as np
+
+def test_synthetic_data_is_shaped_like_the_archive(tmp_path):
+    path = str(tmp_path / "air_quality.csv")
+    synthetic_data.write_station_csv(path, 1)
+    raw = data_preprocessing.read_raw_csv(path)
+    assert list(raw.columns) == ["Date", "Time"] + [profile[0] for profile in synthetic_data.COLUMN_PROFILES]
+    assert raw.Time.str.endswith("+01:00").all()
+    assert (raw.Time == "24:00+01:00").sum() == 365
+
+    df = data_preprocessing.create_date_time_feature(raw)
+    assert (df.date_time.diff().dropna() == pd.Timedelta(hours=1)).all()
+    # femman_o3 is missing in more than half of the rows like in the archive and is dropped
+    assert "femman_o3" not in data_preprocessing.remove_nan_features(df).columns
+
+@pytest.mark.parametrize("fraction, mean_run", [(0.0, 0.0), (0.01, 1.2), (0.265, 938.5), (0.722, 5121.0)])
+def test_missing_mask_fraction(fraction, mean_run):
+    mask = synthetic_data.missing_mask(8760, fraction, mean_run, np.random.default_rng(0))
+    assert mask.sum() == pytest.approx(8760 * fraction, abs=0.002 * 8760)
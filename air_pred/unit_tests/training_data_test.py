@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from air_pred.utils import training_data
+
+class FakeFeatureView(object):
+    """Returns the split in random order with the date time columns, like get_train_test_split"""
+
+    def __init__(self, n_rows=300, seed=0):
+        self.name = "air_qaulity_baseline_fv"
+        self.version = 2
+        self.reads = 0
+        rng = np.random.default_rng(seed)
+        date_time = pd.date_range("2023-01-01 01:00", periods=n_rows, freq="H")
+        df = pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                           "lejonet_no2": rng.random(n_rows), "femman_temp": rng.normal(0, 10, n_rows)})
+        df["femman_pm25"] = 2 * df.lejonet_no2 + rng.random(n_rows)
+        self.df = df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    def get_train_test_split(self, training_dataset_version):
+        self.reads += 1
+        train, test = self.df.iloc[:200], self.df.iloc[200:]
+        return (train.drop("femman_pm25", axis=1), test.drop("femman_pm25", axis=1), train[["femman_pm25"]], test[["femman_pm25"]])
+
+def test_split_is_typed_ordered_and_projected(tmp_path):
+    fv = FakeFeatureView()
+    trainX, _, trainY, _ = fv.get_train_test_split(1)
+    path = str(tmp_path / "train.parquet")
+    training_data.write_split(path, trainX, trainY)
+    assert pq.read_schema(path).names == ["lejonet_no2", "femman_temp", "femman_pm25", "date_time"]
+
+    X, y = training_data.read_split(path)
+    expected = trainX.assign(femman_pm25=trainY.femman_pm25).sort_values("date_time")
+    assert list(X.columns) == ["lejonet_no2", "femman_temp"] and list(y.columns) == ["femman_pm25"]
+    assert (X.dtypes == np.float32).all() and (y.dtypes == np.float32).all()
+    assert np.allclose(X.to_numpy(), expected[["lejonet_no2", "femman_temp"]].to_numpy(), rtol=1e-6)
+    assert np.allclose(y.femman_pm25, expected.femman_pm25, rtol=1e-6)
+    assert list(training_data.read_split(path, ["femman_temp"])[0].columns) == ["femman_temp"]
+
+def test_load_train_test_split_reads_the_feature_store_once(tmp_path):
+    fv = FakeFeatureView()
+    trainX, testX, trainY, testY = training_data.load_train_test_split(fv, 1, directory=str(tmp_path))
+    assert (len(trainX), len(testX), len(trainY), len(testY)) == (200, 100, 200, 100)
+    assert "date_time" not in trainX.columns and "date_time_str" not in testX.columns
+    again = training_data.load_train_test_split(fv, 1, directory=str(tmp_path))
+    assert fv.reads == 1
+    assert all(np.array_equal(first.to_numpy(), second.to_numpy()) for first, second in zip((trainX, testX, trainY, testY), again))
+    # another version of the training dataset is read again
+    training_data.load_train_test_split(fv, 2, directory=str(tmp_path))
+    assert fv.reads == 2
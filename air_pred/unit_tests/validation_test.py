@@ -0,0 +1,114 @@
+import os
+import types
+import numpy as np
+import pandas as pd
+import pytest
+from air_pred.utils import validation
+
+class Feature(object):
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+
+class SuiteFeatureGroup(object):
+    """Feature group that only stores its expectation suite"""
+    def __init__(self, name, features):
+        self.name = name
+        self.version = 1
+        self.features = features
+        self.suite = None
+        self.saves = 0
+
+    def get_expectation_suite(self):
+        return self.suite
+
+    def save_expectation_suite(self, suite, run_validation, validation_ingestion_policy):
+        self.suite = suite
+        self.saves += 1
+
+def make_data(n_rows):
+    rng = np.random.default_rng(0)
+    date_time = pd.date_range("2023-01-01 01:00", periods=n_rows, freq="H")
+    return pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                         "femman_temp": rng.uniform(-5, 25, n_rows), "femman_rh": rng.uniform(20, 100, n_rows),
+                         "femman_pm25": rng.uniform(0, 50, n_rows)})
+
+SCHEMA = {"date_time": "timestamp", "date_time_str": "string", "femman_temp": "double", "femman_rh": "double", "femman_pm25": "double"}
+
+def test_valid_frame_passes():
+    df = make_data(500)
+    report, flags = validation.validate(df, schema=SCHEMA)
+    assert report["failed_rows"] == 0 and report["checks"] == {} and report["schema"] == []
+    assert report["unordered_rows"] == 0 and report["missing_hours"] == 0
+    assert not flags.any()
+
+def test_row_checks():
+    df = make_data(100)
+    df.loc[3, "femman_temp"] = 80.0
+    df.loc[5, "femman_rh"] = -1.0
+    df.loc[7, "femman_pm25"] = np.nan
+    df.loc[9, "date_time"] = df.loc[10, "date_time"]
+    df.loc[20, "date_time"] = df.loc[20, "date_time"] + pd.Timedelta(minutes=30)
+    report, flags = validation.validate(df)
+    assert report["checks"] == {"range:femman_temp": 1, "range:femman_rh": 1, "null:femman_pm25": 1, "duplicate_key": 1, "off_hour": 1}
+    assert report["failed_rows"] == 5
+    # of duplicate keys the last row is kept
+    assert list(np.flatnonzero(flags)) == [3, 5, 7, 9, 20]
+    assert list(validation.describe_flags(flags[[3, 7, 9, 20, 0]])) == ["range", "null", "duplicate_key", "off_hour", ""]
+
+def test_null_rate_and_unmatched_columns():
+    df = make_data(100).assign(other=1.0)
+    df.loc[:4, "femman_pm25"] = np.nan
+    rules = dict(validation.DEFAULT_RULES, max_null_rate={"femman_pm25": 0.1})
+    report, flags = validation.validate(df, rules)
+    # within the allowed null rate and columns without a range are not checked
+    assert report["failed_rows"] == 0
+    report, flags = validation.validate(df, dict(rules, max_null_rate={"femman_pm25": 0.01}))
+    assert report["checks"] == {"null:femman_pm25": 5}
+
+def test_order_and_gaps_are_reported():
+    df = make_data(100).drop(index=[10, 11, 12])
+    df = pd.concat([df.iloc[50:], df.iloc[:50]])
+    report, flags = validation.validate(df)
+    assert report["failed_rows"] == 0
+    assert report["missing_hours"] == 3
+    assert report["unordered_rows"] == 50
+
+def test_schema_errors():
+    df = make_data(10).drop(columns="femman_rh").assign(extra=1.0, femman_pm25="1")
+    report, _ = validation.validate(df, schema=SCHEMA)
+    assert sorted(report["schema"]) == ["column femman_pm25 has dtype object, expected double", "missing column femman_rh", "unexpected column extra"]
+    with pytest.raises(validation.ValidationError):
+        validation.enforce(df, "cleaned_air_quality_data", schema=SCHEMA, policy="quarantine")
+
+def test_enforce_policies(tmp_path):
+    df = make_data(50)
+    df.loc[[2, 4], "femman_temp"] = 99.0
+    valid = validation.enforce(df, "cleaned_air_quality_data", policy="quarantine", quarantine_dir=str(tmp_path))
+    assert len(valid) == 48 and 99.0 not in valid.femman_temp.values
+    files = os.listdir(tmp_path)
+    assert len(files) == 1
+    quarantined = pd.read_parquet(tmp_path / files[0])
+    assert list(quarantined.validation_errors) == ["range", "range"]
+    with pytest.raises(validation.ValidationError) as error:
+        validation.enforce(df, "cleaned_air_quality_data", policy="reject")
+    assert error.value.report["checks"] == {"range:femman_temp": 2}
+    assert validation.enforce(df, "cleaned_air_quality_data", policy="off") is df
+
+def test_expectation_suite_is_only_saved_when_rules_change(monkeypatch):
+    # the exported suite only needs the fingerprint in its meta, great_expectations is not needed
+    monkeypatch.setattr(validation, "to_expectation_suite",
+                        lambda rules, columns, name: types.SimpleNamespace(meta={"rules_fingerprint": validation.rules_fingerprint(rules, columns)}))
+    monkeypatch.setattr(validation, "_synced_suites", set())
+    fg = SuiteFeatureGroup("cleaned_air_quality_data", [Feature(name, type) for name, type in SCHEMA.items()])
+    assert validation.sync_expectation_suite(fg)
+    monkeypatch.setattr(validation, "_synced_suites", set())
+    assert not validation.sync_expectation_suite(fg)
+    rules = dict(validation.DEFAULT_RULES, ranges={"*_temp": (-60.0, 60.0)})
+    assert validation.sync_expectation_suite(fg, rules)
+    assert fg.saves == 2
+
+def test_fingerprint():
+    columns = list(SCHEMA)
+    assert validation.rules_fingerprint(validation.DEFAULT_RULES, columns) == validation.rules_fingerprint(dict(validation.DEFAULT_RULES), columns[::-1])
+    assert validation.rules_fingerprint(validation.DEFAULT_RULES, columns) != validation.rules_fingerprint(validation.DEFAULT_RULES, columns[:-1])
@@ -0,0 +1,163 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from air_pred.utils import instrumentation
+
+class LocalDeployment(object):
+    """Local stand-in for a hopsworks deployment that serves a model with the same predict interface,
+        used to run and test the scoring client offline"""
+
+    def __init__(self, model, latency : float = 0.0):
+        """
+        Parameters
+        ----------
+        model : object
+            fitted model with a predict function, for example the LinearRegression stored in the model registry
+        latency : float
+            seconds every request waits before answering, simulates the network round trip of the model serving
+        """
+        self.model = model
+        self.latency = latency
+
+    def predict(self, inputs):
+        """ Serves a prediction request like predictor.Predict behind a deployment"""
+        if self.latency:
+            time.sleep(self.latency)
+        return {"predictions": self.model.predict(np.asarray(inputs)).tolist()}
+
+def predict_with_retry(deployment, inputs : list, max_retries : int = 3, backoff : float = 0.5) -> np.ndarray:
+    """Function that sends one prediction request and retries it with exponential backoff when it fails
+    Parameters
+    ----------
+    deployment : hsml.deployment.Deployment
+        deployment or LocalDeployment the request is sent to
+    inputs : list
+        feature rows of the request
+    max_retries : int
+        number of times a failed request is retried before the error is raised
+    backoff : float
+        seconds waited before the first retry, doubled for every further retry
+
+    Returns
+    -------
+    np.ndarray
+        predictions with one entry per input row
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            predictions = np.asarray(deployment.predict(inputs=inputs)["predictions"])
+            if len(predictions) != len(inputs):
+                raise ValueError(f"Expected {len(inputs)} predictions but got {len(predictions)}")
+            return predictions
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+@instrumentation.instrument(rows_arg=1)
+def predict_in_batches(deployment, features, batch_size : int = 100, max_in_flight : int = 4, max_retries : int = 3, backoff : float = 0.5) -> np.ndarray:
+    """Function that scores feature rows with a deployment by sending chunks of rows per request and 
+        keeping several requests in flight at once. Predictions are returned in the order of the input rows
+    Parameters
+    ----------
+    deployment : hsml.deployment.Deployment
+        deployment or LocalDeployment the requests are sent to
+    features : list
+        feature rows to be scored, as list of lists or 2d numpy array
+    batch_size : int
+        maximum number of rows sent in a single request
+    max_in_flight : int
+        maximum number of requests that are sent concurrently
+    max_retries : int
+        number of times a failed request is retried before the error is raised
+    backoff : float
+        seconds waited before the first retry of a request, doubled for every further retry
+
+    Returns
+    -------
+    np.ndarray
+        predictions with one entry per feature row
+    """
+    features = np.asarray(features).tolist()
+    if len(features) == 0:
+        return np.empty(0)
+
+    batches = [features[start:start + batch_size] for start in range(0, len(features), batch_size)]
+    if max_in_flight <= 1 or len(batches) == 1:
+        return np.concatenate([predict_with_retry(deployment, batch, max_retries, backoff) for batch in batches])
+
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(batches))) as executor:
+        # map keeps the order of the batches independent of the order in which the requests finish
+        predictions = list(executor.map(lambda batch: predict_with_retry(deployment, batch, max_retries, backoff), batches))
+    return np.concatenate(predictions)
+
+def time_chunks(start : pd.Timestamp, end : pd.Timestamp, chunk : pd.Timedelta) -> list:
+    """Function that splits the time range from start to end into consecutive chunks
+    Parameters
+    ----------
+    start : pd.Timestamp
+        first date_time of the range
+    end : pd.Timestamp
+        end of the range, not included
+    chunk : pd.Timedelta
+        length of every chunk
+
+    Returns
+    -------
+    list
+        tuples (chunk_start, chunk_end) of the chunks, a chunk holds the rows with chunk_start <= date_time < chunk_end
+    """
+    chunk = pd.Timedelta(chunk)
+    if chunk <= pd.Timedelta(0):
+        raise ValueError(f"Chunk length has to be positive but is {chunk}")
+    starts = pd.date_range(start, end, freq=chunk, inclusive="left")
+    return [(chunk_start, min(chunk_start + chunk, end)) for chunk_start in starts]
+
+def score_in_chunks(chunks : list, read_chunk, predict, insert, max_pending_inserts : int = 1) -> dict:
+    """Function that reads, predicts and inserts time ranged chunks one after the other. The insert of a chunk runs in a background
+        thread while the next chunks are read and predicted, so that only the chunks being processed or inserted are held in memory
+    Parameters
+    ----------
+    chunks : list
+        tuples (chunk_start, chunk_end) returned by time_chunks
+    read_chunk : function
+        read_chunk(chunk_start, chunk_end) returns the rows of the chunk as a pd.DataFrame
+    predict : function
+        predict(df) returns the rows to be inserted for the rows of a chunk
+    insert : function
+        insert(df) stores the predicted rows of a chunk
+    max_pending_inserts : int
+        number of inserts that can run while the next chunk is processed, reading waits once there are more
+
+    Returns
+    -------
+    dict
+        number of chunks and of rows that were read and inserted
+    """
+    counts = {"chunks": 0, "rows_read": 0, "rows_inserted": 0}
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            for chunk_start, chunk_end in chunks:
+                with instrumentation.stage("score_chunk") as stage:
+                    df = read_chunk(chunk_start, chunk_end)
+                    stage.set_rows(rows_in=len(df))
+                    counts["chunks"] += 1
+                    counts["rows_read"] += len(df)
+                    if len(df) == 0:
+                        continue
+                    predicted = predict(df)
+                    del df
+                    stage.set_rows(rows_out=len(predicted))
+                while len(pending) >= max_pending_inserts:
+                    pending.popleft().result()
+                pending.append(executor.submit(insert, predicted))
+                counts["rows_inserted"] += len(predicted)
+                del predicted
+        finally:
+            # errors of inserts are raised here, also when reading or predicting a chunk failed
+            while pending:
+                pending.popleft().result()
+    return counts
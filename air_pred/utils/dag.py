@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import joblib
+from air_pred.utils import instrumentation
+
+# Outputs of the stages of every workflow, the last output of every stage is kept together with the fingerprint of its inputs
+WORKFLOW_CACHE_DIR = os.environ.get("AIR_PRED_WORKFLOW_CACHE_DIR", "./.air_pred_cache/workflows")
+# Number of stages run at the same time, the stages mostly wait for the feature store so they run in threads
+WORKFLOW_MAX_WORKERS = int(os.environ.get("AIR_PRED_WORKFLOW_MAX_WORKERS", 4))
+
+class Stage(object):
+    """One step of a workflow. The stage is called with the outputs of its inputs in the given order and its output is cached
+        under a fingerprint of the outputs of its inputs, of the value returned by fingerprint and of version. A stage whose
+        fingerprint did not change since its last successful run is not run again and its stored output is used instead"""
+
+    def __init__(self, name : str, func, inputs : list = (), fingerprint = None, cache : bool = True, version : str = "1"):
+        """
+        Parameters
+        ----------
+        name : str
+            name of the stage, unique in the workflow
+        func : callable
+            called with the outputs of the inputs, returns the output of the stage which has to be picklable
+        inputs : list
+            names of the stages whose outputs the stage takes
+        fingerprint : callable
+            called without arguments before the stage runs, returns a string describing state the stage reads that is not
+            an input, for example the version of a model. Is None if the stage only depends on its inputs
+        cache : bool
+            if set false the stage runs every time, for stages that read from outside like an API
+        version : str
+            changed to invalidate the cached outputs of the stage when its code changes
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.fingerprint = fingerprint
+        self.cache = cache
+        self.version = version
+
+class WorkflowError(RuntimeError):
+    """Raised when stages of a workflow failed, results holds the status of every stage"""
+
+    def __init__(self, message : str, results : dict):
+        super().__init__(message)
+        self.results = results
+
+class Workflow(object):
+    """Stages and their dependencies, run in dependency order with independent stages running at the same time.
+        The stored outputs let a rerun skip every stage whose inputs did not change, and a run after a failure continues
+        at the failed stage since the stages before it are found in the cache"""
+
+    def __init__(self, name : str, stages : list, cache_dir : str = WORKFLOW_CACHE_DIR, max_workers : int = WORKFLOW_MAX_WORKERS):
+        """
+        Parameters
+        ----------
+        name : str
+            name of the workflow, the outputs are stored in a directory of this name
+        stages : list
+            Stage objects
+        cache_dir : str
+            directory the outputs of all workflows are stored in
+        max_workers : int
+            number of stages run at the same time
+        """
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError(f"Stage names of workflow {name} are not unique")
+        self.directory = os.path.join(cache_dir, name)
+        self.max_workers = max_workers
+        self.index_path = os.path.join(self.directory, "index.json")
+        self._lock = threading.Lock()
+        self.order()
+
+    def order(self) -> list:
+        """Function that returns the stage names in an order where every stage comes after its inputs
+        Raises
+        ------
+        ValueError
+            if an input is not a stage of the workflow or the stages depend on each other in a cycle
+        """
+        for stage in self.stages.values():
+            missing = [name for name in stage.inputs if name not in self.stages]
+            if missing:
+                raise ValueError(f"Inputs {missing} of stage {stage.name} are not stages of workflow {self.name}")
+        order, done = [], set()
+        while len(order) < len(self.stages):
+            ready = [name for name, stage in self.stages.items() if name not in done and all(input in done for input in stage.inputs)]
+            if not ready:
+                raise ValueError(f"Stages {sorted(set(self.stages) - done)} of workflow {self.name} depend on each other in a cycle")
+            order += ready
+            done.update(ready)
+        return order
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index : dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path + ".tmp", "w") as index_file:
+            json.dump(index, index_file, indent=2)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def _output_path(self, name : str) -> str:
+        return os.path.join(self.directory, f"{name}.pkl")
+
+    def _key(self, stage : Stage, input_hashes : list) -> str:
+        external = stage.fingerprint() if stage.fingerprint is not None else None
+        content = json.dumps([stage.name, stage.version, external, input_hashes])
+        return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+    def _store(self, name : str, key : str, output) -> str:
+        """Writes the output of a stage and returns the hash of its content, dependents are keyed by it"""
+        output_hash = joblib.hash(output)
+        path = self._output_path(name)
+        os.makedirs(self.directory, exist_ok=True)
+        joblib.dump(output, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            index = self._load_index()
+            index.setdefault("stages", {})[name] = {"key": key, "output_hash": output_hash, "finished": time.time()}
+            self._save_index(index)
+        return output_hash
+
+    def _cached(self, name : str, key : str, index : dict) -> dict:
+        entry = index.get("stages", {}).get(name)
+        if entry is None or entry["key"] != key or not os.path.exists(self._output_path(name)):
+            return None
+        return entry
+
+    def run(self, targets : list = None, resume : bool = False, force : list = ()) -> dict:
+        """Function that runs the stages needed for targets, stages whose fingerprint matches their stored output are skipped
+        Parameters
+        ----------
+        targets : list
+            stages to be run together with the stages they depend on, all stages if None
+        resume : bool
+            if set true and the last run failed, the stored outputs of stages that are not cached, like reading an API,
+            are used again so that the run continues with the same data as the failed one
+        force : list
+            stages that are run even if their output is stored
+
+        Returns
+        -------
+        dict
+            stage name -> status (ran, cached or resumed), seconds and the key of the output
+
+        Raises
+        ------
+        WorkflowError
+            if a stage failed, the stages after it are not run and the stages that do not depend on it are finished
+        """
+        needed = set()
+        pending_targets = list(self.stages) if targets is None else list(targets)
+        while pending_targets:
+            name = pending_targets.pop()
+            if name not in needed:
+                needed.add(name)
+                pending_targets += self.stages[name].inputs
+        order = [name for name in self.order() if name in needed]
+
+        index = self._load_index()
+        resuming = resume and index.get("status") == "failed"
+        with self._lock:
+            index["status"] = "running"
+            index["started"] = time.time()
+            self._save_index(index)
+
+        results, output_hashes, outputs, failed = {}, {}, {}, {}
+        # the stages run in worker threads, their records get the stage the workflow was run in as parent
+        parent = instrumentation.current_stage()
+
+        def output(name):
+            # cached outputs are only loaded when a stage after them runs
+            if name not in outputs:
+                outputs[name] = joblib.load(self._output_path(name))
+            return outputs[name]
+
+        def run_stage(stage, key):
+            start = time.perf_counter()
+            with instrumentation.stage(f"{self.name}.{stage.name}", parent=parent):
+                result = stage.func(*[output(name) for name in stage.inputs])
+            outputs[stage.name] = result
+            output_hashes[stage.name] = self._store(stage.name, key, result)
+            return {"status": "ran", "seconds": time.perf_counter() - start, "key": key}
+
+        def ready(name):
+            return name not in results and name not in failed and all(input in results for input in self.stages[name].inputs)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while True:
+                for name in order:
+                    if name in running.values() or not ready(name):
+                        continue
+                    stage = self.stages[name]
+                    try:
+                        key = self._key(stage, [output_hashes[input] for input in stage.inputs])
+                    except Exception as error:
+                        failed[name] = error
+                        continue
+                    entry, status = None, "cached"
+                    if name in force:
+                        pass
+                    elif stage.cache:
+                        entry = self._cached(name, key, index)
+                    elif resuming and os.path.exists(self._output_path(name)):
+                        entry, status = index.get("stages", {}).get(name), "resumed"
+                    if entry is not None:
+                        output_hashes[name] = entry["output_hash"]
+                        results[name] = {"status": status, "seconds": 0.0, "key": entry["key"]}
+                        print(f"{self.name}: {name} {status}")
+                        continue
+                    running[executor.submit(run_stage, stage, key)] = name
+                # stages that became ready through cached outputs are scheduled before waiting
+                if any(ready(name) and name not in running.values() for name in order):
+                    continue
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        print(f"{self.name}: {name} ran in {results[name]['seconds']:.1f}s")
+                    except Exception as error:
+                        failed[name] = error
+                        print(f"{self.name}: {name} failed with {type(error).__name__}: {error}")
+
+        with self._lock:
+            index = self._load_index()
+            index["status"] = "failed" if failed else "succeeded"
+            self._save_index(index)
+        if failed:
+            skipped = [name for name in order if name not in results and name not in failed]
+            for name, error in failed.items():
+                results[name] = {"status": "failed", "error": f"{type(error).__name__}: {error}"}
+            raise WorkflowError(f"Stages {list(failed)} of workflow {self.name} failed, {skipped} were not run", results) from next(iter(failed.values()))
+        return results
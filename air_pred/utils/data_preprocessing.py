@@ -1,8 +1,16 @@
+from __future__ import annotations
+import typing
 import pandas as pd
+import numpy as np
 import datetime as dt
-from hsfs.feature import Feature
-from sklearn.experimental import enable_iterative_imputer
-from sklearn.impute import IterativeImputer
+from air_pred.utils import time_series_features, parallel_imputation, instrumentation
+
+# sklearn is only imported when an imputer is created, importing it takes longer than the rest of the module
+if typing.TYPE_CHECKING:
+    from sklearn.impute import IterativeImputer
+
+# columns identifying the hour of a row that are not used as features
+DATE_TIME_COLUMNS = ["date_time", "date_time_str"]
 
 def convert_to_datetime(date_str : str):
     """Function used to convert a column into data time that contains time value 24:00 to datetime format of pandas
@@ -26,7 +34,85 @@ def convert_to_datetime(date_str : str):
     return pd.to_datetime(date_str, format='%Y-%m-%d %H:%M') + \
            dt.timedelta(days=1)
 
-def create_date_time_feature(input_df : pd.DataFrame) -> pd.DataFrame:
+def convert_to_datetime_column(date_str : pd.Series) -> pd.Series:
+    """Vectorized version of convert_to_datetime that converts a whole column of date time strings in one pass.
+        Strings can optionally carry a utc offset suffix (for example "+01:00") which is ignored.
+        The fixed width characters are read as bytes so that the date, hour and minute are parsed with numpy,
+        hour value 24 then naturally rolls over to the next day. Columns that do not follow the fixed width format
+        fall back to pandas string parsing
+    Parameters
+    ----------
+    date_str : pd.Series
+        Series of date and time strings in the format %Y-%m-%d %H:%M
+
+    Returns
+    -------
+    pd.Series
+        Series of datetime64 values with the same index as the input
+    """
+    try:
+        raw = np.asarray(date_str.to_numpy(), dtype='S17')
+    except (UnicodeEncodeError, ValueError, TypeError):
+        raw = None
+
+    if raw is not None and len(raw):
+        chars = raw.view(np.uint8).reshape(len(raw), 17)
+        digits = chars.astype(np.int64) - ord('0')
+        digit_positions = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15]
+        year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+        month = digits[:, 5] * 10 + digits[:, 6]
+        day = digits[:, 8] * 10 + digits[:, 9]
+        hours = digits[:, 11] * 10 + digits[:, 12]
+        minutes = digits[:, 14] * 10 + digits[:, 15]
+        is_fixed_width = (digits[:, digit_positions] >= 0).all(axis=1) & (digits[:, digit_positions] <= 9).all(axis=1) & \
+                         (chars[:, 4] == ord('-')) & (chars[:, 7] == ord('-')) & \
+                         (chars[:, 10] == ord(' ')) & (chars[:, 13] == ord(':')) & \
+                         ((chars[:, 16] == 0) | (chars[:, 16] == ord('+'))) & \
+                         (month >= 1) & (month <= 12) & (hours <= 24) & (minutes <= 59)
+        if is_fixed_width.all():
+            month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]').astype('datetime64[D]')
+            next_month_start = ((year - 1970) * 12 + month).astype('datetime64[M]').astype('datetime64[D]')
+            if ((day >= 1) & (day <= (next_month_start - month_start).astype(np.int64))).all():
+                date_time = month_start.astype('datetime64[ns]') + \
+                            ((day - 1) * 24 * 60 + hours * 60 + minutes).astype('timedelta64[m]')
+                return pd.Series(date_time, index=date_str.index)
+
+    # slower path for values that are not fixed width, same logic as convert_to_datetime
+    date_str = date_str.str.split('+', n=1).str[0]
+    is_hour_24 = date_str.str[11:13] == '24'
+    date_str = date_str.where(~is_hour_24, date_str.str[0:11] + '00' + date_str.str[13:])
+    return pd.to_datetime(date_str, format='%Y-%m-%d %H:%M') + \
+           pd.to_timedelta(is_hour_24.astype('int64'), unit='D')
+
+def naive_date_time(date_time : pd.Series) -> pd.Series:
+    """Function that converts date_time read from the feature store to datetime without time zone"""
+    date_time = pd.to_datetime(date_time)
+    return date_time.dt.tz_localize(None) if date_time.dt.tz is not None else date_time
+
+@instrumentation.instrument()
+def read_raw_csv(path : str, lean : bool = False) -> pd.DataFrame:
+    """Function that reads a historical csv file with seperate date and time columns like air_quality_2023.csv
+
+    Parameters
+    ----------
+    path : str
+        path of the csv file
+    lean : bool
+        if set true all sensor columns are read as float32 instead of float64
+
+    Returns
+    -------
+    pd.Dataframe
+        dataframe with the columns of the csv file
+    """
+    if not lean:
+        return pd.read_csv(path, skipinitialspace = True)
+    columns = pd.read_csv(path, skipinitialspace = True, nrows=0).columns
+    dtypes = {column: np.float32 for column in columns if column.lower().strip() not in ['date', 'time']}
+    return pd.read_csv(path, skipinitialspace = True, dtype=dtypes)
+
+@instrumentation.instrument()
+def create_date_time_feature(input_df : pd.DataFrame, keep_date_time_str : bool = True) -> pd.DataFrame:
     """Function that takes in a dataframe that contains seperate colums for date, time 
         and returns a dataframe with a single column for date and time having the correct pandas Datatime format.
 
@@ -34,6 +120,8 @@ def create_date_time_feature(input_df : pd.DataFrame) -> pd.DataFrame:
     ----------
     input_df : pd.DataFrame
         input dataframe that contains the time and date in seperate columns
+    keep_date_time_str : bool
+        if set false the date_time_str column is not created, it can be added with add_date_time_str before inserting
 
     Returns
     -------
@@ -41,10 +129,88 @@ def create_date_time_feature(input_df : pd.DataFrame) -> pd.DataFrame:
         converted dataframe that contains the date and time in a single columns with correct format
     """
     input_df.columns = input_df.columns.str.lower().str.strip()
-    input_df['date_time_str'] = input_df['date'] +' ' + input_df['time'].str.split('+', expand=True)[0]
-    input_df['date_time'] =  input_df['date_time_str'].apply(convert_to_datetime)
+    if not keep_date_time_str:
+        date_time = convert_to_datetime_column(input_df['date'] + ' ' + input_df['time'])
+        return input_df.drop(['date', 'time'], axis =1).assign(date_time=date_time)
+    input_df['date_time_str'] = input_df['date'] +' ' + input_df['time'].str.split('+', n=1).str[0]
+    input_df['date_time'] =  convert_to_datetime_column(input_df['date_time_str'])
     return input_df.drop(['date', 'time'], axis =1)
 
+def add_date_time_str(df : pd.DataFrame) -> pd.DataFrame:
+    """Function that derives the date_time_str column from date_time in the format of the open data portal,
+        where midnight is written as 24:00 of the previous day
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time
+
+    Returns
+    -------
+    pd.Dataframe
+        dataframe with the date_time_str column added
+    """
+    midnight = df.date_time.dt.hour.eq(0) & df.date_time.dt.minute.eq(0)
+    date_time_str = df.date_time.dt.strftime('%Y-%m-%d %H:%M')
+    previous_day = (df.date_time - dt.timedelta(days=1)).dt.strftime('%Y-%m-%d') + ' 24:00'
+    return df.assign(date_time_str=date_time_str.where(~midnight, previous_day))
+
+def to_insert_frame(df : pd.DataFrame) -> pd.DataFrame:
+    """Function that converts a dataframe created in lean mode to the schema of the feature groups, float32 columns
+        are converted to float64 and date_time_str is added if it is missing. Dataframes already matching are returned as is
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time
+
+    Returns
+    -------
+    pd.Dataframe
+        dataframe that can be inserted into the feature groups
+    """
+    float32_columns = df.columns[df.dtypes == np.float32]
+    if len(float32_columns):
+        df = df.astype({column: np.float64 for column in float32_columns})
+    if 'date_time_str' not in df.columns:
+        df = add_date_time_str(df)
+    return df
+
+def to_lean_frame(df : pd.DataFrame) -> pd.DataFrame:
+    """Function that converts float64 columns to float32 and drops date_time_str, the inverse of to_insert_frame
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time
+
+    Returns
+    -------
+    pd.Dataframe
+        dataframe using about half the memory for the sensor columns
+    """
+    float64_columns = df.columns[df.dtypes == np.float64]
+    return df.drop(columns=['date_time_str'], errors='ignore').astype({column: np.float32 for column in float64_columns})
+
+def select_features(df : pd.DataFrame, features : list) -> pd.DataFrame:
+    """Function that selects the columns of a feature group schema from a dataframe. 
+        date_time_str is skipped if the dataframe was created without it in lean mode
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        input dataframe
+    features : list
+        List of Feature object of the feature group schema
+
+    Returns
+    -------
+    pd.Dataframe
+        dataframe with the columns of the schema
+    """
+    colums = [feature.name for feature in features if feature.name != 'date_time_str' or 'date_time_str' in df.columns]
+    return df[colums]
+
 def remove_nan_features(df : pd.DataFrame) -> pd.DataFrame:
     """Function to identify features that have more than 50% of nan values and remove them from dataframe
 
@@ -61,6 +227,7 @@ def remove_nan_features(df : pd.DataFrame) -> pd.DataFrame:
     noisy_features = df.columns[df.isna().sum()/len(df) * 100 > 50].tolist()
     return df.drop(noisy_features, axis=1)
 
+@instrumentation.instrument()
 def clean_data_baseline(df: pd.DataFrame, features : list = None ) -> pd.DataFrame:
     """Function to clean dataframe of nan data a simple interplotation stratagy.
 
@@ -79,11 +246,40 @@ def clean_data_baseline(df: pd.DataFrame, features : list = None ) -> pd.DataFra
     if features is None:
         df = remove_nan_features(df)
     else:
-        colums = [feature.name for feature in features]
-        df = df[colums]
+        df = select_features(df, features)
     return df.sort_values('date_time').interpolate()
 
-def clean_data_IterativeImputer(df: pd.DataFrame, features : list = None ) -> pd.DataFrame:
+@instrumentation.instrument()
+def fit_iterative_imputer(df: pd.DataFrame, features : list = None ) -> IterativeImputer:
+    """Function that fits the IterativeImputer used by clean_data_IterativeImputer without transforming the data, 
+        so that the fitted imputer can be stored and reused for newly arrived rows
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe with the raw data the imputer is fitted on, usually a bounded look back window of history
+    features : List of Feature object 
+        List of features objects that contains features that must be present in returned dataframe. 
+        Is None if a new feature groups is being created and no current schema exists
+    Returns
+    -------
+    IterativeImputer
+        imputer fitted on all columns except date_time and date_time_str
+    """
+    if features is None:
+        df = remove_nan_features(df)
+    else:
+        df = select_features(df, features)
+
+    from sklearn.experimental import enable_iterative_imputer
+    from sklearn.impute import IterativeImputer
+    imputer = IterativeImputer(max_iter=10, random_state=0)
+    imputer.fit(df.drop(DATE_TIME_COLUMNS, axis=1, errors='ignore'))
+    return imputer
+
+@instrumentation.instrument()
+def clean_data_IterativeImputer(df: pd.DataFrame, features : list = None, imputer : IterativeImputer = None, n_jobs : int = None,
+                                split : str = None, overlap : int = None) -> pd.DataFrame:
     """Function to clean dataframe of nan data using IterativeImputer for multi variate feature imputation
 
     Parameters
@@ -92,43 +288,78 @@ def clean_data_IterativeImputer(df: pd.DataFrame, features : list = None ) -> pd
         input dataframe that contains the time and date in seperate columns
     list : List of Feature object 
         List of features objects that contains features that must be present in returned dataframe. 
-        Is None if a new feature groups is being created and no current schema exists
+        Is None if a new feature groups is being created and no current schema exists, 
+        the columns the imputer was fitted on are then used when an imputer is given
+    imputer : IterativeImputer
+        Already fitted imputer from fit_iterative_imputer. If given only the rows of df are transformed and nothing is refitted,
+        so the run time depends on the number of rows in df and not on the history the imputer was fitted on.
+        Is None to fit a new imputer on df
+    n_jobs : int
+        number of processes a new imputer is fitted with, -1 for all cores. With more than one process the data is split
+        and imputed by independent imputers, see parallel_imputation.impute_parallel. Is None to use IMPUTATION_N_JOBS
+    split : str
+        time or station, how the data is split when n_jobs is larger than one. Is None to use IMPUTATION_SPLIT
+    overlap : int
+        number of rows added before and after every time block. Is None to use IMPUTATION_OVERLAP
     Returns
     -------
     pd.Dataframe
         converted dataframe that does not contain features with nan data
     """
-    if features is None:
+    if features is None and imputer is not None:
+        df = df[list(imputer.feature_names_in_) + [column for column in DATE_TIME_COLUMNS if column in df.columns]]
+    elif features is None:
         df = remove_nan_features(df)
     else:
-        colums = [feature.name for feature in features]
-        df = df[colums]
+        df = select_features(df, features)
 
-    imputer = IterativeImputer(max_iter=10, random_state=0)
-
-    date_time = df.date_time
-    date_time_str = df.date_time_str
-    df = df.drop(["date_time", "date_time_str"], axis=1)
+    date_time_columns = [column for column in DATE_TIME_COLUMNS if column in df.columns]
+    date_time_df = df[date_time_columns]
+    df = df.drop(date_time_columns, axis=1)
 
-    df[:] = imputer.fit_transform(df)
+    n_jobs = parallel_imputation.resolve_n_jobs(parallel_imputation.IMPUTATION_N_JOBS if n_jobs is None else n_jobs)
+    if imputer is None and n_jobs > 1:
+        # time blocks have to be consecutive hours
+        df = parallel_imputation.impute_parallel(df.iloc[np.argsort(date_time_df['date_time'].to_numpy(), kind='stable')], n_jobs=n_jobs,
+                                                 split=parallel_imputation.IMPUTATION_SPLIT if split is None else split,
+                                                 overlap=parallel_imputation.IMPUTATION_OVERLAP if overlap is None else overlap)
+    elif imputer is None:
+        from sklearn.experimental import enable_iterative_imputer
+        from sklearn.impute import IterativeImputer
+        imputer = IterativeImputer(max_iter=10, random_state=0)
+        df[:] = imputer.fit_transform(df)
+    else:
+        df[:] = imputer.transform(df)
 
-    df['date_time'] = date_time
-    df['date_time_str'] = date_time_str
+    for column in date_time_columns:
+        df[column] = date_time_df[column]
     
     return df.sort_values('date_time')
 
-def get_time_series_features(df):
-    tsdf = df[['date_time','date_time_str','femman_pm25']].sort_values("date_time")
-    tsdf = tsdf.set_index('date_time', drop=False)
-    tsdf["prev_day"] = tsdf.femman_pm25.shift(periods=24)
-    tsdf["prev_week"] = tsdf.femman_pm25.shift(periods=168)
-    tsdf = tsdf.dropna()
-    return tsdf
+@instrumentation.instrument()
+def get_time_series_features(df, spec : dict = time_series_features.DEFAULT_SPEC, history : pd.DataFrame = None):
+    """Function that creates the features of the time series model, by default the value of femman_pm25 a day and a week earlier.
+        See time_series_features.create_features
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time, date_time_str and the columns of the specification
+    spec : dict
+        feature specification, see time_series_features.DEFAULT_SPEC
+    history : pd.DataFrame
+        rows before df only used to create the features of df, None if df contains the complete history
+
+    Returns
+    -------
+    pd.Dataframe
+        dataframe with the time series features, rows where a feature could not be created are dropped
+    """
+    return time_series_features.create_features(df, spec, history=history)
 
 
-def set_feature_type(df, feature_name, feature_type):
+def set_feature_type(df, feature_name, feature_type, lean : bool = False):
     if feature_type == "double":
-        return df[feature_name].astype(float)
+        return df[feature_name].astype(np.float32 if lean else float)
     elif feature_type == "bigint":
         return df[feature_name].astype(int)
     else:
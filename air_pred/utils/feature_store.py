@@ -0,0 +1,71 @@
+from __future__ import annotations
+import typing
+import datetime
+import pandas as pd
+from air_pred.utils import instrumentation
+
+if typing.TYPE_CHECKING:
+    import hsfs
+
+# Clients are created on first use and shared by everything running in the process, so importing a pipeline
+# does not log in and a run logs in at most once
+_project = None
+_feature_store = None
+_model_registry = None
+
+def get_project():
+    """Function that logs in to hopsworks on the first call and returns the same project afterwards"""
+    global _project
+    if _project is None:
+        import hopsworks
+        with instrumentation.stage("hopsworks_login"):
+            _project = hopsworks.login()
+    return _project
+
+def get_feature_store():
+    """Function that returns the feature store of the project, created on the first call"""
+    global _feature_store
+    if _feature_store is None:
+        _feature_store = get_project().get_feature_store()
+    return _feature_store
+
+def get_model_registry():
+    """Function that returns the model registry of the project, created on the first call"""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = get_project().get_model_registry()
+    return _model_registry
+
+@instrumentation.instrument()
+def read_feature_group(fg : hsfs.feature_group.FeatureGroup, start_time : datetime.datetime = None, end_time : datetime.datetime = None) -> pd.DataFrame:
+    """Function that reads a feature group, optionally only the rows with date_time in [start_time, end_time), 
+        falling back to hive when the default read fails
+    Parameters
+    ----------
+    fg : hsfs.feature_group.FeatureGroup
+        feature group with an event time column named date_time
+    start_time : datetime.datetime
+        first date_time to be read, None to read from the first row
+    end_time : datetime.datetime
+        date_time at which reading stops (exclusive), None to read up to the last row
+
+    Returns
+    -------
+    pd.DataFrame
+        rows read from the feature group
+    """
+    if start_time is None and end_time is None:
+        try:
+            return fg.read()
+        except:
+            return fg.read(read_options={"use_hive":True})
+
+    query = fg.select_all()
+    if start_time is not None:
+        query = query.filter(fg.date_time >= start_time)
+    if end_time is not None:
+        query = query.filter(fg.date_time < end_time)
+    try:
+        return query.read()
+    except:
+        return query.read(read_options={"use_hive":True})
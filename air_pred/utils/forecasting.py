@@ -0,0 +1,79 @@
+import os
+import copy
+import numpy as np
+import pandas as pd
+from air_pred.utils import online_features
+
+# Forecast settings, direct only uses observed values and is limited to the smallest lag of the features,
+# recursive feeds the forecasts of earlier hours back as values of the forecasted column and has no limit
+FORECAST_HORIZON = int(os.environ.get("AIR_PRED_FORECAST_HORIZON", 24))
+FORECAST_STRATEGY = os.environ.get("AIR_PRED_FORECAST_STRATEGY", "direct")
+STRATEGIES = ("direct", "recursive")
+
+def max_direct_horizon(buffer : online_features.HourlyRingBuffer) -> int:
+    """Function that returns the largest horizon whose lag features are all observed, the smallest lag of the specification"""
+    return int(buffer.lags.min()) if len(buffer.lags) else np.iinfo(np.int32).max
+
+def forecast_hours(origin, horizon : int) -> pd.DatetimeIndex:
+    """Function that returns the horizon hours after origin"""
+    return pd.date_range(pd.Timestamp(origin) + pd.Timedelta(hours=1), periods=horizon, freq="H")
+
+def _predict_hours(buffer : online_features.HourlyRingBuffer, model, date_times : pd.DatetimeIndex) -> pd.Series:
+    """Predicts the hours whose features are complete in one call of the model"""
+    features = buffer.feature_frame(date_times)[buffer.feature_names].dropna()
+    if len(features) == 0:
+        return pd.Series(dtype=float)
+    return pd.Series(np.asarray(model.predict(features), dtype=float).reshape(len(features)), index=features.index)
+
+def forecast(buffer : online_features.HourlyRingBuffer, model, horizon : int = FORECAST_HORIZON, strategy : str = FORECAST_STRATEGY,
+             origin = None, target : str = "femman_pm25") -> pd.DataFrame:
+    """Function that forecasts the horizon hours after origin from the lag features in the ring buffer. The features of all
+        hours are read from the buffer at once and predicted with one call of the model. The recursive strategy predicts
+        blocks of max_direct_horizon hours, the forecasts of a block are written to a copy of the buffer and are the lags
+        of the next block
+    Parameters
+    ----------
+    buffer : online_features.HourlyRingBuffer
+        buffer with the observed values up to origin, it is not changed
+    model : object
+        fitted model with a predict method that takes the features of buffer.feature_names
+    horizon : int
+        number of hours forecasted
+    strategy : str
+        direct or recursive
+    origin : datetime.datetime
+        last observed hour, the most recent hour in the buffer if None
+    target : str
+        column the model predicts, the only column of the buffer for the recursive strategy
+
+    Returns
+    -------
+    pd.DataFrame
+        date_time, date_time_str, origin_date_time, horizon and predicted_<target> of every forecasted hour ordered by horizon.
+        Hours whose features could not be created from the buffer, for example because observed hours are missing, are left out
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown forecast strategy {strategy}, expected one of {STRATEGIES}")
+    step = max_direct_horizon(buffer)
+    if strategy == "direct" and horizon > step:
+        raise ValueError(f"The direct strategy can forecast up to {step} hours with lags of at least {step} hours, use the recursive strategy")
+    if strategy == "recursive" and buffer.columns != [target]:
+        raise ValueError(f"The recursive strategy needs a buffer with only the column {target}, got {buffer.columns}")
+
+    origin = pd.Timestamp(origin) if origin is not None else pd.Timestamp(buffer.latest * online_features._NS_PER_HOUR)
+    date_times = forecast_hours(origin, horizon)
+    if strategy == "direct":
+        predictions = _predict_hours(buffer, model, date_times)
+    else:
+        buffer = copy.deepcopy(buffer)
+        predictions = []
+        for start in range(0, horizon, step):
+            block = _predict_hours(buffer, model, date_times[start:start + step])
+            buffer.ingest(pd.DataFrame({"date_time": block.index, target: block.to_numpy()}))
+            predictions.append(block)
+        predictions = pd.concat(predictions)
+
+    date_time = pd.DatetimeIndex(predictions.index)
+    return pd.DataFrame({"date_time": date_time, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M"),
+                         "origin_date_time": origin, "horizon": ((date_time - origin) // pd.Timedelta(hours=1)).astype(np.int64),
+                         f"predicted_{target}": predictions.to_numpy()})
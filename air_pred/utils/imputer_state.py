@@ -0,0 +1,52 @@
+import os
+import datetime
+import joblib
+import pandas as pd
+
+IMPUTER_STATE_FILE = "iterative_imputer.pkl"
+
+def save_imputer_state(imputer, fitted_until : datetime.datetime, path : str):
+    """Function that stores a fitted IterativeImputer together with the columns and the last date_time it was fitted on
+    Parameters
+    ----------
+    imputer : IterativeImputer
+        imputer fitted with data_preprocessing.fit_iterative_imputer
+    fitted_until : datetime.datetime
+        date_time of the most recent row that was used to fit the imputer
+    path : str
+        file the state is written to
+    """
+    state = {"imputer": imputer,
+             "columns": list(imputer.feature_names_in_),
+             "fitted_until": pd.Timestamp(fitted_until)}
+    joblib.dump(state, path)
+
+def load_imputer_state(path : str, columns : list, latest_date_time : datetime.datetime, refit_interval : datetime.timedelta):
+    """Function that loads a stored imputer if it can still be used to impute newly arrived rows
+    Parameters
+    ----------
+    path : str
+        file the state was written to by save_imputer_state
+    columns : list
+        names of the columns that are going to be imputed, in order
+    latest_date_time : datetime.datetime
+        date_time of the most recent newly arrived row
+    refit_interval : datetime.timedelta
+        the imputer is considered stale when the new rows are more than refit_interval newer than the data it was fitted on
+
+    Returns
+    -------
+    IterativeImputer
+        the stored imputer or None if no usable state exists and the imputer has to be refitted
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        state = joblib.load(path)
+    except Exception:
+        return None
+    if state["columns"] != list(columns):
+        return None
+    if pd.Timestamp(latest_date_time) - state["fitted_until"] > refit_interval:
+        return None
+    return state["imputer"]
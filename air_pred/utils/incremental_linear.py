@@ -0,0 +1,239 @@
+import os
+import numpy as np
+import pandas as pd
+from air_pred.utils import online_features
+
+INCREMENTAL_STATE_FILE = "incremental_{model_name}.npz"
+# rows are accumulated in blocks of BLOCK_HOURS so that blocks leaving the window can be removed without reading their rows again
+BLOCK_HOURS = 168
+
+class IncrementalLinearRegression(object):
+    """Ordinary least squares fitted from sufficient statistics. Every block of block_hours keeps the Gram matrix of its rows
+        with an intercept column, X'y, the sum of y^2 and the number of rows. The features are expected to be scaled already,
+        the feature view applies the scaler of its training dataset.
+        Adding rows only updates the statistics of their blocks and the coefficients are solved from the sum of the blocks in
+        the window, so the cost of an update depends on the new rows and the number of features and not on the length of
+        the history. Blocks older than window_hours are dropped and older blocks can be down weighted with halflife_hours"""
+
+    def __init__(self, feature_names : list, window_hours : int = None, halflife_hours : float = None, block_hours : int = BLOCK_HOURS):
+        """
+        Parameters
+        ----------
+        feature_names : list
+            names of the features in the order of the columns of X
+        window_hours : int
+            hours of rows before the most recent row the model is fitted on, all rows if None
+        halflife_hours : float
+            age in hours after which the rows of a block count half, all blocks count the same if None
+        block_hours : int
+            hours of rows accumulated per block, the window moves in steps of this length
+        """
+        self.feature_names = list(feature_names)
+        self.n_features = n_features = len(self.feature_names)
+        self.window_hours = window_hours
+        self.halflife_hours = halflife_hours
+        self.block_hours = block_hours
+        size = n_features + 1
+        self.blocks = np.zeros(0, dtype=np.int64)
+        self.gram = np.zeros((0, size, size))
+        self.xty = np.zeros((0, size))
+        self.yty = np.zeros(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+        # hour of the most recent row that was added, rows up to it are ignored by partial_fit
+        self.fitted_until = -1
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.counts.sum())
+
+    def partial_fit(self, X, y, date_time) -> int:
+        """Function that adds the statistics of rows after fitted_until to their blocks and drops the blocks that left the window
+        Parameters
+        ----------
+        X : np.ndarray
+            features of the rows
+        y : np.ndarray
+            labels of the rows
+        date_time : pd.Series
+            date_time of the rows
+
+        Returns
+        -------
+        int
+            number of rows that were added, rows up to fitted_until were already added and are skipped
+        """
+        hours = online_features.to_hours(date_time)
+        new = hours > self.fitted_until
+        X = np.asarray(X, dtype=np.float64)[new]
+        y = np.asarray(y, dtype=np.float64).reshape(-1)[new]
+        hours = hours[new]
+        if len(hours) == 0:
+            return 0
+        augmented = np.column_stack([np.ones(len(X)), X])
+        row_blocks = hours // self.block_hours
+        for block in np.unique(row_blocks):
+            rows = row_blocks == block
+            index = self._block_index(int(block))
+            self.gram[index] += augmented[rows].T @ augmented[rows]
+            self.xty[index] += augmented[rows].T @ y[rows]
+            self.yty[index] += y[rows] @ y[rows]
+            self.counts[index] += int(rows.sum())
+        self.fitted_until = max(self.fitted_until, int(hours.max()))
+        self._drop_old_blocks()
+        return len(hours)
+
+    def _block_index(self, block : int) -> int:
+        found = np.flatnonzero(self.blocks == block)
+        if len(found):
+            return int(found[0])
+        size = self.n_features + 1
+        self.blocks = np.append(self.blocks, block)
+        self.gram = np.concatenate([self.gram, np.zeros((1, size, size))])
+        self.xty = np.concatenate([self.xty, np.zeros((1, size))])
+        self.yty = np.append(self.yty, 0.0)
+        self.counts = np.append(self.counts, 0)
+        return len(self.blocks) - 1
+
+    def _drop_old_blocks(self):
+        if self.window_hours is None:
+            return
+        # a block is kept while any of its hours is within the window
+        keep = (self.blocks + 1) * self.block_hours > self.fitted_until - self.window_hours
+        for name in ("blocks", "gram", "xty", "yty", "counts"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def _weights(self) -> np.ndarray:
+        if self.halflife_hours is None:
+            return np.ones(len(self.blocks))
+        age = self.fitted_until // self.block_hours - self.blocks
+        return 0.5 ** (age * self.block_hours / self.halflife_hours)
+
+    def statistics(self) -> tuple:
+        """Function that returns the weighted sums of the Gram matrix, X'y and y^2 of the blocks in the window"""
+        weights = self._weights()
+        return np.tensordot(weights, self.gram, axes=1), weights @ self.xty, float(weights @ self.yty)
+
+    def solve(self) -> tuple:
+        """Function that solves the normal equations of the window. The equations are scaled by the diagonal of the Gram matrix
+            before they are solved, which keeps features of very different magnitude like air pressure and rain accurate
+        Returns
+        -------
+        tuple
+            (coef, intercept)
+        """
+        if self.n_rows == 0:
+            raise ValueError("No rows were added to the model")
+        gram, xty, _ = self.statistics()
+        return self._solve(gram, xty)
+
+    @staticmethod
+    def _solve(gram : np.ndarray, xty : np.ndarray) -> tuple:
+        scale = 1 / np.sqrt(np.where(np.diag(gram) > 0, np.diag(gram), 1.0))
+        scaled = gram * scale[:, None] * scale[None, :]
+        try:
+            solution = np.linalg.solve(scaled, xty * scale)
+        except np.linalg.LinAlgError:
+            # collinear or constant features have no unique solution, a least squares solution is used
+            solution = np.linalg.lstsq(scaled, xty * scale, rcond=None)[0]
+        solution = solution * scale
+        return solution[1:], float(solution[0])
+
+    def holdout_mean_squared_error(self, X, y, date_time, tolerance : float = 1e-8) -> float:
+        """Function that returns the mean squared error on a test split of the coefficients solved without the test rows.
+            The test rows must have been added by partial_fit, their statistics are subtracted from their blocks so the error
+            is the one of a refit on the window without them, like the Test MSE of a model trained on the train split.
+            Test rows of blocks that left the window are only evaluated.
+            This is only exact if the test rows have the values they had when they were added, rows rewritten since, e.g. cleaned
+            rows re-imputed by the online feature pipeline, leave statistics of rows that no longer exist. Test rows whose removal
+            leaves a negative sum of squares in the statistics can not have been added and raise a ValueError
+        Parameters
+        ----------
+        X : np.ndarray
+            features of the test rows
+        y : np.ndarray
+            labels of the test rows
+        date_time : pd.Series
+            date_time of the test rows
+        tolerance : float
+            negative sums of squares up to this fraction of the sums of the window are accepted as rounding errors
+
+        Returns
+        -------
+        float
+            mean squared error on the test rows
+        """
+        if self.n_rows == 0:
+            raise ValueError("No rows were added to the model")
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(-1)
+        hours = online_features.to_hours(date_time)
+        # rows of blocks outside the window or after fitted_until were never added
+        positions = pd.Index(self.blocks).get_indexer(hours // self.block_hours)
+        weights = np.where((positions >= 0) & (hours <= self.fitted_until), self._weights()[positions], 0.0)
+        augmented = np.column_stack([np.ones(len(X)), X])
+        gram, xty, yty = self.statistics()
+        if self.n_rows - np.count_nonzero(weights) <= 0:
+            raise ValueError("No rows were added to the model besides the test rows")
+        train_gram = gram - (augmented * weights[:, None]).T @ augmented
+        train_yty = yty - (weights * y) @ y
+        if np.any(np.diag(train_gram) < -tolerance * np.diag(gram)) or train_yty < -tolerance * yty:
+            raise ValueError("The test rows differ from the rows added to the model")
+        coef, intercept = self._solve(train_gram, xty - (augmented * weights[:, None]).T @ y)
+        return float(np.mean((X @ coef + intercept - y) ** 2))
+
+    def mean_squared_error(self, coef : np.ndarray = None, intercept : float = None) -> float:
+        """Function that returns the mean squared error of the coefficients on the rows of the window, computed from
+            the statistics without the rows. The solved coefficients are used if coef is None"""
+        if coef is None:
+            coef, intercept = self.solve()
+        gram, xty, yty = self.statistics()
+        weights = self._weights()
+        beta = np.r_[intercept, coef]
+        return float((yty - 2 * beta @ xty + beta @ gram @ beta) / (weights @ self.counts))
+
+    def to_model(self):
+        """Function that returns a fitted sklearn LinearRegression with the solved coefficients, it can be pickled, registered
+            and served like a LinearRegression fitted on the rows of the window"""
+        from sklearn.linear_model import LinearRegression
+        coef, intercept = self.solve()
+        model = LinearRegression()
+        model.coef_ = coef
+        model.intercept_ = intercept
+        model.n_features_in_ = self.n_features
+        model.feature_names_in_ = np.asarray(self.feature_names, dtype=object)
+        return model
+
+    def save(self, path : str):
+        """Function that writes the statistics to an npz file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        settings = np.array([-1 if self.window_hours is None else self.window_hours, self.block_hours, self.fitted_until])
+        with open(path + ".tmp", "wb") as state:
+            np.savez(state, settings=settings, feature_names=np.array(self.feature_names, dtype=str), halflife_hours=np.nan if self.halflife_hours is None else self.halflife_hours,
+                     blocks=self.blocks, gram=self.gram, xty=self.xty, yty=self.yty, counts=self.counts)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path : str):
+        """Function that loads the statistics written by save
+        Returns
+        -------
+        IncrementalLinearRegression
+            the stored model or None if no usable file exists
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as state:
+                window_hours, block_hours, fitted_until = (int(value) for value in state["settings"])
+                halflife_hours = float(state["halflife_hours"])
+                model = cls(list(state["feature_names"]), None if window_hours < 0 else window_hours, None if np.isnan(halflife_hours) else halflife_hours, block_hours)
+                for name in ("blocks", "gram", "xty", "yty", "counts"):
+                    setattr(model, name, state[name].copy())
+                model.fitted_until = fitted_until
+        except (OSError, ValueError, KeyError):
+            return None
+        return model
+
+def hour_to_timestamp(hour : int) -> pd.Timestamp:
+    """Function that converts whole hours since 1970-01-01 00:00 to a timestamp, the inverse of online_features.to_hours"""
+    return pd.Timestamp(hour * online_features._NS_PER_HOUR)
@@ -0,0 +1,276 @@
+import atexit
+import cProfile
+import contextlib
+import functools
+import inspect
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+
+# Instrumentation is switched on with AIR_PRED_INSTRUMENTATION=1. When it is off stage() and instrument() only check a flag.
+# AIR_PRED_METRICS_FILE : json file the summary is written to at the end of the run, printed to stdout if not set.
+#   {script} is replaced with the name of the script, so that several pipelines can run with the same setting
+# AIR_PRED_PROFILE_DIR : directory cProfile statistics of every outermost stage are written to, no profiling if not set
+ENABLED = os.environ.get("AIR_PRED_INSTRUMENTATION", "0").lower() in ("1", "true", "yes")
+METRICS_FILE = os.environ.get("AIR_PRED_METRICS_FILE")
+PROFILE_DIR = os.environ.get("AIR_PRED_PROFILE_DIR")
+
+_records = []
+_local = threading.local()
+_started = time.time()
+_summary_registered = False
+# peak memory of the run, resetting the peak for a stage hides the earlier peak from getrusage
+_run_peak_mb = 0.0
+# stages running in every thread. The peak memory is the one of the process, so it is only reset when no other thread is in
+# a stage and stages that overlap with a stage of another thread report the peak of the run
+_active = {}
+_active_lock = threading.Lock()
+
+class StageRecord(object):
+    """Measurements of one stage, rows_in and rows_out can be set inside the stage"""
+
+    def __init__(self, name : str, parent : str = None, rows_in : int = None):
+        self.name = name
+        self.parent = parent
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_mb = None
+        self.error = None
+        # set if a stage of another thread ran at the same time, peak_rss_mb is then the peak of the run
+        self.concurrent = False
+
+    def set_rows(self, rows_in : int = None, rows_out : int = None):
+        """Records the number of rows going into and coming out of the stage"""
+        if rows_in is not None:
+            self.rows_in = rows_in
+        if rows_out is not None:
+            self.rows_out = rows_out
+
+    def to_dict(self) -> dict:
+        return {"stage": self.name, "parent": self.parent, "rows_in": self.rows_in, "rows_out": self.rows_out,
+                "wall_seconds": self.wall_seconds, "cpu_seconds": self.cpu_seconds, "peak_rss_mb": self.peak_rss_mb, "error": self.error,
+                "concurrent": self.concurrent}
+
+class _NullRecord(object):
+    """Returned by stage() when instrumentation is off, a context manager and record whose calls do nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_rows(self, rows_in : int = None, rows_out : int = None):
+        pass
+
+_NULL_RECORD = _NullRecord()
+
+def _reset_peak_rss() -> bool:
+    """Resets the peak resident set size of the process, only supported on linux"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is the peak of the complete run and is in bytes on mac os
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+def _keep_peak(stack : list, peak_mb : float):
+    """Adds a peak measured before a reset to the current parent stage and to the run"""
+    global _run_peak_mb
+    with _active_lock:
+        _run_peak_mb = max(_run_peak_mb, peak_mb)
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak_mb)
+
+def _rows(value) -> int:
+    """Number of rows of a dataframe, array or list, None for other values"""
+    if isinstance(value, (str, bytes, dict)) or not hasattr(value, "__len__"):
+        return None
+    return len(value)
+
+def enable(metrics_file : str = None, profile_dir : str = None):
+    """Switches instrumentation on for the rest of the run, the arguments override AIR_PRED_METRICS_FILE and AIR_PRED_PROFILE_DIR"""
+    global ENABLED, METRICS_FILE, PROFILE_DIR, _summary_registered
+    ENABLED = True
+    METRICS_FILE = metrics_file or METRICS_FILE
+    PROFILE_DIR = profile_dir or PROFILE_DIR
+    if not _summary_registered:
+        atexit.register(write_summary)
+        _summary_registered = True
+
+def disable():
+    """Switches instrumentation off, stages that already finished stay in the summary"""
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    """Removes all recorded stages"""
+    global _started, _run_peak_mb
+    del _records[:]
+    _started = time.time()
+    _run_peak_mb = 0.0
+
+def current_stage() -> str:
+    """Function that returns the name of the innermost stage the calling thread is in, None if it is in no stage"""
+    stack = getattr(_local, "stack", None)
+    return stack[-1][0].name if stack else None
+
+def stage(name : str, rows_in : int = None, parent : str = None):
+    """Context manager that records wall time, cpu time, peak memory and rows of the code inside it.
+        Stages can be nested, the parent of a stage is the stage it was started in. Peak memory is the peak resident set size
+        during the stage on linux and the peak of the complete run on other platforms or when a stage of another thread
+        runs at the same time
+    Parameters
+    ----------
+    name : str
+        name of the stage in the summary
+    rows_in : int
+        number of rows going into the stage, can also be set with set_rows on the yielded record
+    parent : str
+        name of the parent of a stage that is started in a worker thread, see current_stage. Stages started inside another
+        stage of the same thread have that stage as parent
+
+    Yields
+    ------
+    StageRecord
+        record of the stage, use record.set_rows(rows_out=len(df)) to record the rows coming out of the stage
+    """
+    if not ENABLED:
+        return _NULL_RECORD
+    return _measure(name, rows_in, parent)
+
+@contextlib.contextmanager
+def _measure(name : str, rows_in : int, parent : str = None):
+    """Measures a stage while instrumentation is on"""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    record = StageRecord(name, parent=stack[-1][0].name if stack else parent, rows_in=rows_in)
+    profiler = cProfile.Profile() if PROFILE_DIR and not stack else None
+    # the peak so far is kept before it is reset, for the parent stage and for the run
+    _keep_peak(stack, _peak_rss_mb())
+    # second item is the peak of the stages nested in this one, their reset of the peak memory hides it from this stage
+    stack.append([record, 0.0])
+    thread = threading.get_ident()
+    with _active_lock:
+        others = [other for ident, records in _active.items() if ident != thread for other in records]
+        for other in others:
+            other.concurrent = True
+        record.concurrent = record.concurrent or bool(others)
+        _active.setdefault(thread, []).append(record)
+    # resetting the peak while another thread is in a stage would hide the peak of that stage
+    if not others:
+        _reset_peak_rss()
+    if profiler is not None:
+        profiler.enable()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    except BaseException as error:
+        record.error = type(error).__name__
+        raise
+    finally:
+        record.wall_seconds = time.perf_counter() - start
+        record.cpu_seconds = time.process_time() - cpu_start
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, re.sub(r"[^\w.-]", "_", name) + ".prof"))
+        _, nested_peak = stack.pop()
+        with _active_lock:
+            _active[thread].remove(record)
+            if not _active[thread]:
+                del _active[thread]
+        record.peak_rss_mb = max(_peak_rss_mb(), nested_peak)
+        if record.concurrent:
+            record.peak_rss_mb = max(record.peak_rss_mb, _run_peak_mb)
+        _keep_peak(stack, record.peak_rss_mb)
+        _records.append(record)
+
+def instrument(name : str = None, rows_arg : int = 0):
+    """Decorator that runs the function as a stage. rows_in is the length of the argument at position rows_arg
+        and rows_out the length of the returned value when they have one
+    Parameters
+    ----------
+    name : str
+        name of the stage, the name of the function if None
+    rows_arg : int
+        position of the argument whose length is recorded as rows_in, it can also be passed by keyword
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+        parameters = list(inspect.signature(func).parameters)
+        rows_name = parameters[rows_arg] if rows_arg < len(parameters) else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            rows_in = _rows(args[rows_arg]) if rows_arg < len(args) else _rows(kwargs.get(rows_name))
+            with stage(stage_name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record.set_rows(rows_out=_rows(result))
+                return result
+        return wrapper
+    return decorator
+
+def summary() -> dict:
+    """Function that returns the recorded stages in the order they finished together with the totals of the run
+    Returns
+    -------
+    dict
+        script, start time, wall time of the run, peak memory, the list of stages and the totals per stage name,
+        stages that run once per chunk or batch are summed up in the totals
+    """
+    totals = {}
+    for record in _records:
+        total = totals.setdefault(record.name, {"stage": record.name, "calls": 0, "rows_in": None, "rows_out": None,
+                                                "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_mb": 0.0})
+        total["calls"] += 1
+        total["wall_seconds"] += record.wall_seconds
+        total["cpu_seconds"] += record.cpu_seconds
+        total["peak_rss_mb"] = max(total["peak_rss_mb"], record.peak_rss_mb)
+        for key in ("rows_in", "rows_out"):
+            if getattr(record, key) is not None:
+                total[key] = (total[key] or 0) + getattr(record, key)
+    return {"script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_started)),
+            "wall_seconds": time.time() - _started,
+            "cpu_seconds": time.process_time(),
+            "peak_rss_mb": max(_run_peak_mb, _peak_rss_mb()),
+            "stages": [record.to_dict() for record in _records],
+            "totals": list(totals.values())}
+
+def write_summary(path : str = None):
+    """Writes the summary as json to path, METRICS_FILE or stdout, called at exit when instrumentation is on"""
+    if not _records:
+        return
+    path = path or METRICS_FILE
+    report = summary()
+    if path:
+        path = path.format(script=os.path.splitext(report["script"] or "run")[0])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report))
+
+if ENABLED:
+    enable()
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from air_pred.utils import instrumentation, model_selection
+
+MODEL_CACHE_DIR = os.environ.get("AIR_PRED_MODEL_CACHE_DIR", "./.air_pred_cache/models")
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("AIR_PRED_MODEL_CACHE_MAX_BYTES", 1024 ** 3))
+# artifacts larger than this are loaded with their numpy arrays memory mapped instead of read into memory
+MMAP_MIN_BYTES = int(os.environ.get("AIR_PRED_MODEL_MMAP_MIN_BYTES", 16 * 1024 ** 2))
+
+def directory_checksum(directory : str) -> str:
+    """Function that returns the sha256 of the names and contents of all files in directory"""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode())
+            with open(path, "rb") as artifact:
+                for block in iter(lambda: artifact.read(1024 ** 2), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+def directory_bytes(directory : str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(directory) for name in files)
+
+class ModelArtifactCache(object):
+    """Local copies of model artifacts downloaded from the model registry keyed by (name, version, checksum).
+        Versions in the model registry do not change, so an artifact is downloaded once per version and every later run reads
+        the local copy. The best version of a model is looked up once per process and deserialized models are kept in memory,
+        so repeated loads in the same process neither download nor unpickle. Least recently used artifacts are evicted
+        when all artifacts together are larger than max_bytes"""
+
+    def __init__(self, cache_dir : str = MODEL_CACHE_DIR, max_bytes : int = MODEL_CACHE_MAX_BYTES, mmap_min_bytes : int = MMAP_MIN_BYTES):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            directory the artifacts and the index are stored in
+        max_bytes : int
+            maximum size of all artifacts, least recently used artifacts are evicted above it
+        mmap_min_bytes : int
+            size from which on the numpy arrays of an artifact are memory mapped when it is loaded
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mmap_min_bytes = mmap_min_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        # best model per (name, metric, direction) and deserialized models per cache key, both only for this process
+        self._resolved = {}
+        self._loaded = {}
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as index_file:
+            return json.load(index_file)
+
+    def _save_index(self, index : dict):
+        with open(self.index_path + ".tmp", "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    @staticmethod
+    def version_key(name : str, version : int) -> str:
+        return f"{name}_{version}"
+
+    def resolve(self, mr, name : str, metric : str = "Test MSE", direction : str = "min", refresh : bool = False):
+        """Function that returns the best version of a model in the model registry, looked up once per process
+        Parameters
+        ----------
+        mr : hsml.model_registry.ModelRegistry
+            model registry of the project
+        name : str
+            name of the model
+        metric : str
+            metric the versions are compared on
+        direction : str
+            min or max, whether the best version has the lowest or the highest metric
+        refresh : bool
+            if set true the model registry is asked again, for example after a new version was registered
+
+        Returns
+        -------
+        hsml.model.Model
+            best version of the model
+        """
+        key = (name, metric, direction)
+        if refresh or key not in self._resolved:
+            with instrumentation.stage("model_lookup"):
+                self._resolved[key] = mr.get_best_model(name, metric=metric, direction=direction)
+        return self._resolved[key]
+
+    def forget(self, name : str = None):
+        """Function that drops the looked up best versions of a model, or of all models if name is None, so that the next
+            resolve asks the model registry again"""
+        for key in [key for key in self._resolved if name is None or key[0] == name]:
+            del self._resolved[key]
+
+    def artifact_dir(self, model) -> str:
+        """Function that returns the local directory with the artifact of a model version, the artifact is only downloaded
+            if no local copy exists
+        Parameters
+        ----------
+        model : hsml.model.Model
+            model version returned by resolve or the model registry
+
+        Returns
+        -------
+        str
+            directory with the files of the model version
+        """
+        key = self.version_key(model.name, model.version)
+        index = self._load_index()
+        entry = index.get(key)
+        if entry is not None and os.path.isdir(os.path.join(self.cache_dir, entry["directory"])):
+            entry["last_used"] = time.time()
+            self._save_index(index)
+            return os.path.join(self.cache_dir, entry["directory"])
+
+        with instrumentation.stage("model_download"):
+            downloaded = model.download()
+        checksum = directory_checksum(downloaded)
+        directory = f"{key}_{checksum[:16]}"
+        path = os.path.join(self.cache_dir, directory)
+        shutil.rmtree(path, ignore_errors=True)
+        shutil.copytree(downloaded, path + ".tmp", dirs_exist_ok=True)
+        os.replace(path + ".tmp", path)
+
+        index = self._load_index()
+        if key in index and index[key]["directory"] != directory:
+            shutil.rmtree(os.path.join(self.cache_dir, index[key]["directory"]), ignore_errors=True)
+        index[key] = {"directory": directory, "checksum": checksum, "bytes": directory_bytes(path), "last_used": time.time()}
+        self._evict(index, keep=key)
+        self._save_index(index)
+        return path
+
+    def load(self, mr, name : str, metric : str = "Test MSE", direction : str = "min", verify : bool = False):
+        """Function that returns the deserialized best version of a model. The artifact is downloaded only if it is not cached
+            and unpickled only on the first load in this process
+        Parameters
+        ----------
+        mr : hsml.model_registry.ModelRegistry
+            model registry of the project
+        name : str
+            name of the model, its artifact is model_selection.artifact_path of the name
+        metric : str
+            metric the versions are compared on
+        direction : str
+            min or max, whether the best version has the lowest or the highest metric
+        verify : bool
+            if set true the checksum of the local copy is compared with the checksum of the download before it is loaded,
+            a local copy that changed is downloaded again
+
+        Returns
+        -------
+        object
+            fitted model
+        """
+        model = self.resolve(mr, name, metric, direction)
+        directory = self.artifact_dir(model)
+        checksum = self._load_index()[self.version_key(model.name, model.version)]["checksum"]
+        if verify and directory_checksum(directory) != checksum:
+            self.invalidate(model.name, model.version)
+            directory = self.artifact_dir(model)
+            checksum = self._load_index()[self.version_key(model.name, model.version)]["checksum"]
+
+        key = (model.name, model.version, checksum)
+        if key not in self._loaded:
+            size = directory_bytes(directory)
+            with instrumentation.stage("model_deserialize"):
+                self._loaded[key] = model_selection.load_artifact(directory, name, mmap_mode="r" if size >= self.mmap_min_bytes else None)
+        return self._loaded[key]
+
+    def _evict(self, index : dict, keep : str = None):
+        """Removes least recently used artifacts until all artifacts fit into max_bytes, the artifact keep is never removed"""
+        total_bytes = sum(entry["bytes"] for entry in index.values())
+        for key in sorted(index, key=lambda key: index[key]["last_used"]):
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total_bytes -= index[key]["bytes"]
+            self._remove(key, index)
+
+    def _remove(self, key : str, index : dict):
+        shutil.rmtree(os.path.join(self.cache_dir, index[key]["directory"]), ignore_errors=True)
+        index.pop(key)
+        self._loaded = {loaded: model for loaded, model in self._loaded.items() if self.version_key(*loaded[:2]) != key}
+
+    def invalidate(self, name : str = None, version : int = None):
+        """Function that removes the cached artifacts of a model version, of all versions of a model if version is None
+            or of all models if name is None"""
+        index = self._load_index()
+        keys = [key for key in index if name is None or key == self.version_key(name, version)
+                or (version is None and key.rsplit("_", 1)[0] == name)]
+        for key in keys:
+            self._remove(key, index)
+        self._save_index(index)
+        self.forget(name)
+
+_default_cache = None
+
+def default_cache() -> ModelArtifactCache:
+    """Returns the cache in MODEL_CACHE_DIR shared by the pipelines"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ModelArtifactCache()
+    return _default_cache
@@ -0,0 +1,165 @@
+import os
+import time
+import importlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import joblib
+from air_pred.utils import instrumentation
+from air_pred.utils.parallel_imputation import resolve_n_jobs
+
+# Candidate estimators and their hyperparameters, estimators are given by their import path so that sklearn
+# is only imported by the processes that fit them
+CANDIDATES = {
+    "linear_regression": ("sklearn.linear_model.LinearRegression", [{}]),
+    "ridge": ("sklearn.linear_model.Ridge", [{"alpha": alpha} for alpha in (0.1, 1.0, 10.0)]),
+    "lasso": ("sklearn.linear_model.Lasso", [{"alpha": alpha, "max_iter": 5000} for alpha in (0.01, 0.1)]),
+    "hist_gradient_boosting": ("sklearn.ensemble.HistGradientBoostingRegressor",
+                               [{"max_iter": 100, "learning_rate": 0.1, "random_state": 0},
+                                {"max_iter": 200, "learning_rate": 0.05, "max_leaf_nodes": 15, "random_state": 0}]),
+}
+# Model selection settings, TRAINING_N_JOBS of -1 uses all cores
+TRAINING_N_JOBS = int(os.environ.get("AIR_PRED_TRAINING_N_JOBS", -1))
+CV_SPLITS = int(os.environ.get("AIR_PRED_CV_SPLITS", 5))
+MODELS_DIR = "./models"
+
+# arrays a worker process already opened, keyed by their file so that every task of a worker reuses the same memory map
+_shared_arrays = {}
+
+def candidate_grid(candidates : dict = None) -> list:
+    """Function that expands the candidates into one entry per estimator and hyperparameter combination
+    Parameters
+    ----------
+    candidates : dict
+        name -> (import path of the estimator, list of parameter dicts), CANDIDATES if None
+
+    Returns
+    -------
+    list
+        tuples (name, import path, params)
+    """
+    candidates = CANDIDATES if candidates is None else candidates
+    return [(name, estimator, params) for name, (estimator, grid) in candidates.items() for params in grid]
+
+def rolling_origin_folds(n_rows : int, n_splits : int = CV_SPLITS, test_size : int = None, gap : int = 0) -> list:
+    """Function that creates the folds of a rolling origin cross validation on rows ordered by time, the same folds
+        as sklearn.model_selection.TimeSeriesSplit. Every fold trains on all rows before its origin and tests on the rows after it
+    Parameters
+    ----------
+    n_rows : int
+        number of rows
+    n_splits : int
+        number of folds
+    test_size : int
+        number of test rows per fold, n_rows // (n_splits + 1) if None
+    gap : int
+        number of rows left out between the train and the test rows of a fold
+
+    Returns
+    -------
+    list
+        tuples (train_stop, test_start, test_stop), the fold trains on rows :train_stop and tests on rows test_start:test_stop
+    """
+    test_size = n_rows // (n_splits + 1) if test_size is None else test_size
+    if n_splits < 1 or test_size < 1 or n_rows - n_splits * test_size - gap < 1:
+        raise ValueError(f"Cannot create {n_splits} folds of {test_size} test rows from {n_rows} rows")
+    test_starts = range(n_rows - n_splits * test_size, n_rows, test_size)
+    return [(test_start - gap, test_start, test_start + test_size) for test_start in test_starts]
+
+def create_estimator(estimator : str, params : dict):
+    """Function that imports the estimator class from its import path and creates it with params"""
+    module, name = estimator.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)(**params)
+
+def share_arrays(directory : str, **arrays) -> dict:
+    """Function that writes arrays to directory so that worker processes can memory map them instead of receiving a copy
+    Returns
+    -------
+    dict
+        name -> path of the array file
+    """
+    paths = {}
+    for name, array in arrays.items():
+        paths[name] = os.path.join(directory, f"{name}.joblib")
+        joblib.dump(np.ascontiguousarray(array), paths[name])
+    return paths
+
+def load_shared(path : str) -> np.ndarray:
+    """Function that memory maps an array written by share_arrays, read only and opened once per process"""
+    if path not in _shared_arrays:
+        _shared_arrays[path] = joblib.load(path, mmap_mode="r")
+    return _shared_arrays[path]
+
+def _init_worker():
+    # every worker fits one model at a time, blas and openmp threads of all workers would compete for the same cores
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=1)
+
+def _cross_validate(x_path : str, y_path : str, estimator : str, params : dict, folds : list) -> dict:
+    """Fits the estimator on every fold and returns the test mean squared errors"""
+    X, y = load_shared(x_path), load_shared(y_path)
+    errors = []
+    start = time.perf_counter()
+    for train_stop, test_start, test_stop in folds:
+        model = create_estimator(estimator, params).fit(X[:train_stop], y[:train_stop])
+        errors.append(float(np.mean((model.predict(X[test_start:test_stop]) - y[test_start:test_stop]) ** 2)))
+    return {"cv_mse": float(np.mean(errors)), "cv_mse_std": float(np.std(errors)), "fold_mse": errors,
+            "fit_seconds": time.perf_counter() - start}
+
+@instrumentation.instrument()
+def select_models(datasets : dict, candidates : dict = None, n_splits : int = CV_SPLITS, n_jobs : int = TRAINING_N_JOBS, gap : int = 0) -> dict:
+    """Function that cross validates every candidate on every dataset with rolling origin folds, the candidates of all datasets
+        are fitted in one process pool. The datasets are written once to a temporary directory and memory mapped by the workers
+    Parameters
+    ----------
+    datasets : dict
+        name -> (X, y) with the rows ordered by time
+    candidates : dict
+        name -> (import path of the estimator, list of parameter dicts), CANDIDATES if None
+    n_splits : int
+        number of cross validation folds
+    n_jobs : int
+        number of processes, -1 for all cores
+    gap : int
+        number of rows left out between the train and the test rows of a fold
+
+    Returns
+    -------
+    dict
+        dataset name -> list of results sorted by cv_mse, every result has the name, estimator and params
+        of the candidate, the mean and standard deviation of the fold errors and the fit time
+    """
+    grid = candidate_grid(candidates)
+    n_jobs = resolve_n_jobs(n_jobs)
+    results = {name: [] for name in datasets}
+    with tempfile.TemporaryDirectory() as directory:
+        tasks = []
+        for dataset, (X, y) in datasets.items():
+            paths = share_arrays(directory, **{f"{dataset}_X": np.asarray(X), f"{dataset}_y": np.asarray(y).ravel()})
+            folds = rolling_origin_folds(len(X), n_splits, gap=gap)
+            tasks += [(dataset, name, estimator, params, (paths[f"{dataset}_X"], paths[f"{dataset}_y"], estimator, params, folds))
+                      for name, estimator, params in grid]
+
+        if n_jobs == 1:
+            scores = [_cross_validate(*arguments) for *_, arguments in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)), initializer=_init_worker) as executor:
+                scores = list(executor.map(_cross_validate, *zip(*[arguments for *_, arguments in tasks])))
+        _shared_arrays.clear()
+
+    for (dataset, name, estimator, params, _), score in zip(tasks, scores):
+        results[dataset].append(dict(name=name, estimator=estimator, params=params, **score))
+    return {dataset: sorted(result, key=lambda result: result["cv_mse"]) for dataset, result in results.items()}
+
+def artifact_path(model_name : str, directory : str = MODELS_DIR) -> str:
+    """Function that returns the path of the artifact of a registered model, every model has its own file"""
+    return os.path.join(directory, f"{model_name}.pkl")
+
+def load_artifact(directory : str, model_name : str, mmap_mode : str = None):
+    """Function that loads the artifact of a model downloaded from the model registry, versions registered before
+        every model had its own artifact are stored as linear_regression.pkl. With mmap_mode the numpy arrays
+        of the model are memory mapped from the file instead of read into memory"""
+    path = artifact_path(model_name, directory)
+    if not os.path.exists(path):
+        path = os.path.join(directory, "linear_regression.pkl")
+    return joblib.load(path, mmap_mode=mmap_mode)
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing, instrumentation, model_selection, online_features, time_series_features
+
+# pollutants measured by the stations, every <station>_<pollutant> column of the cleaned data is a target
+POLLUTANTS = ("pm25", "pm10", "no2", "nox", "o3")
+MULTI_TARGET_MODEL_NAME = "air_quality_multi_target_model"
+
+def find_targets(columns : list, pollutants : tuple = POLLUTANTS) -> list:
+    """Function that returns the station x pollutant columns among columns, for example femman_pm25 or mobil1_no2"""
+    return [column for column in columns if column.lower().rsplit("_", 1)[-1] in pollutants and "_" in column]
+
+def stack_features(df : pd.DataFrame, targets : list, spec : dict = time_series_features.DEFAULT_SPEC, dropna : bool = True) -> pd.DataFrame:
+    """Function that creates the lag and calendar features of all targets in one pass and stacks them into a long dataframe
+        with one row per target and hour. The targets are put on an hourly grid once, every lag is one shifted slice of the grid
+        for all targets and every target gets the same feature names, so that its rows are a training dataset on their own.
+        Lags are based on date_time like in time_series_features.create_features, missing hours give missing features
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time and the targets
+    targets : list
+        columns features are created for, the columns of the specification are ignored
+    spec : dict
+        feature specification with lags and calendar features, see time_series_features.DEFAULT_SPEC. Rolling window features
+        are not supported
+    dropna : bool
+        if set true rows where the value or a feature is missing are dropped
+
+    Returns
+    -------
+    pd.DataFrame
+        date_time, date_time_str, target, value and the features of every target and hour. Ordered by target and date_time,
+        target is categorical with the targets as categories in the given order
+    """
+    if spec.get("rolling"):
+        raise ValueError("Rolling window features are not supported by the stacked features")
+    hours = online_features.to_hours(df['date_time'])
+    order = np.argsort(hours, kind="stable")
+    hours = hours[order]
+    # of rows with the same hour the last one is kept
+    last = np.r_[hours[1:] != hours[:-1], True]
+    rows = order[last]
+    hours = hours[last]
+    if len(hours) == 0:
+        positions = np.zeros(0, dtype=np.int64)
+        grid = np.zeros((0, len(targets)))
+    else:
+        positions = hours - hours[0]
+        grid = np.full((positions[-1] + 1, len(targets)), np.nan)
+        grid[positions] = df[targets].to_numpy(dtype=np.float64)[rows]
+
+    n_rows, n_targets = len(rows), len(targets)
+    # every array is (targets, rows) so that raveling it gives the rows of one target after the other
+    columns = {"value": grid[positions].T}
+    for feature, lag in spec.get("lags", {}).items():
+        source = positions - lag
+        columns[feature] = np.where(source >= 0, grid[np.maximum(source, 0)].T, np.nan)
+
+    date_time = pd.DatetimeIndex(hours.astype("datetime64[h]").astype("datetime64[ns]"))
+    # the primary key is taken from the rows, formatting the timestamps again is slower than creating all features
+    if 'date_time_str' in df.columns:
+        date_time_str = df['date_time_str'].to_numpy()[rows]
+    else:
+        date_time_str = data_preprocessing.add_date_time_str(pd.DataFrame({"date_time": date_time}))['date_time_str'].to_numpy()
+    stacked = pd.DataFrame({"date_time": np.tile(date_time.to_numpy(), n_targets),
+                            "date_time_str": np.tile(date_time_str, n_targets),
+                            "target": pd.Categorical.from_codes(np.repeat(np.arange(n_targets), n_rows), categories=targets)})
+    missing = np.zeros(n_rows * n_targets, dtype=bool)
+    for name, values in columns.items():
+        stacked[name] = values.ravel()
+        missing |= np.isnan(stacked[name].to_numpy())
+    for attribute in spec.get("calendar", []):
+        stacked[attribute] = np.tile(getattr(date_time, attribute), n_targets)
+    if dropna:
+        stacked = stacked[~missing].reset_index(drop=True)
+    return stacked
+
+def feature_names(spec : dict = time_series_features.DEFAULT_SPEC) -> list:
+    """Function that returns the features of the stacked dataframe the models are fitted on"""
+    return list(spec.get("lags", {})) + list(spec.get("calendar", []))
+
+def target_rows(stacked : pd.DataFrame) -> dict:
+    """Function that returns target -> rows of the target in stacked, slices if the rows of every target are contiguous
+        like in the output of stack_features, else arrays of positions"""
+    codes = stacked["target"].cat.codes.to_numpy()
+    categories = stacked["target"].cat.categories
+    if len(codes) == 0 or np.all(codes[1:] >= codes[:-1]):
+        bounds = np.searchsorted(codes, np.arange(len(categories) + 1))
+        return {target: slice(bounds[code], bounds[code + 1]) for code, target in enumerate(categories) if bounds[code + 1] > bounds[code]}
+    return {categories[code]: positions for code, positions in pd.Series(codes).groupby(codes).indices.items()}
+
+class MultiTargetModel(object):
+    """One fitted model per target that predicts the rows of a stacked dataframe of all targets at once"""
+
+    def __init__(self, models : dict, features : list):
+        """
+        Parameters
+        ----------
+        models : dict
+            target -> fitted model
+        features : list
+            columns of the stacked dataframe the models take, see feature_names
+        """
+        self.models = models
+        self.features = features
+
+    @property
+    def targets(self) -> list:
+        return list(self.models)
+
+    def predict(self, stacked : pd.DataFrame) -> np.ndarray:
+        """Function that predicts every row of stacked with the model of its target, the features of all targets are
+            converted to one array and every model predicts a slice of it
+        Returns
+        -------
+        np.ndarray
+            prediction of every row in the order of stacked, nan for targets without a model
+        """
+        X = stacked[self.features].to_numpy(dtype=np.float64)
+        predictions = np.full(len(stacked), np.nan)
+        for target, rows in target_rows(stacked).items():
+            if target in self.models:
+                predictions[rows] = np.asarray(self.models[target].predict(X[rows])).reshape(-1)
+        return predictions
+
+@instrumentation.instrument()
+def fit_targets(stacked : pd.DataFrame, features : list = None, estimator : str = "sklearn.linear_model.LinearRegression", params : dict = None) -> MultiTargetModel:
+    """Function that fits one model per target of a stacked dataframe. The features are converted to one array and every
+        model is fitted on the contiguous rows of its target, so no target is copied or sorted on its own
+    Parameters
+    ----------
+    stacked : pd.DataFrame
+        features returned by stack_features
+    features : list
+        columns the models are fitted on, feature_names of the default specification if None
+    estimator : str
+        import path of the estimator, see model_selection.CANDIDATES
+    params : dict
+        parameters of the estimator
+
+    Returns
+    -------
+    MultiTargetModel
+        fitted models of all targets
+    """
+    features = feature_names() if features is None else features
+    X = stacked[features].to_numpy(dtype=np.float64)
+    y = stacked["value"].to_numpy(dtype=np.float64)
+    models = {target: model_selection.create_estimator(estimator, params or {}).fit(X[rows], y[rows])
+              for target, rows in target_rows(stacked).items()}
+    return MultiTargetModel(models, features)
+
+def evaluate_targets(model : MultiTargetModel, stacked : pd.DataFrame) -> dict:
+    """Function that returns target -> mean squared error of the predictions of the rows of stacked"""
+    errors = (model.predict(stacked) - stacked["value"].to_numpy(dtype=np.float64)) ** 2
+    return {target: float(np.mean(errors[rows])) for target, rows in target_rows(stacked).items()}
+
+def unstack_predictions(stacked : pd.DataFrame, predictions : np.ndarray) -> pd.DataFrame:
+    """Function that returns the predictions as rows of the prediction feature group, one row per target and hour
+    Returns
+    -------
+    pd.DataFrame
+        date_time, date_time_str, target as string, the observed value and predicted_value
+    """
+    return pd.DataFrame({"date_time": stacked["date_time"].to_numpy(), "date_time_str": stacked["date_time_str"].to_numpy(),
+                         "target": stacked["target"].astype(str).to_numpy(), "value": stacked["value"].to_numpy(),
+                         "predicted_value": predictions})
@@ -0,0 +1,162 @@
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from air_pred.utils import time_series_features
+
+ONLINE_FEATURES_FILE = "online_features.npz"
+_NS_PER_HOUR = 3600 * 10 ** 9
+
+def to_hours(date_time) -> np.ndarray:
+    """Function that converts date_time values to whole hours since 1970-01-01 00:00"""
+    date_time = np.asarray(date_time if isinstance(date_time, (pd.Series, pd.DatetimeIndex)) else pd.to_datetime(date_time))
+    return date_time.astype("datetime64[h]").astype(np.int64)
+
+class HourlyRingBuffer(object):
+    """Fixed size array of the last capacity hours of the columns of a feature specification. The row of an hour is its slot
+        hour % capacity, a second array keeps the hour stored in every slot so that overwritten or missing hours are detected.
+        Ingesting rows only writes their slots and the lag features of any hour are read from one slot per lag, so both take
+        constant time whatever the length of the history. Rolling window features are not supported"""
+
+    def __init__(self, spec : dict = time_series_features.DEFAULT_SPEC, capacity : int = None):
+        """
+        Parameters
+        ----------
+        spec : dict
+            feature specification with lags and calendar features, see time_series_features.DEFAULT_SPEC
+        capacity : int
+            number of hours kept, twice the largest lag if None. Features can be created for hours up to
+            capacity - largest lag hours before the most recent ingested hour and up to the smallest lag after it
+        """
+        if spec.get("rolling"):
+            raise ValueError("Rolling window features are not supported by the ring buffer")
+        self.spec = spec
+        self.columns = list(spec["columns"])
+        self.capacity = capacity or 2 * time_series_features.history_hours(spec)
+        if self.capacity < time_series_features.history_hours(spec) + 1:
+            raise ValueError(f"A capacity of {self.capacity} hours cannot hold the lags of {time_series_features.history_hours(spec)} hours")
+        template = spec.get("name_template", "{column}_{feature}")
+        self.lags = np.array([hours for _, hours in spec.get("lags", {}).items() for _ in self.columns], dtype=np.int64)
+        self.lag_columns = np.array([index for _ in spec.get("lags", {}) for index in range(len(self.columns))], dtype=np.int64)
+        self.feature_names = [template.format(column=column, feature=feature) for feature in spec.get("lags", {}) for column in self.columns]
+        self.feature_names += list(spec.get("calendar", []))
+        self.values = np.full((self.capacity, len(self.columns)), np.nan)
+        self.hours = np.full(self.capacity, -1, dtype=np.int64)
+        self.latest = -1
+
+    def ingest(self, df : pd.DataFrame) -> int:
+        """Function that writes new, late or updated rows into the buffer, rows older than the buffer are ignored
+        Parameters
+        ----------
+        df : pd.DataFrame
+            dataframe containing date_time and the columns of the specification, in any order
+
+        Returns
+        -------
+        int
+            number of rows that were written
+        """
+        if len(df) == 0:
+            return 0
+        hours = to_hours(df['date_time'])
+        values = df[self.columns].to_numpy(dtype=float)
+        order = np.argsort(hours, kind="stable")
+        hours, values = hours[order], values[order]
+        latest = max(self.latest, int(hours[-1]))
+        # of rows with the same hour the last one is kept, and only the last capacity hours fit into the buffer
+        last = np.r_[hours[1:] != hours[:-1], True]
+        keep = last & (hours > latest - self.capacity)
+        hours, values = hours[keep], values[keep]
+        slots = hours % self.capacity
+        self.values[slots] = values
+        self.hours[slots] = hours
+        self.latest = latest
+        return len(hours)
+
+    def _lag_values(self, hour : int) -> np.ndarray:
+        source = hour - self.lags
+        slots = source % self.capacity
+        values = self.values[slots, self.lag_columns]
+        return np.where((self.hours[slots] == source) & (source <= self.latest), values, np.nan)
+
+    def feature_vector(self, date_time : datetime.datetime) -> np.ndarray:
+        """Function that returns the features of one hour in constant time
+        Parameters
+        ----------
+        date_time : datetime.datetime
+            hour the features are created for, can be after the most recent ingested hour for forecasts
+
+        Returns
+        -------
+        np.ndarray
+            features in the order of feature_names, nan for lags whose hour is not in the buffer
+        """
+        timestamp = pd.Timestamp(date_time)
+        hour = timestamp.value // _NS_PER_HOUR
+        calendar = [getattr(timestamp, attribute) for attribute in self.spec.get("calendar", [])]
+        return np.concatenate([self._lag_values(hour), np.asarray(calendar, dtype=float)])
+
+    def feature_frame(self, date_times) -> pd.DataFrame:
+        """Function that returns the features of several hours like time_series_features.create_features with dropna False,
+            without the columns of the specification
+        Parameters
+        ----------
+        date_times : list
+            hours the features are created for
+
+        Returns
+        -------
+        pd.DataFrame
+            date_time, date_time_str and the features of every hour, indexed by date_time
+        """
+        date_time = pd.DatetimeIndex(pd.to_datetime(date_times))
+        hours = to_hours(date_time)
+        source = hours[:, None] - self.lags[None, :]
+        slots = source % self.capacity
+        values = np.where((self.hours[slots] == source) & (source <= self.latest), self.values[slots, self.lag_columns[None, :]], np.nan)
+        features = pd.DataFrame(values, index=date_time, columns=self.feature_names[:len(self.lags)])
+        for attribute in self.spec.get("calendar", []):
+            features[attribute] = getattr(date_time, attribute)
+        features.insert(0, "date_time_str", date_time.strftime("%Y-%m-%d %H:%M"))
+        features.insert(0, "date_time", date_time)
+        return features
+
+    def save(self, path : str):
+        """Function that writes the buffer to an npz file so that it survives restarts"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as snapshot:
+            np.savez(snapshot, values=self.values, hours=self.hours, latest=self.latest, columns=np.array(self.columns),
+                     lags=self.lags, capacity=self.capacity)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path : str, spec : dict = time_series_features.DEFAULT_SPEC, capacity : int = None):
+        """Function that loads a buffer written by save
+        Parameters
+        ----------
+        path : str
+            npz file written by save
+        spec : dict
+            feature specification the buffer is used with
+        capacity : int
+            number of hours the buffer should hold, see __init__
+
+        Returns
+        -------
+        HourlyRingBuffer
+            the stored buffer or None if no snapshot exists or it was written for other columns, lags or capacity
+        """
+        if not os.path.exists(path):
+            return None
+        buffer = cls(spec, capacity)
+        try:
+            with np.load(path) as snapshot:
+                if list(snapshot["columns"]) != buffer.columns or not np.array_equal(snapshot["lags"], buffer.lags) \
+                        or int(snapshot["capacity"]) != buffer.capacity:
+                    return None
+                buffer.values = snapshot["values"].copy()
+                buffer.hours = snapshot["hours"].copy()
+                buffer.latest = int(snapshot["latest"])
+        except (OSError, ValueError, KeyError):
+            return None
+        return buffer
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from air_pred.utils import instrumentation
+
+WEEKLY_DATA_URL = 'https://catalog.goteborg.se/rowstore/dataset/85ae9601-5258-442b-bc65-d74549c0cf8a/json'
+
+class PageFetchError(Exception):
+    """Raised when a page could not be fetched after all retries.
+        checkpoint holds the pages fetched so far and can be passed to fetch_rowstore to resume"""
+
+    def __init__(self, offset : int, checkpoint : dict):
+        super().__init__(f"Fetching page at offset {offset} failed, {len(checkpoint)} pages are kept in the checkpoint")
+        self.offset = offset
+        self.checkpoint = checkpoint
+
+def create_session(pool_size : int) -> requests.Session:
+    """Function that creates a session that keeps up to pool_size connections alive so that pages reuse connections"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_page(session : requests.Session, url : str, offset : int, limit : int, max_retries : int = 3, backoff : float = 0.5, timeout : float = 30) -> dict:
+    """Function that fetches one page of a rowstore dataset and retries it with exponential backoff when it fails
+    Parameters
+    ----------
+    session : requests.Session
+        session the request is sent with
+    url : str
+        json url of the rowstore dataset
+    offset : int
+        index of the first row of the page
+    limit : int
+        number of rows requested for the page
+    max_retries : int
+        number of times a failed request is retried before the error is raised
+    backoff : float
+        seconds waited before the first retry, doubled for every further retry
+    timeout : float
+        seconds after which a request is considered failed
+
+    Returns
+    -------
+    dict
+        decoded json response containing resultCount, limit and results
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, params={"_offset": offset, "_limit": limit}, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError):
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+@instrumentation.instrument()
+def fetch_rowstore(url : str = WEEKLY_DATA_URL, page_size : int = 100, max_workers : int = 8, max_retries : int = 3, backoff : float = 0.5,
+                   timeout : float = 30, session : requests.Session = None, checkpoint : dict = None) -> pd.DataFrame:
+    """Function that reads all rows of a rowstore dataset. The first page reports the number of rows,
+        all remaining pages are then fetched concurrently and every page is converted to a DataFrame as soon as it arrives
+    Parameters
+    ----------
+    url : str
+        json url of the rowstore dataset
+    page_size : int
+        number of rows requested per page, the server may answer with a smaller limit
+    max_workers : int
+        maximum number of pages that are fetched concurrently
+    max_retries : int
+        number of times a failed page is retried before PageFetchError is raised
+    backoff : float
+        seconds waited before the first retry of a page, doubled for every further retry
+    timeout : float
+        seconds after which a request is considered failed
+    session : requests.Session
+        session used for the requests, a pooled session is created if None
+    checkpoint : dict
+        pages that were already fetched by offset, as stored in PageFetchError.checkpoint. These pages are not fetched again
+
+    Returns
+    -------
+    pd.DataFrame
+        rows of all pages in the order of their offset
+    """
+    if session is None:
+        session = create_session(max_workers)
+    pages = {} if checkpoint is None else checkpoint
+
+    if 0 in pages:
+        total_results, limit = pages[0]["result_count"], pages[0]["limit"]
+    else:
+        try:
+            first_page = fetch_page(session, url, 0, page_size, max_retries, backoff, timeout)
+        except (requests.RequestException, ValueError):
+            raise PageFetchError(0, pages)
+        total_results, limit = first_page["resultCount"], first_page["limit"]
+        pages[0] = {"result_count": total_results, "limit": limit, "data": pd.DataFrame(first_page["results"])}
+
+    missing_offsets = [offset for offset in range(limit, total_results, limit) if offset not in pages]
+
+    def fetch(offset):
+        page = fetch_page(session, url, offset, limit, max_retries, backoff, timeout)
+        pages[offset] = {"result_count": total_results, "limit": limit, "data": pd.DataFrame(page["results"])}
+
+    failed_offset = None
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing_offsets) or 1))) as executor:
+        futures = {offset: executor.submit(fetch, offset) for offset in missing_offsets}
+        for offset, future in futures.items():
+            if future.exception() is not None and failed_offset is None:
+                failed_offset = offset
+    if failed_offset is not None:
+        raise PageFetchError(failed_offset, pages)
+
+    return pd.concat([pages[offset]["data"] for offset in sorted(pages)], ignore_index=True)
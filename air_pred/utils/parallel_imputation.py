@@ -0,0 +1,124 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Parallel imputation settings, used by clean_data_IterativeImputer when n_jobs is not given.
+# IMPUTATION_N_JOBS of 1 runs the single IterativeImputer over all rows and columns, -1 uses all cores
+IMPUTATION_N_JOBS = int(os.environ.get("AIR_PRED_IMPUTATION_N_JOBS", 1))
+IMPUTATION_SPLIT = os.environ.get("AIR_PRED_IMPUTATION_SPLIT", "time")
+# hours of rows added before and after every time block so that imputation at the block borders sees the neighbouring rows
+IMPUTATION_OVERLAP = int(os.environ.get("AIR_PRED_IMPUTATION_OVERLAP", 168))
+
+def resolve_n_jobs(n_jobs : int) -> int:
+    """Function that converts n_jobs to a number of processes, -1 means all cores"""
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+def station_groups(columns : list) -> list:
+    """Function that groups columns by their station, the part of the name before the first underscore,
+        for example femman_pm25 and femman_no2 belong to the station femman
+    Parameters
+    ----------
+    columns : list
+        names of the columns to be imputed
+
+    Returns
+    -------
+    list
+        list of column lists, one per station in the order of first appearance
+    """
+    groups = {}
+    for column in columns:
+        groups.setdefault(column.split('_', 1)[0], []).append(column)
+    return list(groups.values())
+
+def time_blocks(n_rows : int, n_blocks : int, overlap : int) -> list:
+    """Function that splits n_rows rows into n_blocks consecutive blocks with overlap
+    Parameters
+    ----------
+    n_rows : int
+        number of rows
+    n_blocks : int
+        number of blocks
+    overlap : int
+        number of rows added before and after every block, only used to fit the imputer of the block
+
+    Returns
+    -------
+    list
+        tuples (start, stop, core_start, core_stop) with the rows start:stop the imputer of the block is fitted on
+        and the rows core_start:core_stop whose imputed values are kept
+    """
+    bounds = np.linspace(0, n_rows, max(1, min(n_blocks, n_rows)) + 1).astype(int)
+    return [(max(0, core_start - overlap), min(n_rows, core_stop + overlap), core_start, core_stop)
+            for core_start, core_stop in zip(bounds[:-1], bounds[1:])]
+
+def _impute_block(values : np.ndarray, fill_values : np.ndarray, max_iter : int) -> np.ndarray:
+    """Fits an IterativeImputer on one block and returns the imputed values. Columns without any value in the block
+        are filled with fill_values, the means of the complete data, because the imputer would drop them"""
+    from sklearn.experimental import enable_iterative_imputer
+    from sklearn.impute import IterativeImputer
+    empty = np.isnan(values).all(axis=0)
+    if empty.any():
+        values = values.copy()
+        values[:, empty] = fill_values[empty]
+    return IterativeImputer(max_iter=max_iter, random_state=0).fit_transform(values)
+
+def impute_parallel(df : pd.DataFrame, n_jobs : int = -1, split : str = "time", n_blocks : int = None, overlap : int = IMPUTATION_OVERLAP, max_iter : int = 10) -> pd.DataFrame:
+    """Function that imputes the missing values of df with IterativeImputers that run in a process pool.
+        Every imputer only sees part of the data, which trades accuracy for speed compared to a single IterativeImputer
+    Parameters
+    ----------
+    df : pd.DataFrame
+        numeric columns to be imputed, ordered by date_time when split is time
+    n_jobs : int
+        number of processes, -1 for all cores
+    split : str
+        time to impute blocks of consecutive rows with all columns, keeps the correlation between all stations
+        and the accuracy depends on the block size and the overlap.
+        station to impute the columns of every station over all rows, keeps the full history
+        but drops the correlation between stations
+    n_blocks : int
+        number of time blocks, more blocks are faster but less accurate. Is None to use one block per process
+    overlap : int
+        number of rows added before and after every time block
+    max_iter : int
+        maximum number of imputation rounds of every imputer
+
+    Returns
+    -------
+    pd.DataFrame
+        df with the imputed values, same index and columns
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    values = df.to_numpy(dtype=float)
+    fill_values = np.nan_to_num(np.nanmean(np.where(np.isnan(values).all(axis=0), 0, values), axis=0))
+
+    if split == "time":
+        blocks = time_blocks(len(df), n_jobs if n_blocks is None else n_blocks, overlap)
+        tasks = [(values[start:stop], fill_values) for start, stop, _, _ in blocks]
+    elif split == "station":
+        groups = [[df.columns.get_loc(column) for column in group] for group in station_groups(df.columns)]
+        tasks = [(values[:, group], fill_values[group]) for group in groups]
+    else:
+        raise ValueError(f"Unknown split {split}, expected time or station")
+
+    if n_jobs == 1 or len(tasks) == 1:
+        results = [_impute_block(block, fill, max_iter) for block, fill in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+            results = list(executor.map(_impute_block, *zip(*tasks), [max_iter] * len(tasks)))
+
+    imputed = np.empty_like(values)
+    if split == "time":
+        for (start, _, core_start, core_stop), result in zip(blocks, results):
+            imputed[core_start:core_stop] = result[core_start - start:core_stop - start]
+    else:
+        for group, result in zip(groups, results):
+            imputed[:, group] = result
+    float32_columns = {column: np.float32 for column, dtype in df.dtypes.items() if dtype == np.float32}
+    return pd.DataFrame(imputed, index=df.index, columns=df.columns).astype(float32_columns)
@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pandas as pd
+from air_pred.utils import online_features
+
+ROW_HASHES_FILE = "row_hashes_{name}.npz"
+# hours of hashes kept before the most recent hour, rows older than this that are returned again are treated as new
+RETENTION_HOURS = int(os.environ.get("AIR_PRED_ROW_HASH_RETENTION_HOURS", 24 * 90))
+
+def hash_rows(df : pd.DataFrame, key : str = "date_time", exclude : list = ()) -> tuple:
+    """Function that returns the hour and a 64 bit hash of the content of every row. The columns are hashed in sorted order
+        with pd.util.hash_pandas_object, so the hash does not depend on the column order but on the values and their types
+    Parameters
+    ----------
+    df : pd.DataFrame
+        rows to be hashed
+    key : str
+        date_time column the rows are identified by, it is not part of the hash
+    exclude : list
+        columns that are not part of the hash
+
+    Returns
+    -------
+    tuple
+        (hours, hashes) as int64 and uint64 arrays in the order of df
+    """
+    columns = sorted(column for column in df.columns if column != key and column not in exclude)
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy(dtype=np.uint64)
+    return online_features.to_hours(df[key]), hashes
+
+class RowHashStore(object):
+    """Content hashes of the rows written to a feature group keyed by their hour, kept as two arrays sorted by hour so that the
+        rows of a new batch are looked up with one searchsorted"""
+
+    def __init__(self, retention_hours : int = RETENTION_HOURS):
+        self.retention_hours = retention_hours
+        self.hours = np.zeros(0, dtype=np.int64)
+        self.hashes = np.zeros(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    def diff(self, hours : np.ndarray, hashes : np.ndarray) -> tuple:
+        """Function that compares rows with the stored hashes
+        Parameters
+        ----------
+        hours : np.ndarray
+            hour of every row, see hash_rows
+        hashes : np.ndarray
+            hash of every row
+
+        Returns
+        -------
+        tuple
+            (new, modified) boolean masks of the rows whose hour is not stored and of the rows whose hash differs from the stored one
+        """
+        hours, hashes = np.asarray(hours, dtype=np.int64), np.asarray(hashes, dtype=np.uint64)
+        if len(self.hours) == 0:
+            return np.ones(len(hours), dtype=bool), np.zeros(len(hours), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.hours, hours), len(self.hours) - 1)
+        stored = self.hours[positions] == hours
+        return ~stored, stored & (self.hashes[positions] != hashes)
+
+    def update(self, hours : np.ndarray, hashes : np.ndarray):
+        """Function that stores the hashes of written rows, a later row of the same hour replaces the stored hash and hours
+            older than retention_hours before the most recent hour are dropped"""
+        hours = np.r_[self.hours, np.asarray(hours, dtype=np.int64)]
+        hashes = np.r_[self.hashes, np.asarray(hashes, dtype=np.uint64)]
+        order = np.argsort(hours, kind="stable")
+        hours, hashes = hours[order], hashes[order]
+        last = np.r_[hours[1:] != hours[:-1], True] if len(hours) else np.zeros(0, dtype=bool)
+        if len(hours):
+            last &= hours > hours[-1] - self.retention_hours
+        self.hours, self.hashes = hours[last], hashes[last]
+
+    def save(self, path : str):
+        """Function that writes the hashes to an npz file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as state:
+            np.savez(state, hours=self.hours, hashes=self.hashes, retention_hours=self.retention_hours)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path : str, retention_hours : int = RETENTION_HOURS):
+        """Function that loads hashes written by save, an empty store is returned if no usable file exists so that all rows are new"""
+        store = cls(retention_hours)
+        if not os.path.exists(path):
+            return store
+        try:
+            with np.load(path) as state:
+                store.update(state["hours"], state["hashes"])
+        except (OSError, ValueError, KeyError):
+            return cls(retention_hours)
+        return store
+
+def changed_rows(df : pd.DataFrame, store : RowHashStore, key : str = "date_time", exclude : list = ()) -> tuple:
+    """Function that returns the rows of df that are new or differ from the rows written before
+    Parameters
+    ----------
+    df : pd.DataFrame
+        rows returned by the source
+    store : RowHashStore
+        hashes of the rows written before, it is not updated
+    key : str
+        date_time column the rows are identified by
+    exclude : list
+        columns that are not compared
+
+    Returns
+    -------
+    tuple
+        (changed_df, hours, hashes, counts) the new and modified rows, their hours and hashes to be stored once they are
+        written and the number of rows that were new, modified and skipped
+    """
+    hours, hashes = hash_rows(df, key, exclude)
+    # of rows with the same hour the last one is compared
+    last = np.ones(len(hours), dtype=bool)
+    order = np.argsort(hours, kind="stable")
+    duplicate = np.r_[hours[order][1:] == hours[order][:-1], False]
+    last[order[duplicate]] = False
+    new, modified = store.diff(hours, hashes)
+    changed = (new | modified) & last
+    counts = {"new": int((new & last).sum()), "modified": int((modified & last).sum()), "skipped": int(len(df) - changed.sum())}
+    return df[changed], hours[changed], hashes[changed], counts
@@ -0,0 +1,84 @@
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+
+WATERMARK_FILE = "scoring_watermarks.json"
+
+def watermark_key(model_name : str, model_version : int) -> str:
+    """Function that returns the key of the watermark of a model version"""
+    return f"{model_name}_{model_version}"
+
+def load_watermarks(path : str) -> dict:
+    """Function that loads the stored watermarks
+    Parameters
+    ----------
+    path : str
+        file the watermarks were written to by save_watermark
+
+    Returns
+    -------
+    dict
+        key of the model version -> pd.Timestamp of the last scored date_time, empty if no usable file exists
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as watermark_file:
+            return {key: pd.Timestamp(value) for key, value in json.load(watermark_file).items()}
+    except (OSError, ValueError):
+        return {}
+
+def save_watermark(path : str, key : str, scored_until : datetime.datetime):
+    """Function that stores the last scored date_time of a model version next to the watermarks of the other model versions
+    Parameters
+    ----------
+    path : str
+        file the watermarks are written to
+    key : str
+        key of the model version returned by watermark_key
+    scored_until : datetime.datetime
+        date_time of the most recent row that was scored and inserted
+    """
+    watermarks = load_watermarks(path)
+    watermarks[key] = pd.Timestamp(scored_until)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as watermark_file:
+        json.dump({name: value.isoformat() for name, value in watermarks.items()}, watermark_file)
+    os.replace(path + ".tmp", path)
+
+def find_rows_to_score(data_df : pd.DataFrame, predicted_df : pd.DataFrame, watermark : datetime.datetime, label : str = "femman_pm25") -> pd.DataFrame:
+    """Function that finds the rows that have to be scored. Rows after the watermark are new, rows up to the watermark are
+        late when they have no prediction and updated when their label differs from the label stored with the prediction
+    Parameters
+    ----------
+    data_df : pd.DataFrame
+        rows of the cleaned data from the start of the late row window on, with date_time, date_time_str and label
+    predicted_df : pd.DataFrame
+        predictions from the start of the late row window on, with date_time and label
+    watermark : datetime.datetime
+        date_time of the most recent scored row
+    label : str
+        column that is stored with the predictions
+
+    Returns
+    -------
+    pd.DataFrame
+        date_time, date_time_str and label of the rows to be scored ordered by date_time, with a reason column
+        that is new, late or updated
+    """
+    rows = data_df[["date_time", "date_time_str", label]].drop_duplicates('date_time', keep="last")
+    watermark = pd.Timestamp(watermark)
+    predicted = predicted_df[["date_time", label]].drop_duplicates('date_time', keep="last").rename(columns={label: "scored_label"})
+    rows = rows.merge(predicted, on="date_time", how="left", indicator=True)
+
+    late = (rows.date_time <= watermark) & (rows._merge == "left_only")
+    changed = ~np.isclose(rows[label].astype(float), rows.scored_label.astype(float), equal_nan=True)
+    updated = (rows.date_time <= watermark) & (rows._merge == "both") & changed
+    rows["reason"] = None
+    rows.loc[rows.date_time > watermark, "reason"] = "new"
+    rows.loc[late, "reason"] = "late"
+    rows.loc[updated, "reason"] = "updated"
+    rows = rows[rows.reason.notna()].drop(["scored_label", "_merge"], axis=1)
+    return rows.sort_values('date_time').reset_index(drop=True)
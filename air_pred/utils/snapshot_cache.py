@@ -0,0 +1,218 @@
+from __future__ import annotations
+import typing
+import os
+import json
+import time
+import shutil
+import threading
+import pandas as pd
+from air_pred.utils import data_preprocessing, feature_store, instrumentation
+
+if typing.TYPE_CHECKING:
+    import hsfs
+
+CACHE_DIR = os.environ.get("AIR_PRED_CACHE_DIR", "./.air_pred_cache/feature_groups")
+MAX_CACHE_BYTES = int(os.environ.get("AIR_PRED_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+class FeatureGroupCache(object):
+    """Local parquet snapshots of feature groups keyed by (name, version). The newest date_time of a snapshot is kept
+        as high water mark and on the next read only rows from the high water mark onwards are read from the feature store.
+        These rows are appended to the snapshot as a new parquet part and merged on the primary key when the snapshot is read,
+        the parts are compacted into a single file once there are more than max_parts of them.
+        Rows older than the high water mark that are changed in the feature store are only seen if the writer calls
+        record_write, which lowers the high water mark to the oldest written row, or invalidates the snapshot.
+        The feature store returns date_time with a time zone while the pipelines write it without one, the snapshot and the
+        high water mark therefore hold date_time without time zone and the time zone of the feature group is kept next to
+        the high water mark to filter the next read"""
+
+    def __init__(self, cache_dir : str = CACHE_DIR, max_bytes : int = MAX_CACHE_BYTES, max_parts : int = 16):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            directory the snapshots and the index are stored in
+        max_bytes : int
+            maximum size of all snapshots, least recently used snapshots are evicted above it
+        max_parts : int
+            number of appended parts after which a snapshot is compacted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_parts = max_parts
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        # the pipelines share the cache and run stages in threads, every change of the index is a read modify write under this lock
+        self._lock = threading.RLock()
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as index_file:
+            return json.load(index_file)
+
+    def _save_index(self, index : dict):
+        with open(self.index_path + ".tmp", "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def _part_path(self, key : str, part : int) -> str:
+        return os.path.join(self.cache_dir, key, f"part-{part:05d}.parquet")
+
+    @staticmethod
+    def key(fg : hsfs.feature_group.FeatureGroup) -> str:
+        return f"{fg.name}_{fg.version}"
+
+    def _read_snapshot(self, key : str, entry : dict, primary_key : list) -> pd.DataFrame:
+        parts = [pd.read_parquet(self._part_path(key, part)) for part in range(entry["parts"])]
+        if len(parts) == 1:
+            return parts[0]
+        return pd.concat(parts, ignore_index=True).drop_duplicates(primary_key, keep="last").reset_index(drop=True)
+
+    @staticmethod
+    def _read_naive(fg : hsfs.feature_group.FeatureGroup, start_time : pd.Timestamp = None) -> tuple:
+        """Reads rows of the feature group with date_time converted to datetime without time zone, returns the rows and the time zone"""
+        df = feature_store.read_feature_group(fg, start_time=start_time)
+        date_time = pd.to_datetime(df.date_time)
+        time_zone = str(date_time.dt.tz) if date_time.dt.tz is not None else None
+        df["date_time"] = data_preprocessing.naive_date_time(date_time)
+        return df, time_zone
+
+    @instrumentation.instrument("snapshot_cache_read")
+    def read(self, fg : hsfs.feature_group.FeatureGroup) -> pd.DataFrame:
+        """Function that returns all rows of the feature group, reading only the rows newer than the snapshot from the feature store
+        Parameters
+        ----------
+        fg : hsfs.feature_group.FeatureGroup
+            feature group with an event time column named date_time
+
+        Returns
+        -------
+        pd.DataFrame
+            rows of the feature group
+        """
+        key = self.key(fg)
+        primary_key = list(fg.primary_key)
+        with self._lock:
+            entry = self._load_index().get(key)
+        if entry is not None and not all(os.path.exists(self._part_path(key, part)) for part in range(entry["parts"])):
+            entry = None
+
+        if entry is None:
+            df, time_zone = self._read_naive(fg)
+            self._write_part(key, df, part=0, time_zone=time_zone)
+            return df
+
+        # rows at the high water mark are read again so that rows updated at the same date_time are replaced
+        start_time = pd.Timestamp(entry["high_water_mark"])
+        if entry.get("time_zone") is not None:
+            start_time = start_time.tz_localize(entry["time_zone"])
+        delta, time_zone = self._read_naive(fg, start_time=start_time)
+        snapshot = self._read_snapshot(key, entry, primary_key)
+        if len(delta) == 0:
+            with self._lock:
+                index = self._load_index()
+                if key in index:
+                    index[key]["last_used"] = time.time()
+                    self._save_index(index)
+            return snapshot
+
+        if set(delta.columns) != set(snapshot.columns):
+            # the schema of the feature group changed, the snapshot is rebuilt
+            self._remove_snapshot(key)
+            df, time_zone = self._read_naive(fg)
+            self._write_part(key, df, part=0, time_zone=time_zone)
+            return df
+
+        delta = delta[snapshot.columns]
+        df = pd.concat([snapshot, delta], ignore_index=True).drop_duplicates(primary_key, keep="last").reset_index(drop=True)
+        if entry["parts"] >= self.max_parts:
+            self._remove_snapshot(key)
+            self._write_part(key, df, part=0, time_zone=time_zone)
+        else:
+            self._write_part(key, delta, part=entry["parts"], time_zone=time_zone)
+        return df
+
+    def _write_part(self, key : str, df : pd.DataFrame, part : int, time_zone : str = None):
+        path = self._part_path(key, part)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+        with self._lock:
+            index = self._load_index()
+            # parts after the first one are only written for non empty deltas
+            previous_bytes = index[key]["bytes"] if part > 0 and key in index else 0
+            high_water_mark = df.date_time.max() if len(df) else pd.Timestamp.min
+            index[key] = {"high_water_mark": pd.Timestamp(high_water_mark).isoformat(),
+                          "time_zone": time_zone,
+                          "parts": part + 1,
+                          "bytes": previous_bytes + os.path.getsize(path),
+                          "last_used": time.time()}
+            self._evict(index, keep=key)
+            self._save_index(index)
+
+    def _evict(self, index : dict, keep : str = None):
+        """Removes least recently used snapshots until all snapshots fit into max_bytes, the snapshot keep is never removed"""
+        total_bytes = sum(entry["bytes"] for entry in index.values())
+        for key in sorted(index, key=lambda key: index[key]["last_used"]):
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total_bytes -= index[key]["bytes"]
+            self._remove(key, index)
+
+    def _remove(self, key : str, index : dict):
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+        index.pop(key, None)
+
+    def _remove_snapshot(self, key : str):
+        with self._lock:
+            index = self._load_index()
+            self._remove(key, index)
+            self._save_index(index)
+
+    def invalidate(self, fg : hsfs.feature_group.FeatureGroup = None):
+        """Function that removes the snapshot of a feature group, or all snapshots if fg is None"""
+        with self._lock:
+            index = self._load_index()
+            keys = list(index) if fg is None else [self.key(fg)]
+            for key in keys:
+                self._remove(key, index)
+            self._save_index(index)
+
+    def record_write(self, fg : hsfs.feature_group.FeatureGroup, df : pd.DataFrame):
+        """Function that is called after rows were inserted into a feature group. If rows older than the high water mark of the
+            snapshot were written, the high water mark is moved back to the oldest of them so that the next read replaces them
+        Parameters
+        ----------
+        fg : hsfs.feature_group.FeatureGroup
+            feature group the rows were inserted into
+        df : pd.DataFrame
+            inserted rows with date_time
+        """
+        if len(df) == 0:
+            return
+        date_time = pd.to_datetime(df.date_time)
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(self.key(fg))
+            if entry is None:
+                return
+            # the high water mark has no time zone, written rows with a time zone are compared in the time zone of the feature group
+            if date_time.dt.tz is not None and entry.get("time_zone") is not None:
+                date_time = date_time.dt.tz_convert(entry["time_zone"])
+            oldest = pd.Timestamp(data_preprocessing.naive_date_time(date_time).min())
+            if oldest >= pd.Timestamp(entry["high_water_mark"]):
+                return
+            entry["high_water_mark"] = oldest.isoformat()
+            self._save_index(index)
+
+_default_cache = None
+
+def default_cache() -> FeatureGroupCache:
+    """Returns the cache in CACHE_DIR shared by the pipelines"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FeatureGroupCache()
+    return _default_cache
@@ -0,0 +1,214 @@
+import os
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing, time_series_features
+
+# Maximum number of rows the IterativeImputer of the streaming backfill is fitted on, the sample is kept in memory while
+# the file is read so it bounds the peak memory of the fit whatever the size of the file
+STREAMING_FIT_ROWS = int(os.environ.get("AIR_PRED_STREAMING_FIT_ROWS", 50000))
+
+def iter_raw_chunks(path : str, chunksize : int, lean : bool = False):
+    """Generator that reads a historical csv file in chunks and creates the date_time feature for every chunk
+    Parameters
+    ----------
+    path : str
+        path of the csv file, rows must be ordered by date and time
+    chunksize : int
+        number of rows per chunk
+    lean : bool
+        if set true sensor columns are read as float32 and date_time_str is not created
+
+    Yields
+    ------
+    pd.DataFrame
+        chunk with the date_time feature
+    """
+    dtypes = None
+    if lean:
+        columns = pd.read_csv(path, skipinitialspace = True, nrows=0).columns
+        dtypes = {column: np.float32 for column in columns if column.lower().strip() not in ['date', 'time']}
+    previous_date_time = None
+    for chunk in pd.read_csv(path, skipinitialspace = True, chunksize=chunksize, dtype=dtypes):
+        chunk = data_preprocessing.create_date_time_feature(chunk, keep_date_time_str=not lean)
+        if not chunk.date_time.is_monotonic_increasing or (previous_date_time is not None and chunk.date_time.iloc[0] <= previous_date_time):
+            raise ValueError("Streaming backfill requires the csv file to be ordered by date and time")
+        previous_date_time = chunk.date_time.iloc[-1]
+        yield chunk
+
+def find_nan_features(path : str, chunksize : int) -> list:
+    """Function that finds the columns with more than 50% nan values in a csv file while reading it in chunks,
+        the same columns remove_nan_features drops from the complete dataframe
+    Parameters
+    ----------
+    path : str
+        path of the csv file
+    chunksize : int
+        number of rows per chunk
+
+    Returns
+    -------
+    list
+        names of the noisy columns after create_date_time_feature
+    """
+    nan_counts = None
+    n_rows = 0
+    for chunk in pd.read_csv(path, skipinitialspace = True, chunksize=chunksize):
+        chunk.columns = chunk.columns.str.lower().str.strip()
+        counts = chunk.isna().sum()
+        nan_counts = counts if nan_counts is None else nan_counts + counts
+        n_rows += len(chunk)
+    return nan_counts.index[nan_counts / n_rows * 100 > 50].tolist()
+
+class StreamingInterpolator(object):
+    """Linear interpolation over consecutive chunks that gives the same result as df.interpolate() on the concatenated chunks.
+        Rows are only returned once every column has a valid value at or after them, the other rows are held back until
+        the next chunk arrives. For every column the last valid value before the held back rows is kept as anchor,
+        so the memory needed is bounded by the longest run of missing values and not by the size of the file"""
+
+    def __init__(self, columns : list):
+        """
+        Parameters
+        ----------
+        columns : list
+            names of the columns to be interpolated, all other columns are passed through
+        """
+        self.columns = list(columns)
+        self.position = 0
+        self.pending = None
+        self.anchors = {}
+
+    def _interpolate(self, frame : pd.DataFrame) -> pd.DataFrame:
+        """Interpolates the columns of frame that contain nan values using the row positions as index together with the anchors"""
+        nan_columns = [column for column in self.columns if frame[column].isna().any()]
+        if not nan_columns:
+            return frame
+        anchor_values = {}
+        for column in nan_columns:
+            if column in self.anchors:
+                position, value = self.anchors[column]
+                anchor_values.setdefault(position, {})[column] = value
+        anchor_df = pd.DataFrame.from_dict(anchor_values, orient="index", columns=nan_columns, dtype=float)
+        values = pd.concat([anchor_df, frame[nan_columns]]).sort_index()
+        values = values.interpolate(method="index").loc[frame.index]
+        return frame.assign(**{column: values[column] for column in nan_columns})
+
+    def push(self, chunk : pd.DataFrame) -> pd.DataFrame:
+        """Adds the next chunk and returns all rows whose interpolated values are final"""
+        chunk = chunk.set_axis(pd.RangeIndex(self.position, self.position + len(chunk)))
+        self.position += len(chunk)
+        frame = chunk if self.pending is None else pd.concat([self.pending, chunk])
+
+        last_valid = [frame[column].last_valid_index() for column in self.columns]
+        settled_until = frame.index[0] if any(index is None for index in last_valid) else min(last_valid)
+        settled = frame[frame.index < settled_until]
+        self.pending = frame[frame.index >= settled_until]
+        if len(settled) == 0:
+            return settled
+
+        # the values after settled_until are needed to interpolate the missing values at the end of settled
+        result = self._interpolate(frame).loc[settled.index]
+        for column in self.columns:
+            index = settled[column].last_valid_index()
+            if index is not None:
+                self.anchors[column] = (index, settled.at[index, column])
+        return result
+
+    def flush(self) -> pd.DataFrame:
+        """Returns the rows that are still held back, interpolated like the end of the complete dataframe"""
+        if self.pending is None or len(self.pending) == 0:
+            return pd.DataFrame()
+        result = self._interpolate(self.pending)
+        self.pending = None
+        return result
+
+def fit_streaming_imputer(path : str, chunksize : int, drop_columns : list, fit_rows : int = STREAMING_FIT_ROWS, lean : bool = False):
+    """Function that fits the IterativeImputer on evenly spaced rows of a csv file while reading it in chunks. Files with more
+        than fit_rows rows are fitted on a sample, the imputed values then differ from fitting clean_data_IterativeImputer
+        on the complete file
+    Parameters
+    ----------
+    path : str
+        path of the csv file
+    chunksize : int
+        number of rows per chunk
+    drop_columns : list
+        columns not used, as returned by find_nan_features
+    fit_rows : int
+        maximum number of evenly spaced rows the imputer is fitted on, None to fit on all rows which gives the same
+        imputed values as clean_data_IterativeImputer on the complete file but keeps the complete file in memory
+    lean : bool
+        if set true sensor columns are read as float32
+
+    Returns
+    -------
+    IterativeImputer
+        fitted imputer
+    """
+    n_rows = sum(len(chunk) for chunk in pd.read_csv(path, skipinitialspace = True, chunksize=chunksize, usecols=[0]))
+    step = 1 if fit_rows is None else max(1, int(np.ceil(n_rows / fit_rows)))
+    samples = []
+    offset = 0
+    for chunk in iter_raw_chunks(path, chunksize, lean=lean):
+        chunk = chunk.drop(drop_columns, axis=1)
+        samples.append(chunk.iloc[(-offset) % step::step])
+        offset += len(chunk)
+    return data_preprocessing.fit_iterative_imputer(pd.concat(samples, ignore_index=True))
+
+def iter_backfill_chunks(path : str, chunksize : int, method : str = "baseline", lean : bool = False, fit_rows : int = STREAMING_FIT_ROWS):
+    """Generator that runs the backfill preprocessing on a csv file chunk by chunk. Concatenating the yielded frames
+        gives the same raw, cleaned and time series data as processing the complete file at once, with the iterative method
+        as long as the file has at most fit_rows rows
+    Parameters
+    ----------
+    path : str
+        path of the csv file, rows must be ordered by date and time
+    chunksize : int
+        number of rows per chunk
+    method : str
+        baseline for clean_data_baseline or iterative for clean_data_IterativeImputer
+    lean : bool
+        if set true chunks are processed in memory lean mode, see data_preprocessing.to_insert_frame
+    fit_rows : int
+        maximum number of rows the imputer is fitted on when method is iterative, see fit_streaming_imputer
+
+    Yields
+    ------
+    tuple
+        raw, cleaned and time series dataframe of the chunk. Cleaned and time series frames can be empty or contain
+        rows of earlier chunks when interpolation has to wait for the next chunk
+    """
+    drop_columns = find_nan_features(path, chunksize)
+    tail = None
+
+    if method == "iterative":
+        imputer = fit_streaming_imputer(path, chunksize, drop_columns, fit_rows=fit_rows, lean=lean)
+        clean = lambda chunk: data_preprocessing.clean_data_IterativeImputer(chunk.drop(drop_columns, axis=1), imputer=imputer)
+        flush = lambda: pd.DataFrame()
+    elif method == "baseline":
+        interpolator = None
+
+        def clean(chunk):
+            nonlocal interpolator
+            chunk = chunk.drop(drop_columns, axis=1)
+            if interpolator is None:
+                interpolator = StreamingInterpolator([column for column in chunk.columns if column not in data_preprocessing.DATE_TIME_COLUMNS])
+            return interpolator.push(chunk)
+        flush = lambda: interpolator.flush() if interpolator is not None else pd.DataFrame()
+    else:
+        raise ValueError(f"Unknown cleaning method {method}")
+
+    def time_series(cleaned_df):
+        nonlocal tail
+        if len(cleaned_df) == 0:
+            return pd.DataFrame()
+        tsdf = time_series_features.create_features(cleaned_df, history=tail)
+        tail = time_series_features.history_tail(cleaned_df if tail is None else pd.concat([tail, cleaned_df]))
+        return tsdf
+
+    for raw_df in iter_raw_chunks(path, chunksize, lean=lean):
+        cleaned_df = clean(raw_df).reset_index(drop=True)
+        yield raw_df, cleaned_df, time_series(cleaned_df)
+
+    cleaned_df = flush().reset_index(drop=True)
+    if len(cleaned_df):
+        yield pd.DataFrame(), cleaned_df, time_series(cleaned_df)
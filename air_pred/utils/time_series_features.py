@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+# Declarative description of the time series features.
+# columns : columns features are created for
+# lags : feature name -> number of hours the column is shifted by
+# rolling : feature name -> (aggregation, window in hours), aggregated over the window before the row, the row itself is excluded
+# calendar : attributes of date_time added as features, for example hour, dayofweek or month
+# name_template : name of the created columns, filled with column and feature
+DEFAULT_SPEC = {
+    "columns": ["femman_pm25"],
+    "lags": {"prev_day": 24, "prev_week": 168},
+    "rolling": {},
+    "calendar": [],
+    "name_template": "{feature}",
+}
+
+def history_hours(spec : dict) -> int:
+    """Function that returns how many hours of history are needed to create the features of a row
+    Parameters
+    ----------
+    spec : dict
+        feature specification, see DEFAULT_SPEC
+
+    Returns
+    -------
+    int
+        largest lag or rolling window of the specification in hours
+    """
+    hours = list(spec.get("lags", {}).values()) + [window for _, window in spec.get("rolling", {}).values()]
+    return max(hours, default=0)
+
+def dependent_hours(hours, spec : dict = DEFAULT_SPEC) -> np.ndarray:
+    """Function that returns the hours whose features read the values of the given hours, the hours themselves, the hours
+        a lag after them and the hours whose rolling window contains them
+    Parameters
+    ----------
+    hours : np.ndarray
+        whole hours since 1970-01-01 00:00 of rows whose values changed
+    spec : dict
+        feature specification, see DEFAULT_SPEC
+
+    Returns
+    -------
+    np.ndarray
+        sorted unique hours
+    """
+    hours = np.asarray(hours, dtype=np.int64)
+    offsets = {0} | set(spec.get("lags", {}).values())
+    for _, window in spec.get("rolling", {}).values():
+        offsets |= set(range(1, window + 1))
+    return np.unique(np.concatenate([hours + offset for offset in sorted(offsets)]))
+
+def create_features(df : pd.DataFrame, spec : dict = DEFAULT_SPEC, history : pd.DataFrame = None, dropna : bool = True) -> pd.DataFrame:
+    """Function that creates lag, rolling window and calendar features for all columns of the specification in one pass.
+        Lags and windows are based on date_time and not on row positions, so missing hours give missing features
+        instead of values from the wrong hour
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time, the columns of the specification and optionally date_time_str
+    spec : dict
+        feature specification, see DEFAULT_SPEC
+    history : pd.DataFrame
+        rows before df that are only used to create the features of df, for example the tail returned by history_tail.
+        Is None if df contains the complete history
+    dropna : bool
+        if set true rows where a feature could not be created are dropped
+
+    Returns
+    -------
+    pd.DataFrame
+        date_time, date_time_str, the columns of the specification and the created features, indexed by date_time.
+        Contains only the rows of df when history is given
+    """
+    columns = list(spec["columns"])
+    template = spec.get("name_template", "{column}_{feature}")
+    key_columns = ['date_time', 'date_time_str'] if 'date_time_str' in df.columns else ['date_time']
+    frame = df[key_columns + columns]
+    if history is not None:
+        frame = pd.concat([history[key_columns + columns], frame])
+    frame = frame.drop_duplicates('date_time', keep='last').sort_values('date_time')
+    frame = frame.set_index('date_time', drop=False)
+
+    values = frame[columns]
+    features = []
+    for feature, hours in spec.get("lags", {}).items():
+        shifted = values.shift(freq=pd.Timedelta(hours=hours)).reindex(values.index)
+        features.append(shifted.set_axis([template.format(column=column, feature=feature) for column in columns], axis=1))
+    for feature, (aggregation, hours) in spec.get("rolling", {}).items():
+        rolled = values.astype(float).rolling(pd.Timedelta(hours=hours), closed="left").agg(aggregation)
+        features.append(rolled.set_axis([template.format(column=column, feature=feature) for column in columns], axis=1))
+    if spec.get("calendar"):
+        features.append(pd.DataFrame({attribute: getattr(values.index, attribute) for attribute in spec["calendar"]}, index=values.index))
+
+    feature_df = pd.concat([frame] + features, axis=1)
+    if history is not None:
+        feature_df = feature_df[feature_df.date_time.isin(df.date_time)]
+    if dropna:
+        feature_df = feature_df.dropna()
+    return feature_df
+
+def history_tail(df : pd.DataFrame, spec : dict = DEFAULT_SPEC) -> pd.DataFrame:
+    """Function that returns the rows of df needed as history to create the features of rows appended after df
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe containing date_time, date_time_str and the columns of the specification
+    spec : dict
+        feature specification, see DEFAULT_SPEC
+
+    Returns
+    -------
+    pd.DataFrame
+        rows of df within history_hours of the last date_time
+    """
+    start_time = df.date_time.max() - pd.Timedelta(hours=history_hours(spec))
+    key_columns = ['date_time', 'date_time_str'] if 'date_time_str' in df.columns else ['date_time']
+    return df.loc[df.date_time >= start_time, key_columns + list(spec["columns"])].reset_index(drop=True)
+
+def save_history_tail(df : pd.DataFrame, path : str, spec : dict = DEFAULT_SPEC):
+    """Function that stores the history tail of df so that features of new rows can be created in incremental mode"""
+    history_tail(df, spec).to_parquet(path, index=False)
+
+def load_history_tail(path : str) -> pd.DataFrame:
+    """Function that loads a history tail stored with save_history_tail"""
+    return pd.read_parquet(path)
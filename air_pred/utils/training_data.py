@@ -0,0 +1,117 @@
+from __future__ import annotations
+import typing
+import os
+import json
+import numpy as np
+import pandas as pd
+from air_pred.utils import data_preprocessing, instrumentation
+
+if typing.TYPE_CHECKING:
+    import hsfs
+
+# Format the feature views write their training datasets in, parquet is read without parsing and keeps the column types
+TRAINING_DATA_FORMAT = os.environ.get("AIR_PRED_TRAINING_DATA_FORMAT", "parquet")
+# Local columnar copies of the training datasets, the features are stored as FEATURE_DTYPE in time order
+TRAINING_DATA_DIR = os.environ.get("AIR_PRED_TRAINING_DATA_DIR", "./.air_pred_cache/training_datasets")
+FEATURE_DTYPE = np.float32
+
+def to_table(X : pd.DataFrame, y : pd.DataFrame, dtype : type = FEATURE_DTYPE):
+    """Function that converts the features and labels of a split to an arrow table ordered by date_time. Features and labels
+        are cast to dtype, date_time is kept as the last column and date_time_str is dropped since it is derived from date_time
+    Parameters
+    ----------
+    X : pd.DataFrame
+        features of the split with date_time
+    y : pd.DataFrame
+        labels of the split in the order of X
+    dtype : type
+        type of the feature and label columns
+
+    Returns
+    -------
+    pyarrow.Table
+        features, labels and date_time, the names of the labels are stored in the schema metadata
+    """
+    import pyarrow as pa
+    order = np.argsort(X["date_time"].to_numpy(), kind="stable")
+    features = [column for column in X.columns if column not in data_preprocessing.DATE_TIME_COLUMNS]
+    y = y.to_frame() if isinstance(y, pd.Series) else y
+    arrays = [pa.array(X[column].to_numpy(dtype=dtype)[order]) for column in features]
+    arrays += [pa.array(y[column].to_numpy(dtype=dtype)[order]) for column in y.columns]
+    arrays.append(pa.array(pd.to_datetime(X["date_time"]).to_numpy()[order]))
+    table = pa.Table.from_arrays(arrays, names=features + list(y.columns) + ["date_time"])
+    return table.replace_schema_metadata({"labels": json.dumps(list(y.columns))})
+
+def write_split(path : str, X : pd.DataFrame, y : pd.DataFrame, dtype : type = FEATURE_DTYPE):
+    """Function that writes a split to a parquet file, see to_table"""
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pq.write_table(to_table(X, y, dtype), path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def read_split(path : str, features : list = None, date_time : bool = False) -> tuple:
+    """Function that reads a split written by write_split. Only the feature and label columns are read, date_time is
+        only loaded if asked for. The file is memory mapped and every column is handed to pandas as its own block without consolidation,
+        so the float columns are not copied again after they are decoded
+    Parameters
+    ----------
+    path : str
+        parquet file written by write_split
+    features : list
+        feature columns to read, all features if None
+    date_time : bool
+        if set true date_time is read as the last column of X
+
+    Returns
+    -------
+    tuple
+        (X, y) dataframes in time order
+    """
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(path)
+    labels = json.loads(schema.metadata[b"labels"])
+    if features is None:
+        features = [name for name in schema.names if name not in labels and name not in data_preprocessing.DATE_TIME_COLUMNS]
+    features = features + ["date_time"] if date_time else features
+    table = pq.read_table(path, columns=features + labels, memory_map=True)
+    X = table.select(features).to_pandas(split_blocks=True, self_destruct=True)
+    y = table.select(labels).to_pandas(split_blocks=True, self_destruct=True)
+    return X, y
+
+def split_path(fv : hsfs.feature_view.FeatureView, training_dataset_version : int, split : str, directory : str = TRAINING_DATA_DIR) -> str:
+    return os.path.join(directory, f"{fv.name}_{fv.version}_{training_dataset_version}", f"{split}.parquet")
+
+@instrumentation.instrument()
+def load_train_test_split(fv : hsfs.feature_view.FeatureView, training_dataset_version : int, directory : str = TRAINING_DATA_DIR, date_time : bool = False) -> tuple:
+    """Function that returns the train test split of a feature view as typed columns in time order. The split is read from the
+        feature store once and kept as local parquet files, training datasets are immutable so the files never go stale
+    Parameters
+    ----------
+    fv : hsfs.feature_view.FeatureView
+        feature view with the training dataset
+    training_dataset_version : int
+        version of the training dataset
+    directory : str
+        directory the local copies are stored in
+    date_time : bool
+        if set true trainX and testX keep date_time as their last column
+
+    Returns
+    -------
+    tuple
+        trainX, testX, trainY, testY without the date time columns, testX and trainX with date_time if it is set
+    """
+    paths = {split: split_path(fv, training_dataset_version, split, directory) for split in ("train", "test")}
+    if not all(os.path.exists(path) for path in paths.values()):
+        with instrumentation.stage("get_train_test_split") as stage:
+            trainX, testX, trainY, testY = fv.get_train_test_split(training_dataset_version=training_dataset_version)
+            stage.set_rows(rows_out=len(trainX) + len(testX))
+        write_split(paths["train"], trainX, trainY)
+        write_split(paths["test"], testX, testY)
+        del trainX, testX, trainY, testY
+    with instrumentation.stage("read_train_test_split") as stage:
+        trainX, trainY = read_split(paths["train"], date_time=date_time)
+        features = [column for column in trainX.columns if column != "date_time"]
+        testX, testY = read_split(paths["test"], features, date_time=date_time)
+        stage.set_rows(rows_out=len(trainX) + len(testX))
+    return trainX, testX, trainY, testY
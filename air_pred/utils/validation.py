@@ -0,0 +1,313 @@
+from __future__ import annotations
+import os
+import json
+import time
+import fnmatch
+import hashlib
+import typing
+import numpy as np
+import pandas as pd
+from air_pred.utils import instrumentation
+
+# great_expectations and hsfs are only needed to export the rules and are slow to import
+if typing.TYPE_CHECKING:
+    import great_expectations as ge
+    import hsfs
+
+# Declarative description of the checks run on a dataframe before it is inserted into a feature group.
+# key : column with the hourly timestamps, rows are checked to be on the hour and unique
+# max_null_rate : column pattern -> largest allowed fraction of missing values, the first matching pattern is used.
+#     When a column has more missing values all of its rows with a missing value fail
+# ranges : column pattern -> (minimum, maximum) of the physically possible values of the sensor, the first matching pattern is used.
+#     The ranges are wider than the values measured in Gothenburg, sensor offsets give slightly negative concentrations
+# Column patterns are fnmatch patterns on the lower case column names
+DEFAULT_RULES = {
+    "key": "date_time",
+    "max_null_rate": {"*": 0.0},
+    "ranges": {
+        "*_temp": (-50.0, 50.0),
+        "*_rh": (0.0, 100.0),
+        "*_globrad": (0.0, 1500.0),
+        "*_airpressure": (900.0, 1100.0),
+        "*_windspeed": (0.0, 75.0),
+        "*_winddir": (0.0, 360.0),
+        "*_rain": (0.0, 200.0),
+        "*_no2": (-50.0, 2000.0),
+        "*_nox": (-50.0, 4000.0),
+        "*_o3": (-50.0, 1000.0),
+        "*_pm10": (-100.0, 2000.0),
+        "*_pm25": (-100.0, 1000.0),
+        "prev_*": (-100.0, 1000.0),
+    },
+}
+# quarantine writes rows that fail a check to QUARANTINE_DIR and inserts the others, reject raises ValidationError
+# if any row fails and off inserts all rows unchecked
+VALIDATION_POLICY = os.environ.get("AIR_PRED_VALIDATION_POLICY", "quarantine")
+QUARANTINE_DIR = os.environ.get("AIR_PRED_QUARANTINE_DIR", "./quarantine")
+
+# flags of the row checks, a row can fail several checks
+NULL, RANGE, DUPLICATE_KEY, OFF_HOUR = 1, 2, 4, 8
+FLAG_NAMES = {NULL: "null", RANGE: "range", DUPLICATE_KEY: "duplicate_key", OFF_HOUR: "off_hour"}
+# feature group types and the numpy dtype kinds their columns may have
+TYPE_KINDS = {"double": "fiu", "float": "fiu", "bigint": "iu", "int": "iu", "timestamp": "M", "string": "OSU", "boolean": "b"}
+_NS_PER_HOUR = 3600 * 10 ** 9
+# expectation suites saved or found up to date by this process, keyed by feature group, version and fingerprint
+_synced_suites = set()
+
+class ValidationError(ValueError):
+    """Raised when a dataframe does not match the schema of its feature group or, with the reject policy, when rows fail a check.
+        report holds the report returned by validate"""
+
+    def __init__(self, name : str, report : dict):
+        super().__init__(f"Validation of {name} failed: {summary(report)}")
+        self.report = report
+
+def column_rule(column : str, patterns : dict):
+    """Function that returns the rule of the first pattern matching the lower case column name, None if no pattern matches"""
+    for pattern, rule in patterns.items():
+        if fnmatch.fnmatchcase(column.lower(), pattern):
+            return rule
+    return None
+
+def schema_from_features(features : list) -> dict:
+    """Function that returns column name -> type of the features of a feature group, None for a feature group
+        that was created but never inserted into and has no features yet"""
+    return {feature.name: feature.type for feature in features} or None
+
+def check_schema(df : pd.DataFrame, schema : dict) -> list:
+    """Function that compares the columns of df with the schema of a feature group
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe to be inserted
+    schema : dict
+        column name -> feature group type, see schema_from_features
+
+    Returns
+    -------
+    list
+        one message per missing, unexpected or mistyped column, empty if df matches the schema
+    """
+    errors = [f"missing column {column}" for column in schema if column not in df.columns]
+    errors += [f"unexpected column {column}" for column in df.columns if column not in schema]
+    for column, feature_type in schema.items():
+        kinds = TYPE_KINDS.get(str(feature_type).lower())
+        if column in df.columns and kinds is not None and df[column].dtype.kind not in kinds:
+            errors.append(f"column {column} has dtype {df[column].dtype}, expected {feature_type}")
+    return errors
+
+def validate(df : pd.DataFrame, rules : dict = DEFAULT_RULES, schema : dict = None) -> tuple:
+    """Function that runs all checks of the rules on df. The null and range checks work on the numpy arrays of the columns
+        and the key checks on one sorted copy of the timestamps, so no check loops over rows or creates an intermediate
+        dataframe, and the failed checks of every row are collected in one array of flags
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe to be inserted
+    rules : dict
+        checks to run, see DEFAULT_RULES
+    schema : dict
+        column name -> feature group type, the schema is not checked if None
+
+    Returns
+    -------
+    tuple
+        (report, flags). The report has the number of rows and failed rows, the number of failed rows per check and column,
+        the number of rows that are out of order and of missing hours between the first and the last row and the schema errors.
+        flags has one int per row with the bits of the checks the row failed, 0 for valid rows
+    """
+    n_rows = len(df)
+    flags = np.zeros(n_rows, dtype=np.int8)
+    checks = {}
+    key = rules.get("key")
+
+    columns = [column for column in df.columns if column != key and df[column].dtype.kind in "fiu"]
+    for column in columns:
+        # float64 columns are checked without a copy, every check is one pass over the values of the column
+        values = df[column].to_numpy(dtype=np.float64)
+        max_null_rate = column_rule(column, rules.get("max_null_rate", {}))
+        if max_null_rate is not None:
+            missing = np.isnan(values)
+            null_count = np.count_nonzero(missing)
+            # missing values only fail when the column has more of them than allowed
+            if null_count > max_null_rate * n_rows:
+                flags[missing] |= NULL
+                checks[f"null:{column}"] = null_count
+        bounds = column_rule(column, rules.get("ranges", {}))
+        if bounds is not None:
+            # comparisons with nan are false, missing values are never out of range
+            out_of_range = (values < bounds[0]) | (values > bounds[1])
+            range_count = np.count_nonzero(out_of_range)
+            if range_count:
+                flags[out_of_range] |= RANGE
+                checks[f"range:{column}"] = range_count
+
+    unordered = gaps = 0
+    if key is not None and key in df.columns and n_rows:
+        timestamps = pd.DatetimeIndex(df[key]).asi8
+        missing = timestamps == np.iinfo(np.int64).min
+        flags[missing] |= NULL
+        if missing.any():
+            checks[f"null:{key}"] = int(missing.sum())
+        flags[~missing & (timestamps % _NS_PER_HOUR != 0)] |= OFF_HOUR
+
+        order = np.argsort(timestamps, kind="stable")
+        ordered = timestamps[order]
+        # of rows with the same key the last one is kept, like an upsert into the feature group
+        duplicate = np.r_[ordered[1:] == ordered[:-1], False] & (ordered != np.iinfo(np.int64).min)
+        flags[order[duplicate]] |= DUPLICATE_KEY
+        unordered = int(np.count_nonzero(timestamps[1:] < np.maximum.accumulate(timestamps)[:-1]))
+        hours = ordered[ordered != np.iinfo(np.int64).min] // _NS_PER_HOUR
+        gaps = int(hours[-1] - hours[0] - np.count_nonzero(hours[1:] != hours[:-1])) if len(hours) else 0
+
+    for flag in (DUPLICATE_KEY, OFF_HOUR):
+        count = int(np.count_nonzero(flags & flag))
+        if count:
+            checks[FLAG_NAMES[flag]] = count
+    report = {"rows": n_rows, "failed_rows": int(np.count_nonzero(flags)), "checks": checks, "unordered_rows": unordered,
+              "missing_hours": gaps, "schema": check_schema(df, schema) if schema is not None else []}
+    return report, flags
+
+def describe_flags(flags : np.ndarray) -> np.ndarray:
+    """Function that converts the flags returned by validate to comma separated check names"""
+    names = np.full(len(flags), "", dtype=object)
+    for flag, name in FLAG_NAMES.items():
+        failed = (flags & flag) != 0
+        names[failed] = np.where(names[failed] == "", name, names[failed] + "," + name)
+    return names
+
+def summary(report : dict) -> str:
+    """Function that formats a report in one line for logs and exceptions"""
+    checks = ", ".join(f"{check}={count}" for check, count in report["checks"].items()) or "none"
+    text = f"{report['failed_rows']} of {report['rows']} rows failed, checks: {checks}"
+    if report["unordered_rows"] or report["missing_hours"]:
+        text += f", {report['unordered_rows']} rows out of order, {report['missing_hours']} missing hours"
+    if report["schema"]:
+        text += f", schema: {'; '.join(report['schema'])}"
+    return text
+
+def quarantine(df : pd.DataFrame, flags : np.ndarray, name : str, quarantine_dir : str = QUARANTINE_DIR) -> str:
+    """Function that writes the failed rows of df with the names of their failed checks to a parquet file
+    Returns
+    -------
+    str
+        path of the written file
+    """
+    failed = flags != 0
+    rows = df[failed].reset_index(drop=True).assign(validation_errors=describe_flags(flags[failed]))
+    os.makedirs(quarantine_dir, exist_ok=True)
+    path = os.path.join(quarantine_dir, f"{name}_{time.strftime('%Y%m%dT%H%M%S')}_{time.time_ns() % 10 ** 9:09d}.parquet")
+    rows.to_parquet(path, index=False)
+    return path
+
+def enforce(df : pd.DataFrame, name : str, rules : dict = DEFAULT_RULES, schema : dict = None, policy : str = None,
+            quarantine_dir : str = QUARANTINE_DIR) -> pd.DataFrame:
+    """Function that validates df before it is inserted into a feature group and applies the validation policy.
+        A dataframe that does not match the schema is always rejected, the feature group would not accept it
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe to be inserted
+    name : str
+        name of the feature group, used in the report, the stage name and the quarantine file
+    rules : dict
+        checks to run, see DEFAULT_RULES
+    schema : dict
+        column name -> feature group type, the schema is not checked if None
+    policy : str
+        quarantine, reject or off, VALIDATION_POLICY if None
+    quarantine_dir : str
+        directory the failed rows are written to with the quarantine policy
+
+    Returns
+    -------
+    pd.DataFrame
+        the rows of df that passed all checks
+    """
+    policy = VALIDATION_POLICY if policy is None else policy
+    if policy == "off":
+        return df
+    if policy not in ("quarantine", "reject"):
+        raise ValueError(f"Unknown validation policy {policy}, expected quarantine, reject or off")
+
+    with instrumentation.stage(f"validate_{name}", rows_in=len(df)) as stage:
+        report, flags = validate(df, rules, schema)
+        if report["schema"] or (report["failed_rows"] and policy == "reject"):
+            raise ValidationError(name, report)
+        if report["failed_rows"]:
+            path = quarantine(df, flags, name, quarantine_dir)
+            print(f"Quarantined rows of {name} to {path}: {summary(report)}")
+            df = df[flags == 0]
+        stage.set_rows(rows_out=len(df))
+    return df
+
+def rules_fingerprint(rules : dict, columns : list) -> str:
+    """Function that returns a hash of the rules and the columns they are applied to, it changes whenever the exported
+        expectation suite would change"""
+    content = json.dumps({"rules": rules, "columns": sorted(columns)}, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+def to_expectation_suite(rules : dict, columns : list, suite_name : str) -> ge.core.ExpectationSuite:
+    """Function that exports the rules as an equivalent great expectations suite, so that the checks are documented
+        and monitored in the feature store. The fingerprint of the rules is stored in the meta of the suite
+    Parameters
+    ----------
+    rules : dict
+        checks to export, see DEFAULT_RULES
+    columns : list
+        columns of the feature group
+    suite_name : str
+        name of the expectation suite
+
+    Returns
+    -------
+    ge.core.ExpectationSuite
+        suite with one expectation per null rate, range and key check
+    """
+    import great_expectations as ge
+    suite = ge.core.ExpectationSuite(expectation_suite_name=suite_name, meta={"rules_fingerprint": rules_fingerprint(rules, columns)})
+
+    def expect(expectation_type, **kwargs):
+        suite.add_expectation(ge.core.ExpectationConfiguration(expectation_type=expectation_type, kwargs=kwargs))
+
+    for column in columns:
+        max_null_rate = column_rule(column, rules.get("max_null_rate", {}))
+        if max_null_rate is not None and max_null_rate < 1:
+            expect("expect_column_values_to_not_be_null", column=column, mostly=1 - max_null_rate)
+        bounds = column_rule(column, rules.get("ranges", {}))
+        if bounds is not None and column != rules.get("key"):
+            expect("expect_column_values_to_be_between", column=column, min_value=bounds[0], max_value=bounds[1])
+    if rules.get("key") in columns:
+        expect("expect_column_values_to_be_unique", column=rules["key"])
+    return suite
+
+def sync_expectation_suite(fg : hsfs.feature_group.FeatureGroup, rules : dict = DEFAULT_RULES, suite_name : str = None) -> bool:
+    """Function that saves the exported rules as the expectation suite of a feature group when the rules or the columns
+        changed since the suite was saved. The suite is not run on insert, the rows were already validated by enforce
+    Parameters
+    ----------
+    fg : hsfs.feature_group.FeatureGroup
+        feature group the suite belongs to
+    rules : dict
+        checks to export, see DEFAULT_RULES
+    suite_name : str
+        name of the expectation suite, the name of the feature group if None
+
+    Returns
+    -------
+    bool
+        True if the suite was saved, False if the saved suite is up to date
+    """
+    columns = [feature.name for feature in fg.features]
+    key = (fg.name, getattr(fg, "version", None), rules_fingerprint(rules, columns))
+    if key in _synced_suites:
+        return False
+    try:
+        current = fg.get_expectation_suite()
+    except Exception:
+        current = None
+    saved = current is None or (getattr(current, "meta", None) or {}).get("rules_fingerprint") != key[2]
+    if saved:
+        fg.save_expectation_suite(to_expectation_suite(rules, columns, suite_name or fg.name), run_validation=False, validation_ingestion_policy="ALWAYS")
+    _synced_suites.add(key)
+    return saved
@@ -1,16 +1,114 @@
 import os
+import time
+import base64
+import queue
+import threading
+from concurrent.futures import Future
 import numpy as np
-import hsfs
 import joblib
 
+# Micro batching of concurrent requests, a batch is sent to the model when it holds MAX_BATCH_SIZE rows
+# or when MAX_BATCH_DELAY seconds passed since its first request arrived. With a delay of 0 all requests that queued up 
+# while the previous batch was predicted are batched together. A MAX_BATCH_SIZE of 1 disables micro batching
+MAX_BATCH_SIZE = int(os.environ.get("PREDICTOR_MAX_BATCH_SIZE", 256))
+MAX_BATCH_DELAY = float(os.environ.get("PREDICTOR_MAX_BATCH_DELAY", 0.0))
+
+def find_model_artifact(directory : str, model_name : str = None) -> str:
+    """ Returns the path of the model artifact in directory. Every registered model stores its own <model name>.pkl,
+        model versions registered before store linear_regression.pkl"""
+    artifacts = sorted(name for name in os.listdir(directory) if name.endswith(".pkl"))
+    model_name = model_name or os.environ.get("MODEL_NAME")
+    for name in ([f"{model_name}.pkl"] if model_name else []) + ["linear_regression.pkl"]:
+        if name in artifacts:
+            return os.path.join(directory, name)
+    if len(artifacts) != 1:
+        raise FileNotFoundError(f"Expected one model artifact in {directory} but found {artifacts}")
+    return os.path.join(directory, artifacts[0])
+
 class Predict(object):
 
-    def __init__(self):
-        """ Initializes the serving state, reads a trained model"""        
+    def __init__(self, model=None, max_batch_size : int = MAX_BATCH_SIZE, max_batch_delay : float = MAX_BATCH_DELAY):
+        """ Initializes the serving state, reads a trained model and warms it up"""
         # load the trained model
-        self.model = joblib.load(os.environ["ARTIFACT_FILES_PATH"] + "/linear_regression.pkl")
+        if model is None:
+            model = joblib.load(find_model_artifact(os.environ["ARTIFACT_FILES_PATH"]))
+        self.model = model
+        self.n_features = getattr(self.model, "n_features_in_", None)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+
+        # first prediction is run here so that the first request does not pay for lazy initialization
+        if self.n_features is not None:
+            self.model.predict(np.zeros((1, self.n_features), dtype=np.float64))
+
+        self._requests = queue.Queue()
+        if self.max_batch_size > 1:
+            threading.Thread(target=self._batch_loop, daemon=True).start()
         print("Initialization Complete")
 
+    def decode_inputs(self, inputs) -> np.ndarray:
+        """ Converts the request inputs to a 2d float array and validates the number of features.
+            inputs are either nested lists of feature rows, a columnar payload
+            {"dtype": "float32", "shape": [rows, features], "data": <base64 encoded raw buffer>} or raw float32 bytes,
+            which are only accepted if the model knows its number of features"""
+        if isinstance(inputs, dict):
+            features = np.frombuffer(base64.b64decode(inputs["data"]), dtype=inputs.get("dtype", "float32"))
+            features = features.reshape(inputs["shape"])
+        elif isinstance(inputs, (bytes, bytearray)):
+            # raw float32 bytes carry no shape, the rows are split by the number of features of the model
+            if self.n_features is None:
+                raise ValueError("Raw bytes inputs need a model with n_features_in_, send a columnar payload with a shape instead")
+            features = np.frombuffer(inputs, dtype=np.float32)
+            if features.size % self.n_features:
+                raise ValueError(f"Expected a multiple of {self.n_features} float32 values but got {features.size}")
+            features = features.reshape(-1, self.n_features)
+        else:
+            features = np.asarray(inputs, dtype=np.float64)
+
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.ndim != 2:
+            raise ValueError(f"Expected a 2 dimensional input but got {features.ndim} dimensions")
+        if self.n_features is not None and features.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features per row but got {features.shape[1]}")
+        return features
+
     def predict(self, inputs):
-        """ Serves a prediction request usign a trained model"""        
-        return self.model.predict(np.asarray(inputs)).tolist() # Numpy Arrays are not JSON serializable
\ No newline at end of file
+        """ Serves a prediction request usign a trained model"""
+        features = self.decode_inputs(inputs)
+        if self.max_batch_size <= 1 or len(features) >= self.max_batch_size:
+            return self.model.predict(features).tolist() # Numpy Arrays are not JSON serializable
+
+        request = Future()
+        self._requests.put((features, request))
+        return request.result().tolist()
+
+    def _batch_loop(self):
+        """ Collects concurrent requests into micro batches and runs a single model prediction per batch"""
+        while True:
+            batch = [self._requests.get()]
+            n_rows = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_batch_delay
+            while n_rows < self.max_batch_size:
+                # requests that are already waiting are always taken, new ones are waited for until the deadline
+                timeout = deadline - time.perf_counter()
+                try:
+                    if timeout <= 0:
+                        batch.append(self._requests.get_nowait())
+                    else:
+                        batch.append(self._requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                n_rows += len(batch[-1][0])
+
+            try:
+                predictions = self.model.predict(np.concatenate([features for features, _ in batch]))
+            except Exception as error:
+                for _, request in batch:
+                    request.set_exception(error)
+                continue
+
+            offset = 0
+            for features, request in batch:
+                request.set_result(predictions[offset:offset + len(features)])
+                offset += len(features)